@@ -0,0 +1,118 @@
+"""Benchmark request parsing and response serialization for large code_files bodies.
+
+Compares the stdlib path the handler used before (json.loads on a str body,
+full pydantic validation of code_files, json.dumps) with src.codec (bytes
+body, type-checked code_files attached as is, native encoder).
+
+Run from backend/:
+    python -m benchmarks.codec_benchmark --sizes 1 10 50
+"""
+
+import argparse
+import gc
+import json
+import time
+from typing import Callable, Dict, List
+
+from src import codec
+from src.handlers.main_handler import build_analysis_request
+from src.models import AnalysisRequest, AnalysisMethod, DiagramType, OutputFormat
+
+FILE_TEMPLATE = '''"""Módulo {i}: servicio de ejemplo."""
+
+class Service{i}(BaseService):
+    """Servicio número {i} con "comillas" y tabulaciones\\t."""
+
+    def __init__(self, repository: "Repository{i}"):
+        self.repository = repository
+        self.cache = {{}}
+
+    def handle(self, request):
+        if request.id in self.cache:
+            return self.cache[request.id]
+        result = self.repository.find(request.id)
+        self.cache[request.id] = result
+        return result
+'''
+
+
+def make_body(megabytes: float) -> Dict:
+    """Request body whose code_files add up to about the given size."""
+    target = int(megabytes * 1024 * 1024)
+    code_files = {}
+    size = 0
+    i = 0
+    while size < target:
+        content = FILE_TEMPLATE.format(i=i) * 20
+        code_files[f"src/pkg{i % 50}/service_{i}.py"] = content
+        size += len(content)
+        i += 1
+    return {"code_files": code_files, "diagram_type": "class", "output_format": "mermaid", "filters": {}}
+
+
+def stdlib_request(raw: bytes) -> AnalysisRequest:
+    body = json.loads(raw.decode("utf-8"))
+    return AnalysisRequest(
+        repo_url=body.get('repo_url'),
+        local_directory=body.get('local_directory'),
+        code_files=body.get('code_files'),
+        diagram_type=DiagramType(body['diagram_type']),
+        output_format=OutputFormat(body['output_format']),
+        analysis_method=AnalysisMethod(body.get('analysis_method', 'llm_direct')),
+        filters=body.get('filters', {})
+    )
+
+
+def codec_request(raw: bytes) -> AnalysisRequest:
+    return build_analysis_request(codec.loads(raw))
+
+
+def best_of(fn: Callable[[], object], repeat: int) -> float:
+    """Fastest run in milliseconds; GC is paused so collections do not skew one side."""
+    timings = []
+    for _ in range(repeat):
+        gc.collect()
+        gc.disable()
+        try:
+            started = time.perf_counter()
+            fn()
+            timings.append(time.perf_counter() - started)
+        finally:
+            gc.enable()
+    return min(timings) * 1000
+
+
+def run(sizes: List[float], repeat: int) -> List[Dict]:
+    rows = []
+    for megabytes in sizes:
+        body = make_body(megabytes)
+        raw = json.dumps(body).encode("utf-8")
+        rows.append({
+            "size_mb": round(len(raw) / (1024 * 1024), 1),
+            "parse_stdlib_ms": best_of(lambda: stdlib_request(raw), repeat),
+            "parse_codec_ms": best_of(lambda: codec_request(raw), repeat),
+            "dumps_stdlib_ms": best_of(lambda: json.dumps(body).encode("utf-8"), repeat),
+            "dumps_codec_ms": best_of(lambda: codec.dumps_bytes(body), repeat),
+        })
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=float, nargs="+", default=[1, 10, 50], help="Payload sizes in MB")
+    parser.add_argument("--repeat", type=int, default=5, help="Runs per measurement (best is reported)")
+    args = parser.parse_args()
+
+    print(f"codec backend: {codec.BACKEND}")
+    print(f"{'size MB':>8} {'parse stdlib':>13} {'parse codec':>12} {'speedup':>8} "
+          f"{'dumps stdlib':>13} {'dumps codec':>12} {'speedup':>8}")
+    for row in run(args.sizes, args.repeat):
+        print(f"{row['size_mb']:>8} "
+              f"{row['parse_stdlib_ms']:>11.1f}ms {row['parse_codec_ms']:>10.1f}ms "
+              f"{row['parse_stdlib_ms'] / row['parse_codec_ms']:>7.1f}x "
+              f"{row['dumps_stdlib_ms']:>11.1f}ms {row['dumps_codec_ms']:>10.1f}ms "
+              f"{row['dumps_stdlib_ms'] / row['dumps_codec_ms']:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,428 @@
+"""Load and soak test for the diagram handler with a fake LLM backend.
+
+Drives lambda_handler in-process, or the HTTP server over a local socket, with
+N concurrent closed-loop users. The LLM is replaced by a fake provider with
+configurable latency, so the numbers measure our own code: parsing,
+admission, ingestion, prompt preparation and serialization. The run is split
+into rounds; after each one RSS (and optionally tracemalloc) is sampled to
+expose growth across warm invocations.
+
+Run from backend/:
+    python -m benchmarks.load_test --target lambda --users 50 --requests 2000
+    python -m benchmarks.load_test --target http --users 200 --rounds 10 --requests 5000 \\
+        --trace-memory --max-p95 2 --max-error-rate 0.01 --max-rss-growth-mb 64 --report load.json
+
+Exits with status 1 when a threshold is exceeded, for nightly regression checks.
+"""
+
+import argparse
+import asyncio
+import gc
+import http.client
+import json
+import logging
+import math
+import os
+import random
+import resource
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional, Tuple
+
+from src import codec
+from src.handlers import main_handler
+from src.handlers.http_server import GENERATE_DIAGRAM_PATH, DiagramHTTPServer
+from src.services import admission
+from src.services.admission import AdmissionController
+from src.services.diagram_service import DiagramService
+
+logger = logging.getLogger(__name__)
+
+FILE_TEMPLATE = '''"""Módulo {i} de la prueba de carga."""
+
+class Service{i}:
+    def __init__(self, repository):
+        self.repository = repository
+
+    def handle(self, request_id):
+        return self.repository.find(request_id)
+'''
+
+
+class FakeLLMProvider:
+    """Stand-in for GeminiProvider that sleeps instead of calling the API."""
+
+    model_name = "fake-llm"
+
+    def __init__(self, latency: float = 0.5, jitter: float = 0.2, error_rate: float = 0.0,
+                 response_bytes: int = 2048, seed: Optional[int] = None, ir: bool = True):
+        """
+        Args:
+            latency: Mean seconds per generation
+            jitter: Relative spread of the latency (0.2 = +-20%)
+            error_rate: Fraction of generations that raise
+            response_bytes: Approximate size of the returned diagram code
+            ir: Answer with a diagram IR, as the service asks by default; False
+                measures the direct code generation path
+        """
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        classes = max(1, response_bytes // 20)
+        self.diagram = "classDiagram\n" + "".join(f"    class Service{i}\n" for i in range(classes))
+        self.ir = {
+            "nodes": [{"id": f"Service{i}", "label": f"Service{i}", "kind": "class"} for i in range(classes)],
+            "edges": [{"source": f"Service{i}", "target": "Service0", "kind": "dependency"} for i in range(1, classes)],
+        }
+        if not ir:
+            # DiagramService takes the IR path only when these are callable
+            self.generate_ir_from_source_files = None
+            self.agenerate_ir_from_source_files = None
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def _draw(self) -> Tuple[float, bool]:
+        with self._lock:
+            delay = self.latency * (1 + self.jitter * (2 * self._random.random() - 1))
+            failed = self._random.random() < self.error_rate
+        return max(0.0, delay), failed
+
+    def generate_diagram_from_source_files(self, source_files, diagram_type, output_format, file_aliases=None):
+        delay, failed = self._draw()
+        time.sleep(delay)
+        if failed:
+            raise RuntimeError("Gemini generation failed: fake backend error")
+        return self.diagram, f"{len(source_files)} archivos analizados"
+
+    async def agenerate_diagram_from_source_files(self, source_files, diagram_type, output_format, file_aliases=None):
+        delay, failed = self._draw()
+        await asyncio.sleep(delay)
+        if failed:
+            raise RuntimeError("Gemini generation failed: fake backend error")
+        return self.diagram, f"{len(source_files)} archivos analizados"
+
+    def generate_ir_from_source_files(self, source_files, diagram_type, file_aliases=None):
+        delay, failed = self._draw()
+        time.sleep(delay)
+        if failed:
+            raise RuntimeError("Gemini generation failed: fake backend error")
+        return self.ir, f"{len(source_files)} archivos analizados"
+
+    async def agenerate_ir_from_source_files(self, source_files, diagram_type, file_aliases=None):
+        delay, failed = self._draw()
+        await asyncio.sleep(delay)
+        if failed:
+            raise RuntimeError("Gemini generation failed: fake backend error")
+        return self.ir, f"{len(source_files)} archivos analizados"
+
+    def generate_diagram_from_github_url(self, repo_url, diagram_type, output_format):
+        return self.generate_diagram_from_source_files({}, diagram_type, output_format)
+
+
+def make_body(files: int, file_kb: float, nonce: Optional[int]) -> bytes:
+    """
+    Request body with generated code_files.
+
+    A nonce makes each body unique so single-flight coalescing does not merge
+    concurrent requests; None sends identical bodies.
+    """
+    repeat = max(1, int(file_kb * 1024 / len(FILE_TEMPLATE)))
+    code_files = {f"src/pkg{i % 10}/service_{i}.py": FILE_TEMPLATE.format(i=i) * repeat for i in range(files)}
+    if nonce is not None:
+        code_files["src/request.py"] = f"REQUEST_ID = {nonce}\n"
+    return codec.dumps_bytes({
+        "code_files": code_files,
+        "diagram_type": "class",
+        "output_format": "mermaid",
+        "filters": {},
+    })
+
+
+class LambdaTarget:
+    """Calls main_handler.lambda_handler in this process, as warm Lambda invocations would."""
+
+    name = "lambda"
+
+    def __init__(self, provider: FakeLLMProvider, controller: AdmissionController):
+        # lambda_handler builds a DiagramService per request from this module
+        # attribute and admits through the process-wide controller; both are
+        # restored by close()
+        self._saved = (main_handler.__dict__.get("DiagramService"), admission._default_controller)
+        main_handler.DiagramService = lambda: DiagramService(llm_provider=provider)
+        admission._default_controller = controller
+
+    def send(self, body: bytes, client_id: str) -> int:
+        event = {
+            "httpMethod": "POST",
+            "path": GENERATE_DIAGRAM_PATH,
+            "headers": {"Content-Type": "application/json", "X-Forwarded-For": client_id},
+            "requestContext": {"http": {"method": "POST", "sourceIp": client_id}},
+            "body": body.decode("utf-8"),
+        }
+        return main_handler.lambda_handler(event, None)["statusCode"]
+
+    def close(self):
+        service_class, admission._default_controller = self._saved
+        if service_class is None:
+            main_handler.__dict__.pop("DiagramService", None)
+        else:
+            main_handler.DiagramService = service_class
+
+
+class HttpTarget:
+    """Runs DiagramHTTPServer on a free local port; each user keeps one keep-alive connection."""
+
+    name = "http"
+
+    def __init__(self, provider: FakeLLMProvider, controller: AdmissionController, workers: int):
+        self.server = DiagramHTTPServer(
+            ("127.0.0.1", 0), workers=workers,
+            service=DiagramService(llm_provider=provider), admission=controller
+        )
+        self.port = self.server.server_address[1]
+        self.thread = threading.Thread(target=self.server.serve_forever, name="load-accept", daemon=True)
+        self.thread.start()
+        self._local = threading.local()
+
+    def send(self, body: bytes, client_id: str) -> int:
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = self._local.connection = http.client.HTTPConnection("127.0.0.1", self.port, timeout=300)
+        try:
+            connection.request("POST", GENERATE_DIAGRAM_PATH, body=body, headers={
+                "Content-Type": "application/json", "X-Forwarded-For": client_id
+            })
+            response = connection.getresponse()
+            response.read()
+            if response.getheader("Connection", "").lower() == "close":
+                connection.close()
+                self._local.connection = None
+            return response.status
+        except (OSError, http.client.HTTPException):
+            connection.close()
+            self._local.connection = None
+            raise
+
+    def close(self):
+        self.server.graceful_shutdown(timeout=30)
+        self.thread.join(timeout=5)
+
+
+def rss_bytes() -> int:
+    """Current resident set size (peak RSS where /proc is not available)."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        # ru_maxrss is in KiB on Linux and bytes on macOS
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if os.uname().sysname == "Darwin" else peak * 1024
+
+
+def percentile(sorted_values: List[float], fraction: float) -> float:
+    """Nearest-rank percentile of an ascending list."""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, math.ceil(fraction * len(sorted_values)))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+def run_round(send: Callable[[bytes, str], int], users: int, requests: int,
+              body_factory: Callable[[int], bytes], duration: Optional[float] = None) -> Tuple[List[Tuple[float, int]], float]:
+    """
+    Closed loop: each user sends its next request as soon as the previous one returns.
+
+    Returns:
+        Tuple of ((latency seconds, status) per request with status 0 for
+        exceptions, wall-clock seconds)
+    """
+    samples: List[Tuple[float, int]] = []
+    lock = threading.Lock()
+    issued = [0]
+    started = time.perf_counter()
+    deadline = started + duration if duration else None
+
+    def user(user_index: int):
+        client_id = f"10.0.{user_index // 250}.{user_index % 250 + 1}"
+        while True:
+            with lock:
+                if issued[0] >= requests or (deadline and time.perf_counter() >= deadline):
+                    return
+                sequence = issued[0]
+                issued[0] += 1
+            body = body_factory(sequence)
+            request_started = time.perf_counter()
+            try:
+                status = send(body, client_id)
+            except Exception:
+                status = 0
+            elapsed = time.perf_counter() - request_started
+            with lock:
+                samples.append((elapsed, status))
+
+    with ThreadPoolExecutor(max_workers=users, thread_name_prefix="load-user") as pool:
+        for future in [pool.submit(user, i) for i in range(users)]:
+            future.result()
+    return samples, time.perf_counter() - started
+
+
+def summarize(samples: List[Tuple[float, int]], seconds: float) -> Dict:
+    """Throughput, latency percentiles and status breakdown of a set of requests."""
+    latencies = sorted(latency for latency, _ in samples)
+    statuses = Counter(status for _, status in samples)
+    total = len(samples) or 1
+    errors = sum(count for status, count in statuses.items() if status == 0 or status >= 500)
+    return {
+        "requests": len(samples),
+        "seconds": round(seconds, 3),
+        "throughput_rps": round(len(samples) / seconds, 2) if seconds else 0.0,
+        "latency_s": {
+            "p50": round(percentile(latencies, 0.50), 4),
+            "p95": round(percentile(latencies, 0.95), 4),
+            "p99": round(percentile(latencies, 0.99), 4),
+            "max": round(latencies[-1], 4) if latencies else 0.0,
+        },
+        "statuses": {str(status): count for status, count in sorted(statuses.items())},
+        "error_rate": round(errors / total, 4),
+        "rejected_rate": round(statuses.get(429, 0) / total, 4),
+    }
+
+
+def run_load(target, users: int, requests: int, rounds: int, body_factory: Callable[[int], bytes],
+             duration: Optional[float] = None, warmup: int = 0, trace_memory: bool = False) -> Dict:
+    """
+    Warm up, then run `rounds` rounds of `requests` each and sample memory after every round.
+
+    Memory growth is measured from the end of the first round, so one-off
+    allocations (imports, pools, caches filling up) do not count as a leak.
+    """
+    if warmup:
+        run_round(target.send, min(users, warmup), warmup, body_factory)
+    if trace_memory:
+        tracemalloc.start()
+
+    all_samples: List[Tuple[float, int]] = []
+    memory = []
+    seconds = 0.0
+    round_duration = duration / rounds if duration else None
+    for round_index in range(rounds):
+        offset = warmup + round_index * requests
+        samples, elapsed = run_round(
+            target.send, users, requests, lambda i: body_factory(offset + i), round_duration
+        )
+        all_samples.extend(samples)
+        seconds += elapsed
+        gc.collect()
+        point = {"round": round_index + 1, "requests": len(all_samples), "rss_mb": round(rss_bytes() / 2 ** 20, 1)}
+        if trace_memory:
+            current, peak = tracemalloc.get_traced_memory()
+            point.update({"heap_mb": round(current / 2 ** 20, 2), "heap_peak_mb": round(peak / 2 ** 20, 2)})
+        memory.append(point)
+        logger.warning(f"round {round_index + 1}/{rounds}: {summarize(samples, elapsed)['latency_s']} {point}")
+
+    if trace_memory:
+        tracemalloc.stop()
+
+    report = summarize(all_samples, seconds)
+    report.update({"target": target.name, "users": users, "rounds": memory})
+    report["rss_growth_mb"] = round(memory[-1]["rss_mb"] - memory[0]["rss_mb"], 1)
+    if trace_memory:
+        report["heap_growth_mb"] = round(memory[-1]["heap_mb"] - memory[0]["heap_mb"], 2)
+    return report
+
+
+def check_thresholds(report: Dict, thresholds: Dict[str, Optional[float]]) -> List[str]:
+    """Return one message per exceeded threshold."""
+    measured = {
+        "max_p50": report["latency_s"]["p50"],
+        "max_p95": report["latency_s"]["p95"],
+        "max_p99": report["latency_s"]["p99"],
+        "max_error_rate": report["error_rate"],
+        "max_rejected_rate": report["rejected_rate"],
+        "max_rss_growth_mb": report["rss_growth_mb"],
+        "max_heap_growth_mb": report.get("heap_growth_mb"),
+    }
+    violations = []
+    for name, limit in thresholds.items():
+        if limit is None:
+            continue
+        if name == "min_throughput":
+            if report["throughput_rps"] < limit:
+                violations.append(f"throughput {report['throughput_rps']} rps < {limit}")
+            continue
+        value = measured.get(name)
+        if value is not None and value > limit:
+            violations.append(f"{name[4:]} {value} > {limit}")
+    return violations
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--target", choices=["lambda", "http"], default="lambda")
+    parser.add_argument("--users", type=int, default=50, help="Concurrent users (default: %(default)s)")
+    parser.add_argument("--requests", type=int, default=1000, help="Requests per round (default: %(default)s)")
+    parser.add_argument("--rounds", type=int, default=1, help="Rounds; memory is sampled after each (default: %(default)s)")
+    parser.add_argument("--duration", type=float, help="Total seconds to run instead of a fixed request count")
+    parser.add_argument("--warmup", type=int, default=20, help="Requests sent before measuring (default: %(default)s)")
+    parser.add_argument("--files", type=int, default=20, help="Files per request body (default: %(default)s)")
+    parser.add_argument("--file-kb", type=float, default=4, help="Size of each file in KB (default: %(default)s)")
+    parser.add_argument("--identical", action="store_true", help="Send identical bodies (exercises single-flight)")
+    parser.add_argument("--latency", type=float, default=0.5, help="Fake LLM latency in seconds (default: %(default)s)")
+    parser.add_argument("--jitter", type=float, default=0.2, help="Relative latency spread (default: %(default)s)")
+    parser.add_argument("--llm-error-rate", type=float, default=0.0, help="Fraction of failing LLM calls")
+    parser.add_argument("--response-kb", type=float, default=2, help="Size of the fake diagram in KB")
+    parser.add_argument("--direct", action="store_true",
+                        help="Fake LLM generates code directly instead of the IR rendered locally")
+    parser.add_argument("--admission-concurrency", type=int, default=admission.DEFAULT_MAX_CONCURRENCY)
+    parser.add_argument("--admission-queue", type=int, default=admission.DEFAULT_MAX_QUEUE)
+    parser.add_argument("--server-workers", type=int, help="HTTP worker threads (default: users)")
+    parser.add_argument("--trace-memory", action="store_true",
+                        help="Track Python heap growth with tracemalloc (several times slower; latencies are not comparable)")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--report", help="Write the JSON report to this file")
+    for name in ("max-p50", "max-p95", "max-p99", "max-error-rate", "max-rejected-rate",
+                 "max-rss-growth-mb", "max-heap-growth-mb", "min-throughput"):
+        parser.add_argument(f"--{name}", type=float, help="Fail when exceeded")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.WARNING, format="%(message)s")
+    provider = FakeLLMProvider(args.latency, args.jitter, args.llm_error_rate, int(args.response_kb * 1024), args.seed,
+                               ir=not args.direct)
+    controller = AdmissionController(
+        max_concurrency=args.admission_concurrency, max_queue=args.admission_queue, service_time=args.latency
+    )
+    if args.target == "http":
+        target = HttpTarget(provider, controller, args.server_workers or args.users)
+    else:
+        target = LambdaTarget(provider, controller)
+
+    if args.identical:
+        shared = make_body(args.files, args.file_kb, None)
+        body_factory = lambda i: shared
+    else:
+        body_factory = lambda i: make_body(args.files, args.file_kb, i)
+
+    try:
+        report = run_load(target, args.users, args.requests, args.rounds, body_factory,
+                          args.duration, args.warmup, args.trace_memory)
+    finally:
+        target.close()
+
+    report["config"] = {key: value for key, value in vars(args).items() if not key.startswith(("max_", "min_"))}
+    thresholds = {key: value for key, value in vars(args).items() if key.startswith(("max_", "min_"))}
+    report["violations"] = check_thresholds(report, thresholds)
+
+    print(json.dumps({key: value for key, value in report.items() if key not in ("config", "rounds")}, indent=2))
+    if args.report:
+        with open(args.report, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    for violation in report["violations"]:
+        print(f"THRESHOLD EXCEEDED: {violation}")
+    return 1 if report["violations"] else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
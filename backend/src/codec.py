@@ -0,0 +1,77 @@
+"""JSON codec used for request bodies, responses and model output.
+
+Uses orjson when installed, then msgspec, then the standard library. Both
+native codecs parse multi-megabyte `code_files` bodies several times faster
+than `json` and read `bytes` directly, so the HTTP server never decodes the
+body to a str first. Set UML_JSON_CODEC=json to force the fallback.
+"""
+
+import json
+import logging
+import os
+from typing import Any, Union
+
+logger = logging.getLogger(__name__)
+
+
+def _load_backend(preferred: str):
+    if preferred in ("", "orjson"):
+        try:
+            import orjson
+            return "orjson", orjson
+        except ImportError:
+            pass
+    if preferred in ("", "orjson", "msgspec"):
+        try:
+            import msgspec
+            return "msgspec", msgspec
+        except ImportError:
+            pass
+    return "json", json
+
+
+BACKEND, _module = _load_backend(os.getenv("UML_JSON_CODEC", "").strip().lower())
+logger.info(f"JSON codec: {BACKEND}")
+
+if BACKEND == "orjson":
+    _DUMPS_OPTIONS = _module.OPT_NON_STR_KEYS
+    _msgspec_encoder = _msgspec_decoder = None
+elif BACKEND == "msgspec":
+    _msgspec_encoder = _module.json.Encoder(enc_hook=str)
+    _msgspec_decoder = _module.json.Decoder()
+
+
+def loads(data: Union[str, bytes, bytearray, memoryview]) -> Any:
+    """
+    Parse a JSON document.
+
+    Raises:
+        ValueError: If the document is not valid JSON (json.JSONDecodeError
+            for the stdlib and orjson backends)
+    """
+    if BACKEND == "orjson":
+        return _module.loads(data)
+    if BACKEND == "msgspec":
+        try:
+            return _msgspec_decoder.decode(data)
+        except _module.DecodeError as e:
+            raise ValueError(str(e)) from e
+    if isinstance(data, memoryview):
+        data = data.tobytes()
+    return json.loads(data)
+
+
+def dumps_bytes(obj: Any) -> bytes:
+    """Serialize to UTF-8 encoded JSON."""
+    if BACKEND == "orjson":
+        return _module.dumps(obj, default=str, option=_DUMPS_OPTIONS)
+    if BACKEND == "msgspec":
+        return _msgspec_encoder.encode(obj)
+    return json.dumps(obj, default=str, ensure_ascii=False).encode("utf-8")
+
+
+def dumps(obj: Any) -> str:
+    """Serialize to a JSON string (API Gateway bodies must be str)."""
+    if BACKEND == "json":
+        return json.dumps(obj, default=str)
+    return dumps_bytes(obj).decode("utf-8")
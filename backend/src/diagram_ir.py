@@ -0,0 +1,972 @@
+"""Format-independent diagram description and its local renderers.
+
+The model describes a diagram once as nodes, edges and (for sequence
+diagrams) messages. Mermaid, PlantUML and Draw.io code is rendered from that
+description without another generation, so switching the output format is
+instant. frontend/js/irConverter.js ports these renderers and must produce
+the same code.
+"""
+
+import re
+from typing import Any, Dict, List, Optional, Tuple
+from xml.sax.saxutils import quoteattr
+from .diagram_layout import layered_layout
+from .models import DiagramType, OutputFormat
+
+# Bump when the shape of the IR changes, so cached descriptions are not reused
+IR_VERSION = 1
+
+NODE_KINDS = (
+    "class", "interface", "abstract", "enum", "object",
+    "component", "package", "database", "node", "device", "artifact",
+    "actor", "usecase", "system", "participant",
+    "initial", "final", "action", "decision", "merge", "fork", "join", "state", "choice", "partition",
+)
+# Kinds that can hold other nodes; a parent of any other kind is replaced by its nearest container ancestor
+CONTAINER_KINDS = {"package", "system", "node", "device", "partition", "state", "component"}
+EDGE_KINDS = (
+    "inheritance", "realization", "composition", "aggregation", "association", "dependency",
+    "include", "extend", "flow",
+)
+MESSAGE_KINDS = ("sync", "async", "reply")
+FRAGMENT_KINDS = ("loop", "alt", "opt", "par")
+
+DEFAULT_NODE_KINDS = {
+    DiagramType.CLASS: "class",
+    DiagramType.OBJECT: "object",
+    DiagramType.SEQUENCE: "participant",
+    DiagramType.COMPONENT: "component",
+    DiagramType.DEPLOYMENT: "node",
+    DiagramType.USE_CASE: "usecase",
+    DiagramType.ACTIVITY: "action",
+    DiagramType.STATE: "state",
+}
+DEFAULT_EDGE_KINDS = {DiagramType.ACTIVITY: "flow", DiagramType.STATE: "flow"}
+
+# Arrows shared by Mermaid class diagrams and PlantUML: "source ARROW target"
+CLASS_ARROWS = {
+    "inheritance": "--|>",
+    "realization": "..|>",
+    "composition": "*--",
+    "aggregation": "o--",
+    "association": "--",
+    "dependency": "..>",
+    "include": "..>",
+    "extend": "..>",
+    "flow": "-->",
+}
+MERMAID_FLOW_ARROWS = {
+    "inheritance": "-->",
+    "realization": "-.->",
+    "composition": "---",
+    "aggregation": "---",
+    "association": "---",
+    "dependency": "-.->",
+    "include": "-.->",
+    "extend": "-.->",
+    "flow": "-->",
+}
+MERMAID_MESSAGE_ARROWS = {"sync": "->>", "async": "-)", "reply": "-->>"}
+PLANTUML_MESSAGE_ARROWS = {"sync": "->", "async": "->>", "reply": "-->"}
+EDGE_DEFAULT_LABELS = {"include": "«include»", "extend": "«extend»"}
+KIND_STEREOTYPES = {
+    "interface": "interface", "abstract": "abstract", "enum": "enumeration",
+    "component": "component", "node": "node", "device": "device", "artifact": "artifact", "actor": "actor",
+}
+PLANTUML_KEYWORDS = {
+    "class": "class", "interface": "interface", "abstract": "abstract class", "enum": "enum", "object": "object",
+    "component": "component", "package": "package", "database": "database", "node": "node", "device": "node",
+    "artifact": "artifact", "actor": "actor", "usecase": "usecase", "system": "rectangle", "participant": "participant",
+}
+PLANTUML_CONTAINER_KEYWORDS = {"package", "node", "rectangle", "component", "database"}
+
+IDENTIFIER_RE = re.compile(r'[^A-Za-z0-9_]')
+RESERVED_IDS = {
+    "end", "class", "graph", "flowchart", "subgraph", "style", "state", "note", "loop", "alt", "opt", "par",
+    "and", "else", "participant", "actor", "direction", "click", "namespace", "node", "package", "component",
+    "database", "artifact", "usecase", "object", "interface", "enum", "abstract", "title", "left", "right",
+}
+
+DRAWIO_STYLES = {
+    "object": "rounded=0;fontStyle=4;verticalAlign=top;whiteSpace=wrap;html=0;",
+    "component": "shape=component;align=left;spacingLeft=36;whiteSpace=wrap;html=0;",
+    "package": "shape=folder;tabWidth=80;tabHeight=20;tabPosition=left;verticalAlign=top;align=left;spacingLeft=8;spacingTop=20;whiteSpace=wrap;html=0;",
+    "database": "shape=cylinder3;size=10;whiteSpace=wrap;html=0;",
+    "node": "shape=cube;size=10;verticalAlign=top;align=left;spacingLeft=8;spacingTop=10;whiteSpace=wrap;html=0;",
+    "device": "shape=cube;size=10;verticalAlign=top;align=left;spacingLeft=8;spacingTop=10;whiteSpace=wrap;html=0;",
+    "artifact": "shape=note;size=14;whiteSpace=wrap;html=0;",
+    "actor": "shape=umlActor;verticalLabelPosition=bottom;verticalAlign=top;html=0;",
+    "usecase": "ellipse;whiteSpace=wrap;html=0;",
+    "system": "swimlane;startSize=26;html=0;",
+    "participant": "rounded=0;whiteSpace=wrap;html=0;",
+    "initial": "ellipse;fillColor=#000000;strokeColor=#000000;html=0;",
+    "final": "ellipse;shape=doubleEllipse;fillColor=#000000;strokeColor=#000000;html=0;",
+    "action": "rounded=1;arcSize=40;whiteSpace=wrap;html=0;",
+    "state": "rounded=1;arcSize=20;whiteSpace=wrap;verticalAlign=top;html=0;",
+    "decision": "rhombus;whiteSpace=wrap;html=0;",
+    "merge": "rhombus;whiteSpace=wrap;html=0;",
+    "choice": "rhombus;whiteSpace=wrap;html=0;",
+    "fork": "fillColor=#000000;strokeColor=#000000;html=0;",
+    "join": "fillColor=#000000;strokeColor=#000000;html=0;",
+    "partition": "swimlane;startSize=26;html=0;",
+    "interface": "ellipse;labelPosition=center;verticalLabelPosition=bottom;verticalAlign=top;html=0;",
+}
+DRAWIO_CLASS_STYLE = "swimlane;fontStyle=1;align=center;html=0;"
+DRAWIO_MEMBER_STYLE = "text;align=left;verticalAlign=top;spacingLeft=4;spacingRight=4;overflow=hidden;html=0;"
+DRAWIO_EDGE_STYLES = {
+    "inheritance": "endArrow=block;endFill=0;html=0;",
+    "realization": "endArrow=block;endFill=0;dashed=1;html=0;",
+    "composition": "startArrow=diamondThin;startFill=1;startSize=14;endArrow=none;html=0;",
+    "aggregation": "startArrow=diamondThin;startFill=0;startSize=14;endArrow=none;html=0;",
+    "association": "endArrow=none;html=0;",
+    "dependency": "endArrow=open;dashed=1;html=0;",
+    "include": "endArrow=open;dashed=1;html=0;",
+    "extend": "endArrow=open;dashed=1;html=0;",
+    "flow": "endArrow=open;html=0;",
+}
+DRAWIO_MESSAGE_STYLES = {
+    "sync": "endArrow=block;endFill=1;html=0;",
+    "async": "endArrow=open;html=0;",
+    "reply": "endArrow=open;dashed=1;html=0;",
+}
+DRAWIO_SIZES = {
+    "component": (160, 60), "package": (160, 80), "database": (100, 80), "node": (160, 80), "device": (160, 80),
+    "artifact": (140, 50), "actor": (30, 60), "usecase": (140, 60), "system": (200, 100), "participant": (120, 40),
+    "initial": (30, 30), "final": (30, 30), "action": (140, 40), "state": (140, 50), "decision": (80, 50),
+    "merge": (80, 50), "choice": (80, 50), "fork": (100, 8), "join": (100, 8), "partition": (200, 100),
+    "interface": (20, 20),
+}
+CLASS_KINDS = {"class", "interface", "abstract", "enum", "object"}
+# Generalizations are laid out with the parent above the child
+UPWARD_EDGE_KINDS = {"inheritance", "realization"}
+CONTAINER_PADDING = 20
+CONTAINER_HEADER = 40
+ROW_HEIGHT = 18
+HEADER_HEIGHT = 26
+CHAR_WIDTH = 7
+LIFELINE_SPACING = 180
+MESSAGE_SPACING = 40
+
+
+def normalize_ir(raw: Any, diagram_type: DiagramType) -> Dict:
+    """
+    Validate a model-produced IR and fill in defaults.
+
+    Unknown kinds get the diagram type's default, endpoints that were never
+    declared become nodes, and parents that are not containers (or would form
+    a cycle) are replaced by the nearest container ancestor.
+
+    Returns:
+        Dict with diagram_type, nodes, edges and messages, every field present
+
+    Raises:
+        ValueError: If the IR is not an object or has no nodes
+    """
+    diagram_type = DiagramType(diagram_type)
+    if not isinstance(raw, dict):
+        raise ValueError("Diagram IR must be a JSON object")
+
+    default_kind = DEFAULT_NODE_KINDS.get(diagram_type, "class")
+    default_edge_kind = DEFAULT_EDGE_KINDS.get(diagram_type, "association")
+    nodes: Dict[str, Dict] = {}
+
+    def add_node(item: Dict):
+        node_id = _text(item.get("id")) or _text(item.get("label"))
+        if not node_id or node_id in nodes:
+            return
+        kind = _text(item.get("kind")).lower()
+        nodes[node_id] = {
+            "id": node_id,
+            "label": _text(item.get("label")) or node_id,
+            "kind": kind if kind in NODE_KINDS else default_kind,
+            "stereotype": _text(item.get("stereotype")).strip("<>«» "),
+            "parent": _text(item.get("parent")),
+            "attributes": _lines(item.get("attributes")),
+            "operations": _lines(item.get("operations")),
+        }
+
+    for item in _objects(raw.get("nodes")):
+        add_node(item)
+
+    edges = []
+    for item in _objects(raw.get("edges")):
+        source, target = _text(item.get("source")), _text(item.get("target"))
+        if not source or not target:
+            continue
+        add_node({"id": source})
+        add_node({"id": target})
+        kind = _text(item.get("kind")).lower()
+        edges.append({
+            "source": source,
+            "target": target,
+            "kind": kind if kind in EDGE_KINDS else default_edge_kind,
+            "label": _text(item.get("label")),
+            "source_label": _text(item.get("source_label")),
+            "target_label": _text(item.get("target_label")),
+        })
+
+    messages = []
+    for item in _objects(raw.get("messages")):
+        source, target = _text(item.get("source")), _text(item.get("target"))
+        if not source or not target:
+            continue
+        add_node({"id": source, "kind": "participant"})
+        add_node({"id": target, "kind": "participant"})
+        kind = _text(item.get("kind")).lower()
+        fragment = _text(item.get("fragment")).lower()
+        messages.append({
+            "source": source,
+            "target": target,
+            "label": _text(item.get("label")),
+            "kind": kind if kind in MESSAGE_KINDS else "sync",
+            "fragment": fragment if fragment in FRAGMENT_KINDS else "",
+            "guard": _text(item.get("guard")) if fragment in FRAGMENT_KINDS else "",
+        })
+
+    if not nodes:
+        raise ValueError("Diagram IR has no nodes")
+
+    for node in nodes.values():
+        node["parent"] = _container_parent(node, nodes)
+    # Containers naming each other as parent: the first one seen becomes a root
+    for node in nodes.values():
+        seen = {node["id"]}
+        parent = node["parent"]
+        while parent:
+            if parent in seen:
+                node["parent"] = ""
+                break
+            seen.add(parent)
+            parent = nodes[parent]["parent"]
+
+    return {
+        "version": IR_VERSION,
+        "diagram_type": diagram_type.value,
+        "nodes": list(nodes.values()),
+        "edges": edges,
+        "messages": messages,
+    }
+
+
+def render_ir(ir: Dict, output_format: OutputFormat) -> str:
+    """
+    Render a normalized IR as diagram code.
+
+    Args:
+        ir: Result of normalize_ir
+        output_format: Target format
+
+    Returns:
+        Diagram code in the requested format
+    """
+    output_format = OutputFormat(output_format)
+    diagram_type = DiagramType(ir["diagram_type"])
+    if output_format == OutputFormat.MERMAID:
+        return render_mermaid(ir, diagram_type)
+    if output_format == OutputFormat.PLANTUML:
+        return render_plantuml(ir, diagram_type)
+    return render_drawio(ir, diagram_type)
+
+
+def render_mermaid(ir: Dict, diagram_type: DiagramType) -> str:
+    """Mermaid code: classDiagram, sequenceDiagram, stateDiagram-v2 or a flowchart."""
+    if diagram_type in (DiagramType.CLASS, DiagramType.OBJECT):
+        lines = _mermaid_class(ir)
+    elif diagram_type == DiagramType.SEQUENCE:
+        lines = _mermaid_sequence(ir)
+    elif diagram_type == DiagramType.STATE:
+        lines = _mermaid_state(ir)
+    else:
+        lines = _mermaid_flowchart(ir, "TD" if diagram_type == DiagramType.ACTIVITY else "LR")
+    return "\n".join(lines) + "\n"
+
+
+def render_plantuml(ir: Dict, diagram_type: DiagramType) -> str:
+    """PlantUML code; activity diagrams use the state syntax, which accepts any graph."""
+    if diagram_type in (DiagramType.CLASS, DiagramType.OBJECT):
+        body = _plantuml_class(ir)
+    elif diagram_type == DiagramType.SEQUENCE:
+        body = _plantuml_sequence(ir)
+    elif diagram_type in (DiagramType.STATE, DiagramType.ACTIVITY):
+        body = _plantuml_state(ir)
+    else:
+        body = _plantuml_graph(ir, diagram_type == DiagramType.USE_CASE)
+    return "\n".join(["@startuml"] + body + ["@enduml"]) + "\n"
+
+
+def render_drawio(ir: Dict, diagram_type: DiagramType) -> str:
+    """Draw.io document with one cell per node, edge and message."""
+    cells = ['<mxCell id="0"/>', '<mxCell id="1" parent="0"/>']
+    if diagram_type == DiagramType.SEQUENCE:
+        cells.extend(_drawio_sequence(ir))
+    else:
+        # Use case diagrams read left to right: actors, then the use cases they start
+        cells.extend(_drawio_graph(ir, horizontal=diagram_type == DiagramType.USE_CASE))
+    return (
+        '<mxfile host="EduUML"><diagram id="diagram" name="Diagram"><mxGraphModel><root>'
+        + "".join(cells)
+        + "</root></mxGraphModel></diagram></mxfile>"
+    )
+
+
+# Mermaid
+
+def _mermaid_class(ir: Dict) -> List[str]:
+    aliases = _aliases(ir["nodes"])
+    children = _children(ir["nodes"])
+    lines = ["classDiagram"]
+
+    def declare(node: Dict, indent: str):
+        label = node["label"]
+        if node["kind"] == "object" and node["stereotype"]:
+            label = f"{label} : {node['stereotype']}"
+        header = f'{indent}class {aliases[node["id"]]}'
+        if label != aliases[node["id"]]:
+            header += f'["{_mermaid_label(label)}"]'
+        stereotype = "" if node["kind"] == "object" else _stereotype(node) or _foreign_kind(node)
+        members = [_mermaid_member(member) for member in node["attributes"] + node["operations"]]
+        if not stereotype and not members:
+            lines.append(header)
+            return
+        lines.append(header + " {")
+        if stereotype:
+            lines.append(f"{indent}    <<{stereotype}>>")
+        lines.extend(f"{indent}    {member}" for member in members)
+        lines.append(f"{indent}}}")
+
+    # Mermaid namespaces do not nest: every class goes in its top-level package
+    for node in children.get("", []):
+        if node["id"] not in children:
+            declare(node, "    ")
+            continue
+        lines.append(f"    namespace {aliases[node['id']]} {{")
+        for child in _descendants(node, children):
+            if child["id"] not in children:
+                declare(child, "        ")
+        lines.append("    }")
+
+    for edge in ir["edges"]:
+        lines.append("    " + _relation(edge, aliases, CLASS_ARROWS, _mermaid_label))
+    return lines
+
+
+def _mermaid_sequence(ir: Dict) -> List[str]:
+    aliases = _aliases(ir["nodes"])
+    lines = ["sequenceDiagram"]
+    for node in ir["nodes"]:
+        keyword = "actor" if node["kind"] == "actor" else "participant"
+        alias = aliases[node["id"]]
+        lines.append(f"    {keyword} {alias}" + (f" as {_mermaid_message(node['label'])}" if node["label"] != alias else ""))
+
+    def message_line(message: Dict) -> str:
+        arrow = MERMAID_MESSAGE_ARROWS[message["kind"]]
+        return (f"{aliases[message['source']]}{arrow}{aliases[message['target']]}: "
+                f"{_mermaid_message(message['label']) or ' '}")
+
+    lines.extend(_sequence_lines(ir["messages"], message_line, "    ", {"alt": "else", "par": "and"}))
+    return lines
+
+
+def _mermaid_state(ir: Dict) -> List[str]:
+    aliases = _aliases(ir["nodes"])
+    children = _children(ir["nodes"])
+    nodes = {node["id"]: node for node in ir["nodes"]}
+    scoped_edges = _edges_by_scope(ir["edges"], nodes)
+    lines = ["stateDiagram-v2"]
+
+    def block(parent_id: str, indent: str):
+        for node in children.get(parent_id, []):
+            alias = aliases[node["id"]]
+            if node["kind"] in ("initial", "final"):
+                continue
+            if node["kind"] in ("choice", "decision", "merge", "fork", "join"):
+                marker = {"decision": "choice", "merge": "choice"}.get(node["kind"], node["kind"])
+                lines.append(f"{indent}state {alias} <<{marker}>>")
+                continue
+            if node["label"] != alias:
+                lines.append(f'{indent}state "{_mermaid_state_text(node["label"])}" as {alias}')
+            if node["id"] in children:
+                lines.append(f"{indent}state {alias} {{")
+                block(node["id"], indent + "    ")
+                lines.append(f"{indent}}}")
+            elif node["label"] == alias:
+                lines.append(f"{indent}{alias}")
+            for operation in node["operations"]:
+                lines.append(f"{indent}{alias} : {_mermaid_state_text(operation)}")
+        for edge in scoped_edges.get(parent_id, []):
+            source = "[*]" if nodes[edge["source"]]["kind"] in ("initial", "final") else aliases[edge["source"]]
+            target = "[*]" if nodes[edge["target"]]["kind"] in ("initial", "final") else aliases[edge["target"]]
+            label = f" : {_mermaid_state_text(edge['label'])}" if edge["label"] else ""
+            lines.append(f"{indent}{source} --> {target}{label}")
+
+    block("", "    ")
+    return lines
+
+
+def _mermaid_flowchart(ir: Dict, direction: str) -> List[str]:
+    aliases = _aliases(ir["nodes"])
+    children = _children(ir["nodes"])
+    lines = [f"flowchart {direction}"]
+    bars = []
+
+    def block(parent_id: str, indent: str):
+        for node in children.get(parent_id, []):
+            alias = aliases[node["id"]]
+            if node["id"] in children:
+                lines.append(f'{indent}subgraph {alias}["{_mermaid_text(_titled(node))}"]')
+                block(node["id"], indent + "    ")
+                lines.append(f"{indent}end")
+                continue
+            lines.append(f"{indent}{alias}{_mermaid_shape(node)}")
+            if node["kind"] in ("fork", "join"):
+                bars.append(alias)
+
+    block("", "    ")
+    for edge in ir["edges"]:
+        arrow = MERMAID_FLOW_ARROWS[edge["kind"]]
+        label = edge["label"] or EDGE_DEFAULT_LABELS.get(edge["kind"], "")
+        label = f'|"{_mermaid_text(label)}"|' if label else ""
+        lines.append(f"    {aliases[edge['source']]} {arrow}{label} {aliases[edge['target']]}")
+    if bars:
+        lines.append("    classDef bar fill:#000,stroke:#000,color:#000")
+        lines.append(f"    class {','.join(bars)} bar")
+    return lines
+
+
+def _mermaid_shape(node: Dict) -> str:
+    kind = node["kind"]
+    text = _mermaid_text(node["label"])
+    if kind == "initial":
+        return '(("●"))'
+    if kind == "final":
+        return '(("◉"))'
+    if kind in ("fork", "join"):
+        return '[" "]'
+    if kind in ("decision", "merge", "choice"):
+        return f'{{"{text}"}}'
+    if kind in ("action", "state"):
+        return f'("{text}")'
+    if kind == "usecase":
+        return f'(["{text}"])'
+    if kind == "database":
+        return f'[("{text}")]'
+    if kind == "interface":
+        return f'(("{text}"))'
+    if kind == "actor":
+        actor = _mermaid_text(f"«actor»\n{node['label']}")
+        return f'["{actor}"]'
+    return f'["{_mermaid_text(_titled(node))}"]'
+
+
+def _mermaid_text(text: str) -> str:
+    # Entity codes keep quotes and angle brackets from ending a flowchart label
+    return (text.replace('"', "#quot;").replace("<", "#lt;").replace(">", "#gt;")
+            .replace("\n", "<br/>"))
+
+
+def _mermaid_label(text: str) -> str:
+    return text.replace('"', "'").replace("\n", " ")
+
+
+def _mermaid_message(text: str) -> str:
+    # A semicolon would end the statement
+    return text.replace("\n", " ").replace(";", "#59;")
+
+
+def _mermaid_state_text(text: str) -> str:
+    return text.replace('"', "'").replace("\n", " ")
+
+
+def _mermaid_member(member: str) -> str:
+    # Mermaid writes generics as List~Item~
+    return member.replace("\n", " ").replace("<", "~").replace(">", "~").replace("{", "(").replace("}", ")")
+
+
+# PlantUML
+
+def _plantuml_class(ir: Dict) -> List[str]:
+    aliases = _aliases(ir["nodes"])
+    children = _children(ir["nodes"])
+    lines = []
+
+    def block(parent_id: str, indent: str):
+        for node in children.get(parent_id, []):
+            alias = aliases[node["id"]]
+            if node["id"] in children:
+                lines.append(f'{indent}package "{_plantuml_text(node["label"])}" as {alias} {{')
+                block(node["id"], indent + "  ")
+                lines.append(f"{indent}}}")
+                continue
+            label = node["label"]
+            if node["kind"] == "object" and node["stereotype"]:
+                label = f"{label} : {node['stereotype']}"
+            keyword = PLANTUML_KEYWORDS[node["kind"]] if node["kind"] in CLASS_KINDS else "class"
+            header = f'{indent}{keyword} "{_plantuml_text(label)}" as {alias}'
+            stereotype = "" if node["kind"] == "object" else node["stereotype"] or _foreign_kind(node)
+            if stereotype:
+                header += f" <<{_plantuml_text(stereotype)}>>"
+            members = node["attributes"] + node["operations"]
+            if not members:
+                lines.append(header)
+                continue
+            lines.append(header + " {")
+            lines.extend(f"{indent}  {_plantuml_member(member)}" for member in node["attributes"])
+            if node["attributes"] and node["operations"]:
+                lines.append(f"{indent}  --")
+            lines.extend(f"{indent}  {_plantuml_member(member)}" for member in node["operations"])
+            lines.append(f"{indent}}}")
+
+    block("", "")
+    lines.extend(_relation(edge, aliases, CLASS_ARROWS, _plantuml_text) for edge in ir["edges"])
+    return lines
+
+
+def _plantuml_sequence(ir: Dict) -> List[str]:
+    aliases = _aliases(ir["nodes"])
+    lines = []
+    for node in ir["nodes"]:
+        keyword = {"actor": "actor", "database": "database"}.get(node["kind"], "participant")
+        lines.append(f'{keyword} "{_plantuml_text(node["label"])}" as {aliases[node["id"]]}')
+
+    def message_line(message: Dict) -> str:
+        arrow = PLANTUML_MESSAGE_ARROWS[message["kind"]]
+        label = f" : {_plantuml_text(message['label'])}" if message["label"] else ""
+        return f"{aliases[message['source']]} {arrow} {aliases[message['target']]}{label}"
+
+    lines.extend(_sequence_lines(ir["messages"], message_line, "", {"alt": "else", "par": "else"}))
+    return lines
+
+
+def _plantuml_state(ir: Dict) -> List[str]:
+    aliases = _aliases(ir["nodes"])
+    children = _children(ir["nodes"])
+    nodes = {node["id"]: node for node in ir["nodes"]}
+    scoped_edges = _edges_by_scope(ir["edges"], nodes)
+    lines = ["hide empty description"]
+
+    def block(parent_id: str, indent: str):
+        for node in children.get(parent_id, []):
+            alias = aliases[node["id"]]
+            if node["kind"] in ("initial", "final"):
+                continue
+            if node["kind"] in ("choice", "decision", "merge", "fork", "join"):
+                marker = {"decision": "choice", "merge": "choice"}.get(node["kind"], node["kind"])
+                lines.append(f"{indent}state {alias} <<{marker}>>")
+                continue
+            header = f'{indent}state "{_plantuml_text(node["label"])}" as {alias}'
+            if node["id"] in children:
+                lines.append(header + " {")
+                block(node["id"], indent + "  ")
+                lines.append(f"{indent}}}")
+            else:
+                lines.append(header)
+            for operation in node["operations"]:
+                lines.append(f"{indent}{alias} : {_plantuml_text(operation)}")
+        for edge in scoped_edges.get(parent_id, []):
+            source = "[*]" if nodes[edge["source"]]["kind"] in ("initial", "final") else aliases[edge["source"]]
+            target = "[*]" if nodes[edge["target"]]["kind"] in ("initial", "final") else aliases[edge["target"]]
+            label = f" : {_plantuml_text(edge['label'])}" if edge["label"] else ""
+            lines.append(f"{indent}{source} --> {target}{label}")
+
+    block("", "")
+    return lines
+
+
+def _plantuml_graph(ir: Dict, use_case: bool) -> List[str]:
+    aliases = _aliases(ir["nodes"])
+    children = _children(ir["nodes"])
+    lines = ["left to right direction"] if use_case else []
+
+    def block(parent_id: str, indent: str):
+        for node in children.get(parent_id, []):
+            alias = aliases[node["id"]]
+            keyword = PLANTUML_KEYWORDS.get(node["kind"], "rectangle")
+            if node["id"] in children and keyword not in PLANTUML_CONTAINER_KEYWORDS:
+                keyword = "rectangle"
+            stereotype = node["stereotype"] or ("device" if node["kind"] == "device" else "")
+            header = f'{indent}{keyword} "{_plantuml_text(node["label"])}" as {alias}'
+            if stereotype:
+                header += f" <<{_plantuml_text(stereotype)}>>"
+            if node["id"] in children:
+                lines.append(header + " {")
+                block(node["id"], indent + "  ")
+                lines.append(f"{indent}}}")
+            else:
+                lines.append(header)
+
+    block("", "")
+    lines.extend(_relation(edge, aliases, CLASS_ARROWS, _plantuml_text) for edge in ir["edges"])
+    return lines
+
+
+def _plantuml_text(text: str) -> str:
+    return text.replace('"', "'").replace("\n", "\\n")
+
+
+def _plantuml_member(member: str) -> str:
+    return member.replace("\n", " ").replace("{", "(").replace("}", ")")
+
+
+# Draw.io
+
+def _drawio_graph(ir: Dict, horizontal: bool) -> List[str]:
+    aliases = _aliases(ir["nodes"])
+    children = _children(ir["nodes"])
+    nodes = {node["id"]: node for node in ir["nodes"]}
+    sizes: Dict[str, Tuple[int, int]] = {}
+    # Position relative to the parent cell; bend points relative to the scope's content area
+    positions: Dict[str, Tuple[int, int]] = {}
+    waypoints: Dict[int, Tuple[str, List[Tuple[int, int]]]] = {}
+
+    def layout(scope: str, pad_x: int, pad_y: int) -> Tuple[int, int]:
+        """Lay out the children of scope with the edges between them (or their descendants)."""
+        group = children[scope]
+        for node in group:
+            sizes[node["id"]] = measure(node)
+        edges = []
+        for i, edge in enumerate(ir["edges"]):
+            source = _scope_child(edge["source"], scope, nodes)
+            target = _scope_child(edge["target"], scope, nodes)
+            if source and target and source != target:
+                # Keep generalizations pointing up: parents above their children
+                upward = edge["kind"] in UPWARD_EDGE_KINDS
+                edges.append((target, source, i) if upward else (source, target, i))
+        result = layered_layout([node["id"] for node in group], sizes, edges, horizontal)
+        for node_id, (x, y) in result["positions"].items():
+            positions[node_id] = (x + pad_x, y + pad_y)
+        for upper, lower, i in edges:
+            edge = ir["edges"][i]
+            # Bend points only for edges drawn between these very nodes
+            if i in result["waypoints"] and {upper, lower} == {edge["source"], edge["target"]}:
+                points = result["waypoints"][i]
+                if upper != edge["source"]:
+                    points = points[::-1]
+                waypoints[i] = (scope, [(x + pad_x, y + pad_y) for x, y in points])
+        return result["width"] + pad_x * 2, result["height"] + pad_y + CONTAINER_PADDING
+
+    def measure(node: Dict) -> Tuple[int, int]:
+        if node["id"] not in children:
+            return _leaf_size(node)
+        width, height = layout(node["id"], CONTAINER_PADDING, CONTAINER_HEADER)
+        return max(width, DRAWIO_SIZES.get(node["kind"], (160, 80))[0]), height
+
+    layout("", 40, 40)
+
+    cells = []
+    # Top-left corner of each scope, to turn relative bend points into absolute ones
+    origins: Dict[str, Tuple[int, int]] = {"": (0, 0)}
+
+    def emit(node: Dict, parent: str):
+        alias = aliases[node["id"]]
+        x, y = positions[node["id"]]
+        width, height = sizes[node["id"]]
+        parent_x, parent_y = origins[node["parent"]]
+        origins[node["id"]] = (parent_x + x, parent_y + y)
+        geometry = f'<mxGeometry x="{x}" y="{y}" width="{width}" height="{height}" as="geometry"/>'
+        if node["kind"] in CLASS_KINDS and node["kind"] != "object":
+            cells.extend(_drawio_class(node, alias, parent, geometry, width))
+        else:
+            style = DRAWIO_STYLES.get(node["kind"], DRAWIO_STYLES["component"])
+            if node["id"] in children:
+                style += "container=1;"
+            cells.append(
+                f'<mxCell id="{alias}" value={quoteattr(_drawio_label(node))} style="{style}" vertex="1" '
+                f'parent="{parent}">{geometry}</mxCell>'
+            )
+        for child in children.get(node["id"], []):
+            emit(child, alias)
+
+    for node in children.get("", []):
+        emit(node, "1")
+
+    for i, edge in enumerate(ir["edges"]):
+        label = edge["label"] or EDGE_DEFAULT_LABELS.get(edge["kind"], "")
+        cells.append(
+            f'<mxCell id="e{i}" value={quoteattr(label)} style="{DRAWIO_EDGE_STYLES[edge["kind"]]}" edge="1" '
+            f'parent="1" source="{aliases[edge["source"]]}" target="{aliases[edge["target"]]}">'
+            f'<mxGeometry relative="1" as="geometry">{_drawio_points(waypoints.get(i), origins)}</mxGeometry></mxCell>'
+        )
+        for end, x in (("source_label", -1), ("target_label", 1)):
+            if edge[end]:
+                align = "left" if x < 0 else "right"
+                cells.append(
+                    f'<mxCell id="e{i}-{end[0]}" value={quoteattr(edge[end])} '
+                    f'style="edgeLabel;resizable=0;html=0;align={align};verticalAlign=bottom;" vertex="1" '
+                    f'connectable="0" parent="e{i}"><mxGeometry x="{x}" relative="1" as="geometry"/></mxCell>'
+                )
+    return cells
+
+
+def _drawio_class(node: Dict, alias: str, parent: str, geometry: str, width: int) -> List[str]:
+    y = HEADER_HEIGHT + (ROW_HEIGHT if _stereotype(node) else 0)
+    cells = [
+        f'<mxCell id="{alias}" value={quoteattr(_drawio_label(node))} style="{DRAWIO_CLASS_STYLE}startSize={y};" '
+        f'vertex="1" parent="{parent}">{geometry}</mxCell>'
+    ]
+    for suffix, members in (("attributes", node["attributes"]), ("operations", node["operations"])):
+        if suffix == "operations":
+            cells.append(
+                f'<mxCell id="{alias}-line" value="" style="line;strokeWidth=1;html=0;" vertex="1" parent="{alias}">'
+                f'<mxGeometry y="{y}" width="{width}" height="8" as="geometry"/></mxCell>'
+            )
+            y += 8
+        height = max(1, len(members)) * ROW_HEIGHT
+        value = quoteattr("\n".join(members))
+        cells.append(
+            f'<mxCell id="{alias}-{suffix}" value={value} style="{DRAWIO_MEMBER_STYLE}" '
+            f'vertex="1" parent="{alias}"><mxGeometry y="{y}" width="{width}" height="{height}" as="geometry"/></mxCell>'
+        )
+        y += height
+    return cells
+
+
+def _drawio_sequence(ir: Dict) -> List[str]:
+    aliases = _aliases(ir["nodes"])
+    messages = ir["messages"]
+    centers = {}
+    height = 80 + MESSAGE_SPACING * (len(messages) + 1)
+    cells = []
+    for i, node in enumerate(ir["nodes"]):
+        x = 40 + i * LIFELINE_SPACING
+        centers[node["id"]] = x + 60
+        style = "shape=umlLifeline;perimeter=lifelinePerimeter;container=1;collapsible=0;recursiveResize=0;html=0;"
+        if node["kind"] == "actor":
+            style += "participant=umlActor;verticalLabelPosition=bottom;verticalAlign=top;"
+        cells.append(
+            f'<mxCell id="{aliases[node["id"]]}" value={quoteattr(node["label"])} style="{style}" vertex="1" parent="1">'
+            f'<mxGeometry x="{x}" y="40" width="120" height="{height}" as="geometry"/></mxCell>'
+        )
+
+    for i, message in enumerate(messages):
+        y = 120 + i * MESSAGE_SPACING
+        source, target = centers[message["source"]], centers[message["target"]]
+        points = f'<mxPoint x="{source}" y="{y}" as="sourcePoint"/>'
+        if source == target:
+            points += f'<Array as="points"><mxPoint x="{source + 40}" y="{y}"/><mxPoint x="{source + 40}" y="{y + 20}"/></Array>'
+            points += f'<mxPoint x="{target}" y="{y + 20}" as="targetPoint"/>'
+        else:
+            points += f'<mxPoint x="{target}" y="{y}" as="targetPoint"/>'
+        cells.append(
+            f'<mxCell id="m{i}" value={quoteattr(message["label"])} style="{DRAWIO_MESSAGE_STYLES[message["kind"]]}" '
+            f'edge="1" parent="1"><mxGeometry relative="1" as="geometry">{points}</mxGeometry></mxCell>'
+        )
+
+    for j, frame in enumerate(_fragment_blocks(messages)):
+        xs = [centers[messages[i][end]] for i in range(frame["first"], frame["last"] + 1) for end in ("source", "target")]
+        left = min(xs) - 70
+        right = max(xs) + 70
+        top = 120 + frame["first"] * MESSAGE_SPACING - 30
+        bottom = 120 + frame["last"] * MESSAGE_SPACING + 30
+        guard = frame["guards"][0][1]
+        label = frame["fragment"] + (f" [{guard}]" if guard else "")
+        cells.append(
+            f'<mxCell id="f{j}" value={quoteattr(label)} style="shape=umlFrame;whiteSpace=wrap;html=0;width=120;height=24;" '
+            f'vertex="1" parent="1"><mxGeometry x="{left}" y="{top}" width="{right - left}" height="{bottom - top}" '
+            f'as="geometry"/></mxCell>'
+        )
+        for k, (index, branch_guard) in enumerate(frame["guards"][1:]):
+            y = 120 + index * MESSAGE_SPACING - 20
+            cells.append(
+                f'<mxCell id="f{j}-{k}" value={quoteattr(f"[{branch_guard}]" if branch_guard else "")} '
+                f'style="line;dashed=1;align=left;verticalAlign=bottom;html=0;" vertex="1" parent="1">'
+                f'<mxGeometry x="{left}" y="{y}" width="{right - left}" height="10" as="geometry"/></mxCell>'
+            )
+    return cells
+
+
+def _drawio_points(waypoints: Optional[Tuple[str, List[Tuple[int, int]]]], origins: Dict) -> str:
+    if not waypoints:
+        return ""
+    scope, points = waypoints
+    origin_x, origin_y = origins[scope]
+    return '<Array as="points">' + "".join(
+        f'<mxPoint x="{origin_x + x}" y="{origin_y + y}"/>' for x, y in points
+    ) + "</Array>"
+
+
+def _scope_child(node_id: str, scope: str, nodes: Dict[str, Dict]) -> str:
+    """The ancestor of a node (or the node itself) that is a direct child of scope, or ""."""
+    while node_id:
+        parent = nodes[node_id]["parent"]
+        if parent == scope:
+            return node_id
+        node_id = parent
+    return ""
+
+
+def _leaf_size(node: Dict) -> Tuple[int, int]:
+    if node["kind"] in CLASS_KINDS:
+        lines = [node["label"]] + node["attributes"] + node["operations"]
+        width = min(320, max(140, max(len(line) for line in lines) * CHAR_WIDTH + 24))
+        if node["kind"] == "object":
+            return width, HEADER_HEIGHT + ROW_HEIGHT * len(node["attributes"]) + 8
+        rows = max(1, len(node["attributes"])) + max(1, len(node["operations"]))
+        return width, HEADER_HEIGHT + (ROW_HEIGHT if _stereotype(node) else 0) + ROW_HEIGHT * rows + 8
+    return DRAWIO_SIZES.get(node["kind"], (160, 60))
+
+
+def _drawio_label(node: Dict) -> str:
+    if node["kind"] == "object":
+        label = f"{node['label']} : {node['stereotype']}" if node["stereotype"] else node["label"]
+        return "\n".join([label] + node["attributes"])
+    if node["kind"] in ("initial", "final", "fork", "join"):
+        return ""
+    return _titled(node)
+
+
+# Shared helpers
+
+def _fragment_blocks(messages: List[Dict]) -> List[Dict]:
+    """
+    Group consecutive messages of the same fragment into blocks.
+
+    A new guard inside an alt or par block starts a branch; in a loop or opt
+    it starts a new block.
+
+    Returns:
+        Blocks with fragment, first and last message index, and (index, guard) per branch
+    """
+    blocks: List[Dict] = []
+    current: Optional[Dict] = None
+    for i, message in enumerate(messages):
+        fragment, guard = message["fragment"], message["guard"]
+        if not fragment:
+            current = None
+            continue
+        if current is not None and current["fragment"] == fragment:
+            if guard != current["guards"][-1][1]:
+                if fragment in ("alt", "par"):
+                    current["guards"].append((i, guard))
+                else:
+                    current = None
+        else:
+            current = None
+        if current is None:
+            current = {"fragment": fragment, "first": i, "guards": [(i, guard)]}
+            blocks.append(current)
+        current["last"] = i
+    return blocks
+
+
+def _sequence_lines(messages: List[Dict], message_line, indent: str, separators: Dict[str, str]) -> List[str]:
+    """Message lines wrapped in fragment blocks for the text formats."""
+    openings, ends = {}, set()
+    for block in _fragment_blocks(messages):
+        openings[block["first"]] = f"{block['fragment']} {block['guards'][0][1]}".rstrip()
+        for index, guard in block["guards"][1:]:
+            openings[index] = f"{separators[block['fragment']]} {guard}".rstrip()
+        ends.add(block["last"])
+
+    lines = []
+    for i, message in enumerate(messages):
+        if i in openings:
+            lines.append(indent + openings[i])
+        inner = indent + "    " if message["fragment"] else indent
+        lines.append(inner + message_line(message))
+        if i in ends:
+            lines.append(indent + "end")
+    return lines
+
+
+def _edges_by_scope(edges: List[Dict], nodes: Dict[str, Dict]) -> Dict[str, List[Dict]]:
+    """State transitions grouped by the composite state whose block must contain them."""
+    scoped: Dict[str, List[Dict]] = {}
+    for edge in edges:
+        source, target = nodes[edge["source"]], nodes[edge["target"]]
+        if source["kind"] in ("initial", "final"):
+            scope = source["parent"]
+        elif target["kind"] in ("initial", "final"):
+            scope = target["parent"]
+        else:
+            scope = source["parent"] if source["parent"] == target["parent"] else ""
+        scoped.setdefault(scope, []).append(edge)
+    return scoped
+
+
+def _relation(edge: Dict, aliases: Dict[str, str], arrows: Dict[str, str], escape) -> str:
+    source_label = f' "{escape(edge["source_label"])}"' if edge["source_label"] else ""
+    target_label = f'"{escape(edge["target_label"])}" ' if edge["target_label"] else ""
+    label = edge["label"] or EDGE_DEFAULT_LABELS.get(edge["kind"], "")
+    label = f" : {escape(label)}" if label else ""
+    return (f'{aliases[edge["source"]]}{source_label} {arrows[edge["kind"]]} {target_label}'
+            f'{aliases[edge["target"]]}{label}')
+
+
+def _aliases(nodes: List[Dict]) -> Dict[str, str]:
+    """Identifier that every format accepts for each node id."""
+    aliases = {}
+    used = set()
+    for node in nodes:
+        alias = IDENTIFIER_RE.sub("_", node["id"]) or "n"
+        if alias[0].isdigit():
+            alias = "n" + alias
+        if alias.lower() in RESERVED_IDS:
+            alias += "_"
+        candidate, suffix = alias, 2
+        while candidate.lower() in used:
+            candidate = f"{alias}_{suffix}"
+            suffix += 1
+        used.add(candidate.lower())
+        aliases[node["id"]] = candidate
+    return aliases
+
+
+def _children(nodes: List[Dict]) -> Dict[str, List[Dict]]:
+    children: Dict[str, List[Dict]] = {}
+    for node in nodes:
+        children.setdefault(node["parent"], []).append(node)
+    return children
+
+
+def _descendants(node: Dict, children: Dict[str, List[Dict]]) -> List[Dict]:
+    result = []
+    for child in children.get(node["id"], []):
+        result.append(child)
+        result.extend(_descendants(child, children))
+    return result
+
+
+def _container_parent(node: Dict, nodes: Dict[str, Dict]) -> str:
+    seen = {node["id"]}
+    parent = node["parent"]
+    while parent:
+        if parent in seen or parent not in nodes:
+            return ""
+        if nodes[parent]["kind"] in CONTAINER_KINDS:
+            return parent
+        seen.add(parent)
+        parent = nodes[parent]["parent"]
+    return ""
+
+
+def _stereotype(node: Dict) -> str:
+    return node["stereotype"] or KIND_STEREOTYPES.get(node["kind"], "")
+
+
+def _foreign_kind(node: Dict) -> str:
+    """Kind shown as stereotype for a node that is not a class in a class diagram."""
+    return "" if node["kind"] in CLASS_KINDS or node["kind"] in CONTAINER_KINDS else node["kind"]
+
+
+def _titled(node: Dict) -> str:
+    """Label with its stereotype on a line of its own."""
+    stereotype = _stereotype(node)
+    if stereotype and node["kind"] not in ("actor", "usecase", "interface"):
+        return f"«{stereotype}»\n{node['label']}"
+    return node["label"]
+
+
+def _text(value: Any) -> str:
+    return str(value).strip() if value is not None else ""
+
+
+def _lines(value: Any) -> List[str]:
+    if isinstance(value, str):
+        value = value.splitlines()
+    if not isinstance(value, list):
+        return []
+    return [line for line in (_text(item) for item in value) if line]
+
+
+def _objects(value: Any) -> List[Dict]:
+    return [item for item in value if isinstance(item, dict)] if isinstance(value, list) else []
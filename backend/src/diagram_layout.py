@@ -0,0 +1,271 @@
+"""Layered (Sugiyama-style) layout for the Draw.io renderer.
+
+Cycles are broken by reversing DFS back edges, nodes are assigned to layers by
+longest path, edges spanning several layers get dummy nodes (their bend
+points), layers are ordered by barycenter sweeps keeping the ordering with the
+fewest crossings, and nodes are centred over their neighbours without
+overlapping. Everything is deterministic: frontend/js/diagramLayout.js ports
+it and must produce the same coordinates.
+"""
+
+import math
+from typing import Dict, List, Sequence, Tuple
+
+LAYER_GAP = 70
+NODE_GAP = 40
+# Width reserved in a layer for an edge passing through it
+DUMMY_BREADTH = 20
+ORDER_SWEEPS = 8
+POSITION_SWEEPS = 4
+
+
+def layered_layout(ids: Sequence[str], sizes: Dict[str, Tuple[int, int]],
+                   edges: Sequence[Tuple[str, str, int]], horizontal: bool = False) -> Dict:
+    """
+    Place nodes in layers so that edges point down (or right).
+
+    Args:
+        ids: Node ids; their order is the tie-breaker everywhere
+        sizes: (width, height) per node id
+        edges: (upper, lower, key) triples; self-loops and repeated pairs are allowed
+        horizontal: Layers run left to right instead of top to bottom
+
+    Returns:
+        Dict with positions (id -> top-left (x, y)), width, height, and
+        waypoints (key -> bend points from upper to lower, only for edges that
+        span more than one layer)
+    """
+    if not ids:
+        return {"positions": {}, "width": 0, "height": 0, "waypoints": {}}
+
+    # Breadth runs along a layer, depth across it
+    breadth: Dict[str, float] = {}
+    depth: Dict[str, float] = {}
+    for node_id in ids:
+        width, height = sizes[node_id]
+        breadth[node_id], depth[node_id] = (height, width) if horizontal else (width, height)
+
+    pairs = _distinct_pairs((upper, lower) for upper, lower, _ in edges if upper != lower)
+    back = _back_edges(ids, pairs)
+    dag = _distinct_pairs((lower, upper) if (upper, lower) in back else (upper, lower) for upper, lower in pairs)
+    layer = _assign_layers(ids, dag)
+
+    # Layers with a chain of dummy nodes for every long edge
+    layers: List[List[str]] = [[] for _ in range(max(layer.values()) + 1)]
+    for node_id in ids:
+        layers[layer[node_id]].append(node_id)
+    upper_of: Dict[str, List[str]] = {node_id: [] for node_id in ids}
+    lower_of: Dict[str, List[str]] = {node_id: [] for node_id in ids}
+    chains: Dict[Tuple[str, str], List[str]] = {}
+    dummy_level: Dict[str, int] = {}
+    for upper, lower in dag:
+        chain = []
+        for level in range(layer[upper] + 1, layer[lower]):
+            dummy = f"\0{upper}\0{lower}\0{level}"
+            breadth[dummy], depth[dummy] = DUMMY_BREADTH, 0
+            dummy_level[dummy] = level
+            upper_of[dummy], lower_of[dummy] = [], []
+            layers[level].append(dummy)
+            chain.append(dummy)
+        chains[(upper, lower)] = chain
+        path = [upper] + chain + [lower]
+        for a, b in zip(path, path[1:]):
+            lower_of[a].append(b)
+            upper_of[b].append(a)
+
+    layers = _order_layers(layers, upper_of, lower_of)
+    centers = _position_layers(layers, upper_of, lower_of, breadth)
+
+    # Layer bands across the drawing
+    band = [max(depth[node_id] for node_id in members) for members in layers]
+    offsets = []
+    offset = 0
+    for level_depth in band:
+        offsets.append(offset)
+        offset += level_depth + LAYER_GAP
+    depth_extent = offset - LAYER_GAP
+
+    start = min(centers[node_id] - breadth[node_id] / 2 for members in layers for node_id in members)
+    breadth_extent = math.ceil(max(centers[node_id] + breadth[node_id] / 2
+                                   for members in layers for node_id in members) - start)
+
+    def point(along: int, across: int) -> Tuple[int, int]:
+        return (across, along) if horizontal else (along, across)
+
+    positions = {}
+    for level, members in enumerate(layers):
+        for node_id in members:
+            if node_id in layer:
+                positions[node_id] = point(
+                    math.floor(centers[node_id] - breadth[node_id] / 2 - start),
+                    offsets[level] + math.floor((band[level] - depth[node_id]) / 2)
+                )
+
+    waypoints = {}
+    for upper, lower, key in edges:
+        if (upper, lower) in chains:
+            chain = chains[(upper, lower)]
+        elif (lower, upper) in chains:
+            chain = chains[(lower, upper)][::-1]
+        else:
+            continue
+        if chain:
+            waypoints[key] = [
+                point(math.floor(centers[dummy] - start),
+                      offsets[dummy_level[dummy]] + math.floor(band[dummy_level[dummy]] / 2))
+                for dummy in chain
+            ]
+
+    width, height = (depth_extent, breadth_extent) if horizontal else (breadth_extent, depth_extent)
+    return {"positions": positions, "width": width, "height": height, "waypoints": waypoints}
+
+
+def _distinct_pairs(pairs) -> List[Tuple[str, str]]:
+    seen = set()
+    result = []
+    for pair in pairs:
+        if pair not in seen:
+            seen.add(pair)
+            result.append(pair)
+    return result
+
+
+def _back_edges(ids: Sequence[str], pairs: List[Tuple[str, str]]) -> set:
+    """Edges closing a cycle in a depth-first search; reversing them leaves a DAG."""
+    successors: Dict[str, List[str]] = {node_id: [] for node_id in ids}
+    for upper, lower in pairs:
+        successors[upper].append(lower)
+    state: Dict[str, int] = {}
+    back = set()
+    for root in ids:
+        if root in state:
+            continue
+        state[root] = 1
+        stack = [[root, 0]]
+        while stack:
+            frame = stack[-1]
+            node_id, index = frame
+            if index < len(successors[node_id]):
+                frame[1] += 1
+                following = successors[node_id][index]
+                if state.get(following) == 1:
+                    back.add((node_id, following))
+                elif following not in state:
+                    state[following] = 1
+                    stack.append([following, 0])
+            else:
+                state[node_id] = 2
+                stack.pop()
+    return back
+
+
+def _assign_layers(ids: Sequence[str], dag: List[Tuple[str, str]]) -> Dict[str, int]:
+    """Longest-path layering, then every node with successors moved down next to the nearest one."""
+    successors: Dict[str, List[str]] = {node_id: [] for node_id in ids}
+    indegree = {node_id: 0 for node_id in ids}
+    for upper, lower in dag:
+        successors[upper].append(lower)
+        indegree[lower] += 1
+    layer = {node_id: 0 for node_id in ids}
+    order = [node_id for node_id in ids if indegree[node_id] == 0]
+    index = 0
+    while index < len(order):
+        node_id = order[index]
+        index += 1
+        for following in successors[node_id]:
+            layer[following] = max(layer[following], layer[node_id] + 1)
+            indegree[following] -= 1
+            if indegree[following] == 0:
+                order.append(following)
+    for node_id in reversed(order):
+        if successors[node_id]:
+            layer[node_id] = max(layer[node_id], min(layer[following] for following in successors[node_id]) - 1)
+    return layer
+
+
+def _order_layers(layers: List[List[str]], upper_of: Dict[str, List[str]],
+                  lower_of: Dict[str, List[str]]) -> List[List[str]]:
+    """Barycenter sweeps, alternately down and up, keeping the ordering with the fewest crossings."""
+    position = {node_id: i for members in layers for i, node_id in enumerate(members)}
+    best = [list(members) for members in layers]
+    fewest = _crossings(layers, lower_of, position)
+    for sweep in range(ORDER_SWEEPS):
+        if fewest == 0:
+            break
+        downward = sweep % 2 == 0
+        levels = range(1, len(layers)) if downward else range(len(layers) - 2, -1, -1)
+        neighbours = upper_of if downward else lower_of
+        for level in levels:
+            keys = {}
+            for node_id in layers[level]:
+                adjacent = neighbours[node_id]
+                barycenter = _mean([position[other] for other in adjacent]) if adjacent else position[node_id]
+                keys[node_id] = (barycenter, position[node_id])
+            layers[level].sort(key=keys.__getitem__)
+            for i, node_id in enumerate(layers[level]):
+                position[node_id] = i
+        crossings = _crossings(layers, lower_of, position)
+        if crossings < fewest:
+            fewest = crossings
+            best = [list(members) for members in layers]
+    return best
+
+
+def _crossings(layers: List[List[str]], lower_of: Dict[str, List[str]], position: Dict[str, int]) -> int:
+    total = 0
+    for members in layers:
+        segments = [(position[upper], position[lower]) for upper in members for lower in lower_of[upper]]
+        for i, (upper_a, lower_a) in enumerate(segments):
+            for upper_b, lower_b in segments[i + 1:]:
+                if (upper_a - upper_b) * (lower_a - lower_b) < 0:
+                    total += 1
+    return total
+
+
+def _position_layers(layers: List[List[str]], upper_of: Dict[str, List[str]], lower_of: Dict[str, List[str]],
+                     breadth: Dict[str, float]) -> Dict[str, float]:
+    """Centre of every node along its layer: packed, then pulled towards its neighbours."""
+    centers: Dict[str, float] = {}
+    for members in layers:
+        offset = 0
+        for node_id in members:
+            centers[node_id] = offset + breadth[node_id] / 2
+            offset += breadth[node_id] + NODE_GAP
+    for sweep in range(POSITION_SWEEPS):
+        downward = sweep % 2 == 0
+        levels = range(1, len(layers)) if downward else range(len(layers) - 2, -1, -1)
+        neighbours = upper_of if downward else lower_of
+        for level in levels:
+            desired = []
+            for node_id in layers[level]:
+                adjacent = neighbours[node_id]
+                desired.append(_mean([centers[other] for other in adjacent]) if adjacent else centers[node_id])
+            centers.update(zip(layers[level], _separate(layers[level], desired, breadth)))
+    return centers
+
+
+def _separate(members: List[str], desired: List[float], breadth: Dict[str, float]) -> List[float]:
+    """
+    Closest centres to the desired ones that keep the order and NODE_GAP apart.
+
+    Average of a left-to-right pass that only pushes right and a right-to-left
+    pass that only pushes left; both keep the spacing, so their average does too.
+    """
+    count = len(members)
+    pushed_right = list(desired)
+    for i in range(1, count):
+        spacing = (breadth[members[i - 1]] + breadth[members[i]]) / 2 + NODE_GAP
+        pushed_right[i] = max(pushed_right[i], pushed_right[i - 1] + spacing)
+    pushed_left = list(desired)
+    for i in range(count - 2, -1, -1):
+        spacing = (breadth[members[i]] + breadth[members[i + 1]]) / 2 + NODE_GAP
+        pushed_left[i] = min(pushed_left[i], pushed_left[i + 1] - spacing)
+    return [(right + left) / 2 for right, left in zip(pushed_right, pushed_left)]
+
+
+def _mean(values: List[float]) -> float:
+    # Plain left-to-right sum: sum() compensates float error on 3.12+, JavaScript does not
+    total = 0
+    for value in values:
+        total += value
+    return total / len(values)
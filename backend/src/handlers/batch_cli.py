@@ -0,0 +1,559 @@
+"""Offline batch runner: diagrams for many local folders, ZIP archives or GitHub repositories.
+
+Run with:
+    python -m src.handlers.batch_cli manifest.json --out results/ --concurrency 4
+    python -m src.handlers.batch_cli entregas/ --diagram-type class --diagram-type sequence --out results/
+
+The manifest is a JSON list of items (or {"defaults": {...}, "items": [...]}),
+or JSON Lines with one item per line:
+    {"id": "alumno-01", "source": "entregas/alumno-01.zip",
+     "diagram_types": ["class", "sequence"], "output_format": "plantuml", "filters": {}}
+
+A directory instead of a manifest makes one item per subfolder and per .zip
+inside it. Results land in the output directory as <job>.<ext> plus <job>.json;
+jobs whose .json already records a success are skipped, so an interrupted
+run is resumed by running the same command again.
+"""
+
+import argparse
+import logging
+import multiprocessing
+import os
+import re
+import shutil
+import statistics
+import tempfile
+import threading
+import time
+import zipfile
+from concurrent.futures import FIRST_COMPLETED, Executor, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from .. import codec
+from ..llm.router import is_retryable_error
+from ..models import AnalysisRequest, DiagramResponse, DiagramType, OutputFormat
+from ..services.memory_budget import MEMORY_LIMIT_ERROR, MemoryLimitExceeded
+from ..services.source_records import file_size, forget, read_once
+
+logger = logging.getLogger(__name__)
+
+
+DEFAULT_INGEST_WORKERS = int(os.getenv("UML_BATCH_INGEST_WORKERS", str(min(8, os.cpu_count() or 2))))
+DEFAULT_LLM_CONCURRENCY = int(os.getenv("UML_BATCH_LLM_CONCURRENCY", "4"))
+DEFAULT_POLL_SECONDS = float(os.getenv("UML_BATCH_POLL_SECONDS", "60"))
+# Inline batch jobs must stay below the API's 20 MB request limit
+BATCH_MAX_BYTES = 15 * 1024 * 1024
+FILE_EXTENSIONS = {"mermaid": "mmd", "plantuml": "puml", "drawio": "drawio"}
+STATE_FILE = "batches.json"
+METRICS_FILE = "metrics.json"
+
+
+class BatchJob:
+    """One diagram to produce: a source with a diagram type and output format."""
+
+    def __init__(self, job_id: str, source: str, diagram_type: DiagramType, output_format: OutputFormat,
+                 filters: Optional[Dict[str, Any]] = None):
+        self.id = job_id
+        self.source = source
+        self.diagram_type = diagram_type
+        self.output_format = output_format
+        self.filters = filters or {}
+
+    @property
+    def is_github(self) -> bool:
+        return self.source.startswith(("https://github.com/", "http://github.com/"))
+
+    def build_request(self) -> AnalysisRequest:
+        source = {"repo_url": self.source} if self.is_github else {"local_directory": self.source}
+        return AnalysisRequest(
+            diagram_type=self.diagram_type, output_format=self.output_format, filters=self.filters, **source
+        )
+
+
+def load_jobs(path: str, diagram_types: Optional[List[str]] = None,
+              output_format: Optional[str] = None) -> List[BatchJob]:
+    """
+    Expand a manifest file or a directory of submissions into jobs.
+
+    Args:
+        path: Manifest (.json / .jsonl) or directory
+        diagram_types: Default diagram types for items without their own
+        output_format: Default output format for items without their own
+
+    Returns:
+        One job per item and diagram type, in manifest order
+
+    Raises:
+        ValueError: If the manifest is malformed or job ids collide
+    """
+    defaults = {"diagram_types": diagram_types or ["class"], "output_format": output_format or "plantuml"}
+    if os.path.isdir(path):
+        items = _items_from_directory(path)
+        base_dir = path
+    else:
+        items, manifest_defaults = _read_manifest(path)
+        defaults.update({key: value for key, value in manifest_defaults.items() if value})
+        base_dir = os.path.dirname(os.path.abspath(path))
+
+    jobs = []
+    seen = set()
+    for position, item in enumerate(items):
+        if not isinstance(item, dict) or not item.get("source"):
+            raise ValueError(f"Manifest item {position} has no source")
+        source = item["source"]
+        if not source.startswith(("http://", "https://")) and not os.path.isabs(source):
+            source = os.path.normpath(os.path.join(base_dir, source))
+
+        item_types = item.get("diagram_types") or ([item["diagram_type"]] if item.get("diagram_type") else None)
+        item_id = item.get("id") or _default_item_id(source)
+        for diagram_type in item_types or defaults["diagram_types"]:
+            fmt = item.get("output_format") or defaults["output_format"]
+            job_id = _slug(f"{item_id}-{diagram_type}-{fmt}")
+            if job_id in seen:
+                raise ValueError(f"Duplicate job id {job_id}; give the items distinct ids")
+            seen.add(job_id)
+            jobs.append(BatchJob(job_id, source, DiagramType(diagram_type), OutputFormat(fmt),
+                                 item.get("filters") or defaults.get("filters")))
+    return jobs
+
+
+def ingest_source(source: str) -> Dict[str, Any]:
+    """
+    Read a folder or ZIP archive; runs in the ingestion process pool.
+
+    Returns:
+        Dict with source_files, source_info, ingestion report and seconds taken
+    """
+    from ..services.local_directory_service import LocalDirectoryService
+
+    started = time.perf_counter()
+    service = LocalDirectoryService()
+    if zipfile.is_zipfile(source):
+        temp_dir = tempfile.mkdtemp(prefix="uml_batch_")
+        try:
+            with zipfile.ZipFile(source) as archive:
+                archive.extractall(temp_dir)
+            source_files, report = service.get_source_files_with_report(temp_dir)
+            # The records read their files lazily and the directory goes away below
+            source_files = source_files.materialize()
+        finally:
+            shutil.rmtree(temp_dir, ignore_errors=True)
+        source_info = {"name": os.path.basename(source), "path": os.path.abspath(source), "type": "zip_archive"}
+    elif os.path.isdir(source):
+        source_files, report = service.get_source_files_with_report(source)
+        source_info = service.get_directory_info(source)
+    else:
+        raise ValueError(f"Source is neither a directory nor a ZIP archive: {source}")
+
+    return {
+        "source_files": source_files,
+        "source_info": source_info,
+        "ingestion": report,
+        "seconds": time.perf_counter() - started,
+    }
+
+
+class BatchRunner:
+    """Run jobs through ingestion (process pool) and generation (bounded threads).
+
+    Ingestion of the next sources overlaps with generation of earlier ones, but
+    at most `ingest_ahead` ingested sources wait for the LLM at any time, so a
+    class of hundreds of repositories is never held in memory at once.
+    """
+
+    def __init__(self, out_dir: str, service: Any = None,
+                 ingest_workers: int = DEFAULT_INGEST_WORKERS,
+                 concurrency: int = DEFAULT_LLM_CONCURRENCY,
+                 retry_failed: bool = True,
+                 executor_factory: Optional[Callable[[int], Executor]] = None):
+        """
+        Args:
+            out_dir: Directory for results, metrics and batch state
+            service: DiagramService; created on first use when omitted
+            ingest_workers: Processes reading folders and archives
+            concurrency: LLM calls in flight at once
+            retry_failed: Run jobs again whose previous result is a failure
+            executor_factory: Builds the ingestion executor from a worker count
+        """
+        self.out_dir = out_dir
+        self.service = service
+        self.ingest_workers = ingest_workers
+        self.concurrency = concurrency
+        self.retry_failed = retry_failed
+        self.executor_factory = executor_factory or _process_pool
+        self.ingest_ahead = ingest_workers + 2 * concurrency
+        self.metrics = {
+            "jobs": 0, "skipped": 0, "succeeded": 0, "failed": 0,
+            "sources_ingested": 0, "files_ingested": 0, "bytes_ingested": 0,
+            "ingest_seconds": 0.0, "generation_seconds": [],
+        }
+        self._lock = threading.Lock()
+        os.makedirs(out_dir, exist_ok=True)
+
+    def run(self, jobs: List[BatchJob], batch_mode: bool = False,
+            poll_seconds: float = DEFAULT_POLL_SECONDS) -> Dict[str, Any]:
+        """
+        Produce every job that has no successful result yet.
+
+        Args:
+            jobs: Jobs from load_jobs
+            batch_mode: Submit local sources as provider batch prediction jobs
+                instead of calling the model online (GitHub URLs stay online)
+            poll_seconds: Interval between batch job status checks
+
+        Returns:
+            Run metrics, also written to metrics.json
+        """
+        started = time.perf_counter()
+        state = self._load_state()
+        submitted = {job_id for entry in state["batches"].values() for job_id in entry["job_ids"]}
+
+        pending = []
+        for job in jobs:
+            if self.is_completed(job):
+                self.metrics["skipped"] += 1
+            elif job.id not in submitted:
+                pending.append(job)
+        self.metrics["jobs"] = len(jobs)
+        logger.info(f"{len(jobs)} jobs: {self.metrics['skipped']} already done, {len(pending)} to run, "
+                    f"{len(submitted)} waiting in batch jobs")
+
+        offline = [job for job in pending if batch_mode and not job.is_github]
+        self._run_online([job for job in pending if job not in offline])
+        if offline or state["batches"]:
+            self._run_batch(offline, state, poll_seconds)
+
+        return self._write_metrics(time.perf_counter() - started, batch_mode)
+
+    def is_completed(self, job: BatchJob) -> bool:
+        result_path = self._path(job, "json")
+        if not os.path.exists(result_path):
+            return False
+        if not self.retry_failed:
+            return True
+        try:
+            with open(result_path, "rb") as f:
+                return bool(codec.loads(f.read()).get("success"))
+        except (OSError, ValueError):
+            return False
+
+    def _run_online(self, jobs: List[BatchJob]):
+        """Ingest sources in the process pool and generate with bounded concurrency."""
+        by_source = _group_by_source(jobs)
+        local_sources = [source for source, group in by_source.items() if not group[0].is_github]
+
+        with ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="uml-batch") as llm_pool:
+            llm_futures = [
+                llm_pool.submit(self._generate, job, None)
+                for source, group in by_source.items() if group[0].is_github for job in group
+            ]
+            if local_sources:
+                for source, ingested in self._ingest_all(local_sources):
+                    for job in by_source[source]:
+                        llm_futures.append(llm_pool.submit(self._generate, job, ingested))
+                    # Wait for the LLM to catch up before reading more sources
+                    running = [future for future in llm_futures if not future.done()]
+                    while len(running) > self.ingest_ahead:
+                        wait(running, return_when=FIRST_COMPLETED)
+                        running = [future for future in running if not future.done()]
+            for future in llm_futures:
+                future.result()
+
+    def _ingest_all(self, sources: List[str]):
+        """Yield (source, ingested or exception) as ingestion finishes."""
+        with self.executor_factory(self.ingest_workers) as pool:
+            futures = {}
+            queue = list(sources)
+            while queue or futures:
+                while queue and len(futures) < self.ingest_workers:
+                    source = queue.pop(0)
+                    futures[pool.submit(ingest_source, source)] = source
+                done, _ = wait(futures, return_when=FIRST_COMPLETED)
+                for future in done:
+                    source = futures.pop(future)
+                    try:
+                        ingested = future.result()
+                    except Exception as e:
+                        logger.error(f"Could not ingest {source}: {str(e)}")
+                        yield source, e
+                        continue
+                    self._record_ingestion(ingested)
+                    yield source, ingested
+
+    def _generate(self, job: BatchJob, ingested: Any):
+        started = time.perf_counter()
+        try:
+            if isinstance(ingested, Exception):
+                raise RuntimeError(f"Ingestion failed: {ingested}")
+            request = job.build_request()
+            if ingested is None:
+                response = self._get_service().generate_diagram(request)
+            else:
+                response = self._get_service().generate_from_sources(
+                    request, ingested["source_files"], ingested["source_info"], ingested["ingestion"]
+                )
+        except Exception as e:
+            logger.error(f"Job {job.id} failed: {str(e)}")
+            response = DiagramResponse(diagram_code="", format=job.output_format, metadata={"error": str(e)},
+                                       success=False, error=str(e))
+        self._write_result(job, response, time.perf_counter() - started, mode="online")
+
+    def _run_batch(self, jobs: List[BatchJob], state: Dict, poll_seconds: float):
+        """Submit local sources as provider batch jobs, then poll every open batch job."""
+        provider = self._get_service().llm_provider
+        if provider is None or not hasattr(provider, "submit_batch"):
+            raise RuntimeError("The LLM provider does not support batch prediction")
+
+        by_source = _group_by_source(jobs)
+        chunk, chunk_bytes = [], 0
+        for source, ingested in (self._ingest_all(list(by_source)) if by_source else ()):
+            for job in by_source[source]:
+                if isinstance(ingested, Exception) or not ingested["source_files"]:
+                    # Fails right away with the same error as the online path
+                    self._generate(job, ingested)
+                    continue
+                try:
+                    entry = self._batch_entry(provider, job, ingested)
+                except MemoryLimitExceeded as e:
+                    logger.error(f"Job {job.id} failed: {str(e)}")
+                    self._write_result(job, DiagramResponse(
+                        diagram_code="", format=job.output_format, metadata={"error": str(e), "memory": e.report},
+                        success=False, error=MEMORY_LIMIT_ERROR
+                    ), 0.0, mode="batch")
+                    continue
+                entry_bytes = sum(file_size(ingested["source_files"], path) for path in ingested["source_files"])
+                if chunk and chunk_bytes + entry_bytes > BATCH_MAX_BYTES:
+                    self._submit(provider, chunk, state)
+                    chunk, chunk_bytes = [], 0
+                chunk.append(entry)
+                chunk_bytes += entry_bytes
+        if chunk:
+            self._submit(provider, chunk, state)
+
+        while state["batches"]:
+            for name in list(state["batches"]):
+                self._poll(provider, name, state)
+            if state["batches"]:
+                logger.info(f"{len(state['batches'])} batch jobs still running; next check in {poll_seconds:.0f}s")
+                time.sleep(poll_seconds)
+
+    def _batch_entry(self, provider: Any, job: BatchJob, ingested: Dict) -> Dict:
+        service = self._get_service()
+        request = job.build_request()
+        # Each lazy file is read once for all stages and dropped after the request is built
+        source_files = read_once(ingested["source_files"])
+        try:
+            prompt_files, file_aliases, stage_reports = service._prepare_prompt_files(request, source_files)
+            batch_request = provider.build_batch_request(prompt_files, job.diagram_type, job.output_format, file_aliases)
+        finally:
+            forget(source_files)
+        return {
+            "job": job,
+            "request": batch_request,
+            "context": {
+                "source_info": ingested["source_info"],
+                "ingestion": ingested["ingestion"],
+                "files_analyzed": len(ingested["source_files"]),
+                "stage_reports": stage_reports,
+            },
+        }
+
+    def _submit(self, provider: Any, chunk: List[Dict], state: Dict):
+        key_id, name = provider.submit_batch(
+            [entry["request"] for entry in chunk], display_name=f"eduuml-{os.path.basename(os.path.abspath(self.out_dir))}"
+        )
+        state["batches"][name] = {
+            "key_id": key_id,
+            "submitted_at": time.time(),
+            "job_ids": [entry["job"].id for entry in chunk],
+            "jobs": {entry["job"].id: {
+                "diagram_type": entry["job"].diagram_type.value,
+                "output_format": entry["job"].output_format.value,
+                "source": entry["job"].source,
+                **entry["context"],
+            } for entry in chunk},
+        }
+        # Saved right away: a re-run polls this job instead of paying for it twice
+        self._save_state(state)
+
+    def _poll(self, provider: Any, name: str, state: Dict):
+        batch = state["batches"][name]
+        jobs = [BatchJob(job_id, batch["jobs"][job_id]["source"], DiagramType(batch["jobs"][job_id]["diagram_type"]),
+                         OutputFormat(batch["jobs"][job_id]["output_format"])) for job_id in batch["job_ids"]]
+        try:
+            results = provider.poll_batch(batch["key_id"], name, [job.output_format for job in jobs])
+        except Exception as e:
+            # Only a job that failed, expired or was cancelled is final; anything else is checked again
+            if is_retryable_error(e) or not isinstance(e, RuntimeError):
+                logger.warning(f"Could not check batch job {name}, will retry: {str(e)}")
+                return
+            logger.error(f"Batch job {name} failed: {str(e)}")
+            results = [("", "", str(e))] * len(jobs)
+        if results is None:
+            return
+
+        elapsed = time.time() - batch["submitted_at"]
+        for job, (diagram_code, llm_metadata, error) in zip(jobs, results):
+            context = batch["jobs"][job.id]
+            metadata = {
+                "source": context["source_info"],
+                "files_analyzed": context["files_analyzed"],
+                "analysis_method": "llm_batch",
+                "batch_job": name,
+                "llm_metadata": llm_metadata,
+                "ingestion": context["ingestion"],
+                **context["stage_reports"],
+            }
+            response = DiagramResponse(diagram_code=diagram_code, format=job.output_format, metadata=metadata,
+                                       success=error is None, error=error)
+            self._write_result(job, response, elapsed, mode="batch")
+        del state["batches"][name]
+        self._save_state(state)
+
+    def _record_ingestion(self, ingested: Dict):
+        with self._lock:
+            self.metrics["sources_ingested"] += 1
+            self.metrics["files_ingested"] += len(ingested["source_files"])
+            self.metrics["bytes_ingested"] += sum(file_size(ingested["source_files"], path)
+                                                  for path in ingested["source_files"])
+            self.metrics["ingest_seconds"] += ingested["seconds"]
+
+    def _write_result(self, job: BatchJob, response: DiagramResponse, seconds: float, mode: str):
+        if response.success:
+            _write_atomic(self._path(job, FILE_EXTENSIONS[job.output_format.value]),
+                          response.diagram_code.encode("utf-8"))
+        _write_atomic(self._path(job, "json"), codec.dumps_bytes({
+            "job_id": job.id,
+            "source": job.source,
+            "diagram_type": job.diagram_type.value,
+            "output_format": job.output_format.value,
+            "success": response.success,
+            "error": response.error,
+            "mode": mode,
+            "seconds": round(seconds, 3),
+            "metadata": response.metadata,
+        }))
+        with self._lock:
+            self.metrics["succeeded" if response.success else "failed"] += 1
+            self.metrics["generation_seconds"].append(seconds)
+        logger.info(f"Job {job.id}: {'ok' if response.success else 'failed: ' + str(response.error)} ({seconds:.1f}s)")
+
+    def _write_metrics(self, wall_seconds: float, batch_mode: bool) -> Dict[str, Any]:
+        durations = sorted(self.metrics["generation_seconds"])
+        metrics = {key: value for key, value in self.metrics.items() if key != "generation_seconds"}
+        metrics.update({
+            "mode": "batch" if batch_mode else "online",
+            "wall_seconds": round(wall_seconds, 3),
+            "ingest_seconds": round(metrics["ingest_seconds"], 3),
+            "ingest_workers": self.ingest_workers,
+            "llm_concurrency": self.concurrency,
+            "generation_p50_seconds": round(statistics.median(durations), 3) if durations else None,
+            "generation_p95_seconds": round(durations[int(0.95 * (len(durations) - 1))], 3) if durations else None,
+        })
+        _write_atomic(os.path.join(self.out_dir, METRICS_FILE), codec.dumps_bytes(metrics))
+        return metrics
+
+    def _load_state(self) -> Dict:
+        try:
+            with open(os.path.join(self.out_dir, STATE_FILE), "rb") as f:
+                return codec.loads(f.read())
+        except FileNotFoundError:
+            return {"batches": {}}
+
+    def _save_state(self, state: Dict):
+        _write_atomic(os.path.join(self.out_dir, STATE_FILE), codec.dumps_bytes(state))
+
+    def _path(self, job: BatchJob, extension: str) -> str:
+        return os.path.join(self.out_dir, f"{job.id}.{extension}")
+
+    def _get_service(self):
+        if self.service is None:
+            with self._lock:
+                if self.service is None:
+                    from ..services.diagram_service import DiagramService
+                    self.service = DiagramService()
+        return self.service
+
+
+def _process_pool(workers: int) -> Executor:
+    # Spawned, not forked: generation threads are already running when workers start
+    return ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+
+
+def _read_manifest(path: str) -> Tuple[List[Dict], Dict]:
+    with open(path, "rb") as f:
+        raw = f.read()
+    if path.endswith(".jsonl"):
+        return [codec.loads(line) for line in raw.splitlines() if line.strip()], {}
+    manifest = codec.loads(raw)
+    if isinstance(manifest, list):
+        return manifest, {}
+    if isinstance(manifest, dict) and isinstance(manifest.get("items"), list):
+        return manifest["items"], manifest.get("defaults") or {}
+    raise ValueError("Manifest must be a list of items or an object with an 'items' list")
+
+
+def _items_from_directory(path: str) -> List[Dict]:
+    items = []
+    for name in sorted(os.listdir(path)):
+        full_path = os.path.join(path, name)
+        if name.startswith("."):
+            continue
+        if os.path.isdir(full_path) or (name.lower().endswith(".zip") and zipfile.is_zipfile(full_path)):
+            items.append({"source": full_path})
+    return items
+
+
+def _group_by_source(jobs: List[BatchJob]) -> Dict[str, List[BatchJob]]:
+    """Jobs per source, so each source is read once for all its diagram types."""
+    groups = {}
+    for job in jobs:
+        groups.setdefault(job.source, []).append(job)
+    return groups
+
+
+def _default_item_id(source: str) -> str:
+    name = source.rstrip("/").split("/")[-1]
+    return name[:-4] if name.lower().endswith((".zip", ".git")) else name
+
+
+def _slug(text: str) -> str:
+    return re.sub(r"[^A-Za-z0-9._-]+", "_", text).strip("._") or "job"
+
+
+def _write_atomic(path: str, data: bytes):
+    """Write through a temporary file so an interrupted run never leaves a partial result."""
+    temp_path = f"{path}.tmp"
+    with open(temp_path, "wb") as f:
+        f.write(data)
+    os.replace(temp_path, path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate UML diagrams for many sources")
+    parser.add_argument("manifest", help="Manifest (.json / .jsonl) or directory of folders and ZIP files")
+    parser.add_argument("--out", required=True, help="Output directory (re-runs skip completed jobs)")
+    parser.add_argument("--diagram-type", action="append", choices=[t.value for t in DiagramType],
+                        help="Diagram type for items without their own (repeatable, default: class)")
+    parser.add_argument("--output-format", choices=[f.value for f in OutputFormat],
+                        help="Output format for items without their own (default: plantuml)")
+    parser.add_argument("--ingest-workers", type=int, default=DEFAULT_INGEST_WORKERS,
+                        help="Processes reading sources (default: %(default)s)")
+    parser.add_argument("--concurrency", type=int, default=DEFAULT_LLM_CONCURRENCY,
+                        help="LLM calls in flight (default: %(default)s)")
+    parser.add_argument("--batch", action="store_true",
+                        help="Use the provider's batch prediction mode for local sources (cheaper, slower)")
+    parser.add_argument("--poll-seconds", type=float, default=DEFAULT_POLL_SECONDS,
+                        help="Interval between batch job checks (default: %(default)s)")
+    parser.add_argument("--skip-failed", action="store_true", help="Do not retry jobs that failed before")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+    jobs = load_jobs(args.manifest, args.diagram_type, args.output_format)
+    runner = BatchRunner(args.out, ingest_workers=args.ingest_workers, concurrency=args.concurrency,
+                         retry_failed=not args.skip_failed)
+    metrics = runner.run(jobs, batch_mode=args.batch, poll_seconds=args.poll_seconds)
+    print(codec.dumps(metrics))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,270 @@
+"""Self-hosted HTTP server exposing the Lambda contract as a long-lived service.
+
+Run with:
+    python -m src.handlers.http_server --port 8000 --workers 8
+"""
+
+import argparse
+import logging
+import os
+import signal
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from typing import Any, Dict, Optional
+from .main_handler import handle_event, handle_options_request, create_error_response, _diagram_service_class
+from .. import codec
+from ..llm.router import BackendRouter
+from ..services.admission import AdmissionController, get_default_controller
+
+logger = logging.getLogger(__name__)
+
+
+DEFAULT_HOST = os.getenv("UML_SERVER_HOST", "127.0.0.1")
+DEFAULT_PORT = int(os.getenv("UML_SERVER_PORT", "8000"))
+DEFAULT_WORKERS = int(os.getenv("UML_SERVER_WORKERS", "8"))
+DEFAULT_KEEP_ALIVE = float(os.getenv("UML_SERVER_KEEP_ALIVE", "5"))
+DEFAULT_MAX_BODY_BYTES = int(os.getenv("UML_SERVER_MAX_BODY_BYTES", str(20 * 1024 * 1024)))
+DEFAULT_SHUTDOWN_TIMEOUT = float(os.getenv("UML_SERVER_SHUTDOWN_TIMEOUT", "180"))
+
+GENERATE_DIAGRAM_PATH = "/generate-diagram"
+HEALTH_PATH = "/health"
+
+
+class DiagramRequestHandler(BaseHTTPRequestHandler):
+    """Translate HTTP requests into API Gateway events for handle_event."""
+
+    protocol_version = "HTTP/1.1"
+    server: "DiagramHTTPServer"
+
+    def setup(self):
+        # Idle keep-alive connections are closed after this many seconds
+        self.timeout = self.server.keep_alive_timeout
+        super().setup()
+
+    def do_OPTIONS(self):
+        self._send_lambda_response(handle_options_request())
+
+    def do_GET(self):
+        if self._route() == HEALTH_PATH:
+            health = {
+                "status": "ok",
+                "in_flight": self.server.in_flight,
+                "admission": self.server.admission.snapshot()
+            }
+            router = self.server.llm_router()
+            if router is not None:
+                health["llm_backends"] = router.snapshot()
+            self._send_lambda_response({
+                "statusCode": 200,
+                "headers": {"Content-Type": "application/json"},
+                "body": codec.dumps(health)
+            })
+        else:
+            self._send_lambda_response(create_error_response(404, f"Not found: {self.path}"))
+
+    def do_POST(self):
+        if self._route() != GENERATE_DIAGRAM_PATH:
+            self._discard_body()
+            self._send_lambda_response(create_error_response(404, f"Not found: {self.path}"))
+            return
+
+        length_header = self.headers.get("Content-Length")
+        if length_header is None:
+            self.close_connection = True
+            self._send_lambda_response(create_error_response(411, "Content-Length header is required"))
+            return
+
+        try:
+            length = int(length_header)
+        except ValueError:
+            length = -1
+        if length < 0:
+            # rfile.read(-1) would block this worker until the client closes the socket
+            self.close_connection = True
+            self._send_lambda_response(create_error_response(400, "Invalid Content-Length header"))
+            return
+
+        if length > self.server.max_body_bytes:
+            # The body is not read, so the connection cannot be reused
+            self.close_connection = True
+            self._send_lambda_response(create_error_response(
+                413, f"Request body too large: {length} bytes (limit {self.server.max_body_bytes})"
+            ))
+            return
+
+        # Raw bytes: the JSON codec decodes UTF-8 while parsing
+        body = self.rfile.read(length)
+        event = {
+            "httpMethod": "POST",
+            "path": GENERATE_DIAGRAM_PATH,
+            "headers": dict(self.headers.items()),
+            "requestContext": {"http": {"method": "POST", "sourceIp": self.client_address[0]}},
+            "body": body,
+        }
+        self._send_lambda_response(handle_event(event, self.server.get_service(), self.server.admission))
+
+    def log_message(self, format, *args):
+        logger.info(f"{self.client_address[0]} - {format % args}")
+
+    def _route(self) -> str:
+        return self.path.split("?", 1)[0].rstrip("/") or "/"
+
+    def _discard_body(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        if 0 < length <= self.server.max_body_bytes:
+            self.rfile.read(length)
+        elif length:
+            self.close_connection = True
+
+    def _send_lambda_response(self, response: Dict[str, Any]):
+        body = response.get("body") or b""
+        if isinstance(body, str):
+            body = body.encode("utf-8")
+        if self.server.draining:
+            self.close_connection = True
+
+        self.send_response(response.get("statusCode", 200))
+        for name, value in (response.get("headers") or {}).items():
+            self.send_header(name, str(value))
+        self.send_header("Content-Length", str(len(body)))
+        if self.close_connection:
+            self.send_header("Connection", "close")
+        self.end_headers()
+        if self.command != "HEAD":
+            self.wfile.write(body)
+
+
+class DiagramHTTPServer(HTTPServer):
+    """HTTP server with a bounded worker pool and graceful shutdown."""
+
+    def __init__(self,
+                 address=(DEFAULT_HOST, DEFAULT_PORT),
+                 workers: int = DEFAULT_WORKERS,
+                 keep_alive_timeout: float = DEFAULT_KEEP_ALIVE,
+                 max_body_bytes: int = DEFAULT_MAX_BODY_BYTES,
+                 service: Any = None,
+                 admission: Optional[AdmissionController] = None):
+        """
+        Args:
+            address: (host, port) to bind; port 0 picks a free port
+            workers: Maximum number of connections served concurrently
+            keep_alive_timeout: Seconds an idle keep-alive connection is kept open
+            max_body_bytes: Largest accepted request body
+            service: DiagramService shared by all requests (created on first use if omitted)
+            admission: Gate for generations; connections beyond its concurrency wait in
+                its queue, so workers should exceed admission.max_concurrency
+        """
+        self.request_queue_size = max(workers * 2, 16)
+        super().__init__(address, DiagramRequestHandler)
+        self.workers = workers
+        self.keep_alive_timeout = keep_alive_timeout
+        self.max_body_bytes = max_body_bytes
+        self.draining = False
+        self.in_flight = 0
+        self.admission = admission or get_default_controller()
+        self._service = service
+        self._service_lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(workers)
+        self._idle = threading.Condition()
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="uml-worker")
+
+    def get_service(self):
+        """Return the shared DiagramService, creating it once."""
+        if self._service is None:
+            with self._service_lock:
+                if self._service is None:
+                    self._service = _diagram_service_class()()
+        return self._service
+
+    def llm_router(self):
+        """Key/model router of the service's provider, once the service exists."""
+        router = getattr(getattr(self._service, "llm_provider", None), "router", None)
+        return router if isinstance(router, BackendRouter) else None
+
+    def process_request(self, request, client_address):
+        # Block the accept loop while every worker is busy; further clients wait
+        # in the kernel backlog instead of piling up in memory
+        self._slots.acquire()
+        with self._idle:
+            self.in_flight += 1
+        self._executor.submit(self._process_request_worker, request, client_address)
+
+    def _process_request_worker(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+            self._slots.release()
+            with self._idle:
+                self.in_flight -= 1
+                self._idle.notify_all()
+
+    def graceful_shutdown(self, timeout: float = DEFAULT_SHUTDOWN_TIMEOUT) -> bool:
+        """
+        Stop accepting connections and wait for in-flight requests.
+
+        Returns:
+            True if all requests finished before the timeout
+        """
+        logger.info(f"Shutting down, waiting for {self.in_flight} in-flight connections")
+        self.draining = True
+        self.shutdown()
+        with self._idle:
+            drained = self._idle.wait_for(lambda: self.in_flight == 0, timeout=timeout)
+        self._executor.shutdown(wait=drained)
+        self.server_close()
+        if not drained:
+            logger.warning(f"Shutdown timeout reached with {self.in_flight} connections still open")
+        return drained
+
+
+def serve(host: str = DEFAULT_HOST,
+          port: int = DEFAULT_PORT,
+          workers: int = DEFAULT_WORKERS,
+          keep_alive_timeout: float = DEFAULT_KEEP_ALIVE,
+          max_body_bytes: int = DEFAULT_MAX_BODY_BYTES,
+          shutdown_timeout: float = DEFAULT_SHUTDOWN_TIMEOUT,
+          service: Optional[Any] = None):
+    """Run the server until SIGTERM or SIGINT, then drain gracefully."""
+    server = DiagramHTTPServer((host, port), workers, keep_alive_timeout, max_body_bytes, service)
+    stop_requested = threading.Event()
+
+    def request_stop(signum, frame):
+        logger.info(f"Received signal {signum}")
+        stop_requested.set()
+
+    signal.signal(signal.SIGTERM, request_stop)
+    signal.signal(signal.SIGINT, request_stop)
+
+    serve_thread = threading.Thread(target=server.serve_forever, name="uml-accept", daemon=True)
+    serve_thread.start()
+    logger.info(f"Serving {GENERATE_DIAGRAM_PATH} on http://{host}:{server.server_address[1]} with {workers} workers")
+
+    stop_requested.wait()
+    server.graceful_shutdown(shutdown_timeout)
+    serve_thread.join()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve the UML diagram generator over HTTP")
+    parser.add_argument("--host", default=DEFAULT_HOST)
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS,
+                        help="Concurrent connections served (default: %(default)s)")
+    parser.add_argument("--keep-alive", type=float, default=DEFAULT_KEEP_ALIVE,
+                        help="Idle keep-alive timeout in seconds (default: %(default)s)")
+    parser.add_argument("--max-body-bytes", type=int, default=DEFAULT_MAX_BODY_BYTES,
+                        help="Largest accepted request body (default: %(default)s)")
+    parser.add_argument("--shutdown-timeout", type=float, default=DEFAULT_SHUTDOWN_TIMEOUT,
+                        help="Seconds to wait for in-flight requests on shutdown (default: %(default)s)")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+    serve(args.host, args.port, args.workers, args.keep_alive, args.max_body_bytes, args.shutdown_timeout)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,17 +1,39 @@
 """Main Lambda handler for UML diagram generation."""
 
-import json
 import logging
+import sys
 import traceback
-from typing import Dict, Any
-from ..services.diagram_service import DiagramService
-from ..models import AnalysisRequest, DiagramType, OutputFormat, AnalysisMethod
+from typing import Dict, Any, Optional
+from .. import codec
+from ..services.admission import (
+    AdmissionController, AdmissionRejected, client_id_from_event, get_default_controller, request_priority
+)
+from ..services.memory_budget import MEMORY_LIMIT_ERROR, MemoryBudget, body_fits
+
+# DiagramService and the pydantic models are imported on first use (see
+# _diagram_service_class) so CORS preflights and rejected requests never pay
+# for loading google.genai, requests or pydantic on a cold start.
 
 # Configure logging
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
 
 
+def _diagram_service_class():
+    """Return DiagramService, importing it on first use."""
+    module = sys.modules[__name__]
+    if 'DiagramService' not in module.__dict__:
+        from ..services.diagram_service import DiagramService
+        module.DiagramService = DiagramService
+    return module.DiagramService
+
+
+def __getattr__(name):
+    if name == 'DiagramService':
+        return _diagram_service_class()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
 def lambda_handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     """
     Main Lambda handler for processing UML diagram generation requests.
@@ -20,22 +42,48 @@ def lambda_handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
         event: Lambda event containing request data
         context: Lambda context object
         
+    Returns:
+        HTTP response with generated diagram or error
+    """
+    return handle_event(event)
+
+
+def handle_event(event: Dict[str, Any], service: Any = None,
+                 admission: Optional[AdmissionController] = None) -> Dict[str, Any]:
+    """
+    Process an API Gateway style event.
+    
+    Args:
+        event: Event containing request data
+        service: DiagramService to reuse; a new one is created per request when omitted
+        admission: Admission controller gating generations (process-wide one when omitted)
+        
     Returns:
         HTTP response with generated diagram or error
     """
     try:
-        # Log incoming request
-        logger.info(f"Received request: {json.dumps(event, default=str)}")
+        # Log incoming request (without the body, which may hold megabytes of source code)
+        body_size = len(event.get('body') or '') if isinstance(event.get('body'), (str, bytes)) else 0
+        logger.info(f"Received request: {codec.dumps({k: v for k, v in event.items() if k != 'body'})}, body: {body_size} bytes")
         
         # Handle CORS preflight OPTIONS requests
         http_method = event.get('httpMethod') or event.get('requestContext', {}).get('http', {}).get('method')
         if http_method == 'OPTIONS':
             return handle_options_request()
         
+        # Reject bodies that could not even be parsed within the function memory
+        if body_size and not body_fits(body_size):
+            available_mb = MemoryBudget().available_bytes // (1024 * 1024)
+            return create_error_response(
+                413,
+                f"{MEMORY_LIMIT_ERROR}: a {body_size // (1024 * 1024)} MB request body does not fit in the "
+                f"{available_mb} MB available. Send fewer files or use filters.subpath / filters.focus."
+            )
+        
         # Parse request body
         if 'body' in event and event['body']:
-            if isinstance(event['body'], str):
-                body = json.loads(event['body'])
+            if isinstance(event['body'], (str, bytes, bytearray)):
+                body = codec.loads(event['body'])
             else:
                 body = event['body']
         else:
@@ -64,29 +112,41 @@ def lambda_handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
         
         # Create analysis request
         try:
-            request = AnalysisRequest(
-                repo_url=body.get('repo_url'),
-                local_directory=body.get('local_directory'),
-                code_files=body.get('code_files'),
-                diagram_type=DiagramType(body['diagram_type']),
-                output_format=OutputFormat(body['output_format']),
-                analysis_method=AnalysisMethod(body.get('analysis_method', 'llm_direct')),
-                filters=body.get('filters', {})
-            )
+            request = build_analysis_request(body)
         except ValueError as e:
             return create_error_response(400, f"Invalid request parameters: {str(e)}")
         
-        # Process request
-        service = DiagramService()
-        result = service.generate_diagram(request)
+        # Process request once a generation slot is free
+        admission = admission or get_default_controller()
+        try:
+            with admission.admit(client_id_from_event(event), request_priority(body)) as admission_info:
+                if service is None:
+                    service = _diagram_service_class()()
+                result = service.generate_diagram(request)
+        except AdmissionRejected as e:
+            logger.warning(f"Request rejected by admission control: {str(e)}")
+            return create_error_response(429, str(e), headers={
+                'Retry-After': str(e.retry_after),
+                'Access-Control-Expose-Headers': 'Retry-After'
+            })
+        
+        if admission_info["queued_seconds"]:
+            result.metadata["admission"] = admission_info
+        
+        if not result.success and result.error == MEMORY_LIMIT_ERROR:
+            return create_error_response(413, result.metadata.get("error", MEMORY_LIMIT_ERROR))
         
         # Return success response
-        return create_success_response({
+        payload = {
             'diagram_code': result.diagram_code,
             'format': result.format.value,
             'metadata': result.metadata,
             'success': result.success
-        })
+        }
+        if result.ir is not None:
+            # Lets the frontend switch formats without another request
+            payload['ir'] = result.ir
+        return create_success_response(payload)
         
     except Exception as e:
         logger.error(f"Unexpected error: {str(e)}")
@@ -98,6 +158,38 @@ def lambda_handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
         )
 
 
+def build_analysis_request(body: Dict[str, Any]):
+    """
+    Build an AnalysisRequest from a parsed body.
+    
+    code_files was just decoded from JSON, so it is only type-checked and then
+    attached as is: letting pydantic validate it would rebuild the dict and
+    check every (possibly multi-megabyte) string again.
+    
+    Raises:
+        ValueError: If a field is invalid (pydantic's ValidationError is one)
+    """
+    from ..models import AnalysisRequest, DiagramType, OutputFormat, AnalysisMethod
+    
+    request = AnalysisRequest(
+        repo_url=body.get('repo_url'),
+        local_directory=body.get('local_directory'),
+        diagram_type=DiagramType(body['diagram_type']),
+        output_format=OutputFormat(body['output_format']),
+        analysis_method=AnalysisMethod(body.get('analysis_method', 'llm_direct')),
+        filters=body.get('filters', {})
+    )
+    
+    code_files = body.get('code_files')
+    if code_files is not None:
+        if not isinstance(code_files, dict) or not all(
+            type(path) is str and type(content) is str for path, content in code_files.items()
+        ):
+            raise ValueError("code_files must map file paths to file contents (strings)")
+        request.code_files = code_files
+    return request
+
+
 def create_success_response(data: Dict[str, Any]) -> Dict[str, Any]:
     """Create a successful HTTP response."""
     return {
@@ -108,11 +200,12 @@ def create_success_response(data: Dict[str, Any]) -> Dict[str, Any]:
             'Access-Control-Allow-Methods': 'POST, OPTIONS',
             'Access-Control-Allow-Headers': 'Content-Type'
         },
-        'body': json.dumps(data)
+        'body': codec.dumps(data)
     }
 
 
-def create_error_response(status_code: int, message: str) -> Dict[str, Any]:
+def create_error_response(status_code: int, message: str,
+                          headers: Optional[Dict[str, str]] = None) -> Dict[str, Any]:
     """Create an error HTTP response."""
     return {
         'statusCode': status_code,
@@ -120,9 +213,10 @@ def create_error_response(status_code: int, message: str) -> Dict[str, Any]:
             'Content-Type': 'application/json',
             'Access-Control-Allow-Origin': '*',
             'Access-Control-Allow-Methods': 'POST, OPTIONS',
-            'Access-Control-Allow-Headers': 'Content-Type'
+            'Access-Control-Allow-Headers': 'Content-Type',
+            **(headers or {})
         },
-        'body': json.dumps({
+        'body': codec.dumps({
             'error': message,
             'success': False
         })
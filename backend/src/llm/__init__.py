@@ -1,5 +1,11 @@
 """LLM integration package."""
 
-from .gemini_provider import GeminiProvider
+__all__ = ["GeminiProvider"]
 
-__all__ = ["GeminiProvider"]
\ No newline at end of file
+
+def __getattr__(name):
+    # google.genai is expensive to import; load it only when a provider is needed
+    if name == "GeminiProvider":
+        from .gemini_provider import GeminiProvider
+        return GeminiProvider
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
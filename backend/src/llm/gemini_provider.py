@@ -2,32 +2,61 @@
 
 from google import genai
 from google.genai import types
-import os
-from typing import Dict
+from typing import Any, Dict, List, Optional, Tuple
 import logging
+import os
+import re
 from ..models import DiagramType, OutputFormat
-from ..prompts import DIAGRAM_PROMPTS
+from ..diagram_ir import EDGE_KINDS, MESSAGE_KINDS, NODE_KINDS
+from ..prompts import DIAGRAM_PROMPTS, IR_RESPONSE_PROMPT, SUMMARY_PROMPT
+from .router import Backend, BackendRouter, pool_from_env
+from .response_decoder import (DecodedResponse, continue_code, decode_ir_response, decode_response,
+                               decode_summaries_response)
 
 logger = logging.getLogger(__name__)
 
+# Batch job states that still need polling; SUCCEEDED / PARTIALLY_SUCCEEDED carry results
+BATCH_PENDING_STATES = {
+    "JOB_STATE_UNSPECIFIED", "JOB_STATE_QUEUED", "JOB_STATE_PENDING", "JOB_STATE_RUNNING",
+    "JOB_STATE_PAUSED", "JOB_STATE_UPDATING", "JOB_STATE_CANCELLING",
+}
+BATCH_DONE_STATES = {"JOB_STATE_SUCCEEDED", "JOB_STATE_PARTIALLY_SUCCEEDED"}
+
+# Follow-up calls asking for the rest of a diagram cut off by the output token limit
+MAX_CONTINUATIONS = int(os.getenv("UML_LLM_MAX_CONTINUATIONS", "2"))
+CONTINUATION_PROMPT = (
+    "Tu respuesta anterior se cortó por el límite de longitud. Continúa el código {format_diagram} "
+    "exactamente desde el último carácter escrito, sin repetir nada de lo anterior y sin explicaciones, "
+    "comillas ni bloques de código markdown: devuelve solo el texto que falta del diagrama."
+)
+IR_CONTINUATION_PROMPT = (
+    "Tu respuesta anterior se cortó por el límite de longitud. Continúa el JSON exactamente desde el último "
+    "carácter escrito, sin repetir nada de lo anterior y sin explicaciones ni bloques de código markdown: "
+    "devuelve solo el texto que falta."
+)
+
+# Final "x-Responde exclusivamente en formato JSON..." requirement, swapped for IR_RESPONSE_PROMPT
+RESPONSE_INSTRUCTION_RE = re.compile(r'([a-z])-Responde exclusivamente en formato JSON.*', re.DOTALL)
+IR_FORMAT_NAME = "JSON intermedio (IR)"
+
 
 class GeminiProvider:
     """Google Gemini LLM provider using google.genai."""
     
-    def __init__(self):
-        # API Key from environment variables
-        self.api_key = os.getenv("GOOGLE_API_KEY")
-        logger.info(f"API Key loaded: {'Yes' if self.api_key else 'No'}")
-        if not self.api_key:
-            raise ValueError("GOOGLE_API_KEY not found in environment variables")
-            
-        self.model_name = os.getenv("GEMINI_MODEL_NAME", "gemini-2.5-flash")
-        logger.info(f"Model name: {self.model_name}")
+    def __init__(self, router: Optional[BackendRouter] = None):
+        """
+        Args:
+            router: Pool of key/model backends; built from GOOGLE_API_KEYS /
+                GEMINI_MODEL_NAMES (or GOOGLE_API_KEY / GEMINI_MODEL_NAME) when omitted
+        """
+        if router is None:
+            router = self._router_from_env()
+        self.router = router
+        
+        self.model_names = list(dict.fromkeys(backend.model for backend in router.backends))
+        self.model_name = self.model_names[0]
+        logger.info(f"LLM pool: {len(router.backends)} backends, models: {', '.join(self.model_names)}")
         
-        # Initialize Gemini client
-        self.client = genai.Client(api_key=self.api_key)
-
-           
         # Load prompts from prompts.py file
         self.custom_prompts = {
             DiagramType.USE_CASE: DIAGRAM_PROMPTS.get("use_case", ""),
@@ -40,87 +69,101 @@ class GeminiProvider:
         }
         logger.info(f"Prompts loaded: {len(self.custom_prompts)} prompts available")
     
+    def _router_from_env(self) -> BackendRouter:
+        """One client per API key, shared by the models configured for it."""
+        pool = pool_from_env()
+        logger.info(f"API Keys loaded: {len({key_id for key_id, _, _ in pool})}")
+        if not pool:
+            raise ValueError("GOOGLE_API_KEY not found in environment variables")
+        
+        clients = {}
+        backends = []
+        for key_id, api_key, model in pool:
+            if key_id not in clients:
+                clients[key_id] = genai.Client(api_key=api_key)
+            backends.append(Backend(key_id, model, clients[key_id]))
+        return BackendRouter(backends)
+    
+    def _generate(self, parts: list, contents=None, config=None):
+        """Run generate_content on the backend picked by the router."""
+        contents = contents or types.Content(role="user", parts=parts)
+        config = config or self._build_generate_config()
+        return self.router.call(
+            lambda backend: backend.client.models.generate_content(
+                model=backend.model, contents=contents, config=config
+            )
+        )
+    
+    async def _agenerate(self, parts: list, contents=None, config=None):
+        """Async variant of _generate using the SDK's aio client."""
+        contents = contents or types.Content(role="user", parts=parts)
+        config = config or self._build_generate_config()
+        return await self.router.acall(
+            lambda backend: backend.client.aio.models.generate_content(
+                model=backend.model, contents=contents, config=config
+            )
+        )
+    
+    def _generate_complete(self, parts: list, output_format: OutputFormat, source: str = "") -> tuple[str, str]:
+        """Generate, then ask only for the missing tail while the diagram code is cut off."""
+        decoded = self._decode(self._generate(parts), output_format, source)
+        for _ in range(MAX_CONTINUATIONS):
+            if not decoded.truncated or not decoded.code:
+                break
+            contents, config = self._continuation_request(parts, decoded, output_format)
+            response = self._generate(parts, contents=contents, config=config)
+            decoded = self._continue(decoded, response, output_format)
+        return decoded.code, decoded.metadata
+    
+    async def _agenerate_complete(self, parts: list, output_format: OutputFormat, source: str = "") -> tuple[str, str]:
+        """Async variant of _generate_complete."""
+        decoded = self._decode(await self._agenerate(parts), output_format, source)
+        for _ in range(MAX_CONTINUATIONS):
+            if not decoded.truncated or not decoded.code:
+                break
+            contents, config = self._continuation_request(parts, decoded, output_format)
+            response = await self._agenerate(parts, contents=contents, config=config)
+            decoded = self._continue(decoded, response, output_format)
+        return decoded.code, decoded.metadata
+    
+    def _generate_ir_complete(self, parts: list) -> Tuple[str, Optional[str]]:
+        """Generate an IR reply, asking for the rest of the JSON while it is cut off - returns (text, finish_reason)."""
+        response = self._generate(parts, config=self._build_ir_config())
+        text, finish_reason = response.text or "", self._finish_reason(response)
+        for _ in range(MAX_CONTINUATIONS):
+            if finish_reason != "MAX_TOKENS" or not text:
+                break
+            response = self._generate(parts, *self._ir_continuation_request(parts, text))
+            if not (response.text or "").strip():
+                logger.warning("Empty IR continuation; the reply stays cut off")
+                break
+            text, finish_reason = text + response.text, self._finish_reason(response)
+        return text, finish_reason
+    
+    async def _agenerate_ir_complete(self, parts: list) -> Tuple[str, Optional[str]]:
+        """Async variant of _generate_ir_complete."""
+        response = await self._agenerate(parts, config=self._build_ir_config())
+        text, finish_reason = response.text or "", self._finish_reason(response)
+        for _ in range(MAX_CONTINUATIONS):
+            if finish_reason != "MAX_TOKENS" or not text:
+                break
+            response = await self._agenerate(parts, *self._ir_continuation_request(parts, text))
+            if not (response.text or "").strip():
+                logger.warning("Empty IR continuation; the reply stays cut off")
+                break
+            text, finish_reason = text + response.text, self._finish_reason(response)
+        return text, finish_reason
+    
     def generate_diagram_from_github_url(self, 
                                         repo_url: str,
                                         diagram_type: DiagramType,
                                         output_format: OutputFormat) -> tuple[str, str]:
         """Generate diagram from GitHub repository URL - returns (diagram_code, metadata)."""
         try:
-            # Get custom prompt for diagram type
-            custom_prompt = self.custom_prompts.get(diagram_type, "")
-            if not custom_prompt:
-                custom_prompt = self._get_default_prompt(diagram_type, output_format)
-            
-            # Replace {format_diagram} parameter
-            format_name = self._get_format_name(output_format)
-            custom_prompt = custom_prompt.replace("{format_diagram}", format_name)
-            
-            # Build parts list with the GitHub URL
-            parts = []
-            
-            # Add the main prompt
-            parts.append(types.Part.from_text(text=custom_prompt))
-            
-            # Add the GitHub URL as a separate part
-            parts.append(types.Part.from_text(text=f"Repositorio de GitHub: {repo_url}"))
-            
-            # Define response schema for structured JSON output
-            response_schema = types.Schema(
-                type=types.Type.OBJECT,
-                properties={
-                    "metadata": types.Schema(type=types.Type.STRING),
-                    "codigoUML": types.Schema(type=types.Type.STRING),
-                },
-                required=["metadata", "codigoUML"]
-            )
+            parts = self._build_github_parts(repo_url, diagram_type, output_format)
             
-            generate_content_config = types.GenerateContentConfig(
-                temperature=0,
-                response_mime_type="application/json",
-                response_schema=response_schema,
-                thinking_config = types.ThinkingConfig(
-                    thinking_budget=-1,
-                ),
-            )
-
             # Generate response using the new API with structured JSON output
-            response = self.client.models.generate_content(
-                model=self.model_name,
-                contents=types.Content(role="user", parts=parts),
-                config=generate_content_config,
-            )
-            
-            if not response.text:
-                raise ValueError("Empty response from Gemini")
-            
-            # Parse JSON response - now guaranteed to be valid JSON
-            try:
-                import json
-                response_text = response.text.strip()
-                
-                # Parse JSON directly (guaranteed valid by Gemini's response_mime_type)
-                parsed_response = json.loads(response_text)
-                
-                # Extract codigoUML and metadata
-                metadata = parsed_response.get("metadata", "")
-                codigo_uml = parsed_response.get("codigoUML", "")
-                
-                # Unescape literal \n, \t, \r sequences to actual characters
-                codigo_uml = codigo_uml.replace('\\n', '\n').replace('\\t', '\t').replace('\\r', '\r')
-                
-                # Sanitize diagram code (remove markdown code block markers)
-                codigo_uml = self._sanitize_diagram_code(codigo_uml, output_format)
-                
-                logger.info(f"Successfully parsed JSON response from GitHub URL. Metadata length: {len(metadata)}, Code length: {len(codigo_uml)}")
-                
-                # Return both diagram code and metadata
-                if not codigo_uml:
-                    logger.warning(f"No 'codigoUML' field found in parsed JSON. Response keys: {parsed_response.keys()}")
-                return codigo_uml, metadata
-                    
-            except json.JSONDecodeError as e:
-                logger.error(f"Failed to parse JSON response: {str(e)}. Response text: {response_text}")
-                return "", ""
+            return self._generate_complete(parts, output_format, source="GitHub URL")
             
         except Exception as e:
             logger.error(f"Error in Gemini generation from GitHub URL: {str(e)}")
@@ -129,90 +172,427 @@ class GeminiProvider:
     def generate_diagram_from_source_files(self, 
                                           source_files: Dict[str, str], 
                                           diagram_type: DiagramType,
-                                          output_format: OutputFormat) -> tuple[str, str]:
-        """Generate diagram - returns (diagram_code, metadata)."""
+                                          output_format: OutputFormat,
+                                          file_aliases: Optional[Dict[str, List[str]]] = None) -> tuple[str, str]:
+        """Generate diagram - returns (diagram_code, metadata).
+        
+        file_aliases maps a representative file to the duplicate paths it stands for.
+        """
         try:
-            # Get custom prompt for diagram type
-            custom_prompt = self.custom_prompts.get(diagram_type, "")
-            if not custom_prompt:
-                custom_prompt = self._get_default_prompt(diagram_type, output_format)
-            
-            # Replace {format_diagram} parameter
-            format_name = self._get_format_name(output_format)
-            custom_prompt = custom_prompt.replace("{format_diagram}", format_name)
+            parts = self._build_source_parts(source_files, diagram_type, output_format, file_aliases)
             
-            # Build parts list like in pruebaGemini.py
-            parts = []
+            # Generate response using the new API with structured JSON output
+            return self._generate_complete(parts, output_format)
             
-            # Add the main prompt
-            parts.append(types.Part.from_text(text=custom_prompt))
+        except Exception as e:
+            logger.error(f"Error in Gemini generation: {str(e)}")
+            raise RuntimeError(f"Gemini generation failed: {str(e)}")
+    
+    async def agenerate_diagram_from_github_url(self,
+                                               repo_url: str,
+                                               diagram_type: DiagramType,
+                                               output_format: OutputFormat) -> tuple[str, str]:
+        """Async variant of generate_diagram_from_github_url using the SDK's aio client."""
+        try:
+            parts = self._build_github_parts(repo_url, diagram_type, output_format)
+            return await self._agenerate_complete(parts, output_format, source="GitHub URL")
             
-            # Add each source file as a separate part
-            for file_path, content in source_files.items():
-                if content.strip():
-                    parts.append(types.Part.from_text(text=f"--- FILE: {file_path} ---\n{content}"))
+        except Exception as e:
+            logger.error(f"Error in async Gemini generation from GitHub URL: {str(e)}")
+            raise RuntimeError(f"Gemini generation failed: {str(e)}")
+    
+    async def agenerate_diagram_from_source_files(self,
+                                                 source_files: Dict[str, str],
+                                                 diagram_type: DiagramType,
+                                                 output_format: OutputFormat,
+                                                 file_aliases: Optional[Dict[str, List[str]]] = None) -> tuple[str, str]:
+        """Async variant of generate_diagram_from_source_files using the SDK's aio client."""
+        try:
+            parts = self._build_source_parts(source_files, diagram_type, output_format, file_aliases)
+            return await self._agenerate_complete(parts, output_format)
             
-            # Define response schema for structured JSON output
-            response_schema = types.Schema(
-                type=types.Type.OBJECT,
-                properties={
-                    "metadata": types.Schema(type=types.Type.STRING),
-                    "codigoUML": types.Schema(type=types.Type.STRING),
-                },
-                required=["metadata", "codigoUML"]
+        except Exception as e:
+            logger.error(f"Error in async Gemini generation: {str(e)}")
+            raise RuntimeError(f"Gemini generation failed: {str(e)}")
+    
+    def generate_ir_from_github_url(self, repo_url: str, diagram_type: DiagramType) -> tuple[Dict[str, Any], str]:
+        """Describe the diagram of a GitHub repository as an IR - returns (raw_ir, metadata)."""
+        try:
+            text, finish_reason = self._generate_ir_complete(self._build_github_parts(repo_url, diagram_type, None))
+        except Exception as e:
+            logger.error(f"Error in Gemini IR generation from GitHub URL: {str(e)}")
+            raise RuntimeError(f"Gemini generation failed: {str(e)}")
+        return self._decode_ir(text, finish_reason, source="GitHub URL")
+    
+    def generate_ir_from_source_files(self,
+                                      source_files: Dict[str, str],
+                                      diagram_type: DiagramType,
+                                      file_aliases: Optional[Dict[str, List[str]]] = None) -> tuple[Dict[str, Any], str]:
+        """Describe the diagram as an IR (see diagram_ir.py) - returns (raw_ir, metadata).
+        
+        A reply cut off by the output token limit is continued, as diagram code
+        is. Raises ValueError when the reply still holds no usable IR, so the
+        caller can fall back to generating the diagram code directly.
+        """
+        try:
+            text, finish_reason = self._generate_ir_complete(
+                self._build_source_parts(source_files, diagram_type, None, file_aliases)
             )
-            
-            generate_content_config = types.GenerateContentConfig(
-                temperature=0,
-                response_mime_type="application/json",
-                response_schema=response_schema,
-                thinking_config = types.ThinkingConfig(
-                    thinking_budget=-1,
-                ),
+        except Exception as e:
+            logger.error(f"Error in Gemini IR generation: {str(e)}")
+            raise RuntimeError(f"Gemini generation failed: {str(e)}")
+        return self._decode_ir(text, finish_reason)
+    
+    async def agenerate_ir_from_github_url(self, repo_url: str, diagram_type: DiagramType) -> tuple[Dict[str, Any], str]:
+        """Async variant of generate_ir_from_github_url."""
+        try:
+            text, finish_reason = await self._agenerate_ir_complete(
+                self._build_github_parts(repo_url, diagram_type, None)
             )
-
-            # Generate response using the new API with structured JSON output
-            response = self.client.models.generate_content(
-                model=self.model_name,
-                contents=types.Content(role="user", parts=parts),
-                config=generate_content_config,
+        except Exception as e:
+            logger.error(f"Error in async Gemini IR generation from GitHub URL: {str(e)}")
+            raise RuntimeError(f"Gemini generation failed: {str(e)}")
+        return self._decode_ir(text, finish_reason, source="GitHub URL")
+    
+    async def agenerate_ir_from_source_files(self,
+                                             source_files: Dict[str, str],
+                                             diagram_type: DiagramType,
+                                             file_aliases: Optional[Dict[str, List[str]]] = None) -> tuple[Dict[str, Any], str]:
+        """Async variant of generate_ir_from_source_files."""
+        try:
+            text, finish_reason = await self._agenerate_ir_complete(
+                self._build_source_parts(source_files, diagram_type, None, file_aliases)
             )
-            
-            if not response.text:
-                raise ValueError("Empty response from Gemini")
-            
-            # Parse JSON response - now guaranteed to be valid JSON
-            try:
-                import json
-                response_text = response.text.strip()
-                
-                # Parse JSON directly (guaranteed valid by Gemini's response_mime_type)
-                parsed_response = json.loads(response_text)
-                
-                # Extract codigoUML and metadata
-                metadata = parsed_response.get("metadata", "")
-                codigo_uml = parsed_response.get("codigoUML", "")
-                
-                # Unescape literal \n, \t, \r sequences to actual characters
-                codigo_uml = codigo_uml.replace('\\n', '\n').replace('\\t', '\t').replace('\\r', '\r')
-                
-                # Sanitize diagram code (remove markdown code block markers)
-                codigo_uml = self._sanitize_diagram_code(codigo_uml, output_format)
-                
-                logger.info(f"Successfully parsed JSON response. Metadata length: {len(metadata)}, Code length: {len(codigo_uml)}")
-                
-                # Return both diagram code and metadata
-                if not codigo_uml:
-                    logger.warning(f"No 'codigoUML' field found in parsed JSON. Response keys: {parsed_response.keys()}")
-                return codigo_uml, metadata
-                    
-            except json.JSONDecodeError as e:
-                logger.error(f"Failed to parse JSON response: {str(e)}. Response text: {response_text}")
-                return "", ""
-            
         except Exception as e:
-            logger.error(f"Error in Gemini generation: {str(e)}")
+            logger.error(f"Error in async Gemini IR generation: {str(e)}")
             raise RuntimeError(f"Gemini generation failed: {str(e)}")
+        return self._decode_ir(text, finish_reason)
+    
+    def summarize_source_files(self, source_files: Dict[str, str]) -> Dict[str, str]:
+        """Structural summary of each file, in one call - returns {path: summary}.
+        
+        Files the reply leaves out are simply missing from the result.
+        """
+        try:
+            response = self._generate(self._build_summary_parts(source_files), config=self._build_summary_config())
+        except Exception as e:
+            logger.error(f"Error in Gemini summary generation: {str(e)}")
+            raise RuntimeError(f"Gemini generation failed: {str(e)}")
+        return self._decode_summaries(response, source_files)
+    
+    async def asummarize_source_files(self, source_files: Dict[str, str]) -> Dict[str, str]:
+        """Async variant of summarize_source_files."""
+        try:
+            response = await self._agenerate(self._build_summary_parts(source_files), config=self._build_summary_config())
+        except Exception as e:
+            logger.error(f"Error in async Gemini summary generation: {str(e)}")
+            raise RuntimeError(f"Gemini generation failed: {str(e)}")
+        return self._decode_summaries(response, source_files)
+    
+    def build_batch_request(self,
+                            source_files: Dict[str, str],
+                            diagram_type: DiagramType,
+                            output_format: OutputFormat,
+                            file_aliases: Optional[Dict[str, List[str]]] = None) -> Dict:
+        """Inline request for the Batch API (half price, results within 24 hours)."""
+        parts = self._build_source_parts(source_files, diagram_type, output_format, file_aliases)
+        return {
+            "contents": [types.Content(role="user", parts=parts)],
+            "config": self._build_generate_config(),
+        }
+    
+    def submit_batch(self, requests: List[Dict], display_name: str) -> Tuple[str, str]:
+        """
+        Create a batch prediction job.
+        
+        Returns:
+            Tuple of (key id, job name); the job can only be read with the key that created it
+        """
+        backend = min(self.router.backends, key=lambda b: (b.ejected_until, b.failures))
+        job = backend.client.batches.create(
+            model=backend.model, src=requests, config={"display_name": display_name}
+        )
+        logger.info(f"Submitted batch job {job.name} with {len(requests)} requests on {backend.name}")
+        return backend.key_id, job.name
+    
+    def poll_batch(self, key_id: str, name: str,
+                   output_formats: List[OutputFormat]) -> Optional[List[Tuple[str, str, Optional[str]]]]:
+        """
+        Check a batch job.
+        
+        Args:
+            key_id: Key the job was created with
+            name: Job name returned by submit_batch
+            output_formats: Output format of each request, in submission order
+        
+        Returns:
+            None while the job runs, else one (diagram_code, metadata, error) per request
+        
+        Raises:
+            RuntimeError: If the job failed, expired or was cancelled
+        """
+        client = next((backend.client for backend in self.router.backends if backend.key_id == key_id), None)
+        if client is None:
+            raise RuntimeError(f"No configured API key {key_id} for batch {name}")
+        job = client.batches.get(name=name)
+        state = getattr(job.state, "name", str(job.state))
+        if state in BATCH_PENDING_STATES:
+            return None
+        if state not in BATCH_DONE_STATES:
+            raise RuntimeError(f"Batch job {name} ended in state {state}: {job.error}")
+        
+        results = []
+        for inlined, output_format in zip(job.dest.inlined_responses, output_formats):
+            if inlined.error:
+                results.append(("", "", str(inlined.error)))
+                continue
+            try:
+                diagram_code, metadata = self._parse_response(inlined.response, output_format, source="batch")
+                results.append((diagram_code, metadata, None if diagram_code else "Empty diagram in batch response"))
+            except Exception as e:
+                results.append(("", "", str(e)))
+        return results
+    
+    def _build_prompt(self, diagram_type: DiagramType, output_format: Optional[OutputFormat]) -> str:
+        """Get the prompt for the diagram type with the output format filled in.
+        
+        Without an output format the prompt asks for the diagram IR instead of code.
+        """
+        # Get custom prompt for diagram type
+        custom_prompt = self.custom_prompts.get(diagram_type, "")
+        if not custom_prompt:
+            custom_prompt = self._get_default_prompt(diagram_type, output_format or OutputFormat.MERMAID)
+        
+        if output_format is None:
+            custom_prompt = RESPONSE_INSTRUCTION_RE.sub(
+                lambda match: f"{match.group(1)}-{IR_RESPONSE_PROMPT}", custom_prompt
+            )
+            return custom_prompt.replace("{format_diagram}", IR_FORMAT_NAME)
+        
+        # Replace {format_diagram} parameter
+        format_name = self._get_format_name(output_format)
+        return custom_prompt.replace("{format_diagram}", format_name)
+    
+    def _build_summary_parts(self, source_files: Dict[str, str]) -> list:
+        """Summary prompt plus one part per source file."""
+        parts = [types.Part.from_text(text=SUMMARY_PROMPT)]
+        for file_path, content in source_files.items():
+            if content.strip():
+                parts.append(types.Part.from_text(text=f"{self._file_header(file_path)}\n{content}"))
+        return parts
+    
+    def _build_github_parts(self, repo_url: str, diagram_type: DiagramType, output_format: Optional[OutputFormat]) -> list:
+        """Build the prompt parts for a GitHub URL request."""
+        return [
+            # Add the main prompt
+            types.Part.from_text(text=self._build_prompt(diagram_type, output_format)),
+            # Add the GitHub URL as a separate part
+            types.Part.from_text(text=f"Repositorio de GitHub: {repo_url}"),
+        ]
+    
+    def _build_source_parts(self,
+                            source_files: Dict[str, str],
+                            diagram_type: DiagramType,
+                            output_format: Optional[OutputFormat],
+                            file_aliases: Optional[Dict[str, List[str]]] = None) -> list:
+        """Build the prompt parts: main prompt plus one part per source file."""
+        parts = [types.Part.from_text(text=self._build_prompt(diagram_type, output_format))]
+        
+        # Add each source file as a separate part
+        file_aliases = file_aliases or {}
+        for file_path, content in source_files.items():
+            if content.strip():
+                parts.append(types.Part.from_text(text=f"{self._file_header(file_path, file_aliases.get(file_path))}\n{content}"))
+        return parts
+    
+    def _build_generate_config(self) -> types.GenerateContentConfig:
+        """Generation config requesting structured JSON output."""
+        # Define response schema for structured JSON output
+        response_schema = types.Schema(
+            type=types.Type.OBJECT,
+            properties={
+                "metadata": types.Schema(type=types.Type.STRING),
+                "codigoUML": types.Schema(type=types.Type.STRING),
+            },
+            required=["metadata", "codigoUML"],
+            # Code first: a reply cut off by the token limit loses explanation, not diagram
+            property_ordering=["codigoUML", "metadata"]
+        )
+        
+        return types.GenerateContentConfig(
+            temperature=0,
+            response_mime_type="application/json",
+            response_schema=response_schema,
+            thinking_config = types.ThinkingConfig(
+                thinking_budget=-1,
+            ),
+        )
+    
+    def _build_ir_config(self) -> types.GenerateContentConfig:
+        """Generation config constraining the reply to the diagram IR."""
+        string = types.Schema(type=types.Type.STRING)
+        strings = types.Schema(type=types.Type.ARRAY, items=string)
+        
+        def enum(values) -> types.Schema:
+            return types.Schema(type=types.Type.STRING, enum=list(values))
+        
+        def array_of(properties: Dict[str, types.Schema], required: List[str]) -> types.Schema:
+            return types.Schema(
+                type=types.Type.ARRAY,
+                items=types.Schema(type=types.Type.OBJECT, properties=properties, required=required,
+                                   property_ordering=list(properties)),
+            )
+        
+        diagram = types.Schema(
+            type=types.Type.OBJECT,
+            properties={
+                "nodes": array_of({
+                    "id": string, "label": string, "kind": enum(NODE_KINDS), "stereotype": string,
+                    "parent": string, "attributes": strings, "operations": strings,
+                }, ["id", "label", "kind"]),
+                "edges": array_of({
+                    "source": string, "target": string, "kind": enum(EDGE_KINDS), "label": string,
+                    "source_label": string, "target_label": string,
+                }, ["source", "target", "kind"]),
+                "messages": array_of({
+                    "source": string, "target": string, "label": string, "kind": enum(MESSAGE_KINDS),
+                    "fragment": string, "guard": string,
+                }, ["source", "target", "label", "kind"]),
+            },
+            required=["nodes", "edges"],
+            property_ordering=["nodes", "edges", "messages"],
+        )
+        response_schema = types.Schema(
+            type=types.Type.OBJECT,
+            properties={"diagrama": diagram, "metadata": string},
+            required=["diagrama", "metadata"],
+            # Diagram first, as with codigoUML
+            property_ordering=["diagrama", "metadata"]
+        )
+        
+        return types.GenerateContentConfig(
+            temperature=0,
+            response_mime_type="application/json",
+            response_schema=response_schema,
+            thinking_config = types.ThinkingConfig(
+                thinking_budget=-1,
+            ),
+        )
+    
+    def _build_summary_config(self) -> types.GenerateContentConfig:
+        """Generation config for per-file summaries: a list of path/summary pairs, no thinking."""
+        entry = types.Schema(
+            type=types.Type.OBJECT,
+            properties={
+                "archivo": types.Schema(type=types.Type.STRING),
+                "resumen": types.Schema(type=types.Type.STRING),
+            },
+            required=["archivo", "resumen"],
+            property_ordering=["archivo", "resumen"]
+        )
+        response_schema = types.Schema(
+            type=types.Type.OBJECT,
+            properties={"resumenes": types.Schema(type=types.Type.ARRAY, items=entry)},
+            required=["resumenes"]
+        )
+        
+        # Summaries are extraction, not design: thinking would only add latency
+        return types.GenerateContentConfig(
+            temperature=0,
+            response_mime_type="application/json",
+            response_schema=response_schema,
+            thinking_config=types.ThinkingConfig(thinking_budget=0),
+        )
+    
+    def _parse_response(self, response, output_format: OutputFormat, source: str = "") -> tuple[str, str]:
+        """Extract (diagram_code, metadata) from a structured JSON response."""
+        decoded = self._decode(response, output_format, source)
+        return decoded.code, decoded.metadata
+    
+    def _decode(self, response, output_format: OutputFormat, source: str = "") -> DecodedResponse:
+        """Decode a reply, salvaging truncated or malformed JSON instead of discarding it."""
+        if not response.text:
+            raise ValueError("Empty response from Gemini")
+        
+        decoded = decode_response(response.text, output_format, self._finish_reason(response))
+        
+        source_note = f" from {source}" if source else ""
+        if decoded.method != "json":
+            logger.warning(f"Recovered response{source_note} without strict JSON parsing: {decoded}")
+        logger.info(f"Parsed response{source_note}. Metadata length: {len(decoded.metadata)}, Code length: {len(decoded.code)}")
+        
+        if not decoded.code:
+            logger.warning(f"No diagram code found in response{source_note}: {response.text[:500]}")
+        return decoded
+    
+    def _decode_ir(self, text: str, finish_reason: Optional[str], source: str = "") -> tuple[Dict[str, Any], str]:
+        """Decode an IR reply; ValueError when it holds none."""
+        source_note = f" from {source}" if source else ""
+        if not text:
+            raise ValueError(f"Empty IR response{source_note}")
+        if finish_reason == "MAX_TOKENS":
+            raise ValueError(f"IR response{source_note} still cut off by the output token limit after "
+                             f"{MAX_CONTINUATIONS} continuations")
+        raw_ir, metadata = decode_ir_response(text)
+        logger.info(f"Parsed IR response{source_note}. Nodes: {len(raw_ir.get('nodes') or [])}, "
+                    f"Metadata length: {len(metadata)}")
+        return raw_ir, metadata
+    
+    def _decode_summaries(self, response, source_files: Dict[str, str]) -> Dict[str, str]:
+        """Decode a summary reply, keeping only the requested paths."""
+        if not response.text:
+            raise ValueError("Empty summary response")
+        summaries = decode_summaries_response(response.text)
+        summaries = {path: summary for path, summary in summaries.items() if path in source_files}
+        logger.info(f"Parsed summary response: {len(summaries)}/{len(source_files)} files summarized")
+        return summaries
+    
+    def _continuation_request(self, parts: list, decoded: DecodedResponse,
+                              output_format: OutputFormat) -> Tuple[list, types.GenerateContentConfig]:
+        """Contents and plain-text config asking for the rest of truncated diagram code."""
+        prompt = CONTINUATION_PROMPT.replace("{format_diagram}", self._get_format_name(output_format))
+        contents = [
+            types.Content(role="user", parts=parts),
+            types.Content(role="model", parts=[types.Part.from_text(text=decoded.code)]),
+            types.Content(role="user", parts=[types.Part.from_text(text=prompt)]),
+        ]
+        config = types.GenerateContentConfig(temperature=0, response_mime_type="text/plain")
+        logger.info(f"Diagram code cut off after {len(decoded.code)} chars; requesting continuation")
+        return contents, config
+    
+    def _ir_continuation_request(self, parts: list, text: str) -> Tuple[list, types.GenerateContentConfig]:
+        """Contents and plain-text config asking for the rest of a truncated IR reply."""
+        contents = [
+            types.Content(role="user", parts=parts),
+            types.Content(role="model", parts=[types.Part.from_text(text=text)]),
+            types.Content(role="user", parts=[types.Part.from_text(text=IR_CONTINUATION_PROMPT)]),
+        ]
+        config = types.GenerateContentConfig(temperature=0, response_mime_type="text/plain")
+        logger.info(f"IR reply cut off after {len(text)} chars; requesting continuation")
+        return contents, config
+    
+    def _continue(self, decoded: DecodedResponse, response, output_format: OutputFormat) -> DecodedResponse:
+        """Append a continuation reply to the truncated code."""
+        tail = response.text or ""
+        if not tail.strip():
+            logger.warning("Empty continuation; keeping the truncated diagram")
+            return DecodedResponse(decoded.code, decoded.metadata, decoded.method, False)
+        return continue_code(decoded, tail, output_format, self._finish_reason(response))
+    
+    @staticmethod
+    def _finish_reason(response) -> Optional[str]:
+        """Finish reason name of the first candidate, e.g. "MAX_TOKENS"."""
+        candidates = getattr(response, "candidates", None) or []
+        reason = getattr(candidates[0], "finish_reason", None) if candidates else None
+        if reason is None:
+            return None
+        return getattr(reason, "name", str(reason))
+    
+    def _file_header(self, file_path: str, aliases: Optional[List[str]] = None) -> str:
+        """Build the separator line that introduces a source file in the prompt."""
+        if aliases:
+            return f"--- FILE: {file_path} (also stands for identical or near-identical files: {', '.join(aliases)}) ---"
+        return f"--- FILE: {file_path} ---"
     
     def _get_format_name(self, output_format: OutputFormat) -> str:
         """Get format name for prompt substitution."""
@@ -236,24 +616,3 @@ class GeminiProvider:
                     "metadata": "Explicación detallada en español para estudiantes",
                     "codigoUML": "código {format_name} aquí"
                 }}"""
-
-
-
-    def _sanitize_diagram_code(self, code: str, output_format: OutputFormat) -> str:
-        """Remove markdown code block markers from diagram code."""
-        if not code:
-            return code
-        
-        # Get the format language identifier
-        format_lang = output_format.value.lower()  # 'mermaid', 'drawio', 'plantuml'
-        
-        # Remove opening backticks with language specifier: ```language\n
-        opening_marker = f"```{format_lang}\n"
-        if code.startswith(opening_marker):
-            code = code[len(opening_marker):]
-        
-        # Remove closing backticks: ```
-        if code.endswith("```"):
-            code = code[:-3]
-        
-        return code
\ No newline at end of file
@@ -0,0 +1,273 @@
+"""Tolerant decoding of the model's {"metadata", "codigoUML"} reply.
+
+Structured output is normally valid JSON, but a reply cut off by the output
+token limit (or a model that ignores the schema) used to be thrown away whole.
+This module recovers whatever diagram code is there and says whether it is
+complete, so the provider can ask only for the missing tail.
+"""
+
+import json
+import re
+from typing import Dict, Optional, Tuple
+from .. import codec
+from ..models import OutputFormat
+
+CODE_KEY = "codigoUML"
+METADATA_KEY = "metadata"
+IR_KEY = "diagrama"
+SUMMARIES_KEY = "resumenes"
+
+FIELD_RE = re.compile(r'"(codigoUML|metadata)"\s*:\s*"')
+# A fenced block; an unterminated fence runs to the end of the text
+FENCE_RE = re.compile(r'```[ \t]*([\w+.-]*)[^\n]*\n(.*?)(?:(```)|\Z)', re.DOTALL)
+
+FENCE_LANGUAGES = {
+    OutputFormat.MERMAID: {'mermaid', 'mmd'},
+    OutputFormat.PLANTUML: {'plantuml', 'puml', 'uml'},
+    OutputFormat.DRAWIO: {'drawio', 'xml', 'mxgraph', 'mxfile'},
+}
+
+MERMAID_START_RE = re.compile(
+    r'^\s*(?:%%.*\n\s*)*(?:classDiagram|sequenceDiagram|stateDiagram(?:-v2)?|flowchart|graph|erDiagram|'
+    r'journey|gantt|pie|mindmap|timeline|C4\w+|architecture-beta|block-beta)\b',
+    re.MULTILINE
+)
+
+# Characters of a continuation that may repeat the end of the partial code
+MAX_OVERLAP = 400
+MIN_OVERLAP = 12
+
+
+class DecodedResponse:
+    """Diagram code and explanation recovered from one reply."""
+
+    def __init__(self, code: str, metadata: str, method: str, truncated: bool):
+        """
+        Args:
+            code: Diagram code without markdown fences
+            metadata: Explanation text (may be partial)
+            method: How the reply was read: json, salvaged, fenced, raw or empty
+            truncated: The diagram code is known to be cut off
+        """
+        self.code = code
+        self.metadata = metadata
+        self.method = method
+        self.truncated = truncated
+
+    def __repr__(self) -> str:
+        return (f"DecodedResponse(method={self.method!r}, truncated={self.truncated}, "
+                f"code={len(self.code)} chars, metadata={len(self.metadata)} chars)")
+
+
+def decode_response(text: str, output_format: OutputFormat, finish_reason: Optional[str] = None) -> DecodedResponse:
+    """
+    Recover code and explanation from a model reply.
+
+    Tries, in order: strict JSON, JSON inside a fence or surrounded by prose,
+    the two string fields of a truncated or malformed object, and finally a
+    fenced or bare diagram in plain text.
+
+    Args:
+        text: Reply text
+        output_format: Expected diagram format
+        finish_reason: Candidate finish reason name, e.g. "MAX_TOKENS"
+    """
+    text = (text or "").strip()
+    parsed = _load_object(text)
+    if parsed is not None:
+        code = clean_code(str(parsed.get(CODE_KEY) or ""), output_format)
+        return DecodedResponse(code, str(parsed.get(METADATA_KEY) or ""), "json", _code_incomplete(code, output_format))
+
+    fields = salvage_fields(text)
+    if CODE_KEY in fields or METADATA_KEY in fields:
+        raw_code, closed = fields.get(CODE_KEY, ("", False))
+        metadata = fields.get(METADATA_KEY, ("", True))[0]
+        code = clean_code(raw_code, output_format)
+        truncated = not closed or _code_incomplete(code, output_format)
+        return DecodedResponse(code, metadata, "salvaged", truncated)
+
+    code, fence_closed = extract_fenced(text, output_format)
+    if code is not None:
+        truncated = not fence_closed or finish_reason == "MAX_TOKENS" or _code_incomplete(code, output_format)
+        return DecodedResponse(code, "", "fenced", truncated)
+
+    if looks_like_diagram(text, output_format):
+        truncated = finish_reason == "MAX_TOKENS" or _code_incomplete(text, output_format)
+        return DecodedResponse(text, "", "raw", truncated)
+
+    return DecodedResponse("", "", "empty", False)
+
+
+def continue_code(partial: DecodedResponse, tail_text: str, output_format: OutputFormat,
+                  finish_reason: Optional[str] = None) -> DecodedResponse:
+    """
+    Append a continuation reply to truncated code.
+
+    The tail may come fenced and may repeat the last characters of the
+    partial code; the repeated part is dropped.
+    """
+    tail, _ = extract_fenced(tail_text or "", output_format)
+    if tail is None:
+        tail = tail_text or ""
+    code = partial.code
+    for size in range(min(MAX_OVERLAP, len(code), len(tail)), MIN_OVERLAP - 1, -1):
+        if code.endswith(tail[:size]):
+            tail = tail[size:]
+            break
+    code += tail
+    truncated = finish_reason == "MAX_TOKENS" or _code_incomplete(code, output_format)
+    return DecodedResponse(code, partial.metadata, partial.method, truncated)
+
+
+def decode_ir_response(text: str) -> Tuple[Dict, str]:
+    """
+    Read a {"diagrama", "metadata"} reply describing the diagram as an IR.
+
+    Unlike diagram code, a cut-off description cannot be continued, so there
+    is no salvage step.
+
+    Returns:
+        (raw IR object, explanation)
+
+    Raises:
+        ValueError: If the reply holds no IR object
+    """
+    parsed = _load_object((text or "").strip())
+    if parsed is None or not isinstance(parsed.get(IR_KEY), dict):
+        raise ValueError("Reply does not contain a diagram IR")
+    return parsed[IR_KEY], str(parsed.get(METADATA_KEY) or "")
+
+
+def decode_summaries_response(text: str) -> Dict[str, str]:
+    """
+    Read a {"resumenes": [{"archivo", "resumen"}]} reply.
+
+    Returns:
+        Summary per file path; entries without a path or a summary are skipped
+
+    Raises:
+        ValueError: If the reply holds no summary list
+    """
+    parsed = _load_object((text or "").strip())
+    if parsed is None or not isinstance(parsed.get(SUMMARIES_KEY), list):
+        raise ValueError("Reply does not contain file summaries")
+    summaries = {}
+    for entry in parsed[SUMMARIES_KEY]:
+        if isinstance(entry, dict) and entry.get("archivo") and str(entry.get("resumen") or "").strip():
+            summaries[str(entry["archivo"])] = str(entry["resumen"]).strip()
+    return summaries
+
+
+def salvage_fields(text: str) -> Dict[str, Tuple[str, bool]]:
+    """
+    Read the string fields of a possibly truncated JSON object.
+
+    Returns:
+        Field name -> (decoded value, whether the string was closed)
+    """
+    fields = {}
+    for match in FIELD_RE.finditer(text):
+        name = match.group(1)
+        if name in fields:
+            continue
+        raw, closed = _scan_string(text, match.end())
+        fields[name] = (_decode_string(raw), closed)
+    return fields
+
+
+def extract_fenced(text: str, output_format: OutputFormat) -> Tuple[Optional[str], bool]:
+    """
+    Pick the diagram out of markdown code fences.
+
+    A block tagged with one of the format's languages wins, then an untagged
+    block, then the first block.
+
+    Returns:
+        Tuple of (block content or None when there is no fence, whether the fence was closed)
+    """
+    blocks = [(match.group(1).lower(), match.group(2), match.group(3) is not None)
+              for match in FENCE_RE.finditer(text)]
+    if not blocks:
+        return None, True
+    languages = FENCE_LANGUAGES.get(output_format, set())
+    for predicate in (lambda lang: lang in languages, lambda lang: not lang, lambda lang: True):
+        for lang, body, closed in blocks:
+            if predicate(lang):
+                return body, closed
+    return None, True
+
+
+def clean_code(code: str, output_format: OutputFormat) -> str:
+    """Unescape literal escape sequences and strip markdown fences from a codigoUML value."""
+    if not code:
+        return code
+    # Unescape literal \n, \t, \r sequences to actual characters
+    code = code.replace('\\n', '\n').replace('\\t', '\t').replace('\\r', '\r')
+    fenced, _ = extract_fenced(code, output_format)
+    if fenced is not None:
+        return fenced
+    if code.endswith("```"):
+        code = code[:-3]
+    return code
+
+
+def looks_like_diagram(text: str, output_format: OutputFormat) -> bool:
+    """Whether plain text is (the start of) a diagram in the given format."""
+    if output_format == OutputFormat.PLANTUML:
+        return '@startuml' in text
+    if output_format == OutputFormat.DRAWIO:
+        return '<mxfile' in text or '<mxGraphModel' in text
+    return bool(MERMAID_START_RE.match(text))
+
+
+def _code_incomplete(code: str, output_format: OutputFormat) -> bool:
+    # Only the XML and PlantUML formats have an end marker to check
+    if output_format == OutputFormat.PLANTUML:
+        return '@startuml' in code and '@enduml' not in code
+    if output_format == OutputFormat.DRAWIO:
+        if '<mxfile' in code:
+            return '</mxfile>' not in code
+        return '<mxGraphModel' in code and '</mxGraphModel>' not in code
+    return False
+
+
+def _load_object(text: str) -> Optional[Dict]:
+    candidates = [text]
+    fenced, closed = extract_fenced(text, OutputFormat.MERMAID)
+    if fenced is not None and closed:
+        candidates.append(fenced)
+    start, end = text.find('{'), text.rfind('}')
+    if 0 <= start < end:
+        candidates.append(text[start:end + 1])
+    for candidate in candidates:
+        try:
+            parsed = codec.loads(candidate)
+        except ValueError:
+            continue
+        if isinstance(parsed, dict):
+            return parsed
+    return None
+
+
+def _scan_string(text: str, start: int) -> Tuple[str, bool]:
+    index = start
+    while index < len(text):
+        char = text[index]
+        if char == '\\':
+            index += 2
+            continue
+        if char == '"':
+            return text[start:index], True
+        index += 1
+    return text[start:], False
+
+
+def _decode_string(raw: str) -> str:
+    # A cut may leave half an escape sequence at the end; drop it and retry
+    for trim in range(0, 6):
+        candidate = raw[:len(raw) - trim] if trim else raw
+        try:
+            return json.loads(f'"{candidate}"', strict=False)
+        except ValueError:
+            continue
+    return raw.replace('\\"', '"').replace('\\\\', '\\')
@@ -0,0 +1,262 @@
+"""Latency-aware routing of LLM calls over a pool of API keys and models."""
+
+import logging
+import os
+import threading
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Sequence, Set
+
+logger = logging.getLogger(__name__)
+
+
+DEFAULT_MODEL_NAME = "gemini-2.5-flash"
+# Consecutive failures before a backend is ejected
+DEFAULT_MAX_FAILURES = int(os.getenv("UML_LLM_MAX_FAILURES", "3"))
+# Seconds an ejected backend sits out; doubles on each repeated ejection
+DEFAULT_COOLDOWN = float(os.getenv("UML_LLM_COOLDOWN", "30"))
+MAX_COOLDOWN = 600.0
+# Requests per minute allowed per key and model (0 = no client-side limit)
+DEFAULT_RPM_LIMIT = int(os.getenv("UML_LLM_RPM_LIMIT", "0"))
+# Backends tried per call before the last error is raised
+DEFAULT_MAX_ATTEMPTS = int(os.getenv("UML_LLM_MAX_ATTEMPTS", "3"))
+LATENCY_ALPHA = 0.3
+# A failed call counts as a sample at least this slow, so failing keys lose traffic before ejection
+FAILURE_LATENCY = 1.0
+
+RETRYABLE_STATUS = {408, 429, 500, 502, 503, 504}
+QUOTA_MARKERS = ("429", "RESOURCE_EXHAUSTED", "quota")
+TRANSIENT_MARKERS = ("UNAVAILABLE", "DEADLINE_EXCEEDED", "timed out", "timeout", "Connection")
+
+
+class NoBackendAvailable(RuntimeError):
+    """Raised when the pool has no backends configured."""
+
+
+class Backend:
+    """One API key + model pair and its observed health."""
+
+    def __init__(self, key_id: str, model: str, client: Any):
+        self.key_id = key_id
+        self.model = model
+        self.client = client
+        self.outstanding = 0
+        self.latency = 0.0  # EWMA of successful call durations; 0 until measured
+        self.consecutive_failures = 0
+        self.ejections = 0
+        self.ejected_until = 0.0
+        self.recent = deque()  # start times within the last minute
+        self.requests = 0
+        self.failures = 0
+
+    @property
+    def name(self) -> str:
+        return f"{self.key_id}/{self.model}"
+
+    def snapshot(self, now: float) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "outstanding": self.outstanding,
+            "latency": round(self.latency, 3),
+            "requests": self.requests,
+            "failures": self.failures,
+            "requests_last_minute": len(self.recent),
+            "ejected_for": round(max(0.0, self.ejected_until - now), 1),
+        }
+
+
+class BackendRouter:
+    """Pick a backend per call and fail over on quota or transient errors.
+
+    Each call goes to the healthy backend with the lowest
+    (outstanding + 1) * EWMA latency, so slow or busy keys get less traffic
+    and unmeasured backends are tried first. A quota error ejects the backend
+    right away; other retryable errors eject it after max_failures in a row.
+    Ejected backends return after a cooldown that doubles on every repeated
+    ejection. When every backend is ejected or over its rate limit the one
+    that recovers first is used anyway rather than failing the request.
+    """
+
+    def __init__(self,
+                 backends: Sequence[Backend],
+                 max_failures: int = DEFAULT_MAX_FAILURES,
+                 cooldown: float = DEFAULT_COOLDOWN,
+                 rpm_limit: int = DEFAULT_RPM_LIMIT,
+                 max_attempts: int = DEFAULT_MAX_ATTEMPTS,
+                 clock: Callable[[], float] = time.monotonic):
+        """
+        Args:
+            backends: Key/model pairs to route between
+            max_failures: Consecutive retryable failures before ejection
+            cooldown: Initial ejection time in seconds
+            rpm_limit: Requests per minute per backend (0 disables the limit)
+            max_attempts: Backends tried per call
+            clock: Monotonic time source, replaceable in tests
+        """
+        if not backends:
+            raise NoBackendAvailable("No LLM backends configured")
+        self.backends = list(backends)
+        self.max_failures = max_failures
+        self.cooldown = cooldown
+        self.rpm_limit = rpm_limit
+        self.max_attempts = max(1, min(max_attempts, len(self.backends)))
+        self.clock = clock
+        self._lock = threading.Lock()
+
+    def call(self, fn: Callable[[Backend], Any]) -> Any:
+        """Run fn(backend), failing over to another backend on retryable errors."""
+        tried = set()
+        while True:
+            backend = self._acquire(tried)
+            started = self.clock()
+            try:
+                result = fn(backend)
+            except Exception as e:
+                if not self._release_failure(backend, e, self.clock() - started) or len(tried) >= self.max_attempts:
+                    raise
+                continue
+            self._release_success(backend, self.clock() - started)
+            return result
+
+    async def acall(self, fn: Callable[[Backend], Awaitable[Any]]) -> Any:
+        """Async variant of call for coroutine functions."""
+        tried = set()
+        while True:
+            backend = self._acquire(tried)
+            started = self.clock()
+            try:
+                result = await fn(backend)
+            except Exception as e:
+                if not self._release_failure(backend, e, self.clock() - started) or len(tried) >= self.max_attempts:
+                    raise
+                continue
+            self._release_success(backend, self.clock() - started)
+            return result
+
+    def snapshot(self) -> List[Dict[str, Any]]:
+        """Per-backend load and health, for health checks."""
+        with self._lock:
+            now = self.clock()
+            return [backend.snapshot(now) for backend in self.backends]
+
+    def _acquire(self, tried: Set[int]) -> Backend:
+        with self._lock:
+            now = self.clock()
+            candidates = [
+                (i, backend) for i, backend in enumerate(self.backends) if i not in tried
+            ] or list(enumerate(self.backends))
+            for _, backend in candidates:
+                self._expire(backend, now)
+
+            healthy = [(i, backend) for i, backend in candidates if self._available(backend, now)]
+            if healthy:
+                index, backend = min(healthy, key=lambda item: (self._score(item[1]), item[1].requests, item[0]))
+            else:
+                index, backend = min(candidates, key=lambda item: (self._available_at(item[1]), item[0]))
+                logger.warning(f"All LLM backends are ejected or rate limited; using {backend.name}")
+
+            tried.add(index)
+            backend.outstanding += 1
+            backend.requests += 1
+            backend.recent.append(now)
+            return backend
+
+    def _release_success(self, backend: Backend, elapsed: float):
+        with self._lock:
+            backend.outstanding -= 1
+            backend.consecutive_failures = 0
+            backend.ejections = 0
+            self._observe(backend, elapsed)
+
+    def _release_failure(self, backend: Backend, error: Exception, elapsed: float) -> bool:
+        """Record a failed call; returns True when another backend should be tried."""
+        quota = is_quota_error(error)
+        retryable = quota or is_retryable_error(error)
+        with self._lock:
+            backend.outstanding -= 1
+            if not retryable:
+                # Bad requests say nothing about the backend's health
+                return False
+
+            backend.failures += 1
+            backend.consecutive_failures += 1
+            self._observe(backend, max(2 * elapsed, 2 * backend.latency, FAILURE_LATENCY))
+            if quota or backend.consecutive_failures >= self.max_failures:
+                cooldown = min(MAX_COOLDOWN, self.cooldown * (2 ** backend.ejections))
+                backend.ejected_until = self.clock() + cooldown
+                backend.ejections += 1
+                backend.consecutive_failures = 0
+                logger.warning(f"Ejecting LLM backend {backend.name} for {cooldown:.0f}s: {error}")
+            else:
+                logger.info(f"LLM backend {backend.name} failed ({backend.consecutive_failures} in a row): {error}")
+            return True
+
+    def _observe(self, backend: Backend, sample: float):
+        if backend.latency:
+            backend.latency = LATENCY_ALPHA * sample + (1 - LATENCY_ALPHA) * backend.latency
+        else:
+            backend.latency = sample
+
+    def _expire(self, backend: Backend, now: float):
+        if backend.ejected_until and backend.ejected_until <= now:
+            # Back from a cooldown: forget the failure-inflated latency so it is probed again
+            backend.ejected_until = 0.0
+            backend.latency = 0.0
+        while backend.recent and backend.recent[0] <= now - 60:
+            backend.recent.popleft()
+
+    def _available(self, backend: Backend, now: float) -> bool:
+        if backend.ejected_until > now:
+            return False
+        return not self.rpm_limit or len(backend.recent) < self.rpm_limit
+
+    def _available_at(self, backend: Backend) -> float:
+        rate_free_at = backend.recent[0] + 60 if self.rpm_limit and len(backend.recent) >= self.rpm_limit else 0.0
+        return max(backend.ejected_until, rate_free_at)
+
+    def _score(self, backend: Backend) -> float:
+        return (backend.outstanding + 1) * backend.latency
+
+
+def is_quota_error(error: Exception) -> bool:
+    """True for rate limit / quota errors, which call for ejecting the key."""
+    if _status_code(error) == 429:
+        return True
+    message = str(error)
+    return any(marker in message for marker in QUOTA_MARKERS)
+
+
+def is_retryable_error(error: Exception) -> bool:
+    """True for errors another backend may not hit (quota, server errors, timeouts)."""
+    status = _status_code(error)
+    if status is not None:
+        return status in RETRYABLE_STATUS
+    if isinstance(error, (TimeoutError, ConnectionError)):
+        return True
+    message = str(error)
+    return any(marker in message for marker in QUOTA_MARKERS + TRANSIENT_MARKERS)
+
+
+def _status_code(error: Exception) -> Optional[int]:
+    # google.genai errors carry `code`; HTTP client errors `status_code`
+    for attribute in ("code", "status_code"):
+        value = getattr(error, attribute, None)
+        if isinstance(value, int):
+            return value
+    return None
+
+
+def pool_from_env() -> List[tuple]:
+    """
+    (key_id, api_key, model) triples from GOOGLE_API_KEYS / GEMINI_MODEL_NAMES
+    (comma separated), falling back to GOOGLE_API_KEY / GEMINI_MODEL_NAME.
+    Every key is paired with every model.
+    """
+    keys = _split_env("GOOGLE_API_KEYS") or _split_env("GOOGLE_API_KEY")
+    models = _split_env("GEMINI_MODEL_NAMES") or _split_env("GEMINI_MODEL_NAME") or [DEFAULT_MODEL_NAME]
+    # Keys never appear in logs or snapshots, only their position
+    return [(f"key{i}", key, model) for i, key in enumerate(keys) for model in models]
+
+
+def _split_env(name: str) -> List[str]:
+    return [value.strip() for value in os.getenv(name, "").split(",") if value.strip()]
@@ -46,4 +46,6 @@ class DiagramResponse(BaseModel):
     format: OutputFormat
     metadata: Dict[str, Any]
     success: bool
-    error: Optional[str] = None
\ No newline at end of file
+    error: Optional[str] = None
+    # Format-independent description the code was rendered from (see diagram_ir.py)
+    ir: Optional[Dict[str, Any]] = None
\ No newline at end of file
@@ -76,4 +76,32 @@ DIAGRAM_PROMPTS = {
                 "metadata": "Explicación detallada en español para estudiantes",
                 "codigoUML": "código {format_diagram} aquí"
                 }"""
-}
\ No newline at end of file
+}
+# Replaces the JSON answer instruction of each prompt when the model describes the
+# diagram as nodes and edges (see diagram_ir.py) instead of writing its code
+IR_RESPONSE_PROMPT = """Responde exclusivamente en formato JSON con la siguiente estructura:
+                {
+                "diagrama": {
+                    "nodes": [{"id": "identificador único", "label": "nombre visible", "kind": "tipo de elemento", "stereotype": "estereotipo opcional sin << >>", "parent": "id del paquete, sistema, nodo o estado compuesto que lo contiene", "attributes": ["+ nombre: Tipo"], "operations": ["+ metodo(param: Tipo): Retorno"]}],
+                    "edges": [{"source": "id origen", "target": "id destino", "kind": "tipo de relación", "label": "texto opcional", "source_label": "multiplicidad o rol en el origen", "target_label": "multiplicidad o rol en el destino"}],
+                    "messages": [{"source": "id emisor", "target": "id receptor", "label": "mensaje(args)", "kind": "sync | async | reply", "fragment": "loop | alt | opt | par, vacío si no aplica", "guard": "condición del fragmento"}]
+                },
+                "metadata": "Explicación detallada en español para estudiantes"
+                }
+                Tipos de elemento (kind): class, interface, abstract, enum, object, component, package, database, node, device, artifact, actor, usecase, system, participant, initial, final, action, decision, merge, fork, join, state, choice, partition.
+                Tipos de relación (kind): inheritance, realization, composition, aggregation, association, dependency, include, extend, flow. En composition y aggregation el origen es el todo.
+                "messages" se usa solo en diagramas de secuencia, en orden cronológico; los mensajes consecutivos de un mismo fragmento comparten fragment y guard (en alt, cada rama con su guard).
+                No escribas código Mermaid, PlantUML ni Draw.io: el diagrama se dibuja a partir de esta descripción."""
+
+# Bump when SUMMARY_PROMPT changes so summaries cached with the old prompt are not reused
+SUMMARY_PROMPT_VERSION = 1
+
+SUMMARY_PROMPT = """Actúa como un arquitecto de software. Para cada archivo de código fuente adjunto escribe un resumen estructural breve que permita dibujar después cualquier diagrama UML (clases, secuencia, actividad, estados, componentes, despliegue o casos de uso) sin volver a leer el archivo.
+                REQUISITOS:
+                a-Incluye solo hechos del código: tipos (clases, interfaces, enums) con sus atributos y firmas de métodos, herencia e implementaciones, dependencias y llamadas a otros módulos, funciones públicas, endpoints o comandos expuestos, estados y transiciones, recursos de infraestructura y actores o roles que aparezcan.
+                b-Usa líneas cortas y sin prosa, por ejemplo "class Pedido(Base): id: int, total(): float; usa Cliente, LineaPedido".
+                c-No copies cuerpos de funciones ni comentarios. Un archivo sin nada relevante se resume en una línea.
+                d-Responde exclusivamente en formato JSON con la siguiente estructura:
+                {
+                "resumenes": [{"archivo": "ruta exacta del archivo tal como aparece en su encabezado", "resumen": "resumen estructural"}]
+                }"""
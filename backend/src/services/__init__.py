@@ -1,6 +1,17 @@
 """Services package."""
 
-from .diagram_service import DiagramService
-from .github_service import GitHubService
+__all__ = ["DiagramService", "AsyncDiagramService", "GitHubService"]
 
-__all__ = ["DiagramService", "GitHubService"]
\ No newline at end of file
+
+def __getattr__(name):
+    # Resolved lazily so importing a light submodule does not load the LLM SDK
+    if name == "DiagramService":
+        from .diagram_service import DiagramService
+        return DiagramService
+    if name == "AsyncDiagramService":
+        from .async_diagram_service import AsyncDiagramService
+        return AsyncDiagramService
+    if name == "GitHubService":
+        from .github_service import GitHubService
+        return GitHubService
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
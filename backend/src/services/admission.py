@@ -0,0 +1,254 @@
+"""Admission control in front of the diagram generation pipeline."""
+
+import itertools
+import logging
+import math
+import os
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+DEFAULT_MAX_CONCURRENCY = int(os.getenv("UML_ADMISSION_MAX_CONCURRENCY", "4"))
+DEFAULT_MAX_QUEUE = int(os.getenv("UML_ADMISSION_MAX_QUEUE", "64"))
+# Seconds a request may wait plus run; stays below the Lambda/API timeout
+DEFAULT_DEADLINE = float(os.getenv("UML_ADMISSION_DEADLINE", "150"))
+# Starting guess for one generation until real timings are observed
+DEFAULT_SERVICE_TIME = float(os.getenv("UML_ADMISSION_SERVICE_TIME", "30"))
+SERVICE_TIME_ALPHA = 0.2
+# Proxies in front of the server that append to X-Forwarded-For; 0 ignores the header (the client controls it)
+DEFAULT_TRUSTED_PROXIES = int(os.getenv("UML_TRUSTED_PROXIES", "0"))
+
+# Priority classes: lower runs first
+PRIORITY_SMALL = 0
+PRIORITY_MEDIUM = 1
+PRIORITY_LARGE = 2
+SMALL_PAYLOAD_BYTES = 256 * 1024
+
+
+class AdmissionRejected(Exception):
+    """Raised when a request cannot start before its deadline."""
+
+    def __init__(self, message: str, retry_after: float):
+        super().__init__(message)
+        self.retry_after = max(1, int(math.ceil(retry_after)))
+
+
+class _Waiter:
+    __slots__ = ("client_id", "priority", "tag", "seq", "admitted", "enqueued_at")
+
+    def __init__(self, client_id: str, priority: int, tag: int, seq: int):
+        self.client_id = client_id
+        self.priority = priority
+        self.tag = tag
+        self.seq = seq
+        self.admitted = False
+        self.enqueued_at = time.monotonic()
+
+
+class AdmissionController:
+    """Bounded concurrency gate with a fair, size-aware wait queue.
+
+    Every request gets a virtual-time tag one past its client's previous request
+    (start-time fair queuing). When a slot frees up, the next request is chosen
+    by, in order: the lowest tag, the smallest priority class, then arrival
+    order. One client flooding the queue therefore cannot starve the others,
+    and small `code_files` payloads overtake full repository analyses. A
+    request is rejected immediately when the estimated queue time (from a
+    moving average of generation times) exceeds its deadline.
+    """
+
+    def __init__(self,
+                 max_concurrency: int = DEFAULT_MAX_CONCURRENCY,
+                 max_queue: int = DEFAULT_MAX_QUEUE,
+                 deadline: float = DEFAULT_DEADLINE,
+                 service_time: float = DEFAULT_SERVICE_TIME):
+        """
+        Args:
+            max_concurrency: Generations allowed to run at once
+            max_queue: Requests allowed to wait for a slot
+            deadline: Default seconds a request may spend queued and running
+            service_time: Initial estimate of one generation in seconds
+        """
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.deadline = deadline
+        self.service_time = service_time
+        self.running = 0
+        self.running_by_client = Counter()
+        self.stats = Counter()
+        self._waiters: List[_Waiter] = []
+        self._client_tags: Dict[str, int] = {}
+        self._virtual_time = 0
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+
+    @contextmanager
+    def admit(self, client_id: str = "anonymous", priority: int = PRIORITY_MEDIUM,
+              deadline: Optional[float] = None) -> Iterator[Dict[str, Any]]:
+        """
+        Hold a generation slot for the duration of the block.
+
+        Args:
+            client_id: Caller identity used for fair sharing
+            priority: PRIORITY_SMALL, PRIORITY_MEDIUM or PRIORITY_LARGE
+            deadline: Seconds the caller is willing to wait plus run
+
+        Yields:
+            Admission details (queued seconds, estimated wait) for response metadata
+
+        Raises:
+            AdmissionRejected: The queue is full, or the request would not start in time
+        """
+        deadline = self.deadline if deadline is None else deadline
+        info = self._acquire(client_id, priority, deadline)
+        started = time.monotonic()
+        try:
+            yield info
+        finally:
+            self._release(client_id, time.monotonic() - started)
+
+    def estimate_wait(self, queued_ahead: Optional[int] = None) -> float:
+        """Seconds a newly queued request is expected to wait for a slot."""
+        with self._cond:
+            return self._estimate_wait(len(self._waiters) if queued_ahead is None else queued_ahead)
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Current load, for health checks."""
+        with self._cond:
+            return {
+                "running": self.running,
+                "queued": len(self._waiters),
+                "service_time": round(self.service_time, 2),
+                "stats": dict(self.stats),
+            }
+
+    def _estimate_wait(self, queued_ahead: int) -> float:
+        if self.running < self.max_concurrency and queued_ahead == 0:
+            return 0.0
+        # Each "round" of max_concurrency requests takes about one service time
+        rounds = (queued_ahead // self.max_concurrency) + 1
+        return rounds * self.service_time
+
+    def _acquire(self, client_id: str, priority: int, deadline: float) -> Dict[str, Any]:
+        with self._cond:
+            if self.running < self.max_concurrency and not self._waiters:
+                self._virtual_time = self._next_tag(client_id)
+                self._start(client_id)
+                self.stats["admitted"] += 1
+                return {"queued_seconds": 0.0, "estimated_wait": 0.0}
+
+            if len(self._waiters) >= self.max_queue:
+                self.stats["rejected_queue_full"] += 1
+                raise AdmissionRejected(
+                    f"Server busy: {len(self._waiters)} requests already queued", self.service_time
+                )
+
+            estimated_wait = self._estimate_wait(len(self._waiters))
+            # The request still has to run after it leaves the queue
+            if estimated_wait + self.service_time > deadline:
+                self.stats["rejected_deadline"] += 1
+                raise AdmissionRejected(
+                    f"Server busy: estimated wait of {estimated_wait:.0f}s exceeds the deadline",
+                    estimated_wait + self.service_time - deadline
+                )
+
+            waiter = _Waiter(client_id, priority, self._next_tag(client_id), next(self._seq))
+            self._waiters.append(waiter)
+            timeout = max(deadline - self.service_time, 0.0)
+            admitted = self._cond.wait_for(lambda: waiter.admitted, timeout=timeout)
+            if not admitted:
+                self._waiters.remove(waiter)
+                self.stats["rejected_timeout"] += 1
+                raise AdmissionRejected("Server busy: timed out waiting for a free slot", self.service_time)
+
+            self.stats["admitted"] += 1
+            queued = time.monotonic() - waiter.enqueued_at
+            logger.info(f"Admitted {client_id} after {queued:.2f}s in queue")
+            return {"queued_seconds": round(queued, 3), "estimated_wait": round(estimated_wait, 3)}
+
+    def _release(self, client_id: str, elapsed: float):
+        with self._cond:
+            self.running -= 1
+            self.running_by_client[client_id] -= 1
+            if self.running_by_client[client_id] <= 0:
+                del self.running_by_client[client_id]
+            self.service_time += SERVICE_TIME_ALPHA * (elapsed - self.service_time)
+            self._dispatch()
+
+    def _next_tag(self, client_id: str) -> int:
+        tag = max(self._client_tags.get(client_id, 0), self._virtual_time) + 1
+        self._client_tags[client_id] = tag
+        return tag
+
+    def _start(self, client_id: str):
+        self.running += 1
+        self.running_by_client[client_id] += 1
+
+    def _dispatch(self):
+        """Hand free slots to the best waiters (caller holds the lock)."""
+        dispatched = False
+        while self._waiters and self.running < self.max_concurrency:
+            best = min(self._waiters, key=lambda waiter: (waiter.tag, waiter.priority, waiter.seq))
+            self._waiters.remove(best)
+            self._virtual_time = max(self._virtual_time, best.tag)
+            best.admitted = True
+            self._start(best.client_id)
+            dispatched = True
+
+        if dispatched:
+            # Clients whose tags fell behind virtual time are indistinguishable from new ones
+            self._client_tags = {
+                client_id: tag for client_id, tag in self._client_tags.items() if tag > self._virtual_time
+            }
+            self._cond.notify_all()
+
+
+def request_priority(body: Dict[str, Any]) -> int:
+    """Classify a request body: small pasted files first, whole repositories last."""
+    filters = body.get("filters") or {}
+    if body.get("code_files"):
+        size = sum(len(content or "") for content in body["code_files"].values())
+        return PRIORITY_SMALL if size <= SMALL_PAYLOAD_BYTES else PRIORITY_MEDIUM
+    if body.get("repo_url") and not (filters.get("subpath") or filters.get("include")):
+        return PRIORITY_LARGE
+    return PRIORITY_MEDIUM
+
+
+def client_id_from_event(event: Dict[str, Any], trusted_proxies: int = DEFAULT_TRUSTED_PROXIES) -> str:
+    """
+    Caller identity: the connection source IP, or behind trusted proxies the
+    X-Forwarded-For hop the outermost of them saw.
+
+    Earlier hops are whatever the client sent, so they are never used.
+    """
+    if trusted_proxies > 0:
+        headers = {str(name).lower(): value for name, value in (event.get("headers") or {}).items()}
+        hops = [hop.strip() for hop in (headers.get("x-forwarded-for") or "").split(",") if hop.strip()]
+        if len(hops) >= trusted_proxies:
+            return hops[-trusted_proxies]
+
+    request_context = event.get("requestContext") or {}
+    return (
+        (request_context.get("http") or {}).get("sourceIp")
+        or (request_context.get("identity") or {}).get("sourceIp")
+        or "anonymous"
+    )
+
+
+_default_controller = None
+_default_controller_lock = threading.Lock()
+
+
+def get_default_controller() -> AdmissionController:
+    """Process-wide controller shared by every handler invocation."""
+    global _default_controller
+    if _default_controller is None:
+        with _default_controller_lock:
+            if _default_controller is None:
+                _default_controller = AdmissionController()
+    return _default_controller
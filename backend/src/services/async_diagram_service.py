@@ -0,0 +1,253 @@
+"""asyncio-native diagram generation pipeline."""
+
+import asyncio
+import logging
+import os
+from typing import Any, Iterable, List, Optional
+from ..diagram_ir import normalize_ir
+from ..models import AnalysisRequest, DiagramResponse
+from .diagram_service import DiagramService
+from .file_summaries import DEFAULT_SUMMARY_WORKERS
+from .memory_budget import MEMORY_LIMIT_ERROR, MemoryLimitExceeded
+from .source_records import forget, read_once
+
+logger = logging.getLogger(__name__)
+
+
+# Generations allowed in flight at once per event loop
+DEFAULT_MAX_CONCURRENCY = int(os.getenv("UML_ASYNC_MAX_CONCURRENCY", "32"))
+
+
+class AsyncDiagramService:
+    """Async front end for DiagramService.
+
+    Source loading and filtering run in worker threads, and LLM calls go through
+    the provider's async methods (``agenerate_*``) when it has them. Providers
+    without them are called in a worker thread. A semaphore bounds the number
+    of concurrent generations.
+    """
+
+    def __init__(self, diagram_service: Optional[DiagramService] = None,
+                 max_concurrency: int = DEFAULT_MAX_CONCURRENCY):
+        self.service = diagram_service or DiagramService()
+        self.max_concurrency = max_concurrency
+        self._semaphore = None
+        self._semaphore_loop = None
+
+    @property
+    def llm_provider(self):
+        return self.service.llm_provider
+
+    async def generate_diagram(self, request: AnalysisRequest) -> DiagramResponse:
+        """
+        Generate UML diagram from various sources without blocking the event loop.
+
+        Args:
+            request: Analysis request with source and parameters
+
+        Returns:
+            Diagram response with generated code
+        """
+        key = self.service._coalescing_key(request)
+        if key is None:
+            return await self._generate_diagram(request)
+
+        # Shares in-flight generations with other tasks and with DiagramService threads
+        response, shared = await self.service.single_flight.ado(key, lambda: self._generate_diagram(request))
+        return self.service._coalesced_response(response) if shared else response
+
+    async def _generate_diagram(self, request: AnalysisRequest) -> DiagramResponse:
+        try:
+            if request.repo_url:
+                return await self._generate_from_github_repo(request)
+            elif request.local_directory:
+                return await self._generate_from_local_directory(request)
+            elif request.code_files:
+                return await self._generate_from_code_files(request)
+            else:
+                return self.service._no_source_response(request)
+
+        except Exception as e:
+            logger.error(f"Error generating diagram: {str(e)}")
+            return self.service._error_response(request, str(e))
+
+    async def generate_many(self, requests: Iterable[AnalysisRequest]) -> List[DiagramResponse]:
+        """Run several generations concurrently, bounded by max_concurrency."""
+        return list(await asyncio.gather(*(self.generate_diagram(request) for request in requests)))
+
+    def generate_diagram_sync(self, request: AnalysisRequest) -> DiagramResponse:
+        """Blocking wrapper for callers outside an event loop."""
+        return asyncio.run(self.generate_diagram(request))
+
+    async def _generate_from_local_directory(self, request: AnalysisRequest) -> DiagramResponse:
+        try:
+            source_files, directory_info, ingestion_report = await asyncio.to_thread(
+                self.service._load_local_directory, request
+            )
+
+            if not source_files:
+                return self.service._error_response(
+                    request, "No supported source files found in directory",
+                    error="No supported source files found", ingestion=ingestion_report
+                )
+
+            return await self._generate_with_direct_llm(request, source_files, directory_info, ingestion_report)
+
+        except Exception as e:
+            logger.error(f"Error processing local directory: {str(e)}")
+            return self.service._error_response(request, str(e))
+
+    async def _generate_from_code_files(self, request: AnalysisRequest) -> DiagramResponse:
+        try:
+            source_files, ingestion_report = await asyncio.to_thread(self.service._load_code_files, request)
+
+            if not source_files:
+                return self.service._error_response(
+                    request, "All provided files were filtered out as generated or vendored",
+                    error="No supported source files found", ingestion=ingestion_report
+                )
+
+            return await self._generate_with_direct_llm(request, source_files, {"type": "code_files"}, ingestion_report)
+
+        except Exception as e:
+            logger.error(f"Error processing code files: {str(e)}")
+            return self.service._error_response(request, str(e))
+
+    async def _generate_with_direct_llm(self, request, source_files, source_info, ingestion_report) -> DiagramResponse:
+        unavailable = self.service._check_direct_llm_support(request)
+        if unavailable:
+            return unavailable
+
+        # Every stage reads a lazy file from disk once; the text is dropped when the reply is in
+        source_files = read_once(source_files)
+        try:
+            overview, source_files, partition_report = await asyncio.to_thread(
+                self.service._select_partition, request, source_files, source_info, ingestion_report
+            )
+            if overview is not None:
+                return overview
+
+            prompt_files, file_aliases, stage_reports = await asyncio.to_thread(
+                self.service._prepare_prompt_files, request, source_files
+            )
+            stage_reports.update(partition_report)
+            if self.service._wants_summaries(request):
+                prompt_files, stage_reports["summaries"] = await self._summarize_files(prompt_files)
+
+            ir_result = None
+            if self.service._wants_ir(request, "generate_ir_from_source_files"):
+                key = self.service._ir_cache_key(request, prompt_files, file_aliases)
+                try:
+                    cached = self.service.ir_cache.get(key)
+                    if cached is None:
+                        stage_reports["ir"] = {"cache": "miss"}
+                        cached = self.service._store_ir(request, key, *await self._call_provider(
+                            "generate_ir_from_source_files",
+                            prompt_files,
+                            request.diagram_type,
+                            file_aliases=file_aliases
+                        ))
+                    else:
+                        stage_reports["ir"] = {"cache": "hit"}
+                    ir_result = self.service._render_ir(request, *cached, stage_reports["ir"])
+                except ValueError as e:
+                    logger.warning(f"Diagram IR unusable, generating the code directly: {str(e)}")
+                    # After a cache miss the IR call was paid for: the code is a second full generation
+                    stage_reports["ir"] = {
+                        "fallback": str(e),
+                        "llm_calls": 2 if stage_reports.get("ir", {}).get("cache") == "miss" else 1,
+                    }
+
+            if ir_result is None:
+                diagram_code, llm_metadata = await self._call_provider(
+                    "generate_diagram_from_source_files",
+                    prompt_files,
+                    request.diagram_type,
+                    request.output_format,
+                    file_aliases=file_aliases
+                )
+                ir_result = (diagram_code, llm_metadata, None)
+
+            return self.service._direct_llm_response(
+                request, source_files, source_info, ingestion_report, stage_reports, *ir_result
+            )
+
+        except MemoryLimitExceeded as e:
+            logger.error(f"Rejected to stay within memory: {str(e)}")
+            return self.service._error_response(request, str(e), error=MEMORY_LIMIT_ERROR, memory=e.report)
+        except Exception as e:
+            logger.error(f"Error in direct LLM analysis: {str(e)}")
+            return self.service._error_response(request, str(e))
+        finally:
+            forget(source_files)
+
+    async def _generate_from_github_repo(self, request: AnalysisRequest) -> DiagramResponse:
+        try:
+            logger.info(f"Processing request for repo: {request.repo_url}")
+
+            if self.service._wants_sparse_fetch(request):
+                source_files, source_info, ingestion_report = await asyncio.to_thread(
+                    self.service._load_github_subtree, request
+                )
+                if not source_files:
+                    return self.service._error_response(
+                        request, "No supported source files found in repository subtree",
+                        error="No supported source files found", ingestion=ingestion_report
+                    )
+                return await self._generate_with_direct_llm(request, source_files, source_info, ingestion_report)
+
+            if not self.llm_provider:
+                return self.service._error_response(request, "LLM provider not available")
+
+            if self.service._wants_ir(request, "generate_ir_from_github_url"):
+                try:
+                    raw_ir, llm_metadata = await self._call_provider(
+                        "generate_ir_from_github_url", request.repo_url, request.diagram_type
+                    )
+                    return self.service._github_response(
+                        request, *self.service._render_ir(request, normalize_ir(raw_ir, request.diagram_type), llm_metadata)
+                    )
+                except ValueError as e:
+                    logger.warning(f"Diagram IR unusable, generating the code directly: {str(e)}")
+
+            diagram_code, llm_metadata = await self._call_provider(
+                "generate_diagram_from_github_url",
+                request.repo_url,
+                request.diagram_type,
+                request.output_format
+            )
+
+            return self.service._github_response(request, diagram_code, llm_metadata)
+
+        except Exception as e:
+            logger.error(f"Error generating diagram from GitHub: {str(e)}")
+            return self.service._error_response(request, str(e))
+
+    async def _summarize_files(self, prompt_files):
+        """Async variant of DiagramService._summarize_files: the batches run as concurrent provider calls."""
+        summarizer = await asyncio.to_thread(self.service._file_summarizer)
+        plan = await asyncio.to_thread(summarizer.plan, prompt_files)
+        workers = asyncio.Semaphore(DEFAULT_SUMMARY_WORKERS)
+
+        async def summarize(batch):
+            async with workers:
+                return await self._call_provider("summarize_source_files", batch)
+
+        results = await asyncio.gather(*(summarize(batch) for batch in plan.batches), return_exceptions=True)
+        return await asyncio.to_thread(summarizer.apply, plan, results)
+
+    async def _call_provider(self, method: str, *args: Any, **kwargs: Any):
+        """Call the provider's async variant of method, or the sync one in a thread."""
+        async with self._get_semaphore():
+            async_method = getattr(self.llm_provider, f"a{method}", None)
+            if async_method is not None and asyncio.iscoroutinefunction(async_method):
+                return await async_method(*args, **kwargs)
+            return await asyncio.to_thread(getattr(self.llm_provider, method), *args, **kwargs)
+
+    def _get_semaphore(self) -> asyncio.Semaphore:
+        # asyncio primitives belong to one loop; generate_diagram_sync starts a new one per call
+        loop = asyncio.get_running_loop()
+        if self._semaphore is None or self._semaphore_loop is not loop:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+            self._semaphore_loop = loop
+        return self._semaphore
@@ -0,0 +1,193 @@
+"""Exact and near-duplicate source file collapsing before prompting."""
+
+import hashlib
+import logging
+import os
+import re
+from collections import Counter
+from functools import lru_cache
+from typing import Dict, List, Mapping, Tuple
+from .source_records import file_hash, file_size, subset
+from .token_estimator import estimate_tokens_from_length
+
+logger = logging.getLogger(__name__)
+
+
+TOKEN_RE = re.compile(r'\w+|[^\w\s]')
+STRING_LITERAL_RE = re.compile(r'"(?:\\.|[^"\\\n])*"|\'(?:\\.|[^\'\\\n])*\'')
+NUMBER_LITERAL_RE = re.compile(r'\b\d[\d_.]*\b')
+
+SIMHASH_BITS = 64
+SHINGLE_SIZE = 3
+# Files whose fingerprints differ in at most this many bits are near-duplicates
+NEAR_DUPLICATE_MAX_DISTANCE = 6
+# Bands used to find candidate pairs; must exceed the max distance (pigeonhole)
+SIMHASH_BANDS = 8
+# Near-duplicates must also have a comparable number of tokens
+MIN_LENGTH_RATIO = 0.8
+# Tiny files (empty __init__.py, one-line configs) carry too few shingles to compare
+MIN_NEAR_DUPLICATE_TOKENS = 20
+# Estimated tokens fingerprinted per request; files beyond it are only checked for exact copies
+NEAR_DUPLICATE_MAX_TOKENS = int(os.getenv("UML_NEAR_DUPLICATE_MAX_TOKENS", "250000"))
+
+
+def normalize_tokens(content: str) -> List[str]:
+    """Tokenize source code ignoring whitespace, layout and literal values."""
+    content = STRING_LITERAL_RE.sub('""', content)
+    content = NUMBER_LITERAL_RE.sub('0', content)
+    return TOKEN_RE.findall(content)
+
+
+def simhash(tokens: List[str], shingle_size: int = SHINGLE_SIZE) -> int:
+    """64-bit SimHash fingerprint over token shingles."""
+    shingles = [' '.join(tokens[i:i + shingle_size]) for i in range(max(1, len(tokens) - shingle_size + 1))]
+    digests = b''.join(hashlib.blake2b(shingle.encode('utf-8'), digest_size=8).digest() for shingle in shingles)
+
+    # Set bits per position without a per-bit loop: count the byte values at
+    # each of the 8 offsets, then add up integers holding one counter lane per
+    # bit of the byte, wide enough that the lanes never carry into each other
+    width = len(shingles).bit_length() + 1
+    lanes = _byte_lanes(width)
+    lane_mask = (1 << width) - 1
+    fingerprint = 0
+    for index in range(8):
+        total = sum(lanes[value] * count for value, count in Counter(digests[index::8]).items())
+        # Digests are read big-endian: byte 0 holds the highest bits
+        base = (7 - index) * 8
+        for bit in range(8):
+            if 2 * (total >> (bit * width) & lane_mask) > len(shingles):
+                fingerprint |= 1 << (base + bit)
+    return fingerprint
+
+
+@lru_cache(maxsize=32)
+def _byte_lanes(width: int) -> List[int]:
+    return [sum(1 << (bit * width) for bit in range(8) if value >> bit & 1) for value in range(256)]
+
+
+def hamming_distance(a: int, b: int) -> int:
+    """Number of differing bits between two fingerprints."""
+    return bin(a ^ b).count('1')
+
+
+class SourceDeduplicator:
+    """Collapse identical and near-identical files into a single representative."""
+
+    def __init__(self, near_duplicates: bool = True, max_distance: int = NEAR_DUPLICATE_MAX_DISTANCE,
+                 max_tokens: int = NEAR_DUPLICATE_MAX_TOKENS):
+        self.near_duplicates = near_duplicates
+        self.max_distance = max_distance
+        self.max_tokens = max_tokens
+
+    def deduplicate(self, source_files: Mapping[str, str]) -> Tuple[Mapping[str, str], Dict[str, List[str]], Dict]:
+        """
+        Deduplicate a file map.
+
+        Args:
+            source_files: Mapping of file paths to contents (a lazy SourceFiles
+                stays lazy: the representatives are returned as a subset of it)
+
+        Returns:
+            Tuple of (representative files, representative path -> paths it stands for, report)
+        """
+        representative_paths: List[str] = []
+        aliases: Dict[str, List[str]] = {}
+        by_digest: Dict[str, str] = {}
+        exact_count = 0
+        near_count = 0
+        near_skipped = 0
+        chars_saved = 0
+        tokens_saved = 0
+
+        # Exact duplicates: identical bytes collapse onto the first path seen. Lazy
+        # source records carry their digest, so this pass reads no file contents
+        for path in source_files:
+            digest = file_hash(source_files, path)
+            if digest in by_digest:
+                aliases.setdefault(by_digest[digest], []).append(path)
+                exact_count += 1
+                size = file_size(source_files, path)
+                chars_saved += size
+                tokens_saved += estimate_tokens_from_length(size)
+                continue
+            by_digest[digest] = path
+            representative_paths.append(path)
+
+        representatives = subset(source_files, representative_paths)
+        if self.near_duplicates and len(representatives) > 1:
+            collapsed = set()
+            pairs, near_skipped = self._near_duplicate_pairs(representatives)
+            for path, representative in pairs:
+                collapsed.add(path)
+                aliases.setdefault(representative, []).append(path)
+                # A collapsed file's own exact copies follow it to the representative
+                aliases[representative].extend(aliases.pop(path, []))
+                near_count += 1
+                size = file_size(source_files, path)
+                chars_saved += size
+                tokens_saved += estimate_tokens_from_length(size)
+            if collapsed:
+                representatives = subset(source_files, [path for path in representative_paths if path not in collapsed])
+
+        report = {
+            "files_in": len(source_files),
+            "files_out": len(representatives),
+            "exact_duplicates": exact_count,
+            "near_duplicates": near_count,
+            "chars_saved": chars_saved,
+            "near_duplicate_skipped": near_skipped,
+            "tokens_saved": tokens_saved,
+            "groups": {path: list(paths) for path, paths in aliases.items()},
+        }
+        if exact_count or near_count:
+            logger.info(f"Deduplication collapsed {exact_count} exact and {near_count} near duplicates, "
+                        f"saving ~{tokens_saved} tokens")
+        return representatives, aliases, report
+
+    def _near_duplicate_pairs(self, files: Mapping[str, str]) -> Tuple[List[Tuple[str, str]], int]:
+        """Return (duplicate, representative) pairs in input order and the number of files left unscanned."""
+        fingerprints = {}
+        token_counts = {}
+        scanned = 0
+        skipped = 0
+        for path in files:
+            # Sizes come from the records, so skipped files are never read
+            estimate = estimate_tokens_from_length(file_size(files, path))
+            if scanned + estimate > self.max_tokens:
+                skipped += 1
+                continue
+            scanned += estimate
+            tokens = normalize_tokens(files[path])
+            if len(tokens) >= MIN_NEAR_DUPLICATE_TOKENS:
+                fingerprints[path] = simhash(tokens)
+                token_counts[path] = len(tokens)
+
+        band_bits = SIMHASH_BITS // SIMHASH_BANDS
+        band_mask = (1 << band_bits) - 1
+        buckets: Dict[Tuple[int, int, str], List[str]] = {}
+        representative_of: Dict[str, str] = {}
+        pairs = []
+
+        for path, fingerprint in fingerprints.items():
+            extension = os.path.splitext(path)[1].lower()
+            candidates = []
+            for band in range(SIMHASH_BANDS):
+                key = (band, fingerprint >> (band * band_bits) & band_mask, extension)
+                candidates.extend(buckets.get(key, []))
+                buckets.setdefault(key, []).append(path)
+
+            for candidate in candidates:
+                if candidate in representative_of:
+                    continue
+                if hamming_distance(fingerprint, fingerprints[candidate]) > self.max_distance:
+                    continue
+                shorter, longer = sorted((token_counts[path], token_counts[candidate]))
+                if shorter / longer < MIN_LENGTH_RATIO:
+                    continue
+                representative_of[path] = candidate
+                pairs.append((path, candidate))
+                break
+
+        if skipped:
+            logger.info(f"Near-duplicate scan stopped at ~{self.max_tokens} tokens, {skipped} files not compared")
+        return pairs, skipped
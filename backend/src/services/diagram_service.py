@@ -2,21 +2,49 @@
 
 import logging
 import os
-from typing import Dict, List, Optional
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Mapping, Optional, Tuple
+from ..diagram_ir import normalize_ir, render_ir
 from ..models import AnalysisRequest, DiagramResponse, AnalysisMethod
 from ..llm.gemini_provider import GeminiProvider
 from .github_service import GitHubService
+from .http_client import default_cache_bytes
 from .local_directory_service import LocalDirectoryService
+from .ingestion_filter import IngestionFilter
+from .deduplication import SourceDeduplicator
+from .single_flight import SingleFlight, coalescing_key, get_default_single_flight
+from .partitioning import PartitionPlan, needs_partitioning, plan_partitions
+from .source_records import SourceFiles, forget, read_once, subset
+from .focus_index import DEFAULT_FOCUS_TOP_K, select_focus_files
+from .source_normalizer import STRIP_COMMENTS, SourceNormalizer, keeps_docstrings
+from .memory_budget import (BODY_PARSE_FACTOR, MEMORY_LIMIT_ERROR, MemoryBudget, MemoryLimitExceeded,
+                            fit_prompt, source_bytes)
+from .ir_cache import IRCache, get_default_ir_cache, ir_cache_key
+from .file_summaries import DEFAULT_SUMMARY_WORKERS, FileSummarizer, SummaryCache, get_default_summary_cache
 
 logger = logging.getLogger(__name__)
 
+# Ask the model for the format-independent IR and render the code locally (filters.ir opts out per request)
+USE_DIAGRAM_IR = os.getenv("UML_DIAGRAM_IR", "1").lower() not in ("0", "false", "no")
+# Send cached per-file summaries instead of the code (filters.summaries overrides it per request)
+USE_FILE_SUMMARIES = os.getenv("UML_FILE_SUMMARIES", "0").lower() in ("1", "true", "yes")
+
 
 class DiagramService:
     """Main service for processing diagram generation requests."""
     
-    def __init__(self):
+    def __init__(self, llm_provider: Any = None, single_flight: Optional[SingleFlight] = None,
+                 ir_cache: Optional[IRCache] = None, summary_cache: Optional[SummaryCache] = None):
         self.github_service = GitHubService()
         self.local_directory_service = LocalDirectoryService()
+        self.single_flight = single_flight or get_default_single_flight()
+        self.ir_cache = ir_cache if ir_cache is not None else get_default_ir_cache()
+        # Opened on first use, so the database file only exists when summaries are enabled
+        self.summary_cache = summary_cache
+        
+        if llm_provider is not None:
+            self.llm_provider = llm_provider
+            return
         
         # Initialize Gemini provider
         try:
@@ -32,10 +60,41 @@ class DiagramService:
         
         Args:
             request: Analysis request with source and parameters
-            
+        
         Returns:
             Diagram response with generated code
         """
+        key = self._coalescing_key(request)
+        if key is None:
+            return self._generate_diagram(request)
+        
+        # Identical requests already in flight share that generation
+        response, shared = self.single_flight.do(key, lambda: self._generate_diagram(request))
+        return self._coalesced_response(response) if shared else response
+    
+    def generate_from_sources(self, request: AnalysisRequest, source_files: Dict[str, str], source_info: Dict,
+                              ingestion_report: Optional[Dict] = None) -> DiagramResponse:
+        """
+        Generate a diagram from files that were already read, e.g. by the batch
+        CLI's ingestion process pool.
+        
+        Args:
+            request: Diagram type, output format and filters to apply
+            source_files: Mapping of relative path -> content
+            source_info: Description of where the files came from
+            ingestion_report: Report of the ingestion filter, if any
+        
+        Returns:
+            DiagramResponse with generated diagram
+        """
+        if not source_files:
+            return self._error_response(
+                request, "No supported source files found in directory",
+                error="No supported source files found", ingestion=ingestion_report
+            )
+        return self._generate_with_direct_llm(request, source_files, source_info, ingestion_report)
+    
+    def _generate_diagram(self, request: AnalysisRequest) -> DiagramResponse:
         try:
             # Determine source type and get source files
             if request.repo_url:
@@ -45,141 +104,137 @@ class DiagramService:
             elif request.code_files:
                 return self._generate_from_code_files(request)
             else:
-                return DiagramResponse(
-                    diagram_code="",
-                    format=request.output_format,
-                    metadata={"error": "No source specified (repo_url, local_directory, or code_files)"},
-                    success=False,
-                    error="No source specified"
-                )
-                
+                return self._no_source_response(request)
+        
         except Exception as e:
             logger.error(f"Error generating diagram: {str(e)}")
-            return DiagramResponse(
-                diagram_code="",
-                format=request.output_format,
-                metadata={"error": str(e)},
-                success=False,
-                error=str(e)
-            )
+            return self._error_response(request, str(e))
     
     def _generate_from_local_directory(self, request: AnalysisRequest) -> DiagramResponse:
         """Generate diagram from local directory."""
         try:
-            logger.info(f"Processing local directory: {request.local_directory}")
-            
-            # Get source files from local directory
-            source_files = self.local_directory_service.get_source_files(request.local_directory)
-            directory_info = self.local_directory_service.get_directory_info(request.local_directory)
+            source_files, directory_info, ingestion_report = self._load_local_directory(request)
             
             if not source_files:
-                return DiagramResponse(
-                    diagram_code="",
-                    format=request.output_format,
-                    metadata={"error": "No supported source files found in directory"},
-                    success=False,
-                    error="No supported source files found"
+                return self._error_response(
+                    request, "No supported source files found in directory",
+                    error="No supported source files found", ingestion=ingestion_report
                 )
             
             # Generate diagram using LLM
-            return self._generate_with_direct_llm(request, source_files, directory_info)
-                
+            return self._generate_with_direct_llm(request, source_files, directory_info, ingestion_report)
+        
         except Exception as e:
             logger.error(f"Error processing local directory: {str(e)}")
-            return DiagramResponse(
-                diagram_code="",
-                format=request.output_format,
-                metadata={"error": str(e)},
-                success=False,
-                error=str(e)
-            )
+            return self._error_response(request, str(e))
     
     def _generate_from_code_files(self, request: AnalysisRequest) -> DiagramResponse:
         """Generate diagram from provided code files."""
         try:
-            logger.info(f"Processing {len(request.code_files)} provided code files")
+            source_files, ingestion_report = self._load_code_files(request)
+            
+            if not source_files:
+                return self._error_response(
+                    request, "All provided files were filtered out as generated or vendored",
+                    error="No supported source files found", ingestion=ingestion_report
+                )
             
             # Generate diagram using LLM
-            return self._generate_with_direct_llm(request, request.code_files, {"type": "code_files"})
-                
+            return self._generate_with_direct_llm(request, source_files, {"type": "code_files"}, ingestion_report)
+        
         except Exception as e:
             logger.error(f"Error processing code files: {str(e)}")
-            return DiagramResponse(
-                diagram_code="",
-                format=request.output_format,
-                metadata={"error": str(e)},
-                success=False,
-                error=str(e)
-            )
+            return self._error_response(request, str(e))
     
-    def _generate_with_direct_llm(self, request: AnalysisRequest, source_files: Dict[str, str], source_info: Dict) -> DiagramResponse:
+    def _generate_with_direct_llm(self, request: AnalysisRequest, source_files: Dict[str, str], source_info: Dict,
+                                  ingestion_report: Optional[Dict] = None) -> DiagramResponse:
         """Generate diagram using direct LLM analysis."""
-        if not self.llm_provider:
-            return DiagramResponse(
-                diagram_code="",
-                format=request.output_format,
-                metadata={"error": "LLM provider not available for direct analysis"},
-                success=False,
-                error="LLM provider not available"
-            )
+        unavailable = self._check_direct_llm_support(request)
+        if unavailable:
+            return unavailable
         
+        # Every stage reads a lazy file from disk once; the text is dropped when the reply is in
+        source_files = read_once(source_files)
         try:
-            # Check if provider supports direct analysis
-            if not hasattr(self.llm_provider, 'generate_diagram_from_source_files'):
-                return DiagramResponse(
-                    diagram_code="",
-                    format=request.output_format,
-                    metadata={"error": "LLM provider does not support direct analysis"},
-                    success=False,
-                    error="Direct analysis not supported by LLM provider"
-                )
-            
-            # Generate diagram directly from source files
-            diagram_code, llm_metadata = self.llm_provider.generate_diagram_from_source_files(
-                source_files,
-                request.diagram_type,
-                request.output_format
+            # Large sources answer with a package overview, or analyse one partition of it
+            overview, source_files, partition_report = self._select_partition(
+                request, source_files, source_info, ingestion_report
             )
+            if overview is not None:
+                return overview
             
-            # Create response metadata
-            metadata = {
-                "source": source_info,
-                "files_analyzed": len(source_files),
-                "analysis_method": "llm_direct",
-                "llm_provider": type(self.llm_provider).__name__,
-                "llm_metadata": llm_metadata
-            }
+            prompt_files, file_aliases, stage_reports = self._prepare_prompt_files(request, source_files)
+            stage_reports.update(partition_report)
+            if self._wants_summaries(request):
+                prompt_files, stage_reports["summaries"] = self._summarize_files(prompt_files)
             
-            return DiagramResponse(
-                diagram_code=diagram_code,
-                format=request.output_format,
-                metadata=metadata,
-                success=True
-            )
+            # Render from the (possibly cached) IR; fall back to generating the code directly
+            ir_result = None
+            if self._wants_ir(request, "generate_ir_from_source_files"):
+                key = self._ir_cache_key(request, prompt_files, file_aliases)
+                try:
+                    cached = self.ir_cache.get(key)
+                    if cached is None:
+                        stage_reports["ir"] = {"cache": "miss"}
+                        cached = self._store_ir(request, key, *self.llm_provider.generate_ir_from_source_files(
+                            prompt_files, request.diagram_type, file_aliases=file_aliases
+                        ))
+                    else:
+                        stage_reports["ir"] = {"cache": "hit"}
+                    ir_result = self._render_ir(request, *cached, stage_reports["ir"])
+                except ValueError as e:
+                    logger.warning(f"Diagram IR unusable, generating the code directly: {str(e)}")
+                    # After a cache miss the IR call was paid for: the code is a second full generation
+                    stage_reports["ir"] = {
+                        "fallback": str(e),
+                        "llm_calls": 2 if stage_reports.get("ir", {}).get("cache") == "miss" else 1,
+                    }
             
+            if ir_result is None:
+                # Generate diagram directly from source files
+                diagram_code, llm_metadata = self.llm_provider.generate_diagram_from_source_files(
+                    prompt_files,
+                    request.diagram_type,
+                    request.output_format,
+                    file_aliases=file_aliases
+                )
+                ir_result = (diagram_code, llm_metadata, None)
+            
+            return self._direct_llm_response(
+                request, source_files, source_info, ingestion_report, stage_reports, *ir_result
+            )
+        
+        except MemoryLimitExceeded as e:
+            logger.error(f"Rejected to stay within memory: {str(e)}")
+            return self._error_response(request, str(e), error=MEMORY_LIMIT_ERROR, memory=e.report)
         except Exception as e:
             logger.error(f"Error in direct LLM analysis: {str(e)}")
-            return DiagramResponse(
-                diagram_code="",
-                format=request.output_format,
-                metadata={"error": str(e)},
-                success=False,
-                error=str(e)
-            )
+            return self._error_response(request, str(e))
+        finally:
+            forget(source_files)
     
     def _generate_from_github_repo(self, request: AnalysisRequest) -> DiagramResponse:
         """Generate UML diagram from GitHub repository URL."""
         try:
             logger.info(f"Processing request for repo: {request.repo_url}")
             
+            if self._wants_sparse_fetch(request):
+                return self._generate_from_github_subtree(request)
+            
             if not self.llm_provider:
-                return DiagramResponse(
-                    diagram_code="",
-                    format=request.output_format,
-                    metadata={"error": "LLM provider not available"},
-                    success=False,
-                    error="LLM provider not available"
-                )
+                return self._error_response(request, "LLM provider not available")
+            
+            # Not cached: the repository content behind the URL can change
+            if self._wants_ir(request, "generate_ir_from_github_url"):
+                try:
+                    raw_ir, llm_metadata = self.llm_provider.generate_ir_from_github_url(
+                        request.repo_url, request.diagram_type
+                    )
+                    return self._github_response(
+                        request, *self._render_ir(request, normalize_ir(raw_ir, request.diagram_type), llm_metadata)
+                    )
+                except ValueError as e:
+                    logger.warning(f"Diagram IR unusable, generating the code directly: {str(e)}")
             
             # Generate diagram directly from GitHub URL
             diagram_code, llm_metadata = self.llm_provider.generate_diagram_from_github_url(
@@ -188,27 +243,336 @@ class DiagramService:
                 request.output_format
             )
             
-            # Create response metadata
-            metadata = {
-                "source": {"repository_url": request.repo_url},
-                "analysis_method": "llm_direct",
-                "llm_provider": type(self.llm_provider).__name__,
-                "llm_metadata": llm_metadata
-            }
-            
-            return DiagramResponse(
-                diagram_code=diagram_code,
-                format=request.output_format,
-                metadata=metadata,
-                success=True
-            )
-            
+            return self._github_response(request, diagram_code, llm_metadata)
+        
         except Exception as e:
             logger.error(f"Error generating diagram from GitHub: {str(e)}")
-            return DiagramResponse(
-                diagram_code="",
-                format=request.output_format,
-                metadata={"error": str(e)},
-                success=False,
-                error=str(e)
+            return self._error_response(request, str(e))
+    
+    def _generate_from_github_subtree(self, request: AnalysisRequest) -> DiagramResponse:
+        """Generate diagram from the files under filters.subpath / filters.include only."""
+        source_files, source_info, ingestion_report = self._load_github_subtree(request)
+        
+        if not source_files:
+            return self._error_response(
+                request, "No supported source files found in repository subtree",
+                error="No supported source files found", ingestion=ingestion_report
             )
+        
+        return self._generate_with_direct_llm(request, source_files, source_info, ingestion_report)
+    
+    # Pipeline steps shared with AsyncDiagramService
+    
+    def _coalescing_key(self, request: AnalysisRequest) -> Optional[str]:
+        """Key for single-flight coalescing, or None when the request opts out."""
+        if not (request.filters or {}).get('coalesce', True):
+            return None
+        return coalescing_key(request, getattr(self.llm_provider, 'model_name', None))
+    
+    def _wants_ir(self, request: AnalysisRequest, method: str) -> bool:
+        """Whether to ask for the IR: enabled, not opted out and supported by the provider."""
+        return (USE_DIAGRAM_IR and (request.filters or {}).get('ir', True)
+                and callable(getattr(self.llm_provider, method, None)))
+    
+    def _wants_summaries(self, request: AnalysisRequest) -> bool:
+        """Whether to generate from per-file summaries: opted in and supported by the provider."""
+        return (bool((request.filters or {}).get('summaries', USE_FILE_SUMMARIES))
+                and callable(getattr(self.llm_provider, 'summarize_source_files', None)))
+    
+    def _file_summarizer(self) -> FileSummarizer:
+        if self.summary_cache is None:
+            self.summary_cache = get_default_summary_cache()
+        return FileSummarizer(self.summary_cache, getattr(self.llm_provider, 'model_name', None))
+    
+    def _summarize_files(self, prompt_files: Mapping[str, str]) -> Tuple[Dict[str, str], Dict]:
+        """Replace the larger files by their summaries, generating the missing ones in parallel."""
+        summarizer = self._file_summarizer()
+        plan = summarizer.plan(prompt_files)
+        
+        def summarize(batch: Dict[str, str]):
+            try:
+                return self.llm_provider.summarize_source_files(batch)
+            except Exception as e:
+                return e
+        
+        results = []
+        if plan.batches:
+            with ThreadPoolExecutor(max_workers=min(DEFAULT_SUMMARY_WORKERS, len(plan.batches))) as pool:
+                results = list(pool.map(summarize, plan.batches))
+        return summarizer.apply(plan, results)
+    
+    def _ir_cache_key(self, request: AnalysisRequest, prompt_files: Mapping[str, str],
+                      file_aliases: Dict[str, List[str]]) -> str:
+        return ir_cache_key(prompt_files, request.diagram_type, file_aliases,
+                            getattr(self.llm_provider, 'model_name', None))
+    
+    def _store_ir(self, request: AnalysisRequest, key: str, raw_ir: Any, llm_metadata: str) -> Tuple[Dict, str]:
+        """Normalize a generated IR and cache it for the other output formats."""
+        ir = normalize_ir(raw_ir, request.diagram_type)
+        self.ir_cache.put(key, ir, llm_metadata)
+        return ir, llm_metadata
+    
+    def _render_ir(self, request: AnalysisRequest, ir: Dict, llm_metadata: str,
+                   report: Optional[Dict] = None) -> Tuple[str, str, Dict]:
+        """(diagram_code, llm_metadata, ir) with the code rendered in the requested format."""
+        if report is not None:
+            report.update({"nodes": len(ir["nodes"]), "edges": len(ir["edges"]), "messages": len(ir["messages"])})
+        return render_ir(ir, request.output_format), llm_metadata, ir
+    
+    def _coalesced_response(self, response: DiagramResponse) -> DiagramResponse:
+        """Copy of the leader's response for a request that waited on it."""
+        return response.model_copy(update={"metadata": {**response.metadata, "coalesced": True}})
+    
+    def _wants_sparse_fetch(self, request: AnalysisRequest) -> bool:
+        """A subpath or include globs select part of the repository; partitioned and focus modes need the files themselves."""
+        filters = request.filters or {}
+        return bool(filters.get('subpath') or filters.get('include') or filters.get('partition') or filters.get('focus'))
+    
+    def _load_github_subtree(self, request: AnalysisRequest) -> Tuple[Dict[str, str], Dict, Dict]:
+        """Fetch only the selected files of a GitHub repository."""
+        filters = request.filters or {}
+        include = filters.get('include')
+        if isinstance(include, str):
+            include = [include]
+        
+        logger.info(f"Sparse fetch of {request.repo_url} (subpath={filters.get('subpath', '')}, include={include})")
+        source_files, ingestion_report = self.github_service.get_sparse_source_files(
+            request.repo_url,
+            subpath=filters.get('subpath', ''),
+            include=include,
+            branch=filters.get('branch')
+        )
+        source_info = self.github_service.get_repository_info(request.repo_url)
+        source_info.update({"type": "github_subtree", "subpath": ingestion_report.get('subpath', '')})
+        return source_files, source_info, ingestion_report
+    
+    def _load_local_directory(self, request: AnalysisRequest) -> Tuple[Dict[str, str], Dict, Optional[Dict]]:
+        """Read the source files of a local directory."""
+        logger.info(f"Processing local directory: {request.local_directory}")
+        
+        # Get source files from local directory
+        source_files, ingestion_report = self.local_directory_service.get_source_files_with_report(request.local_directory)
+        directory_info = self.local_directory_service.get_directory_info(request.local_directory)
+        return source_files, directory_info, ingestion_report
+    
+    def _load_code_files(self, request: AnalysisRequest) -> Tuple[Dict[str, str], Dict]:
+        """Filter the code files sent by the client."""
+        logger.info(f"Processing {len(request.code_files)} provided code files")
+        
+        # Drop minified, generated and vendored files the client sent along
+        ingestion_filter = IngestionFilter()
+        source_files = ingestion_filter.filter_code_files(request.code_files)
+        return source_files, ingestion_filter.report()
+    
+    def _check_direct_llm_support(self, request: AnalysisRequest) -> Optional[DiagramResponse]:
+        """Return an error response if the provider cannot analyse source files."""
+        if not self.llm_provider:
+            return self._error_response(
+                request, "LLM provider not available for direct analysis", error="LLM provider not available"
+            )
+        
+        # Check if provider supports direct analysis
+        if not hasattr(self.llm_provider, 'generate_diagram_from_source_files'):
+            return self._error_response(
+                request, "LLM provider does not support direct analysis",
+                error="Direct analysis not supported by LLM provider"
+            )
+        return None
+    
+    def _partition_plan(self, request: AnalysisRequest, source_files: Dict[str, str]) -> Optional[PartitionPlan]:
+        """Partition plan when filters.partition asks for it (true, or 'auto' for large sources)."""
+        filters = request.filters or {}
+        mode = filters.get('partition')
+        if not mode:
+            return None
+        
+        max_files = int(filters.get('partition_max_files') or 0) or None
+        max_chars = int(filters.get('partition_max_chars') or 0) or None
+        limits = {key: value for key, value in (('max_files', max_files), ('max_chars', max_chars)) if value}
+        if mode == 'auto' and not filters.get('partition_id'):
+            # A focus query already narrows the files down
+            if filters.get('focus') or not needs_partitioning(source_files, **limits):
+                return None
+        return plan_partitions(source_files, **limits)
+    
+    def _select_partition(self, request: AnalysisRequest, source_files: Dict[str, str], source_info: Dict,
+                          ingestion_report: Optional[Dict]) -> Tuple[Optional[DiagramResponse], Dict[str, str], Dict]:
+        """
+        Apply partitioned mode.
+        
+        Returns:
+            Tuple of (overview or error response to return as is, files to analyse, stage reports)
+        """
+        plan = self._partition_plan(request, source_files)
+        if plan is None:
+            return None, source_files, {}
+        
+        partition_id = (request.filters or {}).get('partition_id')
+        if not partition_id:
+            return self._partition_overview_response(request, source_files, source_info, ingestion_report, plan), {}, {}
+        
+        partition = plan.get(partition_id)
+        if partition is None:
+            return self._error_response(
+                request, f"Unknown partition: {partition_id}", partitions={"index": plan.index()}
+            ), {}, {}
+        
+        partition_report = {
+            "partition": {
+                "mode": "detail",
+                "id": partition.id,
+                "title": partition.title,
+                "files": partition.files,
+                "index": plan.index(),
+            }
+        }
+        return None, subset(source_files, partition.files), partition_report
+    
+    def _partition_overview_response(self, request: AnalysisRequest, source_files: Dict[str, str], source_info: Dict,
+                                     ingestion_report: Optional[Dict], plan: PartitionPlan) -> DiagramResponse:
+        """Overview of the partitions, built locally without an LLM call."""
+        metadata = {
+            "source": source_info,
+            "files_analyzed": len(source_files),
+            "analysis_method": "partition_overview",
+            "llm_metadata": (
+                f"Vista general del proyecto: {len(plan.partitions)} paquetes y {len(source_files)} archivos. "
+                "Las flechas indican cuántos nombres de otro paquete usa cada uno. "
+                "Abre un paquete para generar su diagrama detallado."
+            ),
+            "partitions": {
+                "mode": "overview",
+                "partition_count": len(plan.partitions),
+                "index": plan.index(),
+                "edges": plan.edge_list(),
+            }
+        }
+        if ingestion_report:
+            metadata["ingestion"] = ingestion_report
+        
+        return DiagramResponse(
+            diagram_code=plan.render_overview(request.output_format.value),
+            format=request.output_format,
+            metadata=metadata,
+            success=True
+        )
+    
+    def _prepare_prompt_files(self, request: AnalysisRequest,
+                              source_files: Mapping[str, str]) -> Tuple[Mapping[str, str], Dict[str, List[str]], Dict]:
+        """
+        Reduce the source files to what is actually sent to the LLM.
+        
+        Returns:
+            Tuple of (files for the prompt, representative -> duplicate paths, per-stage reports)
+        """
+        filters = request.filters or {}
+        stage_reports = {}
+        file_aliases = {}
+        strip_comments = filters.get('strip_comments', STRIP_COMMENTS)
+        
+        # Drop or shrink files when the estimated peak would not fit the memory limit, before any stage reads them
+        memory = MemoryBudget()
+        if request.code_files is not None:
+            # The raw request body and the parsed strings are both alive
+            memory.charge("request_body", source_bytes(request.code_files) * BODY_PARSE_FACTOR)
+        else:
+            memory.charge("source_files", source_bytes(source_files))
+        # Archives kept for conditional GitHub requests stay alive across requests
+        memory.charge("http_cache", default_cache_bytes())
+        # Normalizing plain strings makes a second copy of the text (lazy files are normalized on read)
+        copies_text = strip_comments and not isinstance(source_files, SourceFiles)
+        if copies_text:
+            memory.charge("normalized", source_bytes(source_files))
+        try:
+            prompt_files = fit_prompt(source_files, memory)
+        finally:
+            stage_reports["memory"] = memory.report()
+        
+        # Collapse copied modules so each distinct file is sent only once
+        if filters.get('deduplicate', True):
+            prompt_files, file_aliases, stage_reports["deduplication"] = SourceDeduplicator(
+                near_duplicates=filters.get('near_duplicates', True)
+            ).deduplicate(prompt_files)
+        
+        # Keep only the files that match the focus query plus what they depend on
+        focus = filters.get('focus')
+        if isinstance(focus, str) and focus.strip():
+            prompt_files, stage_reports["focus"] = select_focus_files(
+                prompt_files, focus.strip(),
+                top_k=int(filters.get('focus_top_k') or DEFAULT_FOCUS_TOP_K),
+                with_dependencies=filters.get('focus_dependencies', True)
+            )
+        
+        # Strip comments and blank lines; docstrings stay for the diagram types that read intent from them
+        if strip_comments:
+            keep_docstrings = filters.get('keep_docstrings', keeps_docstrings(request.diagram_type))
+            prompt_files, stage_reports["normalization"] = SourceNormalizer(
+                keep_docstrings=bool(keep_docstrings)
+            ).normalize(prompt_files)
+            if copies_text:
+                memory.release("normalized")
+                memory.charge("normalized", source_bytes(prompt_files))
+                stage_reports["memory"] = memory.report()
+        
+        return prompt_files, file_aliases, stage_reports
+    
+    def _direct_llm_response(self, request: AnalysisRequest, source_files: Dict[str, str], source_info: Dict,
+                             ingestion_report: Optional[Dict], stage_reports: Dict,
+                             diagram_code: str, llm_metadata: str, ir: Optional[Dict] = None) -> DiagramResponse:
+        """Build the success response for a direct source file analysis."""
+        # Create response metadata
+        metadata = {
+            "source": source_info,
+            "files_analyzed": len(source_files),
+            "analysis_method": "llm_direct",
+            "llm_provider": type(self.llm_provider).__name__,
+            "llm_metadata": llm_metadata
+        }
+        if ingestion_report:
+            metadata["ingestion"] = ingestion_report
+        metadata.update(stage_reports)
+        
+        return DiagramResponse(
+            diagram_code=diagram_code,
+            format=request.output_format,
+            metadata=metadata,
+            success=True,
+            ir=ir
+        )
+    
+    def _github_response(self, request: AnalysisRequest, diagram_code: str, llm_metadata: str,
+                         ir: Optional[Dict] = None) -> DiagramResponse:
+        """Build the success response for a GitHub URL analysis."""
+        # Create response metadata
+        metadata = {
+            "source": {"repository_url": request.repo_url},
+            "analysis_method": "llm_direct",
+            "llm_provider": type(self.llm_provider).__name__,
+            "llm_metadata": llm_metadata
+        }
+        
+        return DiagramResponse(
+            diagram_code=diagram_code,
+            format=request.output_format,
+            metadata=metadata,
+            success=True,
+            ir=ir
+        )
+    
+    def _no_source_response(self, request: AnalysisRequest) -> DiagramResponse:
+        return self._error_response(
+            request, "No source specified (repo_url, local_directory, or code_files)", error="No source specified"
+        )
+    
+    def _error_response(self, request: AnalysisRequest, message: str, error: Optional[str] = None,
+                        **extra_metadata) -> DiagramResponse:
+        """Build a failed DiagramResponse."""
+        metadata = {"error": message}
+        metadata.update({key: value for key, value in extra_metadata.items() if value is not None})
+        return DiagramResponse(
+            diagram_code="",
+            format=request.output_format,
+            metadata=metadata,
+            success=False,
+            error=error or message
+        )
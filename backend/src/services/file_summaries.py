@@ -0,0 +1,214 @@
+"""Two-phase generation: per-file structural summaries, cached across requests.
+
+The first phase asks the model for a short summary of each file (in batches,
+in parallel) and stores it in a local SQLite file keyed by the file's content
+hash, the summary prompt version and the model. The final diagram is then
+generated from the summaries, so unchanged files cost no tokens in later
+requests, whatever diagram type those ask for.
+"""
+
+import logging
+import os
+import sqlite3
+import tempfile
+import threading
+from collections.abc import Mapping
+from typing import Dict, Iterable, List, Optional, Tuple, Union
+from ..prompts import SUMMARY_PROMPT_VERSION
+from .source_records import file_hash, file_size
+from .token_estimator import estimate_tokens, estimate_tokens_from_length
+
+logger = logging.getLogger(__name__)
+
+# Only /tmp is writable in Lambda; warm containers keep the file between invocations
+DEFAULT_SUMMARY_CACHE_PATH = os.getenv(
+    "UML_SUMMARY_CACHE_PATH", os.path.join(tempfile.gettempdir(), "eduuml-summaries.sqlite3")
+)
+# Smaller files are sent verbatim: their summary would not be much shorter
+DEFAULT_SUMMARY_MIN_CHARS = int(os.getenv("UML_SUMMARY_MIN_CHARS", "1500"))
+# Limits of one summary call
+DEFAULT_SUMMARY_BATCH_TOKENS = int(os.getenv("UML_SUMMARY_BATCH_TOKENS", "60000"))
+DEFAULT_SUMMARY_BATCH_FILES = int(os.getenv("UML_SUMMARY_BATCH_FILES", "25"))
+# Summary calls in flight at once for one request
+DEFAULT_SUMMARY_WORKERS = int(os.getenv("UML_SUMMARY_WORKERS", "4"))
+
+# Tells the model the file content was replaced by its summary
+SUMMARY_HEADER = "[Resumen estructural del archivo; el código original se omitió]\n"
+
+
+class SummaryCache:
+    """Persistent map of (content hash, prompt version, model) to a file summary.
+
+    Errors opening or using the database are logged and the cache behaves as
+    empty, so a read-only or full disk only costs tokens.
+    """
+
+    def __init__(self, path: str = DEFAULT_SUMMARY_CACHE_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._connection: Optional[sqlite3.Connection] = None
+        try:
+            self._connection = sqlite3.connect(path, check_same_thread=False)
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS summaries ("
+                "content_hash TEXT NOT NULL, prompt_version INTEGER NOT NULL, model TEXT NOT NULL, "
+                "summary TEXT NOT NULL, PRIMARY KEY (content_hash, prompt_version, model))"
+            )
+            self._connection.commit()
+        except (sqlite3.Error, OSError) as e:
+            logger.warning(f"Summary cache unavailable at {path}: {str(e)}")
+            self._connection = None
+
+    def get_many(self, hashes: Iterable[str], model: str = "",
+                 prompt_version: int = SUMMARY_PROMPT_VERSION) -> Dict[str, str]:
+        """Cached summaries of the given content hashes; missing ones are left out."""
+        hashes = list(dict.fromkeys(hashes))
+        if self._connection is None or not hashes:
+            return {}
+        found = {}
+        try:
+            with self._lock:
+                # Stay under SQLite's bound variable limit
+                for start in range(0, len(hashes), 500):
+                    chunk = hashes[start:start + 500]
+                    rows = self._connection.execute(
+                        f"SELECT content_hash, summary FROM summaries WHERE prompt_version = ? AND model = ? "
+                        f"AND content_hash IN ({', '.join('?' * len(chunk))})",
+                        [prompt_version, model, *chunk]
+                    ).fetchall()
+                    found.update(rows)
+        except sqlite3.Error as e:
+            logger.warning(f"Summary cache read failed: {str(e)}")
+        return found
+
+    def put_many(self, summaries: Mapping[str, str], model: str = "",
+                 prompt_version: int = SUMMARY_PROMPT_VERSION):
+        """Store summaries by content hash."""
+        if self._connection is None or not summaries:
+            return
+        try:
+            with self._lock:
+                self._connection.executemany(
+                    "INSERT OR REPLACE INTO summaries VALUES (?, ?, ?, ?)",
+                    [(content_hash, prompt_version, model, summary) for content_hash, summary in summaries.items()]
+                )
+                self._connection.commit()
+        except sqlite3.Error as e:
+            logger.warning(f"Summary cache write failed: {str(e)}")
+
+    def __len__(self) -> int:
+        if self._connection is None:
+            return 0
+        with self._lock:
+            return self._connection.execute("SELECT COUNT(*) FROM summaries").fetchone()[0]
+
+
+class SummaryPlan:
+    """Which files of a request come from the cache and which go to the model, in batches."""
+
+    def __init__(self, source_files: Mapping[str, str], hashes: Dict[str, str], cached: Dict[str, str],
+                 batches: List[Dict[str, str]]):
+        self.source_files = source_files
+        self.hashes = hashes
+        self.cached = cached
+        self.batches = batches
+
+
+class FileSummarizer:
+    """Plans the summary calls for a set of prompt files and applies their results.
+
+    Running the calls is left to the caller (a thread pool or asyncio), which
+    passes one result per batch: the {path: summary} the provider returned or
+    the exception it raised.
+    """
+
+    def __init__(self, cache: SummaryCache, model_name: Optional[str] = None,
+                 min_chars: int = DEFAULT_SUMMARY_MIN_CHARS,
+                 batch_tokens: int = DEFAULT_SUMMARY_BATCH_TOKENS,
+                 batch_files: int = DEFAULT_SUMMARY_BATCH_FILES):
+        self.cache = cache
+        self.model_name = model_name or ""
+        self.min_chars = min_chars
+        self.batch_tokens = batch_tokens
+        self.batch_files = batch_files
+
+    def plan(self, source_files: Mapping[str, str]) -> SummaryPlan:
+        """Look up the cache and group the remaining large files into batches."""
+        large = [path for path in source_files if file_size(source_files, path) >= self.min_chars]
+        hashes = {path: file_hash(source_files, path) for path in large}
+        by_hash = self.cache.get_many(hashes.values(), self.model_name)
+        cached = {path: by_hash[hashes[path]] for path in large if hashes[path] in by_hash}
+
+        batches: List[Dict[str, str]] = []
+        batch: Dict[str, str] = {}
+        batch_tokens = 0
+        for path in large:
+            if path in cached:
+                continue
+            content = source_files[path]
+            tokens = estimate_tokens(content)
+            if batch and (batch_tokens + tokens > self.batch_tokens or len(batch) >= self.batch_files):
+                batches.append(batch)
+                batch, batch_tokens = {}, 0
+            batch[path] = content
+            batch_tokens += tokens
+        if batch:
+            batches.append(batch)
+        return SummaryPlan(source_files, hashes, cached, batches)
+
+    def apply(self, plan: SummaryPlan,
+              results: List[Union[Dict[str, str], BaseException]]) -> Tuple[Dict[str, str], Dict]:
+        """
+        Replace every summarized file by its summary and cache the new ones.
+
+        Files of failed batches, or left out of a reply, are sent verbatim.
+
+        Returns:
+            Tuple of (files for the prompt, report)
+        """
+        generated: Dict[str, str] = {}
+        failed = 0
+        for batch, result in zip(plan.batches, results):
+            if isinstance(result, BaseException):
+                logger.warning(f"Summary batch of {len(batch)} files failed, sending them verbatim: {str(result)}")
+                failed += 1
+                continue
+            generated.update((path, summary.strip()) for path, summary in result.items()
+                             if path in batch and isinstance(summary, str) and summary.strip())
+        self.cache.put_many({plan.hashes[path]: summary for path, summary in generated.items()}, self.model_name)
+
+        summaries = {**plan.cached, **generated}
+        # Batch contents are already loaded: reuse them for the files sent verbatim
+        loaded = {path: content for batch in plan.batches for path, content in batch.items()}
+        prompt_files = {}
+        for path in plan.source_files:
+            if path in summaries:
+                prompt_files[path] = f"{SUMMARY_HEADER}{summaries[path]}"
+            else:
+                prompt_files[path] = loaded[path] if path in loaded else plan.source_files[path]
+        report = {
+            "files": len(plan.source_files),
+            "summarized": len(summaries),
+            "cached": len(plan.cached),
+            "generated": len(generated),
+            "verbatim": len(plan.source_files) - len(summaries),
+            "calls": len(plan.batches),
+            "failed_calls": failed,
+            "source_tokens": sum(estimate_tokens_from_length(file_size(plan.source_files, path))
+                                 for path in plan.source_files),
+            "prompt_tokens": sum(estimate_tokens(content) for content in prompt_files.values()),
+        }
+        return prompt_files, report
+
+
+_default_summary_cache: Optional[SummaryCache] = None
+_default_summary_cache_lock = threading.Lock()
+
+
+def get_default_summary_cache() -> SummaryCache:
+    """Process-wide instance, opened on first use so the database is only created when summaries are enabled."""
+    global _default_summary_cache
+    with _default_summary_cache_lock:
+        if _default_summary_cache is None:
+            _default_summary_cache = SummaryCache()
+        return _default_summary_cache
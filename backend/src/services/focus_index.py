@@ -0,0 +1,174 @@
+"""Offline BM25 index for picking the files relevant to a focus query."""
+
+import logging
+import math
+import os
+import re
+from collections import Counter, defaultdict
+from typing import Dict, List, Mapping, Optional, Tuple
+from .partitioning import DEFINITION_RE, IDENTIFIER_RE, MIN_DEFINITION_LENGTH
+from .source_records import subset
+
+logger = logging.getLogger(__name__)
+
+
+DEFAULT_FOCUS_TOP_K = int(os.getenv("UML_FOCUS_TOP_K", "8"))
+DEFAULT_FOCUS_MAX_DEPENDENCIES = int(os.getenv("UML_FOCUS_MAX_DEPENDENCIES", "12"))
+
+# Okapi BM25 parameters
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+# Field weights: a term in the path or in a definition name counts as several occurrences
+PATH_WEIGHT = 3
+DEFINITION_WEIGHT = 2
+
+# Files scoring below this fraction of the best match are not selected
+MIN_RELATIVE_SCORE = 0.2
+
+SUBWORD_RE = re.compile(r'[A-Z]+(?=[A-Z][a-z])|[A-Z]?[a-z]+|[A-Z]+|\d+')
+
+# Words in a focus query that describe the diagram rather than the code
+QUERY_STOPWORDS = {
+    'the', 'of', 'for', 'and', 'a', 'an', 'in', 'to', 'with', 'how', 'show',
+    'el', 'la', 'los', 'las', 'de', 'del', 'para', 'y', 'en', 'con', 'un', 'una', 'que', 'por',
+    'diagram', 'diagrama', 'uml', 'sequence', 'secuencia', 'flow', 'flujo',
+}
+
+
+def _fold(word: str) -> str:
+    # Naive plural folding so "orders" finds "Order"; applied to documents and queries alike
+    return word[:-1] if len(word) > 3 and word.endswith('s') and not word.endswith('ss') else word
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase terms of a text: every identifier plus its camelCase/snake_case parts."""
+    terms = []
+    for identifier in IDENTIFIER_RE.findall(text):
+        parts = SUBWORD_RE.findall(identifier)
+        if len(parts) > 1:
+            terms.append(_fold(identifier.lower().replace('_', '')))
+        terms.extend(_fold(part.lower()) for part in parts if len(part) > 1)
+    return terms
+
+
+class FocusIndex:
+    """BM25 index over the identifiers, comments and paths of a source set."""
+
+    def __init__(self, source_files: Mapping[str, str]):
+        """
+        Index every file once; the text is not kept.
+
+        Args:
+            source_files: Mapping of relative path -> content (lazy mappings are read once)
+        """
+        self.paths: List[str] = []
+        self.lengths: List[int] = []
+        self.postings: Dict[str, List[Tuple[int, int]]] = defaultdict(list)
+        # Names used by each file and the files defining each name, for dependency expansion
+        self.identifiers: List[set] = []
+        self.defined_in: Dict[str, List[int]] = defaultdict(list)
+
+        for path in source_files:
+            content = source_files[path]
+            doc = len(self.paths)
+            definitions = [name for name in DEFINITION_RE.findall(content) if len(name) >= MIN_DEFINITION_LENGTH]
+            terms = Counter(tokenize(content))
+            for term in tokenize(' '.join(re.split(r'[/\\._-]', path))):
+                terms[term] += PATH_WEIGHT
+            for term in tokenize(' '.join(definitions)):
+                terms[term] += DEFINITION_WEIGHT
+
+            self.paths.append(path)
+            self.lengths.append(sum(terms.values()))
+            for term, frequency in terms.items():
+                self.postings[term].append((doc, frequency))
+            self.identifiers.append(set(IDENTIFIER_RE.findall(content)))
+            for name in set(definitions):
+                self.defined_in[name].append(doc)
+
+        self.average_length = (sum(self.lengths) / len(self.lengths)) if self.lengths else 0.0
+
+    def __len__(self) -> int:
+        return len(self.paths)
+
+    def search(self, query: str, top_k: Optional[int] = None) -> List[Tuple[str, float]]:
+        """
+        Rank files against a query.
+
+        Returns:
+            (path, score) pairs with a positive score, best first
+        """
+        terms = {term for term in tokenize(query) if term not in QUERY_STOPWORDS}
+        scores = defaultdict(float)
+        total = len(self.paths)
+        for term in terms:
+            postings = self.postings.get(term)
+            if not postings:
+                continue
+            idf = math.log(1 + (total - len(postings) + 0.5) / (len(postings) + 0.5))
+            for doc, frequency in postings:
+                norm = BM25_K1 * (1 - BM25_B + BM25_B * self.lengths[doc] / self.average_length)
+                scores[doc] += idf * frequency * (BM25_K1 + 1) / (frequency + norm)
+
+        ranked = sorted(scores.items(), key=lambda item: (-item[1], self.paths[item[0]]))
+        return [(self.paths[doc], score) for doc, score in ranked[:top_k]]
+
+    def dependencies(self, paths: List[str], limit: int = DEFAULT_FOCUS_MAX_DEPENDENCIES) -> List[str]:
+        """Files defining names that the given files use, most referenced first."""
+        docs = {path: doc for doc, path in enumerate(self.paths)}
+        selected = {docs[path] for path in paths}
+        references = Counter()
+        for doc in selected:
+            for name in self.identifiers[doc]:
+                for owner in self.defined_in.get(name, ()):
+                    if owner not in selected:
+                        references[owner] += 1
+        ranked = sorted(references.items(), key=lambda item: (-item[1], self.paths[item[0]]))
+        return [self.paths[doc] for doc, _ in ranked[:limit]]
+
+    def select(self, query: str, top_k: int = DEFAULT_FOCUS_TOP_K, with_dependencies: bool = True,
+               max_dependencies: int = DEFAULT_FOCUS_MAX_DEPENDENCIES) -> Tuple[List[str], Dict]:
+        """
+        Pick the best matching files and their direct dependencies.
+
+        Returns:
+            Tuple of (selected paths in index order, report); no paths when nothing matched
+        """
+        ranked = self.search(query, top_k)
+        if ranked:
+            cutoff = ranked[0][1] * MIN_RELATIVE_SCORE
+            ranked = [(path, score) for path, score in ranked if score >= cutoff]
+        matches = [path for path, _ in ranked]
+        dependencies = self.dependencies(matches, max_dependencies) if matches and with_dependencies else []
+
+        chosen = set(matches) | set(dependencies)
+        report = {
+            "query": query,
+            "files_in": len(self.paths),
+            "files_out": len(chosen),
+            "matches": [{"path": path, "score": round(score, 3)} for path, score in ranked],
+            "dependencies": dependencies,
+        }
+        return [path for path in self.paths if path in chosen], report
+
+
+def select_focus_files(source_files: Mapping[str, str], query: str, top_k: int = DEFAULT_FOCUS_TOP_K,
+                       with_dependencies: bool = True) -> Tuple[Mapping[str, str], Dict]:
+    """
+    Restrict a source set to the files relevant to a focus query.
+
+    When nothing matches, every file is kept and the report says so.
+
+    Returns:
+        Tuple of (selected files, focus report)
+    """
+    index = FocusIndex(source_files)
+    paths, report = index.select(query, top_k, with_dependencies)
+    report["matched"] = bool(paths)
+    if not paths:
+        logger.info(f"Focus query {query!r} matched no files; keeping all {len(source_files)}")
+        return source_files, report
+
+    logger.info(f"Focus query {query!r} selected {len(paths)} of {len(source_files)} files")
+    return subset(source_files, paths), report
@@ -4,27 +4,48 @@ import os
 import tempfile
 import shutil
 import logging
-import requests
 import zipfile
-from typing import Dict, Optional
-from urllib.parse import urlparse
+from concurrent.futures import ThreadPoolExecutor
+from fnmatch import fnmatch
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import quote, urlparse
+from .ingestion_filter import IngestionFilter
+from .http_client import HttpClient, get_default_client
+from .source_records import SourceBudget
 
 logger = logging.getLogger(__name__)
 
 
-# Supported file extensions for source code
-SUPPORTED_EXTENSIONS = [
-    '.py', '.js', '.ts', '.java', '.cpp', '.c', '.cs', 
-    '.php', '.rb', '.go', '.kt', '.swift', '.rs', '.scala',
-    '.yaml', '.yml', '.tf', '.tfvars'
-]
+# Sparse (subtree) fetch limits
+DEFAULT_SPARSE_MAX_BYTES = int(os.getenv("UML_SPARSE_MAX_BYTES", str(5 * 1024 * 1024)))
+DEFAULT_SPARSE_WORKERS = int(os.getenv("UML_SPARSE_WORKERS", "8"))
 
 
 class GitHubService:
     """Service for handling GitHub repository operations."""
     
-    def __init__(self):
+    DEFAULT_BASE_URL = "https://github.com"
+    DEFAULT_API_BASE_URL = "https://api.github.com"
+    DEFAULT_RAW_BASE_URL = "https://raw.githubusercontent.com"
+    
+    def __init__(self, http_client: Optional[HttpClient] = None, base_url: str = DEFAULT_BASE_URL,
+                 api_base_url: str = DEFAULT_API_BASE_URL, raw_base_url: str = DEFAULT_RAW_BASE_URL,
+                 token: Optional[str] = None):
+        """
+        Args:
+            http_client: Pooled client; the process-wide one is shared when omitted
+            base_url: Host serving the archive downloads
+            api_base_url: GitHub REST API used by the sparse fetch
+            raw_base_url: Host serving raw file contents
+            token: GitHub token for API calls (defaults to GITHUB_TOKEN)
+        """
         self.temp_dir = None
+        self.last_ingestion_report = None
+        self.http = http_client or get_default_client()
+        self.base_url = base_url.rstrip('/')
+        self.api_base_url = api_base_url.rstrip('/')
+        self.raw_base_url = raw_base_url.rstrip('/')
+        self.token = token if token is not None else os.getenv("GITHUB_TOKEN")
     
     def clone_repository(self, repo_url: str) -> str:
         """Download GitHub repository as ZIP."""
@@ -37,61 +58,115 @@ class GitHubService:
             zip_url = self._get_zip_download_url(repo_url)
             logger.info(f"Downloading: {zip_url}")
             
-            response = requests.get(zip_url, timeout=300)
+            # Conditional GET: an unchanged archive is answered with 304 from the cache
+            response = self.http.get(zip_url, conditional=True, timeout=300)
             response.raise_for_status()
             
             zip_path = os.path.join(self.temp_dir, "repo.zip")
             with open(zip_path, 'wb') as f:
                 f.write(response.content)
             
-            with zipfile.ZipFile(zip_path, 'r') as zip_ref:
-                zip_ref.extractall(self.temp_dir)
-            
-            os.remove(zip_path)
-            
-            extracted_dirs = [d for d in os.listdir(self.temp_dir) 
-                            if os.path.isdir(os.path.join(self.temp_dir, d))]
-            
-            if not extracted_dirs:
-                raise RuntimeError("No directory found in ZIP")
-            
-            repo_path = os.path.join(self.temp_dir, extracted_dirs[0])
-            return repo_path
+            return self._extract_archive(zip_path)
             
         except Exception as e:
             self.cleanup()
             raise RuntimeError(f"Failed to download: {str(e)}")
     
+    def _extract_archive(self, zip_path: str) -> str:
+        """Extract a downloaded archive into temp_dir and return the repository root."""
+        with zipfile.ZipFile(zip_path, 'r') as zip_ref:
+            zip_ref.extractall(self.temp_dir)
+        
+        os.remove(zip_path)
+        
+        extracted_dirs = [d for d in os.listdir(self.temp_dir) 
+                        if os.path.isdir(os.path.join(self.temp_dir, d))]
+        
+        if not extracted_dirs:
+            raise RuntimeError("No directory found in ZIP")
+        
+        return os.path.join(self.temp_dir, extracted_dirs[0])
+    
     def get_source_files(self, repo_path: str, max_files: int = 100) -> Dict[str, str]:
-        """Get source code files from repository."""
-        source_files = {}
-        file_count = 0
+        """
+        Get source code files from repository.
         
-        for root, dirs, files in os.walk(repo_path):
-            dirs[:] = [d for d in dirs if not self._should_skip_directory(d)]
-            
-            for file in files:
-                if file_count >= max_files:
-                    break
-                
-                if any(file.lower().endswith(ext) for ext in SUPPORTED_EXTENSIONS):
-                    file_path = os.path.join(root, file)
-                    relative_path = os.path.relpath(file_path, repo_path)
-                    
-                    try:
-                        with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
-                            content = f.read()
-                            if len(content) <= 100000:
-                                source_files[relative_path] = content
-                                file_count += 1
-                    except Exception as e:
-                        logger.warning(f"Could not read {relative_path}: {str(e)}")
-            
-            if file_count >= max_files:
-                break
+        The contents are read eagerly (the extracted archive is removed by cleanup)
+        but still within the global byte/token budget.
+        """
+        ingestion_filter = IngestionFilter(skip_directory=self._should_skip_directory)
+        source_files = dict(ingestion_filter.iter_source_files(repo_path, max_files, SourceBudget()))
         
+        self.last_ingestion_report = ingestion_filter.report()
+        logger.info(f"Ingestion report: {self.last_ingestion_report}")
         return source_files
     
+    def get_sparse_source_files(self, repo_url: str, subpath: str = "", include: Optional[List[str]] = None,
+                                max_files: int = 100, max_total_bytes: int = DEFAULT_SPARSE_MAX_BYTES,
+                                branch: Optional[str] = None) -> Tuple[Dict[str, str], Dict]:
+        """
+        Fetch only the files under subpath without downloading the repository archive.
+        
+        The tree is listed through the Git trees API and matching blobs are fetched
+        concurrently from the raw host. Nothing is written to disk, so the call keeps
+        no state and can run concurrently on a shared service.
+        
+        Args:
+            repo_url: GitHub repository URL
+            subpath: Directory inside the repository (empty for the root)
+            include: Glob patterns matched against paths relative to subpath
+            max_files: Maximum number of files to fetch
+            max_total_bytes: Cap on the summed size of the fetched blobs
+            branch: Branch or commit; the repository's default branch when omitted
+        
+        Returns:
+            Tuple of (repository path -> content, ingestion report)
+        """
+        if not self._is_valid_github_url(repo_url):
+            raise ValueError(f"Invalid GitHub URL: {repo_url}")
+        
+        owner, repo_name = self._owner_and_name(repo_url)
+        subpath = subpath.strip('/')
+        branch = branch or self._get_default_branch(owner, repo_name)
+        tree = self._get_tree(owner, repo_name, branch)
+        
+        ingestion_filter = IngestionFilter(skip_directory=self._should_skip_directory)
+        ingestion_filter.method = 'github_trees_api'
+        selected = self._select_blobs(tree, subpath, include, ingestion_filter, max_files, max_total_bytes)
+        
+        def fetch(entry: Dict) -> Tuple[str, Optional[str]]:
+            url = f"{self.raw_base_url}/{owner}/{repo_name}/{quote(branch)}/{quote(entry['path'])}"
+            try:
+                response = self.http.get(url, conditional=True, timeout=30)
+                response.raise_for_status()
+                return entry['path'], response.content.decode('utf-8', errors='ignore')
+            except Exception as e:
+                logger.warning(f"Could not fetch {entry['path']}: {str(e)}")
+                return entry['path'], None
+        
+        source_files = {}
+        with ThreadPoolExecutor(max_workers=DEFAULT_SPARSE_WORKERS) as pool:
+            for path, content in pool.map(fetch, selected):
+                if content is None:
+                    ingestion_filter.skip_counts['read_error'] += 1
+                    continue
+                reason = ingestion_filter.check_content(content)
+                if reason:
+                    ingestion_filter.skip_counts[reason] += 1
+                    continue
+                source_files[path] = content
+                ingestion_filter.files_accepted += 1
+        
+        report = ingestion_filter.report()
+        report.update({
+            'branch': branch,
+            'subpath': subpath,
+            'tree_truncated': bool(tree.get('truncated')),
+            'bytes_fetched': sum(entry.get('size', 0) for entry in selected),
+        })
+        logger.info(f"Sparse fetch report: {report}")
+        return source_files, report
+    
     def get_repository_info(self, repo_url: str) -> Dict[str, str]:
         """Extract repository information from URL."""
         try:
@@ -136,27 +211,98 @@ class GitHubService:
     
     def _get_zip_download_url(self, repo_url: str) -> str:
         """Convert GitHub repo URL to ZIP download URL with branch detection."""
+        candidates = self._zip_url_candidates(repo_url)
+        
+        # Try main branch first, then master as fallback
+        for zip_url in candidates:
+            try:
+                response = self.http.head(zip_url, conditional=True, timeout=10, allow_redirects=True)
+                if response.status_code == 200:
+                    return zip_url
+            except Exception:
+                continue
+        
+        # Default to main if both fail
+        return candidates[0]
+    
+    def _zip_url_candidates(self, repo_url: str) -> List[str]:
+        """Archive URLs to probe, in order of preference."""
         parsed = urlparse(repo_url)
         path_parts = parsed.path.strip('/').split('/')
         
         if len(path_parts) >= 2:
             owner = path_parts[0]
             repo_name = path_parts[1].replace('.git', '')
+            return [
+                f"{self.base_url}/{owner}/{repo_name}/archive/refs/heads/{branch}.zip"
+                for branch in ['main', 'master']
+            ]
+        
+        raise ValueError("Invalid GitHub URL format")
+    
+    def _owner_and_name(self, repo_url: str) -> Tuple[str, str]:
+        path_parts = urlparse(repo_url).path.strip('/').split('/')
+        return path_parts[0], path_parts[1].replace('.git', '')
+    
+    def _api_get(self, path: str) -> Dict:
+        headers = {"Accept": "application/vnd.github+json"}
+        if self.token:
+            headers["Authorization"] = f"Bearer {self.token}"
+        # Revalidated requests answered with 304 do not count against the API rate limit
+        response = self.http.get(f"{self.api_base_url}{path}", conditional=True, headers=headers, timeout=30)
+        response.raise_for_status()
+        return response.json()
+    
+    def _get_default_branch(self, owner: str, repo_name: str) -> str:
+        try:
+            return self._api_get(f"/repos/{owner}/{repo_name}").get('default_branch') or 'main'
+        except Exception as e:
+            logger.warning(f"Could not resolve default branch, using main: {str(e)}")
+            return 'main'
+    
+    def _get_tree(self, owner: str, repo_name: str, branch: str) -> Dict:
+        tree = self._api_get(f"/repos/{owner}/{repo_name}/git/trees/{quote(branch, safe='')}?recursive=1")
+        if tree.get('truncated'):
+            logger.warning(f"Tree listing for {owner}/{repo_name} was truncated by the API")
+        return tree
+    
+    def _select_blobs(self, tree: Dict, subpath: str, include: Optional[List[str]],
+                      ingestion_filter: IngestionFilter, max_files: int, max_total_bytes: int) -> List[Dict]:
+        """Pick the tree entries to fetch, in path order and within the byte budget."""
+        prefix = f"{subpath}/" if subpath else ""
+        selected = []
+        total_bytes = 0
+        
+        for entry in sorted(tree.get('tree', []), key=lambda item: item.get('path', '')):
+            path = entry.get('path', '')
+            if entry.get('type') != 'blob' or not path.startswith(prefix):
+                continue
             
-            # Try main branch first, then master as fallback
-            for branch in ['main', 'master']:
-                zip_url = f"https://github.com/{owner}/{repo_name}/archive/refs/heads/{branch}.zip"
-                try:
-                    response = requests.head(zip_url, timeout=10)
-                    if response.status_code == 200:
-                        return zip_url
-                except:
-                    continue
+            relative_path = path[len(prefix):]
+            if include and not any(fnmatch(relative_path, pattern) for pattern in include):
+                ingestion_filter.skip_counts['not_included'] += 1
+                continue
             
-            # Default to main if both fail
-            return f"https://github.com/{owner}/{repo_name}/archive/refs/heads/main.zip"
+            if ingestion_filter.check_path(relative_path):
+                continue
+            
+            size = entry.get('size', 0)
+            if size > ingestion_filter.max_file_size * 4:
+                ingestion_filter.skip_counts['too_large'] += 1
+                continue
+            
+            if len(selected) >= max_files:
+                logger.warning(f"Reached maximum file limit ({max_files})")
+                break
+            
+            if total_bytes + size > max_total_bytes:
+                ingestion_filter.skip_counts['byte_budget'] += 1
+                continue
+            
+            selected.append(entry)
+            total_bytes += size
         
-        raise ValueError("Invalid GitHub URL format")
+        return selected
     
     def _should_skip_directory(self, dirname: str) -> bool:
         """Check if directory should be skipped."""
@@ -0,0 +1,260 @@
+"""Shared HTTP client with connection pooling, conditional requests and metrics."""
+
+import hashlib
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional
+from urllib.parse import urlparse
+import requests
+from requests.adapters import HTTPAdapter
+from requests.structures import CaseInsensitiveDict
+from urllib3.util.retry import Retry
+
+logger = logging.getLogger(__name__)
+
+
+DEFAULT_POOL_CONNECTIONS = int(os.getenv("UML_HTTP_POOL_CONNECTIONS", "10"))
+DEFAULT_POOL_MAXSIZE = int(os.getenv("UML_HTTP_POOL_MAXSIZE", "20"))
+DEFAULT_MAX_PER_HOST = int(os.getenv("UML_HTTP_MAX_PER_HOST", "8"))
+DEFAULT_RETRIES = int(os.getenv("UML_HTTP_RETRIES", "3"))
+DEFAULT_BACKOFF = 0.5
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+# Conditional-request cache limits (bodies are kept in memory)
+DEFAULT_CACHE_MAX_ENTRIES = 256
+DEFAULT_CACHE_MAX_BYTES = 64 * 1024 * 1024
+DEFAULT_CACHE_MAX_ENTRY_BYTES = 16 * 1024 * 1024
+# Request headers that decide whose response it is; cached bodies are kept per value
+IDENTITY_HEADERS = ("authorization", "cookie")
+
+
+class TransferMetrics:
+    """Thread-safe counters describing the traffic of an HttpClient."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.requests = 0
+            self.errors = 0
+            self.not_modified = 0
+            self.bytes_received = 0
+            self.elapsed_seconds = 0.0
+            self.status_counts: Dict[int, int] = {}
+            self.host_counts: Dict[str, int] = {}
+
+    def record(self, host: str, status: Optional[int], size: int, elapsed: float):
+        with self._lock:
+            self.requests += 1
+            self.bytes_received += size
+            self.elapsed_seconds += elapsed
+            self.host_counts[host] = self.host_counts.get(host, 0) + 1
+            if status is None:
+                self.errors += 1
+            else:
+                self.status_counts[status] = self.status_counts.get(status, 0) + 1
+                if status == 304:
+                    self.not_modified += 1
+
+    def snapshot(self) -> Dict:
+        """Copy of the counters, suitable for response metadata."""
+        with self._lock:
+            return {
+                "requests": self.requests,
+                "errors": self.errors,
+                "not_modified": self.not_modified,
+                "bytes_received": self.bytes_received,
+                "elapsed_seconds": round(self.elapsed_seconds, 3),
+                "status_counts": dict(self.status_counts),
+                "host_counts": dict(self.host_counts),
+            }
+
+
+class _CachedResponse:
+    __slots__ = ("etag", "last_modified", "status_code", "headers", "content")
+
+    def __init__(self, response: requests.Response):
+        self.etag = response.headers.get("ETag")
+        self.last_modified = response.headers.get("Last-Modified")
+        self.status_code = response.status_code
+        self.headers = dict(response.headers)
+        self.content = response.content if response.request.method != "HEAD" else b""
+
+
+class HttpClient:
+    """Pooled, retrying HTTP client shared by the GitHub services."""
+
+    def __init__(self,
+                 pool_connections: int = DEFAULT_POOL_CONNECTIONS,
+                 pool_maxsize: int = DEFAULT_POOL_MAXSIZE,
+                 max_per_host: int = DEFAULT_MAX_PER_HOST,
+                 retries: int = DEFAULT_RETRIES,
+                 backoff_factor: float = DEFAULT_BACKOFF,
+                 cache_max_entries: int = DEFAULT_CACHE_MAX_ENTRIES,
+                 cache_max_bytes: int = DEFAULT_CACHE_MAX_BYTES):
+        """
+        Args:
+            pool_connections: Number of per-host connection pools kept
+            pool_maxsize: Keep-alive connections kept per host
+            max_per_host: Requests allowed in flight per host
+            retries: Retries for connection errors and 429/5xx on idempotent methods
+            backoff_factor: Exponential backoff factor between retries
+            cache_max_entries: Responses kept for conditional requests
+            cache_max_bytes: Total body bytes kept for conditional requests
+        """
+        retry = Retry(
+            total=retries,
+            backoff_factor=backoff_factor,
+            status_forcelist=RETRY_STATUSES,
+            allowed_methods=frozenset(["HEAD", "GET"]),
+            raise_on_status=False,
+        )
+        adapter = HTTPAdapter(pool_connections=pool_connections, pool_maxsize=pool_maxsize, max_retries=retry)
+        self.session = requests.Session()
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+        self.max_per_host = max_per_host
+        self.metrics = TransferMetrics()
+        self.cache_max_entries = cache_max_entries
+        self.cache_max_bytes = cache_max_bytes
+        self._cache: "OrderedDict[tuple, _CachedResponse]" = OrderedDict()
+        self._cache_bytes = 0
+        self._lock = threading.Lock()
+        self._host_limits: Dict[str, threading.BoundedSemaphore] = {}
+
+    def get(self, url: str, conditional: bool = False, **kwargs) -> requests.Response:
+        return self.request("GET", url, conditional=conditional, **kwargs)
+
+    def head(self, url: str, conditional: bool = False, **kwargs) -> requests.Response:
+        return self.request("HEAD", url, conditional=conditional, **kwargs)
+
+    def request(self, method: str, url: str, conditional: bool = False, **kwargs) -> requests.Response:
+        """
+        Send a request through the shared session.
+
+        Args:
+            method: HTTP method
+            url: Absolute URL
+            conditional: Revalidate a previously cached response with
+                If-None-Match/If-Modified-Since; a 304 is answered from the cache
+            **kwargs: Passed to requests.Session.request
+
+        Returns:
+            The response; `from_cache` is True when it was served from a 304
+        """
+        host = urlparse(url).netloc
+        headers = dict(kwargs.pop("headers", None) or {})
+        # A body fetched with one token must not be served to another caller, or revalidated with their credentials
+        cache_key = (method.upper(), url, self._identity(headers))
+        cached = self._cache_get(cache_key) if conditional else None
+
+        if cached is not None:
+            if cached.etag:
+                headers["If-None-Match"] = cached.etag
+            if cached.last_modified:
+                headers["If-Modified-Since"] = cached.last_modified
+
+        started = time.monotonic()
+        with self._host_limit(host):
+            try:
+                response = self.session.request(method, url, headers=headers, **kwargs)
+            except requests.RequestException:
+                self.metrics.record(host, None, 0, time.monotonic() - started)
+                raise
+
+        size = len(response.content) if not kwargs.get("stream") else 0
+        self.metrics.record(host, response.status_code, size, time.monotonic() - started)
+
+        if response.status_code == 304 and cached is not None:
+            return self._from_cache(cached, response)
+
+        response.from_cache = False
+        if conditional and response.status_code == 200 and not kwargs.get("stream"):
+            self._cache_put(cache_key, response)
+        return response
+
+    @property
+    def cache_bytes(self) -> int:
+        """Body bytes currently kept for conditional requests."""
+        return self._cache_bytes
+
+    def close(self):
+        self.session.close()
+
+    def _identity(self, headers: Dict[str, str]) -> str:
+        values = sorted(
+            f"{name.lower()}:{value}" for name, value in {**self.session.headers, **headers}.items()
+            if name.lower() in IDENTITY_HEADERS
+        )
+        return hashlib.sha256("\n".join(values).encode("utf-8")).hexdigest() if values else ""
+
+    def _host_limit(self, host: str) -> threading.BoundedSemaphore:
+        with self._lock:
+            semaphore = self._host_limits.get(host)
+            if semaphore is None:
+                semaphore = threading.BoundedSemaphore(self.max_per_host)
+                self._host_limits[host] = semaphore
+            return semaphore
+
+    def _cache_get(self, key: tuple) -> Optional[_CachedResponse]:
+        with self._lock:
+            entry = self._cache.get(key)
+            if entry is not None:
+                self._cache.move_to_end(key)
+            return entry
+
+    def _cache_put(self, key: tuple, response: requests.Response):
+        if not (response.headers.get("ETag") or response.headers.get("Last-Modified")):
+            return
+        entry = _CachedResponse(response)
+        if len(entry.content) > min(DEFAULT_CACHE_MAX_ENTRY_BYTES, self.cache_max_bytes):
+            return
+
+        with self._lock:
+            previous = self._cache.pop(key, None)
+            if previous is not None:
+                self._cache_bytes -= len(previous.content)
+            self._cache[key] = entry
+            self._cache_bytes += len(entry.content)
+            # Evict least recently used entries beyond the limits
+            while len(self._cache) > self.cache_max_entries or self._cache_bytes > self.cache_max_bytes:
+                _, evicted = self._cache.popitem(last=False)
+                self._cache_bytes -= len(evicted.content)
+
+    @staticmethod
+    def _from_cache(cached: _CachedResponse, not_modified: requests.Response) -> requests.Response:
+        response = requests.Response()
+        response.status_code = cached.status_code
+        response.headers = CaseInsensitiveDict(cached.headers)
+        response._content = cached.content
+        response.url = not_modified.url
+        response.request = not_modified.request
+        response.encoding = not_modified.encoding
+        response.from_cache = True
+        return response
+
+
+_default_client = None
+_default_client_lock = threading.Lock()
+
+
+def default_cache_bytes() -> int:
+    """Bytes held by the process-wide client's conditional cache (0 before it exists)."""
+    client = _default_client
+    return client.cache_bytes if client is not None else 0
+
+
+def get_default_client() -> HttpClient:
+    """Process-wide client so warm invocations reuse pooled connections."""
+    global _default_client
+    if _default_client is None:
+        with _default_client_lock:
+            if _default_client is None:
+                _default_client = HttpClient()
+    return _default_client
@@ -0,0 +1,422 @@
+"""Shared ingestion filter for skipping ignored, vendored and generated files."""
+
+import math
+import os
+import re
+import shutil
+import subprocess
+import logging
+from collections import Counter
+from fnmatch import fnmatch
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+from .source_records import FileLoader, SourceBudget, SourceRecord
+
+logger = logging.getLogger(__name__)
+
+
+# Supported file extensions for source code
+SUPPORTED_EXTENSIONS = [
+    '.py', '.js', '.ts', '.java', '.cpp', '.c', '.cs',
+    '.php', '.rb', '.go', '.kt', '.swift', '.rs', '.scala',
+    '.yaml', '.yml', '.tf', '.tfvars'
+]
+
+# Directories holding third-party code that should never reach the prompt
+VENDORED_DIRECTORIES = {
+    'vendor', 'vendors', 'third_party', 'third-party', 'thirdparty',
+    'bower_components', 'jspm_packages', 'site-packages', 'pods', 'carthage',
+    '__generated__'
+}
+
+# File name patterns produced by bundlers, code generators and lockfile tools
+GENERATED_FILE_PATTERNS = [
+    '*.min.js', '*-min.js', '*.bundle.js', '*.chunk.js',
+    '*_pb2.py', '*_pb2_grpc.py', '*.pb.go', '*.pb.gw.go',
+    '*.generated.cs', '*.designer.cs', '*.g.cs',
+    'pnpm-lock.yaml', '*.lock.yaml', '*.lock.yml'
+]
+
+# Markers code generators write in the file's leading comment; prose such as
+# "generated by the database" or "do not edit without ..." must not match
+GENERATED_HEADER_RE = re.compile(
+    r'@generated\b|\bCode generated\b.*\bDO NOT EDIT\.|<auto-generated\b|'
+    r'Generated by the protocol buffer compiler'
+)
+COMMENT_LINE_RE = re.compile(r'^\s*(?:#|//|/\*|\*|<!--|--|;)')
+
+# Only the leading comment lines of the file are searched for generated-code markers
+GENERATED_HEADER_LINES = 5
+
+# Content heuristics are only applied to files at least this large
+MIN_HEURISTIC_SIZE = 1024
+MINIFIED_AVG_LINE_LENGTH = 200
+MINIFIED_MAX_LINE_LENGTH = 5000
+ENTROPY_SAMPLE_CHARS = 65536
+ENTROPY_THRESHOLD = 5.8
+
+DEFAULT_MAX_FILE_SIZE = 100000
+GIT_LS_FILES_TIMEOUT = 15
+
+
+def _translate_glob(pattern: str) -> str:
+    """Translate a gitignore glob into a regular expression fragment."""
+    parts = []
+    i = 0
+    n = len(pattern)
+    while i < n:
+        if pattern.startswith('**/', i):
+            parts.append('(?:.*/)?')
+            i += 3
+        elif pattern.startswith('**', i):
+            parts.append('.*')
+            i += 2
+        elif pattern[i] == '*':
+            parts.append('[^/]*')
+            i += 1
+        elif pattern[i] == '?':
+            parts.append('[^/]')
+            i += 1
+        elif pattern[i] == '[':
+            end = pattern.find(']', i + 1)
+            if end == -1:
+                parts.append(re.escape('['))
+                i += 1
+                continue
+            body = pattern[i + 1:end]
+            if body.startswith('!'):
+                body = '^' + body[1:]
+            parts.append('[' + body.replace('\\', '\\\\') + ']')
+            i = end + 1
+        else:
+            parts.append(re.escape(pattern[i]))
+            i += 1
+    return ''.join(parts)
+
+
+class GitignoreMatcher:
+    """Compiled rules of a single .gitignore file."""
+
+    def __init__(self, lines: List[str], base: str = ''):
+        """
+        Compile gitignore lines.
+
+        Args:
+            lines: Raw lines of the .gitignore file
+            base: Directory of the .gitignore relative to the scan root ('' for the root)
+        """
+        self.base = base.strip('/')
+        self._rules = []
+        for line in lines:
+            rule = self._compile(line)
+            if rule:
+                self._rules.append(rule)
+
+    @classmethod
+    def from_file(cls, path: str, base: str = '') -> 'GitignoreMatcher':
+        """Load and compile a .gitignore file."""
+        with open(path, 'r', encoding='utf-8', errors='ignore') as f:
+            return cls(f.read().splitlines(), base)
+
+    @staticmethod
+    def _compile(line: str) -> Optional[Tuple[re.Pattern, bool, bool]]:
+        line = line.rstrip('\n').rstrip()
+        if not line or line.startswith('#'):
+            return None
+
+        negate = line.startswith('!')
+        if negate:
+            line = line[1:]
+        if line.startswith('\\'):
+            line = line[1:]
+
+        dir_only = line.endswith('/')
+        line = line.rstrip('/')
+        if not line:
+            return None
+
+        # A slash anywhere but the end anchors the pattern to the .gitignore directory
+        anchored = '/' in line
+        line = line.lstrip('/')
+        prefix = '' if anchored else '(?:.*/)?'
+        regex = re.compile(f"^{prefix}{_translate_glob(line)}(?P<rest>/.*)?$")
+        return regex, negate, dir_only
+
+    def match(self, rel_path: str, is_dir: bool = False) -> Optional[bool]:
+        """
+        Match a path relative to the scan root.
+
+        Returns:
+            True if ignored, False if re-included by a negation, None if no rule applies
+        """
+        if self.base:
+            if not rel_path.startswith(self.base + '/'):
+                return None
+            rel_path = rel_path[len(self.base) + 1:]
+
+        result = None
+        for regex, negate, dir_only in self._rules:
+            m = regex.match(rel_path)
+            if m and (not dir_only or is_dir or m.group('rest')):
+                result = not negate
+        return result
+
+
+def shannon_entropy(text: str) -> float:
+    """Shannon entropy of the text in bits per character."""
+    if not text:
+        return 0.0
+    length = len(text)
+    return -sum((count / length) * math.log2(count / length) for count in Counter(text).values())
+
+
+def has_generated_header(content: str) -> bool:
+    """Whether a generated-code marker appears in the comment lines at the top of the file."""
+    for line in content[:4096].splitlines()[:GENERATED_HEADER_LINES]:
+        if COMMENT_LINE_RE.match(line) and GENERATED_HEADER_RE.search(line):
+            return True
+    return False
+
+
+class IngestionFilter:
+    """Select the source files worth sending to the LLM and count what was skipped."""
+
+    def __init__(self,
+                 supported_extensions: Optional[List[str]] = None,
+                 skip_directory: Optional[Callable[[str], bool]] = None,
+                 max_file_size: int = DEFAULT_MAX_FILE_SIZE,
+                 use_gitignore: bool = True,
+                 use_git: bool = True):
+        """
+        Args:
+            supported_extensions: Accepted file extensions (defaults to SUPPORTED_EXTENSIONS)
+            skip_directory: Caller specific predicate for directory names to prune
+            max_file_size: Maximum file size in characters
+            use_gitignore: Honour .gitignore files found while walking
+            use_git: Use `git ls-files` when the root is a git checkout
+        """
+        self.supported_extensions = tuple(ext.lower() for ext in (supported_extensions or SUPPORTED_EXTENSIONS))
+        self.skip_directory = skip_directory or (lambda dirname: False)
+        self.max_file_size = max_file_size
+        self.use_gitignore = use_gitignore
+        self.use_git = use_git
+        self.skip_counts = Counter()
+        self.files_accepted = 0
+        self.method = None
+        self.budget = None
+
+    def iter_source_files(self, root: str, max_files: int = 100,
+                          budget: Optional[SourceBudget] = None) -> Iterator[Tuple[str, str]]:
+        """
+        Yield (relative_path, content) for every accepted file under root.
+
+        Skipped entries are counted per reason in `skip_counts`. Directories pruned
+        while walking count once; with the git fast path every file counts.
+        """
+        for relative_path, _, content in self._iter_accepted(root, max_files, budget):
+            yield relative_path, content
+
+    def iter_source_records(self, root: str, max_files: int = 100,
+                            budget: Optional[SourceBudget] = None) -> Iterator[SourceRecord]:
+        """
+        Yield a SourceRecord for every accepted file under root.
+
+        Each file is read once for the content checks and hashing, then its text
+        is dropped; the record reads it again when the prompt is built.
+        """
+        for relative_path, file_path, content in self._iter_accepted(root, max_files, budget):
+            yield SourceRecord.from_content(relative_path, content, FileLoader(file_path))
+
+    def _iter_accepted(self, root: str, max_files: int,
+                       budget: Optional[SourceBudget]) -> Iterator[Tuple[str, str, str]]:
+        self.budget = budget
+        for relative_path, file_path in self._iter_candidate_paths(root):
+            if self.files_accepted >= max_files:
+                logger.warning(f"Reached maximum file limit ({max_files})")
+                return
+
+            content = self._read(file_path, relative_path)
+            if content is None:
+                continue
+
+            reason = self.check_content(content)
+            if not reason and budget is not None:
+                reason = budget.admit(len(content))
+            if reason:
+                self.skip_counts[reason] += 1
+                logger.debug(f"Skipping {relative_path}: {reason}")
+                continue
+
+            self.files_accepted += 1
+            yield relative_path, file_path, content
+
+    def filter_code_files(self, code_files: Dict[str, str]) -> Dict[str, str]:
+        """Apply path and content heuristics to an in-memory file map."""
+        self.method = 'code_files'
+        accepted = {}
+        for path, content in code_files.items():
+            parts = path.replace('\\', '/').split('/')
+            reason = None
+            if any(part.lower() in VENDORED_DIRECTORIES for part in parts[:-1]):
+                reason = 'vendored'
+            else:
+                reason = self.check_name(parts[-1]) or self.check_content(content)
+
+            if reason:
+                self.skip_counts[reason] += 1
+                continue
+
+            accepted[path] = content
+            self.files_accepted += 1
+        return accepted
+
+    def check_path(self, relative_path: str) -> Optional[str]:
+        """Return a skip reason for a path from a listing (no file system access)."""
+        parts = relative_path.replace('\\', '/').split('/')
+        reason = self._check_directories(parts[:-1]) or self._check_file(parts[-1])
+        if reason:
+            self.skip_counts[reason] += 1
+        return reason
+
+    def check_name(self, filename: str) -> Optional[str]:
+        """Return a skip reason based on the file name alone."""
+        name = filename.lower()
+        if any(fnmatch(name, pattern) for pattern in GENERATED_FILE_PATTERNS):
+            return 'generated_name'
+        return None
+
+    def check_content(self, content: str) -> Optional[str]:
+        """Return a skip reason based on the file content, or None to keep it."""
+        if len(content) > self.max_file_size:
+            return 'too_large'
+
+        if has_generated_header(content):
+            return 'generated_header'
+
+        if len(content) < MIN_HEURISTIC_SIZE:
+            return None
+
+        lines = content.splitlines() or ['']
+        longest = max(len(line) for line in lines)
+        if len(content) / len(lines) > MINIFIED_AVG_LINE_LENGTH or longest > MINIFIED_MAX_LINE_LENGTH:
+            return 'minified'
+
+        if shannon_entropy(content[:ENTROPY_SAMPLE_CHARS]) > ENTROPY_THRESHOLD:
+            return 'high_entropy'
+
+        return None
+
+    def report(self) -> Dict:
+        """Summary of the last scan for response metadata."""
+        return {
+            'method': self.method,
+            'files_accepted': self.files_accepted,
+            'skipped': dict(self.skip_counts),
+            **({'budget': self.budget.report()} if self.budget is not None else {}),
+        }
+
+    def _iter_candidate_paths(self, root: str) -> Iterator[Tuple[str, str]]:
+        tracked = self._git_ls_files(root)
+        if tracked is not None:
+            self.method = 'git_ls_files'
+            for relative_path in tracked:
+                parts = relative_path.split('/')
+                reason = self._check_directories(parts[:-1]) or self._check_file(parts[-1])
+                if reason:
+                    self.skip_counts[reason] += 1
+                    continue
+                yield os.path.normpath(relative_path), os.path.join(root, relative_path)
+            return
+
+        self.method = 'walk'
+        matchers = []
+        for current, dirs, files in os.walk(root):
+            rel_dir = os.path.relpath(current, root).replace(os.sep, '/')
+            rel_dir = '' if rel_dir == '.' else rel_dir
+
+            # Drop matchers from sibling branches, then load this directory's rules
+            matchers = [m for m in matchers if not m.base or rel_dir == m.base or rel_dir.startswith(m.base + '/')]
+            gitignore_path = os.path.join(current, '.gitignore')
+            if self.use_gitignore and os.path.isfile(gitignore_path):
+                try:
+                    matchers.append(GitignoreMatcher.from_file(gitignore_path, rel_dir))
+                except OSError as e:
+                    logger.warning(f"Could not read {gitignore_path}: {str(e)}")
+
+            kept = []
+            for dirname in dirs:
+                reason = self._check_directories([dirname])
+                if not reason and self._is_ignored(matchers, self._join(rel_dir, dirname), True):
+                    reason = 'gitignored'
+                if reason:
+                    self.skip_counts[reason] += 1
+                else:
+                    kept.append(dirname)
+            dirs[:] = kept
+
+            for filename in files:
+                relative_path = self._join(rel_dir, filename)
+                reason = self._check_file(filename)
+                if not reason and self._is_ignored(matchers, relative_path, False):
+                    reason = 'gitignored'
+                if reason:
+                    self.skip_counts[reason] += 1
+                    continue
+                yield os.path.relpath(os.path.join(current, filename), root), os.path.join(current, filename)
+
+    def _git_ls_files(self, root: str) -> Optional[List[str]]:
+        """List tracked and untracked-but-not-ignored files, or None if git is unusable."""
+        if not self.use_git or not os.path.isdir(os.path.join(root, '.git')) or shutil.which('git') is None:
+            return None
+        try:
+            result = subprocess.run(
+                ['git', '-C', root, 'ls-files', '-z', '--cached', '--others', '--exclude-standard'],
+                capture_output=True, timeout=GIT_LS_FILES_TIMEOUT, check=True
+            )
+        except (OSError, subprocess.SubprocessError) as e:
+            logger.warning(f"git ls-files failed, falling back to directory walk: {str(e)}")
+            return None
+        return [p for p in result.stdout.decode('utf-8', 'surrogateescape').split('\0') if p]
+
+    def _check_directories(self, dirnames: List[str]) -> Optional[str]:
+        for dirname in dirnames:
+            if self.skip_directory(dirname):
+                return 'skipped_directory'
+            if dirname.lower() in VENDORED_DIRECTORIES:
+                return 'vendored'
+        return None
+
+    def _check_file(self, filename: str) -> Optional[str]:
+        if not filename.lower().endswith(self.supported_extensions):
+            return 'unsupported_extension'
+        return self.check_name(filename)
+
+    def _read(self, file_path: str, relative_path: str) -> Optional[str]:
+        # Reject clearly oversized files before reading them; multi-byte text may be
+        # up to 4 bytes per character so the exact check happens on the content
+        try:
+            if os.path.getsize(file_path) > self.max_file_size * 4:
+                self.skip_counts['too_large'] += 1
+                return None
+        except OSError:
+            pass
+
+        try:
+            with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
+                return f.read()
+        except Exception as e:
+            logger.warning(f"Could not read {relative_path}: {str(e)}")
+            self.skip_counts['read_error'] += 1
+            return None
+
+    @staticmethod
+    def _is_ignored(matchers: List[GitignoreMatcher], rel_path: str, is_dir: bool) -> bool:
+        ignored = False
+        for matcher in matchers:
+            result = matcher.match(rel_path, is_dir)
+            if result is not None:
+                ignored = result
+        return ignored
+
+    @staticmethod
+    def _join(rel_dir: str, name: str) -> str:
+        return f"{rel_dir}/{name}" if rel_dir else name
@@ -0,0 +1,76 @@
+"""In-process cache of diagram IRs, keyed by the prompt content rather than the output format."""
+
+import hashlib
+import json
+import logging
+import os
+import threading
+from collections import OrderedDict
+from collections.abc import Mapping
+from typing import Any, Dict, List, Optional, Tuple
+from ..diagram_ir import IR_VERSION
+from .source_records import file_hash
+
+logger = logging.getLogger(__name__)
+
+# A normalized IR is a few KB; warm Lambda containers keep these between invocations
+DEFAULT_IR_CACHE_ENTRIES = int(os.getenv("UML_IR_CACHE_ENTRIES", "128"))
+
+
+class IRCache:
+    """Thread-safe LRU mapping of cache keys to (normalized IR, metadata)."""
+
+    def __init__(self, max_entries: int = DEFAULT_IR_CACHE_ENTRIES):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, Tuple[Dict[str, Any], str]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[Tuple[Dict[str, Any], str]]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def put(self, key: str, ir: Dict[str, Any], metadata: str):
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (ir, metadata)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._entries)
+
+
+def ir_cache_key(source_files: Mapping, diagram_type: Any,
+                 file_aliases: Optional[Dict[str, List[str]]] = None, model_name: Optional[str] = None) -> str:
+    """
+    Digest of everything the IR depends on: the prompt files, the diagram type and the model.
+
+    The output format is deliberately left out, so every format is rendered
+    from the same entry.
+    """
+    digest = hashlib.sha256()
+    for path in sorted(source_files):
+        digest.update(path.encode("utf-8", errors="replace") + b"\0")
+        digest.update(file_hash(source_files, path).encode() + b"\0")
+    options = {
+        "diagram_type": getattr(diagram_type, "value", diagram_type),
+        "file_aliases": file_aliases or {},
+        "model": model_name or "",
+        "ir_version": IR_VERSION,
+    }
+    digest.update(json.dumps(options, sort_keys=True, default=str).encode())
+    return digest.hexdigest()
+
+
+_default_ir_cache = IRCache()
+
+
+def get_default_ir_cache() -> IRCache:
+    """Process-wide instance so separate DiagramService objects share cached IRs."""
+    return _default_ir_cache
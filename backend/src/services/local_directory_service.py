@@ -2,26 +2,20 @@
 
 import os
 import logging
-from typing import Dict, List, Optional
+from typing import Dict, List, Mapping, Optional, Tuple
+from .ingestion_filter import IngestionFilter
+from .source_records import SourceBudget, SourceFiles
 
 logger = logging.getLogger(__name__)
 
 
-# Supported file extensions for source code
-SUPPORTED_EXTENSIONS = [
-    '.py', '.js', '.ts', '.java', '.cpp', '.c', '.cs', 
-    '.php', '.rb', '.go', '.kt', '.swift', '.rs', '.scala', 
-    '.yaml', '.yml', '.tf', '.tfvars'
-]
-
-
 class LocalDirectoryService:
     """Service for handling local directory operations."""
     
     def __init__(self):
-        pass
+        self.last_ingestion_report = None
     
-    def get_source_files(self, directory_path: str, max_files: int = 100) -> Dict[str, str]:
+    def get_source_files(self, directory_path: str, max_files: int = 100) -> Mapping[str, str]:
         """
         Get source code files from local directory.
         
@@ -30,7 +24,22 @@ class LocalDirectoryService:
             max_files: Maximum number of files to process
             
         Returns:
-            Dictionary mapping file paths to file contents
+            Mapping of file paths to file contents (read lazily, see SourceFiles)
+        """
+        source_files, self.last_ingestion_report = self.get_source_files_with_report(directory_path, max_files)
+        return source_files
+    
+    def get_source_files_with_report(self, directory_path: str, max_files: int = 100,
+                                     budget: Optional[SourceBudget] = None) -> Tuple[SourceFiles, Dict]:
+        """
+        Get source code files together with the ingestion report.
+        
+        Unlike get_source_files this keeps no state on the service, so it is safe
+        to call concurrently from several requests. Files are admitted until the
+        byte/token budget is spent and their contents are only kept as records.
+        
+        Returns:
+            Tuple of (lazy file path -> content mapping, ingestion report)
         """
         if not os.path.exists(directory_path):
             raise ValueError(f"Directory does not exist: {directory_path}")
@@ -38,71 +47,22 @@ class LocalDirectoryService:
         if not os.path.isdir(directory_path):
             raise ValueError(f"Path is not a directory: {directory_path}")
         
-        source_files = {}
-        file_count = 0
-        
         logger.info(f"Scanning directory: {directory_path}")
-        logger.info(f"Supported extensions: {SUPPORTED_EXTENSIONS}")
         
+        ingestion_filter = IngestionFilter(skip_directory=self._should_skip_directory)
         try:
-            for root, dirs, files in os.walk(directory_path):
-                # Log directory being processed
-                logger.info(f"Processing directory: {root}")
-                
-                # Skip common non-source directories
-                original_dirs = dirs.copy()
-                dirs[:] = [d for d in dirs if not self._should_skip_directory(d)]
-                
-                if len(dirs) != len(original_dirs):
-                    skipped = set(original_dirs) - set(dirs)
-                    logger.info(f"Skipped directories: {skipped}")
-                
-                logger.info(f"Will process subdirectories: {dirs}")
-                
-                for file in files:
-                    if file_count >= max_files:
-                        logger.warning(f"Reached maximum file limit ({max_files})")
-                        break
-                    
-                    # Log each file being checked
-                    logger.debug(f"Checking file: {file}")
-                    
-                    # Check if file has supported extension
-                    if any(file.lower().endswith(ext) for ext in SUPPORTED_EXTENSIONS):
-                        file_path = os.path.join(root, file)
-                        relative_path = os.path.relpath(file_path, directory_path)
-                        
-                        logger.info(f"Found supported file: {relative_path}")
-                        
-                        try:
-                            with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
-                                content = f.read()
-                                
-                                # Skip very large files (>100KB)
-                                if len(content) > 100000:
-                                    logger.warning(f"Skipping large file: {relative_path}")
-                                    continue
-                                
-                                source_files[relative_path] = content
-                                file_count += 1
-                                logger.info(f"Added file {file_count}: {relative_path}")
-                                
-                        except Exception as e:
-                            logger.warning(f"Could not read file {relative_path}: {str(e)}")
-                            continue
-                    else:
-                        logger.debug(f"Skipped unsupported file: {file}")
-                
-                if file_count >= max_files:
-                    break
+            source_files = SourceFiles(ingestion_filter.iter_source_records(
+                directory_path, max_files, budget or SourceBudget()
+            ))
             
+            report = ingestion_filter.report()
             logger.info(f"Found {len(source_files)} source files in {directory_path}")
-            logger.info(f"Files found: {list(source_files.keys())}")
-            return source_files
+            logger.info(f"Ingestion report: {report}")
+            return source_files, report
             
         except Exception as e:
             logger.error(f"Error reading source files: {str(e)}")
-            return {}
+            return SourceFiles(()), ingestion_filter.report()
     
     def get_directory_info(self, directory_path: str) -> Dict[str, str]:
         """
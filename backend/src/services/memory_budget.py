@@ -0,0 +1,204 @@
+"""Per-request memory accounting and graceful degradation before running out of memory.
+
+The estimates are deliberately simple: every string is assumed to cost about
+one byte per character (source code is mostly ASCII) and the prompt is
+counted PROMPT_COPIES times, for the text of each genai Part plus the
+serialized request the SDK builds from it.
+"""
+
+import logging
+import os
+import re
+import sys
+from collections.abc import Mapping
+from typing import Dict, List, Optional
+from .partitioning import DEFINITION_RE
+from .source_records import SourceFiles, SourceRecord, file_size
+
+logger = logging.getLogger(__name__)
+
+
+# Lambda exports the configured MemorySize; UML_MEMORY_LIMIT_MB overrides it
+DEFAULT_MEMORY_LIMIT_MB = int(os.getenv("UML_MEMORY_LIMIT_MB") or os.getenv("AWS_LAMBDA_FUNCTION_MEMORY_SIZE") or "1024")
+# Interpreter, SDKs and pools; measured ~150 MB warm, with margin for thread stacks and HTTP buffers
+DEFAULT_RESERVED_MB = int(os.getenv("UML_MEMORY_RESERVED_MB", "320"))
+
+# Raw body plus the parsed strings
+BODY_PARSE_FACTOR = 2
+PROMPT_COPIES = 3
+# File header line and Part object per prompt file
+PROMPT_FILE_OVERHEAD = 256
+RESPONSE_RESERVE = 2 * 1024 * 1024
+
+MEMORY_LIMIT_ERROR = "Memory limit exceeded"
+
+# Low-priority files are dropped first, tier by tier, largest first
+TEST_PATH_RE = re.compile(
+    r'(^|/)(tests?|specs?|__tests__|testing)/|(^|/)test_[^/]*$|_test\.\w+$|\.(test|spec)\.\w+$|(^|/)conftest\.py$',
+    re.IGNORECASE
+)
+EXAMPLE_PATH_RE = re.compile(
+    r'(^|/)(examples?|samples?|demos?|docs?|fixtures|migrations|scripts|benchmarks?)/', re.IGNORECASE
+)
+CONFIG_EXTENSIONS = ('.yaml', '.yml', '.tfvars')
+
+SKELETON_LINE_RE = re.compile(
+    r'^[ \t]*(?:@\w|import\b|from[ \t]+\S+[ \t]+import\b|using\b|package\b|#include\b|namespace\b|'
+    r'(?:public|private|protected|internal)\b.*[({]|[\w.]+[ \t]*[:=][ \t]*require\()'
+)
+
+
+class MemoryLimitExceeded(RuntimeError):
+    """The request cannot be served within the memory limit, even degraded."""
+
+    def __init__(self, message: str, report: Dict):
+        super().__init__(message)
+        self.report = report
+
+
+class MemoryBudget:
+    """Ledger of the estimated live bytes of one request."""
+
+    def __init__(self, limit_mb: Optional[int] = None, reserved_mb: Optional[int] = None):
+        """
+        Args:
+            limit_mb: Memory of the function or process (default DEFAULT_MEMORY_LIMIT_MB)
+            reserved_mb: Part of the limit used by the runtime itself (default DEFAULT_RESERVED_MB)
+        """
+        limit_mb = DEFAULT_MEMORY_LIMIT_MB if limit_mb is None else limit_mb
+        reserved_mb = DEFAULT_RESERVED_MB if reserved_mb is None else reserved_mb
+        self.limit_bytes = limit_mb * 1024 * 1024
+        self.available_bytes = max(0, (limit_mb - reserved_mb) * 1024 * 1024)
+        self.ledger: Dict[str, int] = {}
+        self.peak_bytes = 0
+        self.steps: List[Dict] = []
+
+    @property
+    def live_bytes(self) -> int:
+        return sum(self.ledger.values())
+
+    def charge(self, label: str, nbytes: int):
+        self.ledger[label] = self.ledger.get(label, 0) + nbytes
+        self.peak_bytes = max(self.peak_bytes, self.live_bytes)
+
+    def release(self, label: str):
+        self.ledger.pop(label, None)
+
+    def fits(self, extra: int = 0) -> bool:
+        return self.live_bytes + extra <= self.available_bytes
+
+    def report(self) -> Dict:
+        mb = 1024 * 1024
+        return {
+            "limit_mb": round(self.limit_bytes / mb, 1),
+            "available_mb": round(self.available_bytes / mb, 1),
+            "estimated_peak_mb": round(self.peak_bytes / mb, 2),
+            "ledger_mb": {label: round(nbytes / mb, 2) for label, nbytes in self.ledger.items()},
+            "steps": self.steps,
+        }
+
+
+def body_fits(body_bytes: int, budget: Optional[MemoryBudget] = None) -> bool:
+    """Whether a request body can even be parsed within the budget (checked before parsing)."""
+    budget = budget or MemoryBudget()
+    return body_bytes * BODY_PARSE_FACTOR + RESPONSE_RESERVE <= budget.available_bytes
+
+
+def source_bytes(source_files: Mapping) -> int:
+    """Bytes held by a source mapping: string objects, or only records when lazy (plus all text once read_once)."""
+    if isinstance(source_files, SourceFiles):
+        records = sum(sys.getsizeof(record) + len(record.path) for record in source_files.records.values())
+        return records + (source_files.total_bytes if source_files.memo is not None else 0)
+    return sum(sys.getsizeof(content) + len(path) for path, content in source_files.items())
+
+
+def prompt_bytes(source_files: Mapping, paths: Optional[List[str]] = None) -> int:
+    """Estimated bytes of the prompt built from the given files."""
+    paths = list(source_files) if paths is None else paths
+    return sum(file_size(source_files, path) + PROMPT_FILE_OVERHEAD for path in paths) * PROMPT_COPIES
+
+
+def file_priority(path: str) -> int:
+    """0 for tests, 1 for examples/docs/scripts, 2 for configuration, 3 for everything else."""
+    normalized = path.replace('\\', '/')
+    if TEST_PATH_RE.search(normalized):
+        return 0
+    if EXAMPLE_PATH_RE.search(normalized):
+        return 1
+    if normalized.lower().endswith(CONFIG_EXTENSIONS):
+        return 2
+    return 3
+
+
+def extract_skeleton(content: str) -> str:
+    """Keep imports, annotations and type/function signatures; drop bodies."""
+    lines = [line.rstrip() for line in content.splitlines()
+             if SKELETON_LINE_RE.match(line) or DEFINITION_RE.match(line)]
+    return "\n".join(lines) + ("\n" if lines else "")
+
+
+def fit_prompt(source_files: Mapping, budget: MemoryBudget) -> Mapping:
+    """
+    Degrade the prompt files until their estimated cost fits the budget.
+
+    Steps, each only when still needed: drop test, example and configuration
+    files (largest first), then reduce the largest remaining files to their
+    skeleton. The steps taken are recorded in budget.steps.
+
+    Returns:
+        Files to send, charged to the budget as "prompt"
+
+    Raises:
+        MemoryLimitExceeded: If the skeletons alone still do not fit
+    """
+    paths = list(source_files)
+    cost = prompt_bytes(source_files, paths)
+    if budget.fits(cost + RESPONSE_RESERVE):
+        budget.charge("prompt", cost)
+        return source_files
+
+    # 1. Drop low-priority files
+    dropped = []
+    for tier in (0, 1, 2):
+        candidates = sorted((path for path in paths if file_priority(path) == tier),
+                            key=lambda path: -file_size(source_files, path))
+        for path in candidates:
+            if budget.fits(cost + RESPONSE_RESERVE) or len(paths) == 1:
+                break
+            paths.remove(path)
+            dropped.append(path)
+            cost -= (file_size(source_files, path) + PROMPT_FILE_OVERHEAD) * PROMPT_COPIES
+    if dropped:
+        budget.steps.append({"step": "drop_low_priority", "files": dropped})
+
+    # 2. Skeletons of the largest files
+    skeletons: Dict[str, str] = {}
+    for path in sorted(paths, key=lambda path: -file_size(source_files, path)):
+        if budget.fits(cost + RESPONSE_RESERVE):
+            break
+        skeleton = extract_skeleton(source_files[path])
+        cost -= (file_size(source_files, path) - len(skeleton)) * PROMPT_COPIES
+        skeletons[path] = skeleton
+    if skeletons:
+        budget.steps.append({"step": "skeleton", "files": list(skeletons)})
+
+    if not budget.fits(cost + RESPONSE_RESERVE):
+        budget.steps.append({"step": "reject", "estimated_prompt_mb": round(cost / 2 ** 20, 2)})
+        raise MemoryLimitExceeded(
+            f"{MEMORY_LIMIT_ERROR}: the prompt needs ~{cost // 2 ** 20} MB even reduced to signatures, "
+            f"{budget.available_bytes // 2 ** 20} MB available. Send fewer files or use filters.subpath / filters.focus.",
+            budget.report()
+        )
+
+    budget.charge("prompt", cost)
+    logger.warning(f"Prompt degraded to fit memory: dropped {len(dropped)} files, {len(skeletons)} reduced to skeletons")
+    return _with_contents(source_files, paths, skeletons)
+
+
+def _with_contents(source_files: Mapping, paths: List[str], replacements: Dict[str, str]) -> Mapping:
+    if isinstance(source_files, SourceFiles):
+        return SourceFiles(
+            SourceRecord.from_content(path, replacements[path]) if path in replacements else source_files.records[path]
+            for path in paths
+        )
+    return {path: replacements.get(path, source_files[path]) for path in paths}
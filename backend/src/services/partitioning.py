@@ -0,0 +1,251 @@
+"""Split large source sets into per-package partitions with a linked overview."""
+
+import logging
+import math
+import os
+import re
+from collections import Counter, defaultdict
+from typing import Dict, List, Optional, Tuple
+from xml.sax.saxutils import quoteattr
+from .source_records import file_size
+
+logger = logging.getLogger(__name__)
+
+
+# A partition must stay small enough for a quick generation and a fast render
+DEFAULT_PARTITION_MAX_FILES = int(os.getenv("UML_PARTITION_MAX_FILES", "25"))
+DEFAULT_PARTITION_MAX_CHARS = int(os.getenv("UML_PARTITION_MAX_CHARS", "200000"))
+ROOT_PARTITION_ID = "root"
+
+# Type and function definitions across the supported languages
+DEFINITION_RE = re.compile(
+    r'^[ \t]*(?:export[ \t]+)?(?:(?:public|private|protected|internal|abstract|final|static|sealed|data|async)[ \t]+)*'
+    r'(?:class|interface|struct|enum|trait|object|record|def|func|function|fn|module|resource)[ \t]+"?([A-Za-z_]\w*)',
+    re.MULTILINE
+)
+IDENTIFIER_RE = re.compile(r'[A-Za-z_]\w*')
+MIN_DEFINITION_LENGTH = 3
+
+
+class Partition:
+    """A group of files from one package (directory) of the source tree."""
+
+    def __init__(self, partition_id: str, title: str, files: List[str], chars: int):
+        self.id = partition_id
+        self.title = title
+        self.files = files
+        self.chars = chars
+
+    def index_entry(self) -> Dict:
+        return {
+            "id": self.id,
+            "title": self.title,
+            "files": self.files,
+            "file_count": len(self.files),
+            "chars": self.chars,
+        }
+
+
+class PartitionPlan:
+    """Partitions of a source set plus the dependencies between them."""
+
+    def __init__(self, partitions: List[Partition], edges: List[Tuple[str, str, int]]):
+        self.partitions = partitions
+        self.edges = edges
+        self.by_id = {partition.id: partition for partition in partitions}
+
+    def get(self, partition_id: str) -> Optional[Partition]:
+        return self.by_id.get(partition_id)
+
+    def index(self) -> List[Dict]:
+        """Navigation index for response metadata."""
+        return [partition.index_entry() for partition in self.partitions]
+
+    def edge_list(self) -> List[Dict]:
+        return [{"from": source, "to": target, "weight": weight} for source, target, weight in self.edges]
+
+    def render_overview(self, output_format: str) -> str:
+        """
+        Overview diagram with one node per partition and its dependencies.
+
+        Args:
+            output_format: 'mermaid', 'plantuml' or 'drawio'
+
+        Returns:
+            Diagram code in the requested format
+        """
+        renderers = {
+            "mermaid": self._render_mermaid,
+            "plantuml": self._render_plantuml,
+            "drawio": self._render_drawio,
+        }
+        if output_format not in renderers:
+            raise ValueError(f"Unsupported output format for overview: {output_format}")
+        return renderers[output_format]()
+
+    def _node_ids(self) -> Dict[str, str]:
+        return {partition.id: f"p{i}" for i, partition in enumerate(self.partitions)}
+
+    def _render_mermaid(self) -> str:
+        node_ids = self._node_ids()
+        lines = ["flowchart LR"]
+        for partition in self.partitions:
+            label = partition.title.replace('"', "#quot;")
+            lines.append(f'    {node_ids[partition.id]}["{label}<br/>{len(partition.files)} archivos"]')
+        for source, target, weight in self.edges:
+            lines.append(f"    {node_ids[source]} -->|{weight}| {node_ids[target]}")
+        return "\n".join(lines) + "\n"
+
+    def _render_plantuml(self) -> str:
+        node_ids = self._node_ids()
+        lines = ["@startuml"]
+        for partition in self.partitions:
+            label = partition.title.replace('"', "'")
+            lines.append(f'package "{label} ({len(partition.files)} archivos)" as {node_ids[partition.id]} {{')
+            lines.append("}")
+        for source, target, weight in self.edges:
+            lines.append(f"{node_ids[source]} ..> {node_ids[target]} : {weight}")
+        lines.append("@enduml")
+        return "\n".join(lines) + "\n"
+
+    def _render_drawio(self) -> str:
+        node_ids = self._node_ids()
+        columns = max(1, math.ceil(math.sqrt(len(self.partitions))))
+        width, height, gap = 200, 70, 60
+
+        cells = ['<mxCell id="0"/>', '<mxCell id="1" parent="0"/>']
+        for i, partition in enumerate(self.partitions):
+            x = (i % columns) * (width + gap) + 40
+            y = (i // columns) * (height + gap) + 40
+            value = quoteattr(f"{partition.title}\n{len(partition.files)} archivos")
+            cells.append(
+                f'<mxCell id="{node_ids[partition.id]}" value={value} '
+                f'style="shape=folder;tabWidth=60;tabHeight=14;whiteSpace=wrap;html=0;" vertex="1" parent="1">'
+                f'<mxGeometry x="{x}" y="{y}" width="{width}" height="{height}" as="geometry"/></mxCell>'
+            )
+        for i, (source, target, weight) in enumerate(self.edges):
+            cells.append(
+                f'<mxCell id="e{i}" value="{weight}" style="endArrow=open;dashed=1;html=0;" edge="1" parent="1" '
+                f'source="{node_ids[source]}" target="{node_ids[target]}">'
+                f'<mxGeometry relative="1" as="geometry"/></mxCell>'
+            )
+
+        return (
+            '<mxfile host="EduUML"><diagram id="overview" name="Overview"><mxGraphModel><root>'
+            + "".join(cells)
+            + "</root></mxGraphModel></diagram></mxfile>"
+        )
+
+
+def plan_partitions(source_files: Dict[str, str],
+                    max_files: int = DEFAULT_PARTITION_MAX_FILES,
+                    max_chars: int = DEFAULT_PARTITION_MAX_CHARS) -> PartitionPlan:
+    """
+    Group files by directory, descending into subdirectories until each group
+    fits the budget. The result depends only on the paths and sizes, so a
+    follow-up request for one partition finds the same ids.
+
+    Args:
+        source_files: Mapping of relative path -> content
+        max_files: Maximum files per partition
+        max_chars: Maximum characters per partition
+
+    Returns:
+        PartitionPlan with partitions in path order
+    """
+    sizes = {path.replace('\\', '/'): file_size(source_files, path) for path in source_files}
+    original = {path.replace('\\', '/'): path for path in source_files}
+
+    groups = _split((), sorted(sizes), sizes, max_files, max_chars)
+    partitions = []
+    for prefix, chunk_index, chunk_count, paths in groups:
+        partition_id = "/".join(prefix) or ROOT_PARTITION_ID
+        title = partition_id if prefix else "(raíz)"
+        if chunk_count > 1:
+            partition_id = f"{partition_id}~{chunk_index}"
+            title = f"{title} ({chunk_index}/{chunk_count})"
+        files = [original[path] for path in paths]
+        partitions.append(Partition(partition_id, title, files, sum(sizes[path] for path in paths)))
+
+    edges = _dependency_edges(partitions, source_files)
+    logger.info(f"Partitioned {len(source_files)} files into {len(partitions)} partitions with {len(edges)} dependencies")
+    return PartitionPlan(partitions, edges)
+
+
+def needs_partitioning(source_files: Dict[str, str],
+                       max_files: int = DEFAULT_PARTITION_MAX_FILES,
+                       max_chars: int = DEFAULT_PARTITION_MAX_CHARS) -> bool:
+    """True when the files do not fit into a single partition."""
+    if len(source_files) > max_files:
+        return True
+    return sum(file_size(source_files, path) for path in source_files) > max_chars
+
+
+def _split(prefix: Tuple[str, ...], paths: List[str], sizes: Dict[str, int],
+           max_files: int, max_chars: int) -> List[Tuple[Tuple[str, ...], int, int, List[str]]]:
+    if _fits(paths, sizes, max_files, max_chars):
+        return [(prefix, 1, 1, paths)]
+
+    direct = []
+    children = defaultdict(list)
+    for path in paths:
+        parts = path.split('/')
+        if len(parts) > len(prefix) + 1:
+            children[parts[len(prefix)]].append(path)
+        else:
+            direct.append(path)
+
+    groups = []
+    if direct:
+        groups.extend(_chunk(prefix, direct, sizes, max_files, max_chars))
+    for name in sorted(children):
+        groups.extend(_split(prefix + (name,), children[name], sizes, max_files, max_chars))
+    return groups
+
+
+def _chunk(prefix: Tuple[str, ...], paths: List[str], sizes: Dict[str, int],
+           max_files: int, max_chars: int) -> List[Tuple[Tuple[str, ...], int, int, List[str]]]:
+    """Split the files directly inside one directory into budget-sized chunks."""
+    chunks = [[]]
+    chars = 0
+    for path in paths:
+        if chunks[-1] and (len(chunks[-1]) >= max_files or chars + sizes[path] > max_chars):
+            chunks.append([])
+            chars = 0
+        chunks[-1].append(path)
+        chars += sizes[path]
+    return [(prefix, i + 1, len(chunks), chunk) for i, chunk in enumerate(chunks)]
+
+
+def _fits(paths: List[str], sizes: Dict[str, int], max_files: int, max_chars: int) -> bool:
+    return len(paths) <= max_files and sum(sizes[path] for path in paths) <= max_chars
+
+
+def _dependency_edges(partitions: List[Partition], source_files: Dict[str, str]) -> List[Tuple[str, str, int]]:
+    """Count references from each partition to names defined in another one."""
+    defined_in = {}
+    ambiguous = set()
+    # One read per file: definitions and identifiers come from the same text
+    identifiers = {}
+    for partition in partitions:
+        used = identifiers[partition.id] = set()
+        for path in partition.files:
+            content = source_files[path]
+            used.update(IDENTIFIER_RE.findall(content))
+            for name in DEFINITION_RE.findall(content):
+                if len(name) < MIN_DEFINITION_LENGTH:
+                    continue
+                owner = defined_in.setdefault(name, partition.id)
+                if owner != partition.id:
+                    ambiguous.add(name)
+    for name in ambiguous:
+        del defined_in[name]
+
+    edges = Counter()
+    for partition in partitions:
+        for name in identifiers[partition.id]:
+            owner = defined_in.get(name)
+            if owner is not None and owner != partition.id:
+                edges[(partition.id, owner)] += 1
+
+    return [(source, target, weight) for (source, target), weight in sorted(edges.items())]
@@ -0,0 +1,129 @@
+"""Coalescing of identical in-flight generation requests."""
+
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import threading
+from concurrent.futures import Future
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class SingleFlight:
+    """Run one call per key at a time and share its outcome with concurrent callers.
+
+    Calls are tracked with concurrent.futures.Future objects, so a generation
+    started by a worker thread can be awaited by an asyncio task and vice versa.
+    Nothing is cached: once the leading call finishes, the key is released and
+    the next request starts a fresh generation.
+    """
+
+    def __init__(self):
+        self._calls: Dict[str, Future] = {}
+        self._lock = threading.Lock()
+
+    def do(self, key: str, fn: Callable[[], Any]) -> Tuple[Any, bool]:
+        """
+        Call fn, or wait for the identical call already in flight.
+
+        Returns:
+            Tuple of (result, shared) where shared is True for followers
+        """
+        future, leader = self._join(key)
+        if not leader:
+            return future.result(), True
+
+        self._run(key, future, fn)
+        return future.result(), False
+
+    async def ado(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Tuple[Any, bool]:
+        """Async variant of do; fn returns the awaitable to run when leading."""
+        future, leader = self._join(key)
+        if not leader:
+            return await asyncio.wrap_future(future), True
+
+        try:
+            result = await fn()
+        except BaseException as e:
+            self._finish(key, future, exception=e)
+            raise
+        self._finish(key, future, result=result)
+        return result, False
+
+    def in_flight(self) -> int:
+        with self._lock:
+            return len(self._calls)
+
+    def _join(self, key: str) -> Tuple[Future, bool]:
+        with self._lock:
+            future = self._calls.get(key)
+            if future is not None:
+                return future, False
+            future = Future()
+            self._calls[key] = future
+            return future, True
+
+    def _run(self, key: str, future: Future, fn: Callable[[], Any]):
+        try:
+            result = fn()
+        except BaseException as e:
+            self._finish(key, future, exception=e)
+            raise
+        self._finish(key, future, result=result)
+
+    def _finish(self, key: str, future: Future, result: Any = None, exception: Optional[BaseException] = None):
+        # Release the key first so late arrivals start a new call instead of
+        # joining one whose result has already been handed out
+        with self._lock:
+            self._calls.pop(key, None)
+        if exception is not None:
+            future.set_exception(exception)
+        else:
+            future.set_result(result)
+
+
+def coalescing_key(request: Any, model_name: Optional[str] = None) -> str:
+    """
+    Digest identifying requests that would produce the same diagram.
+
+    Args:
+        request: AnalysisRequest
+        model_name: Model that will serve the request
+
+    Returns:
+        Hex digest over the source, diagram type, output format, filters and model
+    """
+    digest = hashlib.sha256()
+
+    if request.repo_url:
+        source = "repo:" + request.repo_url.strip().rstrip('/').lower()
+        if source.endswith('.git'):
+            source = source[:-4]
+        digest.update(source.encode())
+    elif request.local_directory:
+        digest.update(("dir:" + os.path.realpath(request.local_directory)).encode())
+    elif request.code_files:
+        digest.update(b"files:")
+        for path in sorted(request.code_files):
+            digest.update(path.encode("utf-8", errors="replace") + b"\0")
+            digest.update(hashlib.sha256((request.code_files[path] or "").encode("utf-8", errors="replace")).digest())
+
+    options = {
+        "diagram_type": getattr(request.diagram_type, "value", request.diagram_type),
+        "output_format": getattr(request.output_format, "value", request.output_format),
+        "filters": request.filters or {},
+        "model": model_name or "",
+    }
+    digest.update(json.dumps(options, sort_keys=True, default=str).encode())
+    return digest.hexdigest()
+
+
+_default_single_flight = SingleFlight()
+
+
+def get_default_single_flight() -> SingleFlight:
+    """Process-wide instance so separate DiagramService objects coalesce too."""
+    return _default_single_flight
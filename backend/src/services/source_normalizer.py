@@ -0,0 +1,474 @@
+"""Language-aware comment, docstring and whitespace stripping before prompting.
+
+Comments, blank lines and trailing whitespace are removed and indentation is
+reduced to one space per level, for every language in SUPPORTED_EXTENSIONS.
+Lines are never joined or reordered and string literals are left untouched,
+so the code keeps its structure (also where indentation is syntax, as in
+Python) and every kept line reads as it did in the original file.
+"""
+
+import logging
+import math
+import os
+import re
+from collections.abc import Mapping
+from typing import Dict, List, Optional, Tuple
+from ..models import DiagramType
+from .source_records import LANGUAGES, SourceFiles, SourceRecord, content_hash
+
+logger = logging.getLogger(__name__)
+
+# On by default; filters.strip_comments overrides it per request
+STRIP_COMMENTS = os.getenv("UML_STRIP_COMMENTS", "1").lower() not in ("0", "false", "no")
+# Diagram types that read intent from documentation (filters.keep_docstrings overrides it per request)
+KEEP_DOCSTRINGS_FOR = {
+    value.strip() for value in os.getenv("UML_KEEP_DOCSTRINGS_FOR", DiagramType.USE_CASE.value).split(",")
+    if value.strip()
+}
+
+# String literal kinds: closed on the same line, may span lines, or a single (escaped) character
+LINE = "line"
+MULTILINE = "multiline"
+CHAR = "char"
+
+CHAR_LITERAL_RE = re.compile(r"'(?:\\[^\n']{1,10}|[^'\\\n])'")
+# What may follow a Python string statement on its line for it to be a docstring
+DOCSTRING_TAIL_RE = re.compile(r'[ \t]*(?:#[^\n]*)?(?:\n|$)')
+DOCSTRING_PREFIX_RE = re.compile(r'[ \t]*[rRuU]?')
+BLOCK_COMMENT_TOKEN_RE = re.compile(r'/\*|\*/')
+BEGIN_END_CLOSE_RE = re.compile(r'^=end\b[^\n]*', re.MULTILINE)
+YAML_BLOCK_SCALAR_RE = re.compile(r'(?:^|[:-])[ \t]+[|>][-+0-9]*[ \t]*(?:#.*)?$')
+# A JavaScript regex literal: escapes and [classes] may hold '/', the literal cannot span lines
+REGEX_LITERAL_RE = re.compile(r'/(?![*/])(?:\\.|\[(?:\\.|[^\]\\\n])*\]|[^/\\\[\n])+/[a-z]*')
+# Code a '/' may follow as a regex literal rather than as a division
+REGEX_PRECEDING_RE = re.compile(
+    r'(?:^|[(,=:\[!&|?{};+\-*%<>~^]|\b(?:return|typeof|instanceof|in|of|new|delete|void|throw|case|do|else|'
+    r'yield|await))[ \t]*$'
+)
+
+
+class CommentSyntax:
+    """Comment and string delimiters of one language."""
+
+    def __init__(self, line_comments: Tuple[str, ...] = (), block_comments: bool = False,
+                 nested_blocks: bool = False, strings: Tuple[Tuple[str, str], ...] = (),
+                 doc_comments: Tuple[str, ...] = (), full_line_docs: bool = False,
+                 docstring_statements: bool = False, indent_sensitive: bool = False,
+                 hash_attributes: bool = False, begin_end_blocks: bool = False, regex_literals: bool = False):
+        """
+        Args:
+            line_comments: Markers of comments running to the end of the line
+            block_comments: Has /* ... */ comments
+            nested_blocks: Block comments nest (Rust, Swift, Kotlin, Scala)
+            strings: (delimiter, kind) pairs, longer delimiters first
+            doc_comments: Comment prefixes that are documentation (/**, ///)
+            full_line_docs: Any comment on a line of its own is documentation (Go, Ruby)
+            docstring_statements: A string literal alone on its line is a docstring (Python)
+            indent_sensitive: Indentation is syntax, so continuation lines inside braces do not count
+            hash_attributes: #[ starts an attribute, not a comment (PHP 8)
+            begin_end_blocks: =begin ... =end block comments (Ruby)
+            regex_literals: /.../ regex literals, which may contain // (JavaScript, TypeScript)
+        """
+        self.line_comments = line_comments
+        self.block_comments = block_comments
+        self.nested_blocks = nested_blocks
+        self.strings = strings
+        self.doc_comments = doc_comments
+        self.full_line_docs = full_line_docs
+        self.docstring_statements = docstring_statements
+        self.indent_sensitive = indent_sensitive
+        self.hash_attributes = hash_attributes
+        self.begin_end_blocks = begin_end_blocks
+        self.regex_literals = regex_literals
+
+        tokens = ['\n', '(', ')', '[', ']', '{', '}', *line_comments, *(delimiter for delimiter, _ in strings)]
+        if block_comments:
+            tokens.append('/*')
+        if regex_literals:
+            tokens.append('/')
+        pattern = '|'.join(re.escape(token) for token in sorted(set(tokens), key=len, reverse=True))
+        if begin_end_blocks:
+            pattern = r'^=begin\b|' + pattern
+        self.special = re.compile(pattern, re.MULTILINE)
+        self.string_kinds = dict(strings)
+        self.string_ends = {
+            delimiter: re.compile(r'\\.|' + re.escape(delimiter) + ('' if kind == MULTILINE else r'|\n'), re.DOTALL)
+            for delimiter, kind in strings if kind != CHAR
+        }
+
+
+C_DOCS = ('/**', '///', '//!')
+C_STRINGS = (('"', LINE), ("'", CHAR))
+
+SYNTAXES = {
+    'python': CommentSyntax(('#',), strings=(('"""', MULTILINE), ("'''", MULTILINE), ('"', LINE), ("'", LINE)),
+                            docstring_statements=True, indent_sensitive=True),
+    'javascript': CommentSyntax(('//',), True, strings=(('`', MULTILINE), ('"', LINE), ("'", LINE)),
+                                doc_comments=C_DOCS, regex_literals=True),
+    'typescript': CommentSyntax(('//',), True, strings=(('`', MULTILINE), ('"', LINE), ("'", LINE)),
+                                doc_comments=C_DOCS, regex_literals=True),
+    'java': CommentSyntax(('//',), True, strings=(('"""', MULTILINE),) + C_STRINGS, doc_comments=C_DOCS),
+    'c': CommentSyntax(('//',), True, strings=C_STRINGS, doc_comments=C_DOCS),
+    'cpp': CommentSyntax(('//',), True, strings=C_STRINGS, doc_comments=C_DOCS),
+    'csharp': CommentSyntax(('//',), True, strings=C_STRINGS, doc_comments=C_DOCS),
+    'php': CommentSyntax(('//', '#'), True, strings=(('"', MULTILINE), ("'", MULTILINE)), doc_comments=C_DOCS,
+                         hash_attributes=True),
+    'ruby': CommentSyntax(('#',), strings=(('"', MULTILINE), ("'", MULTILINE)), full_line_docs=True,
+                          begin_end_blocks=True),
+    'go': CommentSyntax(('//',), True, strings=(('`', MULTILINE),) + C_STRINGS, full_line_docs=True),
+    'kotlin': CommentSyntax(('//',), True, True, strings=(('"""', MULTILINE),) + C_STRINGS, doc_comments=C_DOCS),
+    'swift': CommentSyntax(('//',), True, True, strings=(('"""', MULTILINE), ('"', LINE)), doc_comments=C_DOCS),
+    'rust': CommentSyntax(('//',), True, True, strings=(('"', MULTILINE), ("'", CHAR)), doc_comments=C_DOCS),
+    'scala': CommentSyntax(('//',), True, True, strings=(('"""', MULTILINE),) + C_STRINGS, doc_comments=C_DOCS),
+    'terraform': CommentSyntax(('#', '//'), True, strings=(('"', LINE),)),
+}
+
+
+def keeps_docstrings(diagram_type) -> bool:
+    """Whether docstrings stay in the prompt for this diagram type by default."""
+    return getattr(diagram_type, "value", diagram_type) in KEEP_DOCSTRINGS_FOR
+
+
+def normalize_source(path: str, content: str, keep_docstrings: bool = False) -> str:
+    """
+    Strip comments, blank lines and excess indentation from one file.
+
+    Files in a language without a known syntax are returned unchanged.
+
+    Args:
+        path: Relative path; its extension selects the language
+        content: File text
+        keep_docstrings: Keep documentation (docstrings, /** */, /// and, in Go
+            and Ruby, comments on a line of their own) while dropping the rest
+    """
+    language = LANGUAGES.get(os.path.splitext(path)[1].lower())
+    if language == 'yaml':
+        return _normalize_yaml(content)
+    syntax = SYNTAXES.get(language)
+    if syntax is None:
+        return content
+    return _assemble(_Scanner(content, syntax, keep_docstrings).scan(), syntax.indent_sensitive)
+
+
+class SourceNormalizer:
+    """Normalizes the prompt files of a request and reports the reduction per language."""
+
+    def __init__(self, keep_docstrings: bool = False):
+        self.keep_docstrings = keep_docstrings
+
+    def normalize(self, source_files: Mapping) -> Tuple[Mapping, Dict]:
+        """
+        Lazy SourceFiles stay lazy: each file is normalized when it is read, so
+        their report has the sizes before normalization only.
+
+        Returns:
+            Tuple of (normalized files, report)
+        """
+        if isinstance(source_files, SourceFiles):
+            return self._normalize_lazy(source_files)
+
+        contents: Dict[str, str] = {}
+        languages: Dict[str, Dict] = {}
+        for path in source_files:
+            content = source_files[path]
+            normalized = normalize_source(path, content, self.keep_docstrings)
+            contents[path] = normalized
+            language = LANGUAGES.get(os.path.splitext(path)[1].lower()) or "other"
+            stats = languages.setdefault(language, {"files": 0, "chars_before": 0, "chars_after": 0})
+            stats["files"] += 1
+            stats["chars_before"] += len(content)
+            stats["chars_after"] += len(normalized)
+
+        for stats in languages.values():
+            stats["reduction"] = _reduction(stats["chars_before"], stats["chars_after"])
+        before = sum(stats["chars_before"] for stats in languages.values())
+        after = sum(stats["chars_after"] for stats in languages.values())
+        report = {
+            "files": len(contents),
+            "keep_docstrings": self.keep_docstrings,
+            "chars_before": before,
+            "chars_after": after,
+            "reduction": _reduction(before, after),
+            "languages": languages,
+        }
+        logger.info(f"Normalized {len(contents)} files: {before} -> {after} characters")
+        return contents, report
+
+    def _normalize_lazy(self, source_files: SourceFiles) -> Tuple[SourceFiles, Dict]:
+        records = []
+        languages: Dict[str, Dict] = {}
+        for record in source_files.records.values():
+            # The original size stays as an upper bound; the hash only has to change with content and options
+            records.append(SourceRecord(
+                record.path, record.size, content_hash(f"normalized:{int(self.keep_docstrings)}:{record.hash}"),
+                record.language, NormalizedLoader(record, self.keep_docstrings)
+            ))
+            stats = languages.setdefault(record.language or "other", {"files": 0, "chars_before": 0})
+            stats["files"] += 1
+            stats["chars_before"] += record.size
+        report = {
+            "files": len(records),
+            "keep_docstrings": self.keep_docstrings,
+            "deferred": True,
+            "chars_before": source_files.total_bytes,
+            "languages": languages,
+        }
+        return SourceFiles(records), report
+
+
+class NormalizedLoader:
+    """Picklable loader normalizing a source record's text each time it is read."""
+
+    __slots__ = ("record", "keep_docstrings")
+
+    def __init__(self, record: SourceRecord, keep_docstrings: bool):
+        self.record = record
+        self.keep_docstrings = keep_docstrings
+
+    def __call__(self) -> str:
+        return normalize_source(self.record.path, self.record.load(), self.keep_docstrings)
+
+
+def _reduction(before: int, after: int) -> float:
+    return round(1 - after / before, 3) if before else 0.0
+
+
+class _Line:
+    __slots__ = ("text", "starts_in_string", "ends_in_string", "structural")
+
+    def __init__(self, text: str, starts_in_string: bool, ends_in_string: bool, structural: bool):
+        self.text = text
+        self.starts_in_string = starts_in_string
+        self.ends_in_string = ends_in_string
+        # Starts a statement: its indentation is the block's, not an alignment
+        self.structural = structural
+
+
+class _Scanner:
+    """Single pass over the text that copies code and strings and skips comments."""
+
+    def __init__(self, content: str, syntax: CommentSyntax, keep_docstrings: bool):
+        self.content = content
+        self.syntax = syntax
+        self.keep_docstrings = keep_docstrings
+        self.lines: List[_Line] = []
+        self.pieces: List[str] = []
+        self.starts_in_string = False
+        self.structural = True
+        self.depth = 0
+
+    def scan(self) -> List[_Line]:
+        content = self.content
+        index = 0
+        while index < len(content):
+            match = self.syntax.special.search(content, index)
+            if match is None:
+                self.pieces.append(content[index:])
+                break
+            self.pieces.append(content[index:match.start()])
+            index = self._token(match.start(), match.group())
+        self._end_line()
+        return self.lines
+
+    def _token(self, start: int, token: str) -> int:
+        """Handle the token at start; returns where scanning continues."""
+        if token == '\n':
+            self._end_line()
+        elif token in '([{':
+            if token != '{' or self.syntax.indent_sensitive:
+                self.depth += 1
+            self.pieces.append(token)
+        elif token in ')]}':
+            if token != '}' or self.syntax.indent_sensitive:
+                self.depth = max(0, self.depth - 1)
+            self.pieces.append(token)
+        elif token == '/*':
+            return self._block_comment(start)
+        elif token == '/':
+            return self._regex_or_division(start)
+        elif token.startswith('=begin'):
+            return self._begin_end_comment(start)
+        elif token in self.syntax.line_comments:
+            return self._line_comment(start, token)
+        else:
+            return self._string(start, token)
+        return start + len(token)
+
+    def _end_line(self, in_string: bool = False, in_comment: bool = False):
+        text = ''.join(self.pieces)
+        self.lines.append(_Line(text, self.starts_in_string, in_string, self.structural))
+        self.pieces = []
+        self.starts_in_string = in_string
+        continued = text.rstrip().endswith('\\')
+        self.structural = not (in_string or in_comment or continued) and self.depth == 0
+
+    def _emit(self, text: str, in_string: bool = False, in_comment: bool = False):
+        """Copy text that may span lines."""
+        parts = text.split('\n')
+        for part in parts[:-1]:
+            self.pieces.append(part)
+            self._end_line(in_string, in_comment)
+        self.pieces.append(parts[-1])
+
+    def _line_start(self) -> bool:
+        return not ''.join(self.pieces).strip()
+
+    def _line_comment(self, start: int, marker: str) -> int:
+        content = self.content
+        if self.syntax.hash_attributes and content.startswith('#[', start):
+            self.pieces.append('#')
+            return start + 1
+        end = content.find('\n', start)
+        if end < 0:
+            end = len(content)
+        if self.keep_docstrings and (any(content.startswith(doc, start) for doc in self.syntax.doc_comments)
+                                     or (self.syntax.full_line_docs and self._line_start())):
+            self.pieces.append(content[start:end])
+        return end
+
+    def _regex_or_division(self, start: int) -> int:
+        match = REGEX_LITERAL_RE.match(self.content, start)
+        if match and REGEX_PRECEDING_RE.search(''.join(self.pieces)):
+            # Copied as is, like a string: a // or /* inside it is not a comment
+            self.pieces.append(match.group())
+            return match.end()
+        self.pieces.append('/')
+        return start + 1
+
+    def _block_comment(self, start: int) -> int:
+        content = self.content
+        if self.syntax.nested_blocks:
+            level = 0
+            end = len(content)
+            for match in BLOCK_COMMENT_TOKEN_RE.finditer(content, start):
+                level += 1 if match.group() == '/*' else -1
+                if level == 0:
+                    end = match.end()
+                    break
+        else:
+            close = content.find('*/', start + 2)
+            end = len(content) if close < 0 else close + 2
+        return self._skip_comment(start, end, is_doc=content.startswith('/**', start)
+                                  and not content.startswith('/**/', start))
+
+    def _begin_end_comment(self, start: int) -> int:
+        match = BEGIN_END_CLOSE_RE.search(self.content, start)
+        return self._skip_comment(start, match.end() if match else len(self.content), is_doc=False)
+
+    def _skip_comment(self, start: int, end: int, is_doc: bool) -> int:
+        text = self.content[start:end]
+        if self.keep_docstrings and is_doc:
+            self._emit(text, in_comment=True)
+        elif '\n' in text:
+            # Keep the line breaks: code before and after the comment stays on separate lines
+            for _ in range(text.count('\n')):
+                self._end_line(in_comment=True)
+        else:
+            # One space between the code on either side, none before the indentation or after the code
+            before = ''.join(self.pieces)
+            if before.strip():
+                self.pieces = [before.rstrip(' \t') + ('' if self.content[end:end + 1] in ' \t\n' else ' ')]
+        return end
+
+    def _string(self, start: int, delimiter: str) -> int:
+        end = self._string_end(start, delimiter)
+        if end is None:
+            # Not a literal after all (an apostrophe, a Rust lifetime): copy the character
+            self.pieces.append(delimiter[0])
+            return start + 1
+
+        if (self.syntax.docstring_statements and not self.keep_docstrings and self.structural and self.depth == 0
+                and DOCSTRING_PREFIX_RE.fullmatch(''.join(self.pieces))
+                and DOCSTRING_TAIL_RE.match(self.content, end)):
+            # A string statement does nothing but document: drop it with its prefix
+            self.pieces = []
+            return end
+
+        self._emit(self.content[start:end], in_string=True)
+        return end
+
+    def _string_end(self, start: int, delimiter: str) -> Optional[int]:
+        """End of the literal opening at start, or None if it is not one."""
+        kind = self.syntax.string_kinds[delimiter]
+        if kind == CHAR:
+            match = CHAR_LITERAL_RE.match(self.content, start)
+            return match.end() if match else None
+        pattern = self.syntax.string_ends[delimiter]
+        index = start + len(delimiter)
+        while True:
+            match = pattern.search(self.content, index)
+            if match is None:
+                return len(self.content) if kind == MULTILINE else None
+            if match.group() == delimiter:
+                return match.end()
+            if match.group() == '\n':
+                return None
+            index = match.end()
+
+
+def _assemble(lines: List[_Line], indent_sensitive: bool = False) -> str:
+    """Join the scanned lines without blank ones, trailing whitespace or excess indentation."""
+    lines = [line for line in lines if line.starts_in_string or line.ends_in_string or line.text.strip()]
+    code = [line for line in lines if not line.starts_in_string]
+
+    # Indentation is divided by the unit of the block structure, unless it uses tabs
+    unit = 0
+    if not any('\t' in line.text[:_indent(line.text)] for line in code):
+        for line in code:
+            if line.structural:
+                unit = math.gcd(unit, _indent(line.text))
+    if indent_sensitive:
+        lines = _fill_empty_blocks(lines, unit if unit > 1 else 4)
+
+    result = []
+    for line in lines:
+        text = line.text
+        if not line.ends_in_string:
+            text = text.rstrip()
+        if not line.starts_in_string and unit > 1:
+            indent = _indent(text)
+            text = ' ' * (indent // unit + indent % unit) + text[indent:]
+        result.append(text)
+    return '\n'.join(result) + ('\n' if result else '')
+
+
+def _fill_empty_blocks(lines: List[_Line], unit: int) -> List[_Line]:
+    """Give a body of ... to the blocks that only held a docstring, so the Python still parses."""
+    result = []
+    statement_indent = 0
+    for index, line in enumerate(lines):
+        result.append(line)
+        if line.starts_in_string:
+            continue
+        if line.structural:
+            statement_indent = _indent(line.text)
+        if line.ends_in_string or not line.text.rstrip().endswith(':'):
+            continue
+        following = lines[index + 1] if index + 1 < len(lines) else None
+        if following is None or (following.structural and _indent(following.text) <= statement_indent):
+            result.append(_Line(' ' * (statement_indent + unit) + '...', False, False, True))
+    return result
+
+
+def _indent(text: str) -> int:
+    return len(text) - len(text.lstrip(' \t'))
+
+
+def _normalize_yaml(content: str) -> str:
+    """Drop comment and blank lines, leaving block scalars (| and >) untouched."""
+    result = []
+    block_indent = None
+    for line in content.splitlines():
+        stripped = line.strip()
+        indent = len(line) - len(line.lstrip())
+        if block_indent is not None:
+            if not stripped or indent > block_indent:
+                result.append(line)
+                continue
+            block_indent = None
+        if not stripped or stripped.startswith('#'):
+            continue
+        result.append(line.rstrip())
+        if YAML_BLOCK_SCALAR_RE.search(line):
+            block_indent = indent
+    return '\n'.join(result) + ('\n' if result else '')
@@ -0,0 +1,206 @@
+"""Compact source file records with lazily loaded content."""
+
+import hashlib
+import os
+from collections.abc import Mapping
+from typing import Callable, Dict, Iterable, Iterator, Optional
+from .token_estimator import estimate_tokens_from_length
+
+# Total size of the files accepted from one source; the scan stops adding files
+# past either budget (Gemini's context window is ~1M tokens)
+DEFAULT_MAX_TOTAL_BYTES = int(os.getenv("UML_SOURCE_MAX_BYTES", str(4 * 1024 * 1024)))
+DEFAULT_MAX_TOTAL_TOKENS = int(os.getenv("UML_SOURCE_MAX_TOKENS", "800000"))
+
+LANGUAGES = {
+    '.py': 'python', '.js': 'javascript', '.ts': 'typescript', '.java': 'java',
+    '.cpp': 'cpp', '.c': 'c', '.cs': 'csharp', '.php': 'php', '.rb': 'ruby',
+    '.go': 'go', '.kt': 'kotlin', '.swift': 'swift', '.rs': 'rust', '.scala': 'scala',
+    '.yaml': 'yaml', '.yml': 'yaml', '.tf': 'terraform', '.tfvars': 'terraform',
+}
+
+
+def content_hash(content: str) -> str:
+    """SHA-256 of the text, the same digest deduplication uses."""
+    return hashlib.sha256(content.encode('utf-8', 'surrogatepass')).hexdigest()
+
+
+class FileLoader:
+    """Picklable loader reading one file as text (same decoding as the scan)."""
+
+    __slots__ = ("file_path",)
+
+    def __init__(self, file_path: str):
+        self.file_path = file_path
+
+    def __call__(self) -> str:
+        with open(self.file_path, 'r', encoding='utf-8', errors='ignore') as f:
+            return f.read()
+
+
+class SourceRecord:
+    """Metadata of one accepted source file; the text is read again only when needed."""
+
+    __slots__ = ("path", "size", "hash", "language", "_loader")
+
+    def __init__(self, path: str, size: int, digest: str, language: Optional[str], loader: Callable[[], str]):
+        self.path = path
+        self.size = size
+        self.hash = digest
+        self.language = language
+        self._loader = loader
+
+    @classmethod
+    def from_content(cls, path: str, content: str, loader: Optional[Callable[[], str]] = None) -> 'SourceRecord':
+        """
+        Record for content that was just read.
+
+        Args:
+            path: Relative path
+            content: Text, used for size and hash only unless no loader is given
+            loader: Reads the text again later; without one the text is kept in memory
+        """
+        return cls(
+            path, len(content), content_hash(content), LANGUAGES.get(os.path.splitext(path)[1].lower()),
+            loader or (lambda: content)
+        )
+
+    def load(self) -> str:
+        return self._loader()
+
+    def __repr__(self) -> str:
+        return f"SourceRecord({self.path!r}, size={self.size}, language={self.language!r})"
+
+
+class MemoLoader:
+    """Loader reading a record's text once, then serving it from a memo shared by one request."""
+
+    __slots__ = ("record", "memo")
+
+    def __init__(self, record: SourceRecord, memo: Dict[str, str]):
+        self.record = record
+        self.memo = memo
+
+    def __call__(self) -> str:
+        content = self.memo.get(self.record.path)
+        if content is None:
+            content = self.memo[self.record.path] = self.record.load()
+        return content
+
+
+class SourceBudget:
+    """Total byte and token allowance for the files of one request."""
+
+    def __init__(self, max_bytes: int = DEFAULT_MAX_TOTAL_BYTES, max_tokens: int = DEFAULT_MAX_TOTAL_TOKENS):
+        self.max_bytes = max_bytes
+        self.max_tokens = max_tokens
+        self.used_bytes = 0
+        self.used_tokens = 0
+
+    def admit(self, size: int) -> Optional[str]:
+        """Reserve room for a file of `size` characters, or return the skip reason."""
+        tokens = estimate_tokens_from_length(size)
+        if self.used_bytes + size > self.max_bytes:
+            return 'byte_budget'
+        if self.used_tokens + tokens > self.max_tokens:
+            return 'token_budget'
+        self.used_bytes += size
+        self.used_tokens += tokens
+        return None
+
+    def report(self) -> Dict:
+        return {
+            "max_bytes": self.max_bytes,
+            "used_bytes": self.used_bytes,
+            "max_tokens": self.max_tokens,
+            "used_tokens": self.used_tokens,
+        }
+
+
+class SourceFiles(Mapping):
+    """
+    Read-only path -> content mapping over SourceRecords.
+
+    Works wherever a Dict[str, str] of sources is expected, but holds only the
+    records: each lookup reads the file again and nothing is cached, so the
+    full text of a repository exists only while the prompt is being packed.
+    read_once() gives one request a view that reads each file at most once.
+    """
+
+    def __init__(self, records: Iterable[SourceRecord]):
+        self.records = {record.path: record for record in records}
+        # Text read through a read_once() view, until forget()
+        self.memo: Optional[Dict[str, str]] = None
+
+    def __getitem__(self, path: str) -> str:
+        return self.records[path].load()
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.records)
+
+    def __len__(self) -> int:
+        return len(self.records)
+
+    @property
+    def total_bytes(self) -> int:
+        return sum(record.size for record in self.records.values())
+
+    def subset(self, paths: Iterable[str]) -> 'SourceFiles':
+        view = SourceFiles(self.records[path] for path in paths)
+        view.memo = self.memo
+        return view
+
+    def read_once(self) -> 'SourceFiles':
+        """View whose files (and subsets') are read at most once and kept until forget()."""
+        memo: Dict[str, str] = {}
+        view = SourceFiles(
+            SourceRecord(record.path, record.size, record.hash, record.language, MemoLoader(record, memo))
+            for record in self.records.values()
+        )
+        view.memo = memo
+        return view
+
+    def forget(self):
+        """Drop the text kept by a read_once() view."""
+        if self.memo is not None:
+            self.memo.clear()
+
+    def materialize(self) -> Dict[str, str]:
+        """Load every file into a plain dict (e.g. before the files are deleted)."""
+        return {path: record.load() for path, record in self.records.items()}
+
+    def __repr__(self) -> str:
+        return f"SourceFiles({len(self.records)} files, {self.total_bytes} bytes)"
+
+
+def subset(source_files: Mapping, paths: Iterable[str]) -> Mapping:
+    """The given paths of a source mapping, without loading lazy contents."""
+    if isinstance(source_files, SourceFiles):
+        return source_files.subset(paths)
+    return {path: source_files[path] for path in paths}
+
+
+def read_once(source_files: Mapping) -> Mapping:
+    """Per-request view of a source mapping reading each lazy file at most once."""
+    if isinstance(source_files, SourceFiles):
+        return source_files.read_once()
+    return source_files
+
+
+def forget(source_files: Mapping):
+    """Drop the text kept by read_once(); plain dicts are left alone."""
+    if isinstance(source_files, SourceFiles):
+        source_files.forget()
+
+
+def file_size(source_files: Mapping, path: str) -> int:
+    """Length of one file's text, without loading it when the mapping is lazy."""
+    if isinstance(source_files, SourceFiles):
+        return source_files.records[path].size
+    return len(source_files[path])
+
+
+def file_hash(source_files: Mapping, path: str) -> str:
+    """content_hash of one file, without loading it when the mapping is lazy."""
+    if isinstance(source_files, SourceFiles):
+        return source_files.records[path].hash
+    return content_hash(source_files[path])
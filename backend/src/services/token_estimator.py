@@ -0,0 +1,16 @@
+"""Cheap token estimates used for prompt budgeting and reporting."""
+
+# Rough average for source code with the Gemini tokenizer
+CHARS_PER_TOKEN = 4
+
+
+def estimate_tokens(text: str) -> int:
+    """Estimate the number of prompt tokens for a piece of text."""
+    return estimate_tokens_from_length(len(text) if text else 0)
+
+
+def estimate_tokens_from_length(length: int) -> int:
+    """Estimate the prompt tokens of a text of `length` characters without the text itself."""
+    if not length:
+        return 0
+    return max(1, length // CHARS_PER_TOKEN)
@@ -1,5 +1,7 @@
 """Pytest configuration for tests."""
 
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 import pytest
 
 # Configure pytest-asyncio
@@ -11,3 +13,59 @@ def pytest_configure(config):
     config.addinivalue_line(
         "markers", "asyncio: mark test as an asyncio test"
     )
+
+
+class _StandInHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_HEAD(self):
+        self._respond(head=True)
+
+    def do_GET(self):
+        self._respond(head=False)
+
+    def _respond(self, head):
+        server = self.server
+        with server.lock:
+            server.hits[self.path] = server.hits.get(self.path, 0) + 1
+            server.connections.add(self.client_address)
+            server.active += 1
+            server.peak = max(server.peak, server.active)
+        try:
+            route = server.routes.get(self.path)
+            if route is None:
+                status, headers, body = 404, {}, b""
+            else:
+                status, headers, body = route(self, server.hits[self.path])
+            self.send_response(status)
+            for name, value in headers.items():
+                self.send_header(name, value)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            if not head:
+                self.wfile.write(body)
+        finally:
+            with server.lock:
+                server.active -= 1
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def http_stand_in():
+    """Local HTTP server; tests register `routes[path] = fn(handler, hit) -> (status, headers, body)`."""
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), _StandInHandler)
+    httpd.daemon_threads = True
+    httpd.lock = threading.Lock()
+    httpd.hits = {}
+    httpd.connections = set()
+    httpd.active = 0
+    httpd.peak = 0
+    httpd.routes = {}
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    httpd.base_url = f"http://127.0.0.1:{httpd.server_address[1]}"
+    yield httpd
+    httpd.shutdown()
+    httpd.server_close()
@@ -0,0 +1,153 @@
+"""Unit tests for admission control."""
+
+import json
+import threading
+import time
+import pytest
+from unittest.mock import Mock
+from src.handlers.main_handler import handle_event
+from src.services.admission import (
+    AdmissionController, AdmissionRejected, PRIORITY_LARGE, PRIORITY_MEDIUM, PRIORITY_SMALL,
+    client_id_from_event, request_priority
+)
+
+
+def queue_requests(controller, requests, order):
+    """Start one thread per (client_id, priority) and wait until all are queued."""
+    def run(client_id, priority, label):
+        with controller.admit(client_id, priority):
+            order.append(label)
+
+    threads = []
+    for client_id, priority, label in requests:
+        thread = threading.Thread(target=run, args=(client_id, priority, label))
+        thread.start()
+        threads.append(thread)
+        while len(controller._waiters) < len(threads):
+            time.sleep(0.001)
+    return threads
+
+
+class TestAdmissionController:
+    """Test cases for AdmissionController."""
+
+    def test_admits_immediately_when_idle(self):
+        """Test that requests below the concurrency limit never queue."""
+        controller = AdmissionController(max_concurrency=2)
+
+        with controller.admit("a") as first, controller.admit("b") as second:
+            assert first["queued_seconds"] == 0.0
+            assert second["queued_seconds"] == 0.0
+            assert controller.running == 2
+
+        assert controller.running == 0
+        assert controller.snapshot()["stats"] == {"admitted": 2}
+
+    def test_rejects_when_wait_exceeds_deadline(self):
+        """Test the fast 429 path with a retry hint."""
+        controller = AdmissionController(max_concurrency=1, service_time=10, deadline=15)
+
+        with controller.admit("a"):
+            with pytest.raises(AdmissionRejected) as excinfo:
+                with controller.admit("b"):
+                    pass
+
+        assert excinfo.value.retry_after == 5
+        assert controller.snapshot()["stats"]["rejected_deadline"] == 1
+
+    def test_rejects_when_queue_full(self):
+        """Test that the wait queue is bounded."""
+        controller = AdmissionController(max_concurrency=1, max_queue=0)
+
+        with controller.admit("a"):
+            with pytest.raises(AdmissionRejected, match="already queued"):
+                with controller.admit("b"):
+                    pass
+
+    def test_small_payloads_first(self):
+        """Test that a small request overtakes a queued full-repository request."""
+        controller = AdmissionController(max_concurrency=1, service_time=0.01)
+        order = []
+
+        with controller.admit("x"):
+            threads = queue_requests(controller, [
+                ("a", PRIORITY_LARGE, "repo"),
+                ("b", PRIORITY_MEDIUM, "folder"),
+                ("c", PRIORITY_SMALL, "snippet"),
+            ], order)
+
+        for thread in threads:
+            thread.join()
+        assert order == ["snippet", "folder", "repo"]
+
+    def test_fair_share_between_clients(self):
+        """Test that one client's burst does not starve another client."""
+        controller = AdmissionController(max_concurrency=1, service_time=0.01)
+        order = []
+
+        with controller.admit("x"):
+            threads = queue_requests(controller, [
+                ("a", PRIORITY_SMALL, "a1"),
+                ("a", PRIORITY_SMALL, "a2"),
+                ("a", PRIORITY_SMALL, "a3"),
+                ("b", PRIORITY_SMALL, "b1"),
+            ], order)
+
+        for thread in threads:
+            thread.join()
+        assert order == ["a1", "b1", "a2", "a3"]
+
+    def test_service_time_estimate_tracks_runs(self):
+        """Test that the moving average follows observed generation times."""
+        controller = AdmissionController(service_time=10)
+
+        with controller.admit("a"):
+            pass
+
+        assert controller.service_time < 10
+
+
+class TestRequestClassification:
+    """Test client identification and priority classes."""
+
+    def test_client_id_from_event(self):
+        """Test that the source IP wins unless trusted proxies are configured."""
+        forwarded = {
+            "headers": {"X-Forwarded-For": "10.9.9.9, 10.0.0.1, 172.16.0.1"},
+            "requestContext": {"http": {"sourceIp": "192.168.1.1"}}
+        }
+        # A client-supplied header does not change the identity
+        assert client_id_from_event(forwarded) == "192.168.1.1"
+        # Behind two proxies only the hop the outer one appended counts, not the spoofed first one
+        assert client_id_from_event(forwarded, trusted_proxies=2) == "10.0.0.1"
+        assert client_id_from_event(forwarded, trusted_proxies=4) == "192.168.1.1"
+        assert client_id_from_event({"requestContext": {"http": {"sourceIp": "192.168.1.1"}}}) == "192.168.1.1"
+        assert client_id_from_event({"requestContext": {"identity": {"sourceIp": "192.168.1.2"}}}) == "192.168.1.2"
+        assert client_id_from_event({}) == "anonymous"
+
+    def test_request_priority(self):
+        """Test size based priority classes."""
+        assert request_priority({"code_files": {"a.py": "x"}}) == PRIORITY_SMALL
+        assert request_priority({"code_files": {"a.py": "x" * 300000}}) == PRIORITY_MEDIUM
+        assert request_priority({"repo_url": "https://github.com/u/r"}) == PRIORITY_LARGE
+        assert request_priority({"repo_url": "https://github.com/u/r", "filters": {"subpath": "src"}}) == PRIORITY_MEDIUM
+
+
+class TestHandlerAdmission:
+    """Test the 429 contract of handle_event."""
+
+    def test_busy_returns_429_with_retry_after(self):
+        """Test that a rejected request gets 429 and never reaches the service."""
+        controller = AdmissionController(max_concurrency=1, service_time=60, deadline=30)
+        service = Mock()
+        event = {"body": json.dumps({
+            "code_files": {"a.py": "class A: pass"}, "diagram_type": "class", "output_format": "mermaid"
+        })}
+
+        with controller.admit("other"):
+            response = handle_event(event, service, controller)
+
+        assert response["statusCode"] == 429
+        assert int(response["headers"]["Retry-After"]) >= 1
+        assert json.loads(response["body"])["success"] is False
+        service.generate_diagram.assert_not_called()
@@ -0,0 +1,127 @@
+"""Unit tests for the asyncio pipeline."""
+
+import asyncio
+import json
+import os
+import time
+from unittest.mock import patch
+from src.models import AnalysisRequest, DiagramType, OutputFormat
+from src.services.diagram_service import DiagramService
+from src.services.async_diagram_service import AsyncDiagramService
+
+
+def make_request(**overrides):
+    fields = {
+        'code_files': {'user.py': 'class User:\n    pass\n'},
+        'diagram_type': DiagramType.CLASS,
+        'output_format': OutputFormat.MERMAID,
+    }
+    fields.update(overrides)
+    return AnalysisRequest(**fields)
+
+
+class FakeAsyncProvider:
+    """Provider exposing async methods that record their concurrency."""
+
+    def __init__(self, delay=0.05):
+        self.delay = delay
+        self.active = 0
+        self.peak = 0
+
+    def generate_diagram_from_source_files(self, *args, **kwargs):
+        raise AssertionError("sync method should not be used")
+
+    async def agenerate_diagram_from_source_files(self, source_files, diagram_type, output_format, file_aliases=None):
+        self.active += 1
+        self.peak = max(self.peak, self.active)
+        await asyncio.sleep(self.delay)
+        self.active -= 1
+        return f"classDiagram\n    class {len(source_files)}", "analysis"
+
+
+class FakeSyncProvider:
+    """Provider with only blocking methods."""
+
+    def generate_diagram_from_source_files(self, source_files, diagram_type, output_format, file_aliases=None):
+        time.sleep(0.01)
+        return "classDiagram", "sync analysis"
+
+    def generate_diagram_from_github_url(self, repo_url, diagram_type, output_format):
+        return "classDiagram", f"from {repo_url}"
+
+
+class TestAsyncDiagramService:
+    """Test cases for AsyncDiagramService."""
+
+    def test_bounded_concurrency(self):
+        """Test that generations overlap but never exceed max_concurrency."""
+        provider = FakeAsyncProvider()
+        service = AsyncDiagramService(DiagramService(llm_provider=provider), max_concurrency=3)
+
+        responses = asyncio.run(service.generate_many([
+            make_request(code_files={f'user{i}.py': f'class User{i}:\n    pass\n'}) for i in range(9)
+        ]))
+
+        assert all(response.success for response in responses)
+        assert provider.peak == 3
+        assert responses[0].metadata['llm_metadata'] == "analysis"
+
+    def test_sync_provider_runs_in_thread(self):
+        """Test the fallback for providers without async methods."""
+        service = AsyncDiagramService(DiagramService(llm_provider=FakeSyncProvider()))
+
+        response = service.generate_diagram_sync(make_request())
+        github = service.generate_diagram_sync(make_request(code_files=None, repo_url='https://github.com/u/r'))
+
+        assert response.success is True
+        assert response.metadata['llm_metadata'] == "sync analysis"
+        assert github.metadata['llm_metadata'] == "from https://github.com/u/r"
+
+    def test_local_directory(self, tmp_path):
+        """Test that local directories are read off the event loop."""
+        (tmp_path / 'order.py').write_text('class Order:\n    pass\n')
+        service = AsyncDiagramService(DiagramService(llm_provider=FakeAsyncProvider(delay=0)))
+
+        response = service.generate_diagram_sync(make_request(code_files=None, local_directory=str(tmp_path)))
+
+        assert response.success is True
+        assert response.metadata['files_analyzed'] == 1
+        assert response.metadata['ingestion']['files_accepted'] == 1
+
+    def test_no_provider(self):
+        """Test the error response when no provider is configured."""
+        diagram_service = DiagramService(llm_provider=FakeSyncProvider())
+        diagram_service.llm_provider = None
+
+        response = AsyncDiagramService(diagram_service).generate_diagram_sync(make_request())
+
+        assert response.success is False
+        assert response.error == "LLM provider not available"
+
+
+class TestGeminiProviderAsync:
+    """Test the provider's aio code path with a fake SDK client."""
+
+    def test_agenerate_diagram_from_source_files(self):
+        """Test that the async method uses client.aio and parses the JSON reply."""
+        from src.llm.gemini_provider import GeminiProvider
+
+        class FakeModels:
+            async def generate_content(self, model, contents, config):
+                self.contents = contents
+                return type('Response', (), {'text': json.dumps({
+                    'metadata': 'explicación', 'codigoUML': '```mermaid\nclassDiagram\n```'
+                })})()
+
+        with patch.dict(os.environ, {'GOOGLE_API_KEY': 'test-key'}):
+            provider = GeminiProvider()
+        models = FakeModels()
+        provider.router.backends[0].client = type('Client', (), {'aio': type('Aio', (), {'models': models})()})()
+
+        code, metadata = asyncio.run(provider.agenerate_diagram_from_source_files(
+            {'a.py': 'class A: pass'}, DiagramType.CLASS, OutputFormat.MERMAID, file_aliases={'a.py': ['b.py']}
+        ))
+
+        assert code == "classDiagram\n"
+        assert metadata == 'explicación'
+        assert 'also stands for' in models.contents.parts[1].text
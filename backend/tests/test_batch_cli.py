@@ -0,0 +1,374 @@
+"""Unit tests for the offline batch runner."""
+
+import json
+import os
+import threading
+import time
+import zipfile
+import pytest
+from concurrent.futures import ThreadPoolExecutor
+import src.handlers.batch_cli as batch_cli
+from src.handlers.batch_cli import BatchRunner, ingest_source, load_jobs
+from src.models import DiagramResponse
+
+
+def make_submissions(root, count=3):
+    """One folder per student plus a ZIP archive."""
+    for i in range(count):
+        folder = root / f"alumno-{i}"
+        folder.mkdir()
+        (folder / "model.py").write_text(f"class Alumno{i}:\n    pass\n")
+    with zipfile.ZipFile(root / "zipped.zip", "w") as archive:
+        archive.writestr("zipped-main/app.py", "class App:\n    pass\n")
+    return root
+
+
+class FakeService:
+    """DiagramService stand-in recording calls and overlapping generations."""
+
+    def __init__(self, delay=0.0, fail=()):
+        self.delay = delay
+        self.fail = set(fail)
+        self.calls = []
+        self.active = 0
+        self.peak = 0
+        self._lock = threading.Lock()
+        self.llm_provider = None
+
+    def generate_from_sources(self, request, source_files, source_info, ingestion_report=None):
+        with self._lock:
+            self.calls.append((source_info['name'], request.diagram_type.value))
+            self.active += 1
+            self.peak = max(self.peak, self.active)
+        time.sleep(self.delay)
+        with self._lock:
+            self.active -= 1
+        if source_info['name'] in self.fail:
+            return DiagramResponse(diagram_code="", format=request.output_format, metadata={}, success=False,
+                                   error="quota exceeded")
+        return DiagramResponse(diagram_code=f"@startuml\n' {sorted(source_files)}\n@enduml",
+                               format=request.output_format, metadata={"files_analyzed": len(source_files)},
+                               success=True)
+
+    def generate_diagram(self, request):
+        self.calls.append((request.repo_url, request.diagram_type.value))
+        return DiagramResponse(diagram_code="@startuml\n@enduml", format=request.output_format, metadata={},
+                               success=True)
+
+    def _prepare_prompt_files(self, request, source_files):
+        return source_files, {}, {}
+
+
+class FakeBatchProvider:
+    """Provider whose batch jobs finish after a number of polls."""
+
+    def __init__(self, polls_until_done=1, errors=()):
+        self.polls_until_done = polls_until_done
+        self.errors = list(errors)
+        self.jobs = {}
+        self.polls = 0
+
+    def build_batch_request(self, source_files, diagram_type, output_format, file_aliases=None):
+        return {"files": sorted(source_files), "diagram_type": diagram_type.value}
+
+    def submit_batch(self, requests, display_name):
+        name = f"batches/{len(self.jobs)}"
+        self.jobs[name] = requests
+        return "key0", name
+
+    def poll_batch(self, key_id, name, output_formats):
+        self.polls += 1
+        if self.errors:
+            raise self.errors.pop(0)
+        if self.polls < self.polls_until_done:
+            return None
+        return [(f"@startuml\n' {request['files']}\n@enduml", "batch analysis", None) for request in self.jobs[name]]
+
+
+def thread_pool(workers):
+    return ThreadPoolExecutor(max_workers=workers)
+
+
+def read_result(out_dir, job_id):
+    with open(os.path.join(out_dir, f"{job_id}.json")) as f:
+        return json.load(f)
+
+
+class TestLoadJobs:
+    """Test manifest expansion."""
+
+    def test_directory_of_submissions(self, tmp_path):
+        """Test one job per folder/ZIP and diagram type."""
+        make_submissions(tmp_path)
+
+        jobs = load_jobs(str(tmp_path), ["class", "sequence"], "mermaid")
+
+        assert len(jobs) == 8
+        assert jobs[0].id == "alumno-0-class-mermaid"
+        assert {job.id for job in jobs if job.source.endswith(".zip")} == {
+            "zipped-class-mermaid", "zipped-sequence-mermaid"
+        }
+
+    def test_manifest_with_defaults(self, tmp_path):
+        """Test a JSON manifest with defaults and relative sources."""
+        manifest = tmp_path / "manifest.json"
+        manifest.write_text(json.dumps({
+            "defaults": {"diagram_types": ["component"], "output_format": "drawio"},
+            "items": [
+                {"id": "a", "source": "repos/a"},
+                {"source": "https://github.com/user/repo", "diagram_type": "class", "output_format": "mermaid"},
+            ]
+        }))
+
+        jobs = load_jobs(str(manifest))
+
+        assert [job.id for job in jobs] == ["a-component-drawio", "repo-class-mermaid"]
+        assert jobs[0].source == str(tmp_path / "repos" / "a")
+        assert jobs[1].is_github
+
+    def test_jsonl_and_duplicates(self, tmp_path):
+        """Test JSON Lines manifests and job id collisions."""
+        manifest = tmp_path / "manifest.jsonl"
+        manifest.write_text('{"source": "x/a"}\n\n{"source": "y/a"}\n')
+
+        with pytest.raises(ValueError, match="Duplicate job id"):
+            load_jobs(str(manifest))
+
+
+class TestIngestSource:
+    """Test the ingestion worker function."""
+
+    def test_zip_archive(self, tmp_path):
+        """Test that archives are extracted, read and cleaned up."""
+        make_submissions(tmp_path, count=0)
+
+        ingested = ingest_source(str(tmp_path / "zipped.zip"))
+
+        assert list(ingested["source_files"].values()) == ["class App:\n    pass\n"]
+        assert ingested["source_info"]["type"] == "zip_archive"
+
+    def test_unknown_source(self, tmp_path):
+        """Test that a missing path is rejected."""
+        with pytest.raises(ValueError):
+            ingest_source(str(tmp_path / "missing"))
+
+
+class TestBatchRunner:
+    """Test BatchRunner."""
+
+    def test_runs_all_and_writes_results(self, tmp_path):
+        """Test results, per-job records and metrics."""
+        (tmp_path / "in").mkdir()
+        jobs = load_jobs(str(make_submissions(tmp_path / "in")))
+        out_dir = str(tmp_path / "out")
+        service = FakeService()
+
+        metrics = BatchRunner(out_dir, service=service, ingest_workers=2, concurrency=2,
+                              executor_factory=thread_pool).run(jobs)
+
+        assert metrics["succeeded"] == 4
+        assert metrics["sources_ingested"] == 4
+        assert metrics["files_ingested"] == 4
+        assert os.path.exists(os.path.join(out_dir, "alumno-0-class-plantuml.puml"))
+        assert read_result(out_dir, "zipped-class-plantuml")["metadata"]["files_analyzed"] == 1
+        with open(os.path.join(out_dir, "metrics.json")) as f:
+            assert json.load(f)["jobs"] == 4
+
+    def test_resume_skips_completed(self, tmp_path):
+        """Test that a re-run only retries failed jobs."""
+        (tmp_path / "in").mkdir()
+        jobs = load_jobs(str(make_submissions(tmp_path / "in")))
+        out_dir = str(tmp_path / "out")
+
+        BatchRunner(out_dir, service=FakeService(fail={"alumno-1"}), ingest_workers=2,
+                    executor_factory=thread_pool).run(jobs)
+        assert read_result(out_dir, "alumno-1-class-plantuml")["success"] is False
+
+        service = FakeService()
+        metrics = BatchRunner(out_dir, service=service, ingest_workers=2, executor_factory=thread_pool).run(jobs)
+
+        assert service.calls == [("alumno-1", "class")]
+        assert metrics["skipped"] == 3
+        assert read_result(out_dir, "alumno-1-class-plantuml")["success"] is True
+
+    def test_skip_failed(self, tmp_path):
+        """Test that retry_failed=False leaves failed jobs alone."""
+        (tmp_path / "in").mkdir()
+        jobs = load_jobs(str(make_submissions(tmp_path / "in")))
+        out_dir = str(tmp_path / "out")
+        BatchRunner(out_dir, service=FakeService(fail={"alumno-1"}), executor_factory=thread_pool).run(jobs)
+
+        service = FakeService()
+        BatchRunner(out_dir, service=service, retry_failed=False, executor_factory=thread_pool).run(jobs)
+
+        assert service.calls == []
+
+    def test_bounded_llm_concurrency(self, tmp_path):
+        """Test that no more than `concurrency` generations overlap."""
+        (tmp_path / "in").mkdir()
+        jobs = load_jobs(str(make_submissions(tmp_path / "in", count=6)), ["class", "sequence"])
+        service = FakeService(delay=0.05)
+
+        BatchRunner(str(tmp_path / "out"), service=service, ingest_workers=2, concurrency=3,
+                    executor_factory=thread_pool).run(jobs)
+
+        assert len(service.calls) == 14
+        assert service.peak == 3
+
+    def test_ingestion_error_is_recorded(self, tmp_path):
+        """Test that a missing source fails its jobs without stopping the run."""
+        manifest = tmp_path / "manifest.json"
+        (tmp_path / "ok").mkdir()
+        (tmp_path / "ok" / "a.py").write_text("class A: pass\n")
+        manifest.write_text(json.dumps([{"source": "missing"}, {"source": "ok"}]))
+        out_dir = str(tmp_path / "out")
+
+        metrics = BatchRunner(out_dir, service=FakeService(), executor_factory=thread_pool).run(
+            load_jobs(str(manifest))
+        )
+
+        assert metrics["failed"] == 1 and metrics["succeeded"] == 1
+        assert "Ingestion failed" in read_result(out_dir, "missing-class-plantuml")["error"]
+
+    def test_github_sources_use_online_path(self, tmp_path):
+        """Test that GitHub URLs skip ingestion and go through generate_diagram."""
+        manifest = tmp_path / "manifest.json"
+        manifest.write_text(json.dumps([{"source": "https://github.com/user/repo"}]))
+        service = FakeService()
+
+        BatchRunner(str(tmp_path / "out"), service=service, executor_factory=thread_pool).run(load_jobs(str(manifest)))
+
+        assert service.calls == [("https://github.com/user/repo", "class")]
+
+    def test_process_pool_ingestion(self, tmp_path):
+        """Test the default process pool."""
+        (tmp_path / "in").mkdir()
+        jobs = load_jobs(str(make_submissions(tmp_path / "in", count=2)))
+
+        metrics = BatchRunner(str(tmp_path / "out"), service=FakeService(), ingest_workers=2).run(jobs)
+
+        assert metrics["succeeded"] == 3
+
+
+class TestBatchMode:
+    """Test the provider batch prediction path."""
+
+    def test_submit_poll_and_resume(self, tmp_path, monkeypatch):
+        """Test that open batch jobs survive a restart and are polled, not resubmitted."""
+        (tmp_path / "in").mkdir()
+        jobs = load_jobs(str(make_submissions(tmp_path / "in", count=2)), ["class", "state"])
+        out_dir = str(tmp_path / "out")
+        service = FakeService()
+        provider = service.llm_provider = FakeBatchProvider(polls_until_done=2)
+
+        # First run: the job is submitted, then the process dies while waiting for it
+        def interrupted(_):
+            raise KeyboardInterrupt
+        monkeypatch.setattr(batch_cli.time, "sleep", interrupted)
+        with pytest.raises(KeyboardInterrupt):
+            BatchRunner(out_dir, service=service, executor_factory=thread_pool).run(jobs, batch_mode=True)
+        monkeypatch.undo()
+
+        with open(os.path.join(out_dir, "batches.json")) as f:
+            assert len(json.load(f)["batches"]) == 1
+
+        metrics = BatchRunner(out_dir, service=service, executor_factory=thread_pool).run(
+            jobs, batch_mode=True, poll_seconds=0
+        )
+
+        assert len(provider.jobs) == 1
+        assert len(provider.jobs["batches/0"]) == 6
+        assert metrics["succeeded"] == 6
+        assert service.calls == []
+        result = read_result(out_dir, "zipped-state-plantuml")
+        assert result["mode"] == "batch"
+        assert result["metadata"]["llm_metadata"] == "batch analysis"
+        with open(os.path.join(out_dir, "batches.json")) as f:
+            assert json.load(f)["batches"] == {}
+
+    def test_transient_poll_error_is_retried(self, tmp_path):
+        """Test that a failed check leaves the job open and a later check gets its results."""
+        (tmp_path / "in").mkdir()
+        jobs = load_jobs(str(make_submissions(tmp_path / "in", count=1)))
+        service = FakeService()
+        provider = service.llm_provider = FakeBatchProvider(errors=[TimeoutError("The read operation timed out")])
+
+        metrics = BatchRunner(str(tmp_path / "out"), service=service, executor_factory=thread_pool).run(
+            jobs, batch_mode=True, poll_seconds=0
+        )
+
+        assert provider.polls == 2
+        assert len(provider.jobs) == 1
+        assert metrics["succeeded"] == 2
+
+    def test_terminal_poll_error_fails_jobs(self, tmp_path):
+        """Test that a job that ended badly marks its jobs failed and leaves the state file."""
+        (tmp_path / "in").mkdir()
+        jobs = load_jobs(str(make_submissions(tmp_path / "in", count=1)))
+        out_dir = str(tmp_path / "out")
+        service = FakeService()
+        service.llm_provider = FakeBatchProvider(errors=[RuntimeError("Batch job batches/0 ended in state JOB_STATE_EXPIRED")])
+
+        metrics = BatchRunner(out_dir, service=service, executor_factory=thread_pool).run(
+            jobs, batch_mode=True, poll_seconds=0
+        )
+
+        assert metrics["failed"] == 2
+        assert "JOB_STATE_EXPIRED" in read_result(out_dir, "zipped-class-plantuml")["error"]
+        with open(os.path.join(out_dir, "batches.json")) as f:
+            assert json.load(f)["batches"] == {}
+
+
+class TestGeminiBatchPrediction:
+    """Test GeminiProvider's batch methods with a fake SDK client."""
+
+    def test_submit_and_poll(self):
+        """Test job creation, pending state and parsed results."""
+        from types import SimpleNamespace
+        from src.llm.gemini_provider import GeminiProvider
+        from src.llm.router import Backend, BackendRouter
+        from src.models import DiagramType, OutputFormat
+
+        class FakeBatches:
+            def __init__(self):
+                self.state = "JOB_STATE_RUNNING"
+
+            def create(self, model, src, config):
+                self.model, self.src = model, src
+                return SimpleNamespace(name="batches/1")
+
+            def get(self, name):
+                reply = SimpleNamespace(text=json.dumps({'metadata': 'm', 'codigoUML': '```mermaid\nclassDiagram\n```'}))
+                return SimpleNamespace(
+                    state=SimpleNamespace(name=self.state), error=None,
+                    dest=SimpleNamespace(inlined_responses=[
+                        SimpleNamespace(response=reply, error=None),
+                        SimpleNamespace(response=None, error="RESOURCE_EXHAUSTED"),
+                    ])
+                )
+
+        batches = FakeBatches()
+        provider = GeminiProvider(router=BackendRouter([Backend("key0", "gemini-x", SimpleNamespace(batches=batches))]))
+        request = provider.build_batch_request({'a.py': 'class A: pass'}, DiagramType.CLASS, OutputFormat.MERMAID)
+
+        assert provider.submit_batch([request, request], "eduuml-test") == ("key0", "batches/1")
+        assert batches.model == "gemini-x"
+        assert provider.poll_batch("key0", "batches/1", [OutputFormat.MERMAID] * 2) is None
+
+        batches.state = "JOB_STATE_SUCCEEDED"
+        results = provider.poll_batch("key0", "batches/1", [OutputFormat.MERMAID] * 2)
+
+        assert results[0] == ("classDiagram\n", "m", None)
+        assert results[1][2] == "RESOURCE_EXHAUSTED"
+
+    def test_poll_with_removed_key(self):
+        """Test that polling a job whose key is no longer configured raises RuntimeError."""
+        from types import SimpleNamespace
+        from src.llm.gemini_provider import GeminiProvider
+        from src.llm.router import Backend, BackendRouter
+        from src.models import OutputFormat
+
+        provider = GeminiProvider(router=BackendRouter([Backend("key1", "gemini-x", SimpleNamespace())]))
+
+        with pytest.raises(RuntimeError, match="No configured API key key0 for batch batches/1"):
+            provider.poll_batch("key0", "batches/1", [OutputFormat.MERMAID])
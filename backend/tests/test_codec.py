@@ -0,0 +1,64 @@
+"""Unit tests for the JSON codec and the request fast path."""
+
+import json
+import pytest
+from src import codec
+from src.handlers.main_handler import build_analysis_request
+from src.models import DiagramType
+
+
+class TestCodec:
+    """Test cases for the codec module."""
+
+    def test_round_trip(self):
+        """Test that str and bytes input decode to the same value."""
+        document = {'code_files': {'módulo.py': 'class Ñandú:\n    pass\n'}, 'filters': {'depth': 2}}
+
+        assert codec.loads(codec.dumps(document)) == document
+        assert codec.loads(codec.dumps_bytes(document)) == document
+        assert codec.loads(json.dumps(document).encode('utf-8')) == document
+
+    def test_output_is_standard_json(self):
+        """Test that the stdlib can read what the codec writes."""
+        assert json.loads(codec.dumps({'a': [1, 2.5, None, True], 'b': 'x'})) == {'a': [1, 2.5, None, True], 'b': 'x'}
+
+    def test_invalid_json_raises_value_error(self):
+        """Test that every backend reports bad input as ValueError."""
+        with pytest.raises(ValueError):
+            codec.loads('invalid json {')
+
+    def test_backend_name(self):
+        """Test that the selected backend is reported."""
+        assert codec.BACKEND in ('orjson', 'msgspec', 'json')
+
+
+class TestBuildAnalysisRequest:
+    """Test building requests without re-validating code_files."""
+
+    def make_body(self, **overrides):
+        body = {'code_files': {'a.py': 'class A: pass'}, 'diagram_type': 'class', 'output_format': 'mermaid'}
+        body.update(overrides)
+        return body
+
+    def test_code_files_are_not_copied(self):
+        """Test that the parsed file map is attached as is."""
+        body = self.make_body()
+        request = build_analysis_request(body)
+
+        assert request.code_files is body['code_files']
+        assert request.diagram_type == DiagramType.CLASS
+        assert request.filters == {}
+
+    def test_rejects_non_string_contents(self):
+        """Test that the cheap type check still rejects malformed maps."""
+        with pytest.raises(ValueError):
+            build_analysis_request(self.make_body(code_files={'a.py': 42}))
+        with pytest.raises(ValueError):
+            build_analysis_request(self.make_body(code_files=['a.py']))
+
+    def test_other_fields_are_validated(self):
+        """Test that the remaining fields still go through pydantic."""
+        with pytest.raises(ValueError):
+            build_analysis_request(self.make_body(filters='not a dict'))
+        with pytest.raises(ValueError):
+            build_analysis_request(self.make_body(diagram_type='flowchart'))
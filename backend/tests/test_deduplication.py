@@ -0,0 +1,108 @@
+"""Unit tests for source file deduplication."""
+
+import hashlib
+from src.services.deduplication import SourceDeduplicator, simhash, normalize_tokens, hamming_distance
+
+
+MODULE = '''
+class OrderService:
+    def __init__(self, repository, notifier):
+        self.repository = repository
+        self.notifier = notifier
+
+    def place_order(self, customer, items):
+        order = Order(customer=customer, items=items)
+        self.repository.save(order)
+        self.notifier.send(customer.email, "Order placed")
+        return order
+
+    def cancel_order(self, order_id):
+        order = self.repository.get(order_id)
+        order.status = "cancelled"
+        self.repository.save(order)
+        return order
+'''
+
+
+class TestSourceDeduplicator:
+    """Test cases for SourceDeduplicator."""
+
+    def test_exact_duplicates(self):
+        """Test that byte-identical files collapse onto the first path."""
+        files = {
+            'a/service.py': MODULE,
+            'b/service.py': MODULE,
+            'c/other.py': 'x = 1\n',
+        }
+
+        result, aliases, report = SourceDeduplicator().deduplicate(files)
+
+        assert list(result) == ['a/service.py', 'c/other.py']
+        assert aliases == {'a/service.py': ['b/service.py']}
+        assert report['exact_duplicates'] == 1
+        assert report['chars_saved'] == len(MODULE)
+        assert report['tokens_saved'] > 0
+
+    def test_near_duplicates(self):
+        """Test that a copy with small edits collapses onto the original."""
+        edited = MODULE.replace('"Order placed"', '"Pedido creado"').replace('    ', '  ')
+        edited = edited.replace('    order.status = "cancelled"\n', '    order.status = "cancelled"\n    order.cancelled_at = now()\n')
+        files = {
+            'app/service.py': MODULE,
+            'copy/service.py': edited,
+        }
+
+        assert hamming_distance(simhash(normalize_tokens(MODULE)), simhash(normalize_tokens(edited))) <= 6
+
+        result, aliases, report = SourceDeduplicator().deduplicate(files)
+
+        assert list(result) == ['app/service.py']
+        assert aliases == {'app/service.py': ['copy/service.py']}
+        assert report['near_duplicates'] == 1
+
+        result, _, report = SourceDeduplicator(near_duplicates=False).deduplicate(files)
+        assert len(result) == 2
+        assert report['near_duplicates'] == 0
+
+    def test_distinct_files_are_kept(self):
+        """Test that unrelated files are not merged."""
+        other = '''
+func main() {
+    server := http.NewServeMux()
+    server.HandleFunc("/health", func(w http.ResponseWriter, r *http.Request) {
+        w.WriteHeader(http.StatusOK)
+    })
+    log.Fatal(http.ListenAndServe(":8080", server))
+}
+'''
+        renamed = MODULE.replace('Order', 'Invoice').replace('order', 'invoice').replace('place', 'issue')
+        files = {'service.py': MODULE, 'invoices.py': renamed, 'main.go': other, 'empty.py': '', 'init.py': ''}
+
+        result, aliases, report = SourceDeduplicator().deduplicate(files)
+
+        assert set(result) == {'service.py', 'invoices.py', 'main.go', 'empty.py'}
+        assert report['files_out'] == 4
+        assert report['near_duplicates'] == 0
+
+    def test_near_duplicate_scan_is_bounded(self):
+        """Test that files past the token cap are kept without being compared."""
+        edited = MODULE.replace('"Order placed"', '"Pedido creado"')
+        files = {'app/service.py': MODULE, 'copy/service.py': edited}
+
+        result, _, report = SourceDeduplicator(max_tokens=len(MODULE) // 4).deduplicate(files)
+
+        assert list(result) == ['app/service.py', 'copy/service.py']
+        assert report['near_duplicate_skipped'] == 1
+
+
+class TestSimhash:
+    """Test cases for simhash."""
+
+    def test_matches_bitwise_majority(self):
+        """Test that the fingerprint is the per-bit majority of the shingle hashes."""
+        tokens = normalize_tokens(MODULE)
+        hashes = [int.from_bytes(hashlib.blake2b(' '.join(tokens[i:i + 3]).encode(), digest_size=8).digest(), 'big')
+                  for i in range(len(tokens) - 2)]
+        expected = sum(1 << bit for bit in range(64) if 2 * sum(h >> bit & 1 for h in hashes) > len(hashes))
+
+        assert simhash(tokens) == expected
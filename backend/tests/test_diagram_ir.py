@@ -0,0 +1,347 @@
+"""Unit tests for the diagram IR, its renderers and the IR generation path."""
+
+import asyncio
+import json
+import shutil
+import subprocess
+import xml.etree.ElementTree as ET
+from pathlib import Path
+import pytest
+from src.diagram_ir import normalize_ir, render_ir
+from src.llm.response_decoder import decode_ir_response
+from src.models import AnalysisRequest, DiagramType, OutputFormat
+from src.services.async_diagram_service import AsyncDiagramService
+from src.services.diagram_service import DiagramService
+from src.services.ir_cache import IRCache
+from src.services.single_flight import SingleFlight
+
+FRONTEND_JS = Path(__file__).resolve().parents[2] / 'frontend' / 'js'
+
+CLASS_IR = {
+    'nodes': [
+        {'id': 'shop', 'label': 'shop', 'kind': 'package'},
+        {'id': 'Order', 'label': 'Order', 'kind': 'class', 'parent': 'shop',
+         'attributes': ['- id: int', '- lines: List<Line>'], 'operations': ['+ total(): float']},
+        {'id': 'Line', 'label': 'Order Line', 'kind': 'class', 'parent': 'shop'},
+        {'id': 'Payable', 'label': 'Payable', 'kind': 'interface', 'operations': ['+ pay(): void']},
+    ],
+    'edges': [
+        {'source': 'Order', 'target': 'Line', 'kind': 'composition', 'target_label': '1..*'},
+        {'source': 'Order', 'target': 'Payable', 'kind': 'realization'},
+    ],
+}
+
+SEQUENCE_IR = {
+    'nodes': [
+        {'id': 'user', 'label': 'User', 'kind': 'actor'},
+        {'id': 'api', 'label': 'API', 'kind': 'participant'},
+    ],
+    'messages': [
+        {'source': 'user', 'target': 'api', 'label': 'login()', 'kind': 'sync'},
+        {'source': 'api', 'target': 'user', 'label': 'ok', 'kind': 'reply', 'fragment': 'alt', 'guard': 'valid'},
+        {'source': 'api', 'target': 'user', 'label': 'error', 'kind': 'reply', 'fragment': 'alt', 'guard': 'else'},
+    ],
+}
+
+STATE_IR = {
+    'nodes': [
+        {'id': 'start', 'kind': 'initial'},
+        {'id': 'Open', 'label': 'Open', 'kind': 'state'},
+        {'id': 'Closed', 'label': 'Closed', 'kind': 'state'},
+        {'id': 'end', 'kind': 'final'},
+    ],
+    'edges': [
+        {'source': 'start', 'target': 'Open'},
+        {'source': 'Open', 'target': 'Closed', 'label': 'close'},
+        {'source': 'Closed', 'target': 'end'},
+    ],
+}
+
+USE_CASE_IR = {
+    'nodes': [
+        {'id': 'client', 'label': 'Client', 'kind': 'actor'},
+        {'id': 'shop', 'label': 'Shop', 'kind': 'system'},
+        {'id': 'buy', 'label': 'Buy', 'kind': 'usecase', 'parent': 'shop'},
+        {'id': 'pay', 'label': 'Pay', 'kind': 'usecase', 'parent': 'shop'},
+    ],
+    'edges': [
+        {'source': 'client', 'target': 'buy', 'kind': 'association'},
+        {'source': 'buy', 'target': 'pay', 'kind': 'include'},
+    ],
+}
+
+ACTIVITY_IR = {
+    'nodes': [
+        {'id': 'start', 'kind': 'initial'},
+        {'id': 'clients', 'label': 'Client', 'kind': 'partition'},
+        {'id': 'order', 'label': 'Place order', 'kind': 'action', 'parent': 'clients'},
+        {'id': 'stock', 'label': 'In stock?', 'kind': 'decision'},
+        {'id': 'ship', 'label': 'Ship', 'kind': 'action'},
+        {'id': 'end', 'kind': 'final'},
+    ],
+    'edges': [
+        {'source': 'start', 'target': 'order'},
+        {'source': 'order', 'target': 'stock'},
+        {'source': 'stock', 'target': 'ship', 'label': 'yes'},
+        {'source': 'stock', 'target': 'end', 'label': 'no'},
+        {'source': 'ship', 'target': 'end'},
+    ],
+}
+
+COMPONENT_IR = {
+    'nodes': [
+        {'id': 'web', 'label': 'Web', 'kind': 'component', 'stereotype': 'frontend'},
+        {'id': 'api', 'label': 'API', 'kind': 'component'},
+        {'id': 'IOrders', 'label': 'IOrders', 'kind': 'interface', 'parent': 'api'},
+        {'id': 'db', 'label': 'Orders DB', 'kind': 'database'},
+    ],
+    'edges': [
+        {'source': 'web', 'target': 'IOrders', 'kind': 'dependency', 'label': 'HTTPS'},
+        {'source': 'api', 'target': 'db', 'kind': 'association'},
+    ],
+}
+
+DEPLOYMENT_IR = {
+    'nodes': [
+        {'id': 'aws', 'label': 'AWS', 'kind': 'node'},
+        {'id': 'lambda', 'label': 'Lambda', 'kind': 'node', 'parent': 'aws'},
+        {'id': 'zip', 'label': 'backend.zip', 'kind': 'artifact', 'parent': 'lambda'},
+        {'id': 'phone', 'label': 'Phone', 'kind': 'device'},
+    ],
+    'edges': [
+        {'source': 'phone', 'target': 'lambda', 'kind': 'association', 'label': 'HTTPS'},
+    ],
+}
+
+OBJECT_IR = {
+    'nodes': [
+        {'id': 'order1', 'label': 'order1: Order', 'kind': 'object', 'attributes': ['id = 1']},
+        {'id': 'line1', 'label': 'line1: Line', 'kind': 'object', 'attributes': ['qty = 2']},
+    ],
+    'edges': [
+        {'source': 'order1', 'target': 'line1', 'kind': 'composition', 'label': 'lines'},
+    ],
+}
+
+# One IR per diagram type
+SAMPLES = [
+    (DiagramType.CLASS, CLASS_IR),
+    (DiagramType.SEQUENCE, SEQUENCE_IR),
+    (DiagramType.STATE, STATE_IR),
+    (DiagramType.USE_CASE, USE_CASE_IR),
+    (DiagramType.ACTIVITY, ACTIVITY_IR),
+    (DiagramType.COMPONENT, COMPONENT_IR),
+    (DiagramType.DEPLOYMENT, DEPLOYMENT_IR),
+    (DiagramType.OBJECT, OBJECT_IR),
+]
+
+
+class IRProvider:
+    """Provider that answers with a fixed IR and counts its calls."""
+
+    model_name = 'fake-model'
+
+    def __init__(self, raw_ir=None, fail=False):
+        self.raw_ir = raw_ir if raw_ir is not None else CLASS_IR
+        self.fail = fail
+        self.ir_calls = 0
+        self.code_calls = 0
+
+    def generate_ir_from_source_files(self, source_files, diagram_type, file_aliases=None):
+        self.ir_calls += 1
+        if self.fail:
+            raise ValueError("Reply does not contain a diagram IR")
+        return self.raw_ir, "explanation"
+
+    def generate_diagram_from_source_files(self, source_files, diagram_type, output_format, file_aliases=None):
+        self.code_calls += 1
+        return "classDiagram\n    class Direct", "direct"
+
+
+def class_request(output_format, **filters):
+    return AnalysisRequest(
+        code_files={'order.py': 'class Order:\n    pass\n'},
+        diagram_type=DiagramType.CLASS,
+        output_format=output_format,
+        filters=filters or None,
+    )
+
+
+class TestNormalizeIR:
+    """Test cases for normalize_ir."""
+
+    def test_defaults_and_undeclared_endpoints(self):
+        """Test that missing fields get defaults and edge endpoints become nodes."""
+        ir = normalize_ir({'nodes': [{'id': 'A'}], 'edges': [{'source': 'A', 'target': 'B', 'kind': 'bogus'}]},
+                          DiagramType.CLASS)
+
+        assert [node['id'] for node in ir['nodes']] == ['A', 'B']
+        assert ir['nodes'][1] == {'id': 'B', 'label': 'B', 'kind': 'class', 'stereotype': '', 'parent': '',
+                                  'attributes': [], 'operations': []}
+        assert ir['edges'][0]['kind'] == 'association'
+        assert ir['messages'] == []
+
+    def test_parents_must_be_containers_without_cycles(self):
+        """Test that a class parent is replaced by its package and a parent cycle is broken."""
+        ir = normalize_ir({'nodes': [
+            {'id': 'pkg', 'kind': 'package'},
+            {'id': 'Outer', 'kind': 'class', 'parent': 'pkg'},
+            {'id': 'Inner', 'kind': 'class', 'parent': 'Outer'},
+            {'id': 'a', 'kind': 'package', 'parent': 'b'},
+            {'id': 'b', 'kind': 'package', 'parent': 'a'},
+        ]}, DiagramType.CLASS)
+        parents = {node['id']: node['parent'] for node in ir['nodes']}
+
+        assert parents['Inner'] == 'pkg'
+        assert '' in (parents['a'], parents['b'])
+
+    def test_rejects_empty_ir(self):
+        """Test that an IR without nodes is rejected."""
+        with pytest.raises(ValueError):
+            normalize_ir({'nodes': []}, DiagramType.CLASS)
+        with pytest.raises(ValueError):
+            normalize_ir(['not', 'an', 'object'], DiagramType.CLASS)
+
+    def test_decode_ir_response(self):
+        """Test that the IR is read from the reply and a reply without one is rejected."""
+        raw_ir, metadata = decode_ir_response(json.dumps({'diagrama': CLASS_IR, 'metadata': 'texto'}))
+
+        assert raw_ir == CLASS_IR
+        assert metadata == 'texto'
+        with pytest.raises(ValueError):
+            decode_ir_response('{"codigoUML": "classDiagram"}')
+
+
+class TestRenderers:
+    """Test the Mermaid, PlantUML and Draw.io renderers."""
+
+    def test_mermaid_class(self):
+        """Test namespaces, members, labels and relation arrows."""
+        code = render_ir(normalize_ir(CLASS_IR, DiagramType.CLASS), OutputFormat.MERMAID)
+
+        assert code.startswith('classDiagram\n')
+        assert '    namespace shop {' in code
+        assert '        class Line["Order Line"]' in code
+        assert '- lines: List~Line~' in code
+        assert '        <<interface>>' in code
+        assert 'Order *-- "1..*" Line' in code
+        assert 'Order ..|> Payable' in code
+
+    def test_plantuml_sequence_fragments(self):
+        """Test that consecutive alt messages share one block with an else branch."""
+        code = render_ir(normalize_ir(SEQUENCE_IR, DiagramType.SEQUENCE), OutputFormat.PLANTUML)
+
+        assert code.splitlines() == [
+            '@startuml',
+            'actor "User" as user',
+            'participant "API" as api',
+            'user -> api : login()',
+            'alt valid',
+            '    api --> user : ok',
+            'else else',
+            '    api --> user : error',
+            'end',
+            '@enduml',
+        ]
+
+    def test_state_terminals(self):
+        """Test that initial and final nodes become [*] in both text formats."""
+        ir = normalize_ir(STATE_IR, DiagramType.STATE)
+
+        assert '    [*] --> Open\n' in render_ir(ir, OutputFormat.MERMAID)
+        assert 'Closed --> [*]\n' in render_ir(ir, OutputFormat.PLANTUML)
+
+    def test_use_case_include(self):
+        """Test the system boundary and the default «include» label."""
+        code = render_ir(normalize_ir(USE_CASE_IR, DiagramType.USE_CASE), OutputFormat.MERMAID)
+
+        assert code.startswith('flowchart LR\n')
+        assert '    subgraph shop["Shop"]' in code
+        assert 'buy -.->|"«include»"| pay' in code
+
+    @pytest.mark.parametrize('diagram_type, raw_ir', SAMPLES)
+    def test_drawio_is_valid_xml(self, diagram_type, raw_ir):
+        """Test that every Draw.io rendering parses and its edges reference existing cells."""
+        code = render_ir(normalize_ir(raw_ir, diagram_type), OutputFormat.DRAWIO)
+        cells = ET.fromstring(code).findall('.//mxCell')
+        ids = {cell.get('id') for cell in cells}
+
+        assert len(ids) == len(cells)
+        for cell in cells:
+            assert cell.get('parent') in ids | {None}
+            assert cell.get('source', '1') in ids
+            assert cell.get('target', '1') in ids
+
+    @pytest.mark.skipif(shutil.which('node') is None, reason='node is not installed')
+    def test_frontend_converter_matches(self):
+        """Test that frontend/js/irConverter.js (with diagramLayout.js) renders exactly the same code."""
+        assert {diagram_type for diagram_type, _ in SAMPLES} == set(DiagramType)
+        irs = [normalize_ir(raw_ir, diagram_type) for diagram_type, raw_ir in SAMPLES]
+        formats = [output_format.value for output_format in OutputFormat]
+        script = ''.join((FRONTEND_JS / name).read_text(encoding='utf-8')
+                         for name in ('diagramLayout.js', 'irConverter.js')) + (
+            f"\nconst irs = {json.dumps(irs)};\n"
+            f"process.stdout.write(JSON.stringify(irs.map(ir => {json.dumps(formats)}"
+            ".map(format => irConverter.render(ir, format)))));"
+        )
+
+        result = subprocess.run(['node', '-'], input=script, capture_output=True, text=True, timeout=60)
+
+        assert result.returncode == 0, result.stderr
+        assert json.loads(result.stdout) == [[render_ir(ir, output_format) for output_format in OutputFormat]
+                                             for ir in irs]
+
+
+class TestIRGeneration:
+    """Test the IR path through the services."""
+
+    def test_format_switch_reuses_cached_ir(self):
+        """Test that a second format is rendered from the cache without calling the model."""
+        provider = IRProvider()
+        service = DiagramService(llm_provider=provider, single_flight=SingleFlight(), ir_cache=IRCache())
+
+        mermaid = service.generate_diagram(class_request(OutputFormat.MERMAID))
+        plantuml = service.generate_diagram(class_request(OutputFormat.PLANTUML))
+
+        assert provider.ir_calls == 1
+        assert provider.code_calls == 0
+        assert mermaid.metadata['ir'] == {'cache': 'miss', 'nodes': 4, 'edges': 2, 'messages': 0}
+        assert plantuml.metadata['ir']['cache'] == 'hit'
+        assert plantuml.diagram_code == render_ir(mermaid.ir, OutputFormat.PLANTUML)
+        assert plantuml.metadata['llm_metadata'] == 'explanation'
+
+    def test_unusable_ir_falls_back_to_code(self):
+        """Test that an IR failure generates the code directly instead of failing the request."""
+        provider = IRProvider(fail=True)
+        service = DiagramService(llm_provider=provider, single_flight=SingleFlight(), ir_cache=IRCache())
+
+        response = service.generate_diagram(class_request(OutputFormat.MERMAID))
+
+        assert response.success
+        assert response.ir is None
+        assert response.diagram_code == "classDiagram\n    class Direct"
+        assert 'fallback' in response.metadata['ir']
+        assert response.metadata['ir']['llm_calls'] == 2
+
+    def test_filter_opts_out(self):
+        """Test that filters.ir = false skips the IR."""
+        provider = IRProvider()
+        service = DiagramService(llm_provider=provider, single_flight=SingleFlight(), ir_cache=IRCache())
+
+        response = service.generate_diagram(class_request(OutputFormat.MERMAID, ir=False))
+
+        assert (provider.ir_calls, provider.code_calls) == (0, 1)
+        assert 'ir' not in response.metadata
+
+    def test_async_service_renders_ir(self):
+        """Test that the async pipeline shares the IR cache with the sync one."""
+        provider = IRProvider()
+        service = DiagramService(llm_provider=provider, single_flight=SingleFlight(), ir_cache=IRCache())
+        async_service = AsyncDiagramService(service)
+
+        drawio = asyncio.run(async_service.generate_diagram(class_request(OutputFormat.DRAWIO)))
+        mermaid = service.generate_diagram(class_request(OutputFormat.MERMAID))
+
+        assert drawio.diagram_code.startswith('<mxfile')
+        assert mermaid.metadata['ir']['cache'] == 'hit'
+        assert provider.ir_calls == 1
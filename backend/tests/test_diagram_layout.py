@@ -0,0 +1,108 @@
+"""Unit tests for the layered Draw.io layout."""
+
+import random
+import xml.etree.ElementTree as ET
+from src.diagram_ir import normalize_ir, render_ir
+from src.diagram_layout import LAYER_GAP, NODE_GAP, layered_layout
+from src.models import DiagramType, OutputFormat
+
+
+def boxes_overlap(a, b):
+    (ax, ay, aw, ah), (bx, by, bw, bh) = a, b
+    return ax < bx + bw and bx < ax + aw and ay < by + bh and by < ay + ah
+
+
+class TestLayeredLayout:
+    """Test cases for layered_layout."""
+
+    def test_edges_point_down(self):
+        """Test that each edge goes from a layer to a lower one."""
+        ids = ['a', 'b', 'c', 'd']
+        sizes = {node_id: (100, 50) for node_id in ids}
+
+        result = layered_layout(ids, sizes, [('a', 'b', 0), ('a', 'c', 1), ('b', 'd', 2), ('c', 'd', 3)])
+        y = {node_id: position[1] for node_id, position in result['positions'].items()}
+
+        assert y['a'] == 0
+        assert y['b'] == y['c'] == 50 + LAYER_GAP
+        assert y['d'] == 2 * (50 + LAYER_GAP)
+        assert result['height'] == 3 * 50 + 2 * LAYER_GAP
+
+    def test_parent_is_centred_over_children(self):
+        """Test that a node with two children sits between them."""
+        ids = ['a', 'b', 'c']
+        sizes = {node_id: (100, 50) for node_id in ids}
+
+        result = layered_layout(ids, sizes, [('a', 'b', 0), ('a', 'c', 1)])
+        x = {node_id: position[0] for node_id, position in result['positions'].items()}
+
+        assert x['c'] - x['b'] == 100 + NODE_GAP
+        assert x['a'] == (x['b'] + x['c']) // 2
+        assert result['width'] == 2 * 100 + NODE_GAP
+
+    def test_long_edges_get_bend_points(self):
+        """Test that an edge skipping a layer bends beside the node in between."""
+        ids = ['a', 'b', 'c']
+        sizes = {node_id: (100, 50) for node_id in ids}
+
+        result = layered_layout(ids, sizes, [('a', 'b', 0), ('b', 'c', 1), ('a', 'c', 'skip'), ('c', 'a', 'back')])
+        [(x, y)] = result['waypoints']['skip']
+        bx, by = result['positions']['b']
+
+        assert list(result['waypoints']) == ['skip', 'back']
+        assert by <= y <= by + 50
+        assert not bx <= x <= bx + 100
+
+    def test_cycles_and_self_loops(self):
+        """Test that cycles are broken and self-loops ignored without losing nodes."""
+        ids = ['a', 'b', 'c']
+        sizes = {node_id: (80, 40) for node_id in ids}
+
+        result = layered_layout(ids, sizes, [('a', 'b', 0), ('b', 'c', 1), ('c', 'a', 2), ('a', 'a', 3)])
+
+        assert set(result['positions']) == set(ids)
+        assert len({position[1] for position in result['positions'].values()}) == 3
+
+    def test_horizontal(self):
+        """Test that horizontal layers run left to right."""
+        ids = ['actor', 'case']
+        sizes = {'actor': (30, 60), 'case': (140, 60)}
+
+        result = layered_layout(ids, sizes, [('actor', 'case', 0)], horizontal=True)
+
+        assert result['positions'] == {'actor': (0, 0), 'case': (30 + LAYER_GAP, 0)}
+        assert (result['width'], result['height']) == (30 + LAYER_GAP + 140, 60)
+
+    def test_random_graphs_do_not_overlap(self):
+        """Test that no two nodes overlap and all stay inside the reported size."""
+        rng = random.Random(42)
+        for _ in range(100):
+            ids = [f'n{i}' for i in range(rng.randint(1, 25))]
+            sizes = {node_id: (rng.randint(20, 300), rng.randint(8, 200)) for node_id in ids}
+            edges = [(rng.choice(ids), rng.choice(ids), key) for key in range(rng.randint(0, 3 * len(ids)))]
+
+            result = layered_layout(ids, sizes, edges, horizontal=rng.random() < 0.3)
+            boxes = {node_id: (*result['positions'][node_id], *sizes[node_id]) for node_id in ids}
+
+            for node_id, (x, y, width, height) in boxes.items():
+                assert x >= 0 and y >= 0
+                assert x + width <= result['width'] and y + height <= result['height']
+            for i, a in enumerate(ids):
+                for b in ids[i + 1:]:
+                    assert not boxes_overlap(boxes[a], boxes[b]), (a, b)
+
+    def test_drawio_generalization_parent_on_top(self):
+        """Test that the Draw.io class diagram puts the superclass above its subclasses."""
+        ir = normalize_ir({
+            'nodes': [{'id': 'Dog'}, {'id': 'Cat'}, {'id': 'Animal'}],
+            'edges': [
+                {'source': 'Dog', 'target': 'Animal', 'kind': 'inheritance'},
+                {'source': 'Cat', 'target': 'Animal', 'kind': 'inheritance'},
+            ],
+        }, DiagramType.CLASS)
+
+        root = ET.fromstring(render_ir(ir, OutputFormat.DRAWIO))
+        geometry = {cell.get('id'): cell.find('mxGeometry') for cell in root.iter('mxCell') if cell.get('vertex')}
+        y = {node_id: int(geometry[node_id].get('y')) for node_id in ('Dog', 'Cat', 'Animal')}
+
+        assert y['Animal'] < y['Dog'] == y['Cat']
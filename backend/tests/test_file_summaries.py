@@ -0,0 +1,192 @@
+"""Unit tests for the per-file summary cache and the two-phase generation."""
+
+import asyncio
+import pytest
+from src.llm.response_decoder import decode_summaries_response
+from src.models import AnalysisRequest, DiagramType, OutputFormat
+from src.services.async_diagram_service import AsyncDiagramService
+from src.services.diagram_service import DiagramService
+from src.services.file_summaries import SUMMARY_HEADER, FileSummarizer, SummaryCache
+from src.services.ir_cache import IRCache
+from src.services.source_records import SourceFiles, SourceRecord
+from src.services.single_flight import SingleFlight
+
+LARGE = 'class Order:\n' + '    def total(self):\n        return 1\n' * 60
+SOURCES = {
+    'shop/order.py': LARGE,
+    'shop/line.py': LARGE.replace('Order', 'Line'),
+    'shop/tiny.py': 'X = 1\n',
+}
+
+
+class SummaryProvider:
+    """Provider that summarizes every file and records what it was asked for."""
+
+    model_name = 'fake-model'
+
+    def __init__(self, fail=False):
+        self.fail = fail
+        self.summarized = []
+        self.prompts = []
+
+    def summarize_source_files(self, source_files):
+        self.summarized.extend(source_files)
+        if self.fail:
+            raise RuntimeError("Gemini generation failed: quota")
+        return {path: f"summary of {path}" for path in source_files}
+
+    def generate_diagram_from_source_files(self, source_files, diagram_type, output_format, file_aliases=None):
+        self.prompts.append(dict(source_files))
+        return "classDiagram\n    class Order", "explanation"
+
+
+def make_request(diagram_type=DiagramType.CLASS, **filters):
+    return AnalysisRequest(
+        code_files=dict(SOURCES),
+        diagram_type=diagram_type,
+        output_format=OutputFormat.MERMAID,
+        filters={'summaries': True, 'ir': False, 'deduplicate': False, 'strip_comments': False, **filters},
+    )
+
+
+def make_service(provider, cache=None):
+    return DiagramService(llm_provider=provider, single_flight=SingleFlight(), ir_cache=IRCache(),
+                          summary_cache=cache or SummaryCache(':memory:'))
+
+
+class TestSummaryCache:
+    """Test cases for SummaryCache."""
+
+    def test_round_trip_by_model_and_version(self):
+        """Test that summaries are found only for the same model and prompt version."""
+        cache = SummaryCache(':memory:')
+        cache.put_many({'h1': 'one', 'h2': 'two'}, model='m')
+
+        assert cache.get_many(['h1', 'h2', 'h3'], model='m') == {'h1': 'one', 'h2': 'two'}
+        assert cache.get_many(['h1'], model='other') == {}
+        assert cache.get_many(['h1'], model='m', prompt_version=-1) == {}
+
+    def test_persists_across_instances(self, tmp_path):
+        """Test that a new cache on the same file sees earlier summaries."""
+        path = str(tmp_path / 'summaries.sqlite3')
+        SummaryCache(path).put_many({'h1': 'one'})
+
+        assert SummaryCache(path).get_many(['h1']) == {'h1': 'one'}
+
+    def test_unusable_path_behaves_as_empty(self, tmp_path):
+        """Test that a database that cannot be opened does not raise."""
+        cache = SummaryCache(str(tmp_path / 'missing' / 'summaries.sqlite3'))
+        cache.put_many({'h1': 'one'})
+
+        assert cache.get_many(['h1']) == {}
+        assert len(cache) == 0
+
+
+class TestFileSummarizer:
+    """Test cases for FileSummarizer."""
+
+    def test_batches_respect_file_limit(self):
+        """Test that large files are split into batches and small ones left out."""
+        summarizer = FileSummarizer(SummaryCache(':memory:'), batch_files=1)
+
+        plan = summarizer.plan(SOURCES)
+
+        assert plan.batches == [{'shop/order.py': SOURCES['shop/order.py']},
+                                {'shop/line.py': SOURCES['shop/line.py']}]
+
+    def test_failed_batch_is_sent_verbatim(self):
+        """Test that files of a failed batch keep their content and are not cached."""
+        cache = SummaryCache(':memory:')
+        summarizer = FileSummarizer(cache, batch_files=1)
+        plan = summarizer.plan(SOURCES)
+
+        prompt_files, report = summarizer.apply(plan, [{'shop/order.py': 'orders'}, RuntimeError("quota")])
+
+        assert prompt_files['shop/order.py'] == f"{SUMMARY_HEADER}orders"
+        assert prompt_files['shop/line.py'] == SOURCES['shop/line.py']
+        assert prompt_files['shop/tiny.py'] == SOURCES['shop/tiny.py']
+        assert (report['summarized'], report['verbatim'], report['failed_calls']) == (1, 2, 1)
+        assert len(cache) == 1
+
+    def test_lazy_files_loaded_once(self):
+        """Test that plan and apply read each file of a lazy mapping at most once."""
+        loads = []
+
+        def record(path, content):
+            return SourceRecord.from_content(path, content, loader=lambda: loads.append(path) or content)
+
+        files = SourceFiles(record(path, content) for path, content in SOURCES.items())
+        summarizer = FileSummarizer(SummaryCache(':memory:'), batch_files=1)
+        plan = summarizer.plan(files)
+
+        prompt_files, report = summarizer.apply(plan, [{'shop/order.py': 'orders'}, RuntimeError("quota")])
+
+        assert sorted(loads) == sorted(SOURCES)
+        assert prompt_files['shop/line.py'] == SOURCES['shop/line.py']
+        assert report['source_tokens'] > report['prompt_tokens']
+
+
+class TestTwoPhaseGeneration:
+    """Test the summaries stage through the services."""
+
+    def test_summaries_reused_across_diagram_types(self):
+        """Test that a second request for another diagram type summarizes nothing again."""
+        provider = SummaryProvider()
+        service = make_service(provider)
+
+        first = service.generate_diagram(make_request())
+        second = service.generate_diagram(make_request(DiagramType.SEQUENCE))
+
+        assert sorted(provider.summarized) == ['shop/line.py', 'shop/order.py']
+        assert first.metadata['summaries']['generated'] == 2
+        assert second.metadata['summaries']['cached'] == 2
+        assert second.metadata['summaries']['calls'] == 0
+        prompt = provider.prompts[-1]
+        assert prompt['shop/order.py'] == f"{SUMMARY_HEADER}summary of shop/order.py"
+        assert prompt['shop/tiny.py'] == SOURCES['shop/tiny.py']
+        assert second.metadata['summaries']['prompt_tokens'] < second.metadata['summaries']['source_tokens']
+
+    def test_provider_failure_still_generates(self):
+        """Test that failed summary calls fall back to the full files."""
+        provider = SummaryProvider(fail=True)
+
+        response = make_service(provider).generate_diagram(make_request())
+
+        assert response.success
+        assert provider.prompts[-1] == SOURCES
+        assert response.metadata['summaries']['failed_calls'] == 1
+
+    def test_disabled_by_default(self):
+        """Test that without filters.summaries the files are sent as they are."""
+        provider = SummaryProvider()
+
+        response = make_service(provider).generate_diagram(make_request(summaries=False))
+
+        assert provider.summarized == []
+        assert 'summaries' not in response.metadata
+
+    def test_async_service_shares_cache(self):
+        """Test that the async pipeline stores summaries the sync one reuses."""
+        provider = SummaryProvider()
+        service = make_service(provider)
+
+        asyncio.run(AsyncDiagramService(service).generate_diagram(make_request()))
+        response = service.generate_diagram(make_request(DiagramType.ACTIVITY))
+
+        assert len(provider.summarized) == 2
+        assert response.metadata['summaries']['cached'] == 2
+
+
+class TestDecodeSummaries:
+    """Test cases for decode_summaries_response."""
+
+    def test_decodes_list(self):
+        """Test that entries become a path -> summary mapping, skipping malformed ones."""
+        text = '{"resumenes": [{"archivo": "a.py", "resumen": "A"}, {"archivo": "b.py"}, "x"]}'
+
+        assert decode_summaries_response(text) == {'a.py': 'A'}
+
+    def test_rejects_reply_without_list(self):
+        """Test that a reply without summaries raises ValueError."""
+        with pytest.raises(ValueError):
+            decode_summaries_response('{"codigoUML": "classDiagram"}')
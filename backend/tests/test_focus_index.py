@@ -0,0 +1,124 @@
+"""Unit tests for the focus query index."""
+
+from src.models import AnalysisRequest, DiagramType, OutputFormat
+from src.services.diagram_service import DiagramService
+from src.services.focus_index import FocusIndex, select_focus_files, tokenize
+from src.services.single_flight import SingleFlight
+
+
+FILES = {
+    'shop/checkout/checkout_service.py': '''
+class CheckoutService:
+    """Runs the checkout: validates the cart, charges the payment and places the order."""
+
+    def checkout(self, cart, card):
+        PaymentGateway().charge(card, cart.total)
+        return OrderRepository().save(cart)
+''',
+    'shop/payments/gateway.py': '''
+class PaymentGateway:
+    def charge(self, card, amount):
+        return True
+''',
+    'shop/orders/repository.py': '''
+class OrderRepository:
+    def save(self, cart):
+        return cart
+''',
+    'shop/orders/order_state.py': '''
+class OrderStateMachine:
+    # pending -> paid -> shipped -> delivered
+    TRANSITIONS = {"pending": ["paid"], "paid": ["shipped"], "shipped": ["delivered"]}
+''',
+    'shop/catalog/product.py': '''
+class Product:
+    def __init__(self, name, price):
+        self.name = name
+        self.price = price
+''',
+    'shop/users/profile.py': '''
+class UserProfile:
+    def rename(self, name):
+        self.name = name
+''',
+}
+
+
+class TestTokenize:
+    """Test cases for identifier tokenization."""
+
+    def test_splits_identifiers(self):
+        """Test that camelCase and snake_case names are split and folded."""
+        terms = tokenize('OrderStateMachine checkout_service orders')
+
+        assert 'orderstatemachine' in terms
+        assert {'order', 'state', 'machine', 'checkout', 'service'} <= set(terms)
+        assert terms.count('order') == 2
+
+
+class TestFocusIndex:
+    """Test cases for BM25 ranking and dependency expansion."""
+
+    def test_best_match_first(self):
+        """Test that the file about the query ranks first."""
+        index = FocusIndex(FILES)
+
+        assert index.search('sequence diagram for checkout')[0][0] == 'shop/checkout/checkout_service.py'
+        assert index.search('state machine of Order')[0][0] == 'shop/orders/order_state.py'
+
+    def test_select_adds_direct_dependencies(self):
+        """Test that files defining names used by the matches are included."""
+        paths, report = FocusIndex(FILES).select('checkout', top_k=1)
+
+        assert paths == ['shop/checkout/checkout_service.py', 'shop/payments/gateway.py', 'shop/orders/repository.py']
+        assert report['matches'][0]['path'] == 'shop/checkout/checkout_service.py'
+        assert set(report['dependencies']) == {'shop/payments/gateway.py', 'shop/orders/repository.py'}
+
+    def test_without_dependencies(self):
+        """Test that dependency expansion can be disabled."""
+        paths, _ = FocusIndex(FILES).select('checkout', top_k=1, with_dependencies=False)
+
+        assert paths == ['shop/checkout/checkout_service.py']
+
+    def test_no_match_keeps_everything(self):
+        """Test that an unmatched query leaves the source set unchanged."""
+        selected, report = select_focus_files(FILES, 'kubernetes ingress')
+
+        assert selected is FILES
+        assert report['matched'] is False
+
+
+class RecordingProvider:
+    """Provider that records the files it was asked to analyse."""
+
+    model_name = "fake-model"
+
+    def __init__(self):
+        self.calls = []
+
+    def generate_diagram_from_source_files(self, source_files, diagram_type, output_format, file_aliases=None):
+        self.calls.append(sorted(source_files))
+        return "sequenceDiagram", "analysis"
+
+
+class TestFocusFilter:
+    """Test the focus filter in the generation pipeline."""
+
+    def test_prompt_only_has_focused_files(self):
+        """Test that filters.focus restricts the files sent to the provider."""
+        provider = RecordingProvider()
+        service = DiagramService(llm_provider=provider, single_flight=SingleFlight())
+        request = AnalysisRequest(
+            code_files=dict(FILES),
+            diagram_type=DiagramType.SEQUENCE,
+            output_format=OutputFormat.MERMAID,
+            filters={'focus': 'checkout', 'focus_top_k': 1}
+        )
+
+        response = service.generate_diagram(request)
+
+        assert response.success
+        assert provider.calls == [sorted([
+            'shop/checkout/checkout_service.py', 'shop/payments/gateway.py', 'shop/orders/repository.py'
+        ])]
+        assert response.metadata['focus']['files_out'] == 3
@@ -1,8 +1,10 @@
 """Unit tests for GitHub service."""
 
+import json
 import pytest
 from unittest.mock import Mock, patch, MagicMock
 from src.services.github_service import GitHubService
+from src.services.http_client import HttpClient
 
 
 class TestGitHubService:
@@ -116,3 +118,61 @@ class TestGitHubService:
             
             # Cleanup should be called on exit
             mock_cleanup.assert_called_once()
+
+
+class TestSparseFetch:
+    """Test the trees API based subtree fetch against a local stand-in."""
+    
+    def make_service(self, stand_in, tree):
+        stand_in.routes["/repos/user/repo"] = lambda handler, hit: (
+            200, {}, json.dumps({"default_branch": "dev"}).encode()
+        )
+        stand_in.routes["/repos/user/repo/git/trees/dev?recursive=1"] = lambda handler, hit: (
+            200, {}, json.dumps({"tree": tree, "truncated": False}).encode()
+        )
+        for entry in tree:
+            if entry["type"] == "blob":
+                body = entry.pop("content").encode()
+                entry["size"] = len(body)
+                stand_in.routes[f"/user/repo/dev/{entry['path']}"] = lambda handler, hit, body=body: (200, {}, body)
+        return GitHubService(http_client=HttpClient(), api_base_url=stand_in.base_url, raw_base_url=stand_in.base_url)
+    
+    def test_fetches_only_subpath(self, http_stand_in):
+        """Test that only blobs under the subpath are downloaded."""
+        tree = [
+            {"path": "services", "type": "tree"},
+            {"path": "services/billing/invoice.py", "type": "blob", "content": "class Invoice:\n    pass\n"},
+            {"path": "services/billing/README.md", "type": "blob", "content": "# Billing\n"},
+            {"path": "services/billing/vendor/lib.js", "type": "blob", "content": "var x;\n"},
+            {"path": "services/auth/user.py", "type": "blob", "content": "class User:\n    pass\n"},
+        ]
+        service = self.make_service(http_stand_in, tree)
+        
+        files, report = service.get_sparse_source_files("https://github.com/user/repo", subpath="services/billing/")
+        
+        assert files == {"services/billing/invoice.py": "class Invoice:\n    pass\n"}
+        assert report["branch"] == "dev"
+        assert report["skipped"] == {"unsupported_extension": 1, "vendored": 1}
+        assert "/user/repo/dev/services/auth/user.py" not in http_stand_in.hits
+    
+    def test_include_globs_and_byte_budget(self, http_stand_in):
+        """Test include patterns and the cap on total fetched bytes."""
+        tree = [
+            {"path": "a.py", "type": "blob", "content": "a = 1\n"},
+            {"path": "b.py", "type": "blob", "content": "b = 2\n"},
+            {"path": "c.java", "type": "blob", "content": "class C {}\n"},
+        ]
+        service = self.make_service(http_stand_in, tree)
+        
+        files, report = service.get_sparse_source_files(
+            "https://github.com/user/repo", include=["*.py"], max_total_bytes=8
+        )
+        
+        assert list(files) == ["a.py"]
+        assert report["skipped"] == {"not_included": 1, "byte_budget": 1}
+        assert report["bytes_fetched"] == 6
+    
+    def test_invalid_url(self):
+        """Test that non GitHub URLs are rejected."""
+        with pytest.raises(ValueError, match="Invalid GitHub URL"):
+            GitHubService().get_sparse_source_files("https://gitlab.com/user/repo", subpath="src")
@@ -0,0 +1,136 @@
+"""Tests for the pooled HTTP client against a local HTTP server."""
+
+import io
+import time
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from src.services.http_client import HttpClient
+from src.services.github_service import GitHubService
+
+
+def etag_route(body, etag='"v1"'):
+    def route(handler, hit):
+        if handler.headers.get("If-None-Match") == etag:
+            return 304, {"ETag": etag}, b""
+        return 200, {"ETag": etag}, body
+    return route
+
+
+class TestHttpClient:
+    """Test cases for HttpClient."""
+
+    def test_keep_alive_reuses_connection(self, http_stand_in):
+        """Test that sequential requests share one pooled connection."""
+        http_stand_in.routes["/a"] = lambda handler, hit: (200, {}, b"ok")
+        client = HttpClient()
+
+        for _ in range(5):
+            assert client.get(http_stand_in.base_url + "/a").content == b"ok"
+
+        assert len(http_stand_in.connections) == 1
+        assert client.metrics.snapshot()["requests"] == 5
+        assert client.metrics.snapshot()["bytes_received"] == 10
+
+    def test_conditional_request_served_from_cache(self, http_stand_in):
+        """Test that a 304 answer returns the cached body."""
+        http_stand_in.routes["/archive.zip"] = etag_route(b"zip-bytes")
+        client = HttpClient()
+
+        first = client.get(http_stand_in.base_url + "/archive.zip", conditional=True)
+        second = client.get(http_stand_in.base_url + "/archive.zip", conditional=True)
+
+        assert first.from_cache is False
+        assert second.from_cache is True
+        assert second.status_code == 200
+        assert second.content == b"zip-bytes"
+        metrics = client.metrics.snapshot()
+        assert metrics["not_modified"] == 1
+        assert metrics["bytes_received"] == len(b"zip-bytes")
+
+    def test_cache_is_kept_per_credentials(self, http_stand_in):
+        """Test that a body fetched with one token is neither served to nor revalidated for another caller."""
+        seen = []
+
+        def route(handler, hit):
+            seen.append((handler.headers.get("Authorization"), handler.headers.get("If-None-Match")))
+            return etag_route(b"private-zip")(handler, hit)
+        http_stand_in.routes["/archive.zip"] = route
+        client = HttpClient()
+        url = http_stand_in.base_url + "/archive.zip"
+
+        client.get(url, conditional=True, headers={"Authorization": "token A"})
+        anonymous = client.get(url, conditional=True)
+        again = client.get(url, conditional=True, headers={"Authorization": "token A"})
+
+        assert anonymous.from_cache is False
+        assert again.from_cache is True
+        assert seen == [("token A", None), (None, None), ("token A", '"v1"')]
+        assert client.cache_bytes == 2 * len(b"private-zip")
+
+    def test_unconditional_request_is_not_cached(self, http_stand_in):
+        """Test that plain requests never send validators."""
+        http_stand_in.routes["/archive.zip"] = etag_route(b"zip-bytes")
+        client = HttpClient()
+
+        client.get(http_stand_in.base_url + "/archive.zip")
+        response = client.get(http_stand_in.base_url + "/archive.zip")
+
+        assert response.from_cache is False
+        assert client.metrics.snapshot()["not_modified"] == 0
+
+    def test_retries_transient_errors(self, http_stand_in):
+        """Test that 503 responses are retried."""
+        http_stand_in.routes["/flaky"] = lambda handler, hit: (503, {}, b"") if hit < 3 else (200, {}, b"ok")
+        client = HttpClient(retries=3, backoff_factor=0)
+
+        response = client.get(http_stand_in.base_url + "/flaky")
+
+        assert response.status_code == 200
+        assert http_stand_in.hits["/flaky"] == 3
+
+    def test_per_host_concurrency_limit(self, http_stand_in):
+        """Test that at most max_per_host requests reach a host at once."""
+        def slow(handler, hit):
+            time.sleep(0.05)
+            return 200, {}, b"ok"
+        http_stand_in.routes["/slow"] = slow
+        client = HttpClient(max_per_host=2)
+
+        with ThreadPoolExecutor(max_workers=6) as pool:
+            list(pool.map(lambda _: client.get(http_stand_in.base_url + "/slow"), range(6)))
+
+        assert http_stand_in.peak == 2
+
+    def test_cache_eviction(self, http_stand_in):
+        """Test that the conditional cache respects its entry limit."""
+        for name in ("a", "b"):
+            http_stand_in.routes["/" + name] = etag_route(name.encode())
+        client = HttpClient(cache_max_entries=1)
+
+        client.get(http_stand_in.base_url + "/a", conditional=True)
+        client.get(http_stand_in.base_url + "/b", conditional=True)
+
+        assert client.get(http_stand_in.base_url + "/a", conditional=True).from_cache is False
+
+
+class TestGitHubServiceDownload:
+    """Test GitHubService downloads through the pooled client."""
+
+    def test_clone_repository_revalidates_archive(self, http_stand_in):
+        """Test branch detection and archive download with conditional requests."""
+        buffer = io.BytesIO()
+        with zipfile.ZipFile(buffer, 'w') as archive:
+            archive.writestr('repo-master/app.py', 'print("hi")\n')
+        http_stand_in.routes["/user/repo/archive/refs/heads/master.zip"] = etag_route(buffer.getvalue())
+        client = HttpClient()
+
+        for _ in range(2):
+            with GitHubService(http_client=client, base_url=http_stand_in.base_url) as service:
+                repo_path = service.clone_repository('https://github.com/user/repo')
+                assert service.get_source_files(repo_path) == {'app.py': 'print("hi")\n'}
+
+        metrics = client.metrics.snapshot()
+        # main.zip 404s twice; master.zip HEAD and GET are revalidated on the second run
+        assert metrics["status_counts"][404] == 2
+        assert metrics["not_modified"] == 2
+        assert len(http_stand_in.connections) == 1
@@ -0,0 +1,146 @@
+"""Tests for the self-hosted HTTP server entry point."""
+
+import http.client
+import json
+import threading
+import time
+from unittest.mock import Mock
+from src.handlers.http_server import DiagramHTTPServer
+from src.models import DiagramResponse, OutputFormat
+
+
+REQUEST = {
+    'code_files': {'user.py': 'class User:\n    pass'},
+    'diagram_type': 'class',
+    'output_format': 'mermaid'
+}
+
+
+class TestDiagramHTTPServer:
+    """Test cases for DiagramHTTPServer."""
+
+    def setup_method(self):
+        """Start a server on a free port with a mocked service."""
+        self.service = Mock()
+        self.service.generate_diagram.return_value = DiagramResponse(
+            diagram_code="classDiagram\n    class User",
+            format=OutputFormat.MERMAID,
+            metadata={"files_analyzed": 1},
+            success=True
+        )
+        self.server = DiagramHTTPServer(('127.0.0.1', 0), workers=2, keep_alive_timeout=2,
+                                        max_body_bytes=4096, service=self.service)
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        self.port = self.server.server_address[1]
+
+    def teardown_method(self):
+        """Stop the server."""
+        if not self.server.draining:
+            self.server.graceful_shutdown(timeout=5)
+        self.thread.join(timeout=5)
+
+    def connect(self):
+        return http.client.HTTPConnection('127.0.0.1', self.port, timeout=5)
+
+    def test_generate_diagram_with_keep_alive(self):
+        """Test two requests over one persistent connection reuse the service."""
+        conn = self.connect()
+        for _ in range(2):
+            conn.request('POST', '/generate-diagram', body=json.dumps(REQUEST),
+                         headers={'Content-Type': 'application/json'})
+            response = conn.getresponse()
+            body = json.loads(response.read())
+
+            assert response.status == 200
+            assert response.getheader('Access-Control-Allow-Origin') == '*'
+            assert body['diagram_code'] == "classDiagram\n    class User"
+            assert body['success'] is True
+        conn.close()
+
+        assert self.service.generate_diagram.call_count == 2
+
+    def test_validation_error_contract(self):
+        """Test that validation errors keep the Lambda error contract."""
+        conn = self.connect()
+        conn.request('POST', '/generate-diagram', body=json.dumps({'diagram_type': 'class'}))
+        response = conn.getresponse()
+
+        assert response.status == 400
+        assert 'At least one source must be provided' in json.loads(response.read())['error']
+
+    def test_request_too_large(self):
+        """Test that oversized bodies are rejected with 413 before reading them."""
+        conn = self.connect()
+        conn.request('POST', '/generate-diagram', body='x' * 5000)
+        response = conn.getresponse()
+
+        assert response.status == 413
+        assert response.getheader('Connection') == 'close'
+        self.service.generate_diagram.assert_not_called()
+
+    def test_negative_content_length(self):
+        """Test that a negative Content-Length is rejected with 400 instead of reading to EOF."""
+        conn = self.connect()
+        conn.putrequest('POST', '/generate-diagram')
+        conn.putheader('Content-Length', '-1')
+        conn.endheaders()
+        response = conn.getresponse()
+
+        assert response.status == 400
+        assert 'Content-Length' in json.loads(response.read())['error']
+        self.service.generate_diagram.assert_not_called()
+
+    def test_options_health_and_not_found(self):
+        """Test preflight, health check and unknown routes."""
+        conn = self.connect()
+        conn.request('OPTIONS', '/generate-diagram')
+        response = conn.getresponse()
+        response.read()
+        assert response.status == 200
+        assert 'POST' in response.getheader('Access-Control-Allow-Methods')
+
+        conn.request('GET', '/health')
+        response = conn.getresponse()
+        assert response.status == 200
+        assert json.loads(response.read())['status'] == 'ok'
+
+        conn.request('GET', '/missing')
+        response = conn.getresponse()
+        response.read()
+        assert response.status == 404
+
+    def test_graceful_shutdown_waits_for_in_flight(self):
+        """Test that shutdown lets a running generation finish."""
+        release = threading.Event()
+        original = self.service.generate_diagram.return_value
+
+        def slow_generate(request):
+            release.wait(5)
+            return original
+
+        self.service.generate_diagram.side_effect = slow_generate
+        result = {}
+
+        def client():
+            conn = self.connect()
+            conn.request('POST', '/generate-diagram', body=json.dumps(REQUEST))
+            response = conn.getresponse()
+            result['status'] = response.status
+            result['body'] = json.loads(response.read())
+
+        client_thread = threading.Thread(target=client)
+        client_thread.start()
+        while self.server.in_flight == 0:
+            time.sleep(0.01)
+
+        shutdown_thread = threading.Thread(target=lambda: result.update(drained=self.server.graceful_shutdown(timeout=5)))
+        shutdown_thread.start()
+        time.sleep(0.1)
+        release.set()
+        shutdown_thread.join(5)
+        client_thread.join(5)
+
+        assert result['status'] == 200
+        assert result['body']['success'] is True
+        assert result['drained'] is True
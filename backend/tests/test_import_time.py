@@ -0,0 +1,80 @@
+"""Cold-start import budget for the Lambda handler."""
+
+import json
+import os
+import re
+import subprocess
+import sys
+
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Cumulative import time allowed for the handler module; the default leaves room
+# for slow CI hosts, nightly jobs can tighten it through the environment
+IMPORT_TIME_BUDGET_MS = float(os.getenv("IMPORT_TIME_BUDGET_MS", "300"))
+
+SDK_MODULES = ("google.genai", "requests", "httpx")
+
+IMPORT_TIME_RE = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \|(\s*)(\S+)$")
+
+
+def import_time_report(code: str):
+    """
+    Run code in a fresh interpreter with -X importtime.
+
+    Returns:
+        Tuple of (module -> cumulative microseconds, set of modules loaded at exit)
+    """
+    script = f"{code}\nimport sys, json\nprint(json.dumps(sorted(sys.modules)))"
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", script],
+        cwd=BACKEND_DIR, capture_output=True, text=True, timeout=120, check=True
+    )
+
+    cumulative = {}
+    for line in result.stderr.splitlines():
+        match = IMPORT_TIME_RE.match(line)
+        if match:
+            cumulative[match.group(4)] = int(match.group(2))
+    loaded = set(json.loads(result.stdout.strip().splitlines()[-1]))
+    return cumulative, loaded
+
+
+def format_report(cumulative, top: int = 10) -> str:
+    slowest = sorted(cumulative.items(), key=lambda item: item[1], reverse=True)[:top]
+    return "\n".join(f"{us / 1000:9.1f} ms  {name}" for name, us in slowest)
+
+
+class TestImportTime:
+    """Guard the handler's cold-start import cost."""
+
+    def test_handler_import_within_budget(self):
+        """Test that importing the handler stays under the budget and skips the SDK."""
+        cumulative, loaded = import_time_report("import src.handlers.main_handler")
+
+        handler_ms = cumulative["src.handlers.main_handler"] / 1000
+        assert handler_ms <= IMPORT_TIME_BUDGET_MS, (
+            f"Handler import took {handler_ms:.1f} ms (budget {IMPORT_TIME_BUDGET_MS} ms)\n"
+            + format_report(cumulative)
+        )
+        assert not loaded.intersection(SDK_MODULES), format_report(cumulative)
+
+    def test_options_request_does_not_import_sdk(self):
+        """Test that a CORS preflight never loads the LLM SDK or pydantic."""
+        _, loaded = import_time_report(
+            "from src.handlers.main_handler import lambda_handler\n"
+            "assert lambda_handler({'httpMethod': 'OPTIONS'}, None)['statusCode'] == 200"
+        )
+
+        assert not loaded.intersection(SDK_MODULES + ("pydantic",))
+
+    def test_validation_error_does_not_import_sdk(self):
+        """Test that rejected requests never load the LLM SDK."""
+        _, loaded = import_time_report(
+            "import json\n"
+            "from src.handlers.main_handler import lambda_handler\n"
+            "body = {'code_files': {'a.py': 'x = 1'}, 'diagram_type': 'nope', 'output_format': 'mermaid'}\n"
+            "assert lambda_handler({'body': json.dumps(body)}, None)['statusCode'] == 400"
+        )
+
+        assert not loaded.intersection(SDK_MODULES)
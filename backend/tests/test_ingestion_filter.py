@@ -0,0 +1,145 @@
+"""Unit tests for the shared ingestion filter."""
+
+import random
+import shutil
+import string
+import subprocess
+import pytest
+from src.services.ingestion_filter import IngestionFilter, GitignoreMatcher, shannon_entropy
+
+
+def write(root, relative_path, content):
+    path = root / relative_path
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(content, encoding='utf-8')
+
+
+class TestGitignoreMatcher:
+    """Test cases for gitignore pattern compilation."""
+
+    def test_basic_patterns(self):
+        """Test unanchored, anchored, directory-only and negated patterns."""
+        matcher = GitignoreMatcher([
+            '# comment',
+            '*.log',
+            '/config.py',
+            'build/',
+            'docs/**/*.py',
+            '!keep.log',
+        ])
+
+        assert matcher.match('app.log') is True
+        assert matcher.match('nested/app.log') is True
+        assert matcher.match('keep.log') is False
+        assert matcher.match('config.py') is True
+        assert matcher.match('src/config.py') is None
+        assert matcher.match('build', is_dir=True) is True
+        assert matcher.match('build', is_dir=False) is None
+        assert matcher.match('src/build/out.py') is True
+        assert matcher.match('docs/a/b/c.py') is True
+        assert matcher.match('main.py') is None
+
+    def test_nested_base(self):
+        """Test that a nested .gitignore only applies below its directory."""
+        matcher = GitignoreMatcher(['*.py'], base='generated')
+
+        assert matcher.match('generated/client.py') is True
+        assert matcher.match('src/client.py') is None
+
+
+class TestIngestionFilter:
+    """Test cases for IngestionFilter."""
+
+    def test_walk_skips_gitignored_vendored_and_generated(self, tmp_path):
+        """Test the directory walk path and per-reason skip counts."""
+        write(tmp_path, '.gitignore', 'ignored/\n*.tmp.py\n')
+        write(tmp_path, 'src/main.py', 'def main():\n    pass\n')
+        write(tmp_path, 'src/scratch.tmp.py', 'x = 1\n')
+        write(tmp_path, 'ignored/secret.py', 'x = 1\n')
+        write(tmp_path, 'vendor/lib.go', 'package lib\n')
+        write(tmp_path, 'web/app.min.js', 'var a=1;')
+        write(tmp_path, 'api/service_pb2.py', '# Generated by the protocol buffer compiler.  DO NOT EDIT!\n')
+        write(tmp_path, 'api/client.py', '# Code generated by openapi-generator. DO NOT EDIT.\nclass Client: pass\n')
+        write(tmp_path, 'README.md', '# readme')
+
+        ingestion_filter = IngestionFilter(use_git=False)
+        files = dict(ingestion_filter.iter_source_files(str(tmp_path)))
+
+        assert list(files) == ['src/main.py']
+        report = ingestion_filter.report()
+        assert report['method'] == 'walk'
+        assert report['files_accepted'] == 1
+        assert report['skipped']['gitignored'] == 2
+        assert report['skipped']['vendored'] == 1
+        assert report['skipped']['generated_name'] == 2
+        assert report['skipped']['generated_header'] == 1
+        assert report['skipped']['unsupported_extension'] == 2
+
+    def test_generated_header_markers_only(self):
+        """Test that prose mentioning generation or editing does not drop hand-written files."""
+        ingestion_filter = IngestionFilter()
+
+        assert ingestion_filter.check_content('// <auto-generated />\nclass Order {}') == 'generated_header'
+        assert ingestion_filter.check_content('package api\n// Code generated by mockgen. DO NOT EDIT.\n') == (
+            'generated_header'
+        )
+        assert ingestion_filter.check_content('# @generated\nx = 1\n') == 'generated_header'
+        assert ingestion_filter.check_content('// IDs are auto-generated by the database\nclass Order {}') is None
+        assert ingestion_filter.check_content('"""Report generated by the nightly job."""') is None
+        assert ingestion_filter.check_content('# Do not edit these constants without updating docs') is None
+        assert ingestion_filter.check_content('x = 1\n' * 5 + '# @generated\n') is None
+
+    def test_minified_and_high_entropy_content(self):
+        """Test content heuristics for minified bundles and embedded blobs."""
+        ingestion_filter = IngestionFilter()
+        minified = 'function a(){return 1};' * 200
+        rng = random.Random(0)
+        blob = 'DATA = "' + ''.join(rng.choice(string.ascii_letters + string.digits + '+/') for _ in range(4000)) + '"\n'
+        blob = '\n'.join(blob[i:i + 80] for i in range(0, len(blob), 80))
+        regular = 'class User:\n    def __init__(self, name):\n        self.name = name\n' * 40
+
+        assert ingestion_filter.check_content(minified) == 'minified'
+        assert ingestion_filter.check_content(blob) == 'high_entropy'
+        assert ingestion_filter.check_content(regular) is None
+        assert shannon_entropy(blob) > shannon_entropy(regular)
+
+    def test_max_files_and_too_large(self, tmp_path):
+        """Test the file limit and the size limit."""
+        for i in range(5):
+            write(tmp_path, f'm{i}.py', f'x = {i}\n')
+
+        ingestion_filter = IngestionFilter(use_git=False)
+        assert len(dict(ingestion_filter.iter_source_files(str(tmp_path), max_files=3))) == 3
+
+        write(tmp_path, 'huge.py', 'x = 1\n' * 50)
+        ingestion_filter = IngestionFilter(use_git=False, max_file_size=100)
+        files = dict(ingestion_filter.iter_source_files(str(tmp_path)))
+
+        assert 'huge.py' not in files
+        assert ingestion_filter.skip_counts['too_large'] == 1
+
+    @pytest.mark.skipif(shutil.which('git') is None, reason="git not available")
+    def test_git_ls_files_fast_path(self, tmp_path):
+        """Test that git checkouts are listed through git ls-files."""
+        subprocess.run(['git', 'init', '-q', str(tmp_path)], check=True)
+        write(tmp_path, '.gitignore', 'out/\n')
+        write(tmp_path, 'app.py', 'print(1)\n')
+        write(tmp_path, 'out/build.py', 'print(2)\n')
+
+        ingestion_filter = IngestionFilter(skip_directory=lambda d: d.startswith('.'))
+        files = dict(ingestion_filter.iter_source_files(str(tmp_path)))
+
+        assert ingestion_filter.method == 'git_ls_files'
+        assert list(files) == ['app.py']
+
+    def test_filter_code_files(self):
+        """Test filtering an in-memory code_files map."""
+        ingestion_filter = IngestionFilter()
+        accepted = ingestion_filter.filter_code_files({
+            'src/user.py': 'class User:\n    pass\n',
+            'third_party/lib.py': 'class Lib:\n    pass\n',
+            'static/app.bundle.js': 'var a;',
+        })
+
+        assert list(accepted) == ['src/user.py']
+        assert ingestion_filter.report()['skipped'] == {'vendored': 1, 'generated_name': 1}
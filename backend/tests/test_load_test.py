@@ -0,0 +1,84 @@
+"""Smoke tests for the load/soak harness."""
+
+from benchmarks import load_test
+from src.handlers import main_handler
+from src.models import AnalysisRequest, DiagramType, OutputFormat
+from src.services import admission
+from src.services.admission import AdmissionController
+from src.services.diagram_service import DiagramService
+from src.services.ir_cache import IRCache
+from src.services.single_flight import SingleFlight
+
+
+class TestStatistics:
+    """Test cases for the report helpers."""
+
+    def test_percentiles_and_rates(self):
+        """Test nearest-rank percentiles and the status breakdown."""
+        samples = [(i / 100, 200) for i in range(1, 98)] + [(1.0, 429), (2.0, 500), (3.0, 0)]
+
+        report = load_test.summarize(samples, seconds=10)
+
+        assert report['requests'] == 100
+        assert report['throughput_rps'] == 10.0
+        assert report['latency_s']['p50'] == 0.5
+        assert report['latency_s']['p99'] == 2.0
+        assert report['error_rate'] == 0.02
+        assert report['rejected_rate'] == 0.01
+
+    def test_thresholds(self):
+        """Test that only exceeded thresholds are reported."""
+        report = {'latency_s': {'p50': 0.1, 'p95': 0.5, 'p99': 0.9}, 'error_rate': 0.0, 'rejected_rate': 0.0,
+                  'rss_growth_mb': 80.0, 'throughput_rps': 12.0}
+
+        violations = load_test.check_thresholds(report, {
+            'max_p95': 1.0, 'max_rss_growth_mb': 64, 'min_throughput': 20, 'max_heap_growth_mb': 1, 'max_p99': None
+        })
+
+        assert violations == ['rss_growth_mb 80.0 > 64', 'throughput 12.0 rps < 20']
+
+
+class TestTargets:
+    """Run a few requests through each target with an instant fake LLM."""
+
+    def run(self, target):
+        try:
+            return load_test.run_load(target, users=4, requests=12, rounds=2,
+                                      body_factory=lambda i: load_test.make_body(3, 0.5, i))
+        finally:
+            target.close()
+
+    def test_lambda_target(self):
+        """Test that lambda_handler answers every request and the globals are restored."""
+        controller = admission._default_controller
+        report = self.run(load_test.LambdaTarget(load_test.FakeLLMProvider(latency=0), AdmissionController()))
+
+        assert report['statuses'] == {'200': 24}
+        assert len(report['rounds']) == 2
+        assert admission._default_controller is controller
+        assert 'DiagramService' not in main_handler.__dict__ or main_handler.DiagramService.__name__ == 'DiagramService'
+
+    def test_http_target(self):
+        """Test the same load over the local HTTP server."""
+        target = load_test.HttpTarget(load_test.FakeLLMProvider(latency=0), AdmissionController(), workers=4)
+
+        report = self.run(target)
+
+        assert report['statuses'] == {'200': 24}
+        assert report['error_rate'] == 0.0
+
+    def test_provider_paths(self):
+        """Test that the fake provider takes the default IR path unless asked for direct generation."""
+        request = AnalysisRequest(code_files={'a.py': 'class A:\n    pass\n'}, diagram_type=DiagramType.CLASS,
+                                  output_format=OutputFormat.PLANTUML)
+
+        def generate(provider):
+            return DiagramService(llm_provider=provider, single_flight=SingleFlight(),
+                                  ir_cache=IRCache()).generate_diagram(request)
+
+        via_ir = generate(load_test.FakeLLMProvider(latency=0, response_bytes=100))
+        direct = generate(load_test.FakeLLMProvider(latency=0, response_bytes=100, ir=False))
+
+        assert via_ir.ir is not None and via_ir.diagram_code.startswith('@startuml')
+        assert via_ir.metadata['ir']['nodes'] == 5
+        assert direct.ir is None and direct.diagram_code.startswith('classDiagram')
@@ -0,0 +1,185 @@
+"""Unit tests for memory accounting and graceful degradation."""
+
+import json
+import pytest
+from unittest.mock import patch
+from src.handlers.main_handler import lambda_handler
+from src.models import AnalysisRequest, DiagramType, OutputFormat
+from src.services import memory_budget
+from src.services.diagram_service import DiagramService
+from src.services.memory_budget import (MEMORY_LIMIT_ERROR, MemoryBudget, MemoryLimitExceeded, extract_skeleton,
+                                        file_priority, fit_prompt)
+from src.services.single_flight import SingleFlight
+from src.services.source_records import SourceFiles, SourceRecord
+
+KB = 1024
+
+CLASS_SOURCE = (
+    "import os\n"
+    "from typing import List\n"
+    "\n"
+    "class Order(Base):\n"
+    "    def total(self) -> int:\n"
+    "        return sum(line.price for line in self.lines)\n"
+    "\n"
+    "def load_orders(path):\n"
+    "    return [Order() for _ in range(3)]\n"
+)
+
+
+def padded(source, size):
+    """Source of roughly the given size, padded with function body lines."""
+    body = "        value = compute(value)\n"
+    return source + body * max(0, (size - len(source)) // len(body))
+
+
+class RecordingProvider:
+    """Provider that records the files it was given."""
+
+    def __init__(self):
+        self.source_files = None
+
+    def generate_diagram_from_source_files(self, source_files, diagram_type, output_format, file_aliases=None):
+        self.source_files = dict(source_files)
+        return "classDiagram", "analysis"
+
+
+class TestDegradation:
+    """Test cases for file priorities, skeletons and fit_prompt."""
+
+    def test_file_priority(self):
+        """Test that tests go first, then examples and docs, then configuration."""
+        assert file_priority('tests/test_order.py') == 0
+        assert file_priority('src/order.test.ts') == 0
+        assert file_priority('examples/demo.py') == 1
+        assert file_priority('deploy/values.yaml') == 2
+        assert file_priority('src/order.py') == 3
+
+    def test_extract_skeleton(self):
+        """Test that imports and signatures survive and bodies are dropped."""
+        skeleton = extract_skeleton(CLASS_SOURCE)
+
+        assert skeleton == (
+            "import os\n"
+            "from typing import List\n"
+            "class Order(Base):\n"
+            "    def total(self) -> int:\n"
+            "def load_orders(path):\n"
+        )
+
+    def test_fitting_prompt_is_untouched(self):
+        """Test that a small prompt is returned as is and charged."""
+        budget = MemoryBudget(limit_mb=64, reserved_mb=0)
+        files = {'order.py': CLASS_SOURCE, 'tests/test_order.py': CLASS_SOURCE}
+
+        assert fit_prompt(files, budget) is files
+        assert budget.steps == []
+        assert budget.ledger['prompt'] > 0
+
+    def test_low_priority_files_are_dropped_first(self):
+        """Test that the test file is dropped before any code is reduced."""
+        budget = MemoryBudget(limit_mb=3, reserved_mb=0)
+        files = {
+            'order.py': padded(CLASS_SOURCE, 100 * KB),
+            'tests/test_order.py': padded(CLASS_SOURCE, 300 * KB),
+            'docs/conf.py': padded(CLASS_SOURCE, 20 * KB),
+        }
+
+        result = fit_prompt(files, budget)
+
+        assert list(result) == ['order.py', 'docs/conf.py']
+        assert result['order.py'] == files['order.py']
+        assert budget.steps == [{'step': 'drop_low_priority', 'files': ['tests/test_order.py']}]
+
+    def test_large_code_is_reduced_to_skeletons(self):
+        """Test that lazy records are replaced by their skeleton when dropping is not enough."""
+        budget = MemoryBudget(limit_mb=3, reserved_mb=0)
+        files = SourceFiles([
+            SourceRecord.from_content('order.py', padded(CLASS_SOURCE, 600 * KB)),
+            SourceRecord.from_content('customer.py', CLASS_SOURCE),
+        ])
+
+        result = fit_prompt(files, budget)
+
+        assert isinstance(result, SourceFiles)
+        assert result['order.py'] == extract_skeleton(CLASS_SOURCE)
+        assert result['customer.py'] == CLASS_SOURCE
+        assert budget.steps == [{'step': 'skeleton', 'files': ['order.py']}]
+
+    def test_rejected_when_skeletons_do_not_fit(self):
+        """Test that signatures alone over the limit raise with the report."""
+        budget = MemoryBudget(limit_mb=3, reserved_mb=0)
+        files = {'imports.py': "import os\n" * (80 * KB)}
+
+        with pytest.raises(MemoryLimitExceeded) as raised:
+            fit_prompt(files, budget)
+
+        assert MEMORY_LIMIT_ERROR in str(raised.value)
+        assert raised.value.report['steps'][-1]['step'] == 'reject'
+
+
+class TestMemoryLimits:
+    """Test the limits through the service and the Lambda handler."""
+
+    def test_service_reports_memory_decisions(self):
+        """Test that the degradation steps reach the response metadata."""
+        provider = RecordingProvider()
+        service = DiagramService(llm_provider=provider, single_flight=SingleFlight())
+        # Each file stays under the ingestion filter's per-file size limit
+        tests = {f'tests/test_order{i}.py': padded(CLASS_SOURCE, 60 * KB) + f"# {i}\n" for i in range(4)}
+        request = AnalysisRequest(
+            code_files={'order.py': CLASS_SOURCE, **tests},
+            diagram_type=DiagramType.CLASS,
+            output_format=OutputFormat.MERMAID,
+            filters={'deduplicate': False},
+        )
+
+        with patch.object(memory_budget, 'DEFAULT_MEMORY_LIMIT_MB', 3), \
+                patch.object(memory_budget, 'DEFAULT_RESERVED_MB', 0):
+            response = service.generate_diagram(request)
+
+        assert response.success
+        memory = response.metadata['memory']
+        assert memory['limit_mb'] == 3.0
+        [step] = memory['steps']
+        assert step['step'] == 'drop_low_priority'
+        # Only as many test files as needed are dropped
+        assert 0 < len(step['files']) < len(tests)
+        assert set(provider.source_files) == {'order.py', *tests} - set(step['files'])
+        assert set(memory['ledger_mb']) == {'request_body', 'http_cache', 'normalized', 'prompt'}
+        # Degradation runs first, so later stages only read the files that are kept
+        assert response.metadata['normalization']['files'] == len(provider.source_files)
+
+    def test_oversized_body_is_rejected_before_parsing(self):
+        """Test that the handler answers 413 without parsing a body that cannot fit."""
+        event = {'body': json.dumps({
+            'code_files': {'order.py': 'x' * (1024 * KB)},
+            'diagram_type': 'class',
+            'output_format': 'mermaid',
+        })}
+
+        with patch.object(memory_budget, 'DEFAULT_MEMORY_LIMIT_MB', 3), \
+                patch.object(memory_budget, 'DEFAULT_RESERVED_MB', 0), \
+                patch('src.handlers.main_handler.codec.loads') as loads:
+            response = lambda_handler(event, {})
+
+        assert response['statusCode'] == 413
+        assert MEMORY_LIMIT_ERROR in json.loads(response['body'])['error']
+        loads.assert_not_called()
+
+    def test_service_rejection_maps_to_413(self):
+        """Test that a request the service cannot degrade enough is answered with 413."""
+        event = {'body': json.dumps({
+            'code_files': {f'imports{i}.py': f"import os{i}\n" * (5 * KB) for i in range(5)},
+            'diagram_type': 'class',
+            'output_format': 'mermaid',
+        })}
+
+        with patch.object(memory_budget, 'DEFAULT_MEMORY_LIMIT_MB', 3), \
+                patch.object(memory_budget, 'DEFAULT_RESERVED_MB', 0), \
+                patch('src.handlers.main_handler.DiagramService') as service_class:
+            service_class.return_value = DiagramService(llm_provider=RecordingProvider(), single_flight=SingleFlight())
+            response = lambda_handler(event, {})
+
+        assert response['statusCode'] == 413
+        assert 'signatures' in json.loads(response['body'])['error']
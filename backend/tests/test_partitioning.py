@@ -0,0 +1,178 @@
+"""Unit tests for partitioned diagram generation."""
+
+import asyncio
+import xml.etree.ElementTree as ET
+from src.models import AnalysisRequest, DiagramType, OutputFormat
+from src.services.diagram_service import DiagramService
+from src.services.async_diagram_service import AsyncDiagramService
+from src.services.single_flight import SingleFlight
+from src.services.partitioning import needs_partitioning, plan_partitions
+from src.services.source_records import SourceFiles, SourceRecord
+
+
+def make_sources():
+    return {
+        'app.py': 'from billing.invoice import Invoice\n\ndef main():\n    Invoice()\n',
+        'billing/invoice.py': 'class Invoice:\n    pass\n',
+        'billing/payment.py': 'class Payment:\n    customer: "Customer"\n',
+        'users/customer.py': 'class Customer:\n    pass\n',
+        'users/admin.py': 'class Admin(Customer):\n    pass\n',
+    }
+
+
+class RecordingProvider:
+    """Provider that records the files it was asked to analyse."""
+
+    model_name = "fake-model"
+
+    def __init__(self):
+        self.calls = []
+
+    def generate_diagram_from_source_files(self, source_files, diagram_type, output_format, file_aliases=None):
+        self.calls.append(sorted(source_files))
+        return "classDiagram", "analysis"
+
+    async def agenerate_diagram_from_source_files(self, source_files, diagram_type, output_format, file_aliases=None):
+        return self.generate_diagram_from_source_files(source_files, diagram_type, output_format, file_aliases)
+
+
+def make_service(provider):
+    return DiagramService(llm_provider=provider, single_flight=SingleFlight())
+
+
+def make_request(filters, output_format=OutputFormat.MERMAID):
+    return AnalysisRequest(
+        code_files=make_sources(),
+        diagram_type=DiagramType.CLASS,
+        output_format=output_format,
+        filters=filters
+    )
+
+
+class TestPlanPartitions:
+    """Test cases for plan_partitions."""
+
+    def test_small_sources_stay_whole(self):
+        """Test that sources within budget form a single partition."""
+        plan = plan_partitions(make_sources())
+
+        assert [partition.id for partition in plan.partitions] == ["root"]
+        assert not needs_partitioning(make_sources())
+
+    def test_split_by_directory(self):
+        """Test that an oversized tree splits into one partition per directory."""
+        plan = plan_partitions(make_sources(), max_files=2)
+
+        assert [partition.id for partition in plan.partitions] == ["root", "billing", "users"]
+        assert plan.get("billing").files == ["billing/invoice.py", "billing/payment.py"]
+        assert sum(len(partition.files) for partition in plan.partitions) == len(make_sources())
+
+    def test_large_directory_is_chunked(self):
+        """Test that a flat directory over budget splits into numbered chunks."""
+        sources = {f'models/m{i}.py': f'class M{i}:\n    pass\n' for i in range(5)}
+        plan = plan_partitions(sources, max_files=2)
+
+        assert [partition.id for partition in plan.partitions] == ["models~1", "models~2", "models~3"]
+        assert plan.partitions[0].title == "models (1/3)"
+
+    def test_dependency_edges(self):
+        """Test that references to names defined elsewhere become weighted edges."""
+        plan = plan_partitions(make_sources(), max_files=2)
+
+        assert ("root", "billing", 1) in plan.edges
+        assert ("billing", "users", 1) in plan.edges
+        assert all(source != target for source, target, _ in plan.edges)
+
+    def test_lazy_files_read_once(self):
+        """Test that planning reads each lazy file once, for definitions and references alike."""
+        loads = []
+        files = SourceFiles(
+            SourceRecord.from_content(path, content, loader=lambda path=path, content=content: loads.append(path) or content)
+            for path, content in make_sources().items()
+        )
+
+        plan = plan_partitions(files, max_files=2)
+
+        assert ("root", "billing", 1) in plan.edges
+        assert sorted(loads) == sorted(make_sources())
+
+    def test_ids_are_stable(self):
+        """Test that the plan does not depend on dict order."""
+        sources = make_sources()
+        reversed_sources = dict(reversed(list(sources.items())))
+
+        assert plan_partitions(sources, max_files=2).index() == plan_partitions(reversed_sources, max_files=2).index()
+
+    def test_overview_formats(self):
+        """Test overview rendering in every output format."""
+        plan = plan_partitions(make_sources(), max_files=2)
+
+        mermaid = plan.render_overview("mermaid")
+        assert mermaid.startswith("flowchart LR")
+        assert '["billing<br/>2 archivos"]' in mermaid
+
+        plantuml = plan.render_overview("plantuml")
+        assert plantuml.startswith("@startuml") and "..>" in plantuml
+
+        root = ET.fromstring(plan.render_overview("drawio"))
+        assert len(root.findall(".//mxCell[@vertex='1']")) == 3
+
+
+class TestPartitionedGeneration:
+    """Test partitioned mode in DiagramService."""
+
+    def test_overview_skips_llm(self):
+        """Test that the overview is built without calling the provider."""
+        provider = RecordingProvider()
+        response = make_service(provider).generate_diagram(make_request({'partition': True, 'partition_max_files': 2}))
+
+        assert response.success
+        assert provider.calls == []
+        assert response.metadata['analysis_method'] == "partition_overview"
+        assert response.metadata['partitions']['partition_count'] == 3
+        assert [entry['id'] for entry in response.metadata['partitions']['index']] == ["root", "billing", "users"]
+
+    def test_detail_analyses_one_partition(self):
+        """Test that a partition_id restricts the prompt to that partition."""
+        provider = RecordingProvider()
+        response = make_service(provider).generate_diagram(
+            make_request({'partition': True, 'partition_max_files': 2, 'partition_id': 'users'})
+        )
+
+        assert response.success
+        assert provider.calls == [["users/admin.py", "users/customer.py"]]
+        assert response.metadata['files_analyzed'] == 2
+        assert response.metadata['partition']['id'] == "users"
+        assert len(response.metadata['partition']['index']) == 3
+
+    def test_unknown_partition(self):
+        """Test that an unknown partition_id fails with the index."""
+        response = make_service(RecordingProvider()).generate_diagram(
+            make_request({'partition': True, 'partition_max_files': 2, 'partition_id': 'missing'})
+        )
+
+        assert not response.success
+        assert "missing" in response.error
+        assert len(response.metadata['partitions']['index']) == 3
+
+    def test_auto_mode_small_sources(self):
+        """Test that 'auto' leaves sources within budget alone."""
+        provider = RecordingProvider()
+        response = make_service(provider).generate_diagram(make_request({'partition': 'auto'}))
+
+        assert response.success
+        assert len(provider.calls) == 1
+        assert 'partition' not in response.metadata
+
+    def test_async_overview(self):
+        """Test the overview through AsyncDiagramService."""
+        provider = RecordingProvider()
+        service = AsyncDiagramService(make_service(provider))
+
+        response = asyncio.run(service.generate_diagram(
+            make_request({'partition': 'auto', 'partition_max_files': 2}, output_format=OutputFormat.PLANTUML)
+        ))
+
+        assert response.success
+        assert provider.calls == []
+        assert response.diagram_code.startswith("@startuml")
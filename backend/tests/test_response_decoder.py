@@ -0,0 +1,157 @@
+"""Unit tests for the tolerant LLM response decoder."""
+
+import json
+import os
+from types import SimpleNamespace
+from unittest.mock import patch
+from src.llm.response_decoder import DecodedResponse, continue_code, decode_response, salvage_fields
+from src.models import DiagramType, OutputFormat
+
+PLANTUML = '@startuml\nclass Order\nclass Customer\nCustomer --> Order\n@enduml\n'
+DRAWIO = '<mxfile><diagram><mxGraphModel><root><mxCell id="0"/></root></mxGraphModel></diagram></mxfile>'
+
+
+class TestDecodeResponse:
+    """Test cases for decode_response."""
+
+    def test_strict_json(self):
+        """Test that valid JSON is read as before, fences included."""
+        text = json.dumps({'metadata': 'm', 'codigoUML': '```mermaid\nclassDiagram\n```'})
+
+        decoded = decode_response(text, OutputFormat.MERMAID)
+
+        assert (decoded.code, decoded.metadata, decoded.method, decoded.truncated) == ('classDiagram\n', 'm', 'json', False)
+
+    def test_json_wrapped_in_prose_and_fence(self):
+        """Test that JSON inside a markdown fence or after a preamble is found."""
+        document = json.dumps({'metadata': 'm', 'codigoUML': PLANTUML})
+
+        for text in (f'```json\n{document}\n```', f'Aquí está el resultado:\n{document}\nSaludos'):
+            decoded = decode_response(text, OutputFormat.PLANTUML)
+            assert decoded.method == 'json'
+            assert decoded.code == PLANTUML
+
+    def test_truncated_code_is_salvaged(self):
+        """Test that code cut off mid-string is kept and flagged as truncated."""
+        text = json.dumps({'codigoUML': PLANTUML, 'metadata': 'explicación'})[:60]
+
+        decoded = decode_response(text, OutputFormat.PLANTUML, finish_reason='MAX_TOKENS')
+
+        assert decoded.method == 'salvaged'
+        assert decoded.truncated
+        assert PLANTUML.startswith(decoded.code)
+        assert decoded.code.startswith('@startuml\nclass Order')
+
+    def test_truncated_metadata_keeps_complete_code(self):
+        """Test that losing the end of the explanation does not flag the code."""
+        text = json.dumps({'codigoUML': PLANTUML, 'metadata': 'una explicación larga'})[:-8]
+
+        decoded = decode_response(text, OutputFormat.PLANTUML)
+
+        assert decoded.code == PLANTUML
+        assert decoded.metadata.startswith('una explicación')
+        assert not decoded.truncated
+
+    def test_half_escape_at_cut(self):
+        """Test that a cut inside an escape sequence is dropped."""
+        fields = salvage_fields('{"codigoUML": "classDiagram\\n  class A\\u00')
+
+        assert fields['codigoUML'] == ('classDiagram\n  class A', False)
+
+    def test_fenced_blocks_for_every_format(self):
+        """Test that plain-text replies with fenced code are accepted."""
+        text = f'Explicación.\n```puml\n{PLANTUML}```\n```xml\n{DRAWIO}\n```'
+
+        assert decode_response(text, OutputFormat.PLANTUML).code == PLANTUML
+        assert decode_response(text, OutputFormat.DRAWIO).code == DRAWIO + '\n'
+
+    def test_bare_incomplete_drawio(self):
+        """Test that unfenced XML without its closing tag is flagged."""
+        decoded = decode_response(DRAWIO[:50], OutputFormat.DRAWIO)
+
+        assert decoded.method == 'raw'
+        assert decoded.truncated
+
+    def test_unrecognised_text(self):
+        """Test that text without a diagram yields empty code."""
+        decoded = decode_response('Lo siento, no puedo ayudar.', OutputFormat.MERMAID)
+
+        assert (decoded.code, decoded.method) == ('', 'empty')
+
+
+class TestContinueCode:
+    """Test cases for continue_code."""
+
+    def test_overlap_is_removed(self):
+        """Test that a tail repeating the end of the partial code is joined once."""
+        partial = DecodedResponse(PLANTUML[:30], 'm', 'salvaged', True)
+
+        decoded = continue_code(partial, '```plantuml\n' + PLANTUML[15:] + '```', OutputFormat.PLANTUML)
+
+        assert decoded.code == PLANTUML
+        assert not decoded.truncated
+
+
+class TestProviderContinuation:
+    """Test GeminiProvider asking for the missing tail."""
+
+    def test_truncated_reply_is_continued(self):
+        """Test that a MAX_TOKENS reply triggers one continuation call."""
+        from src.llm.gemini_provider import GeminiProvider
+
+        cut = json.dumps({'codigoUML': PLANTUML, 'metadata': 'm'})[:40]
+        received = len(salvage_fields(cut)['codigoUML'][0])
+        replies = [
+            SimpleNamespace(text=cut, candidates=[SimpleNamespace(finish_reason=SimpleNamespace(name='MAX_TOKENS'))]),
+            SimpleNamespace(text=PLANTUML[received:], candidates=[SimpleNamespace(finish_reason=SimpleNamespace(name='STOP'))]),
+        ]
+
+        class FakeModels:
+            def __init__(self):
+                self.calls = []
+
+            def generate_content(self, model, contents, config):
+                self.calls.append((contents, config))
+                return replies[len(self.calls) - 1]
+
+        with patch.dict(os.environ, {'GOOGLE_API_KEY': 'test-key'}):
+            provider = GeminiProvider()
+        models = FakeModels()
+        provider.router.backends[0].client = SimpleNamespace(models=models)
+
+        code, _ = provider.generate_diagram_from_source_files(
+            {'a.py': 'class Order: pass'}, DiagramType.CLASS, OutputFormat.PLANTUML
+        )
+
+        assert code == PLANTUML
+        assert len(models.calls) == 2
+        contents, config = models.calls[1]
+        assert [content.role for content in contents] == ['user', 'model', 'user']
+        assert config.response_mime_type == 'text/plain'
+
+    def test_truncated_ir_is_continued(self):
+        """Test that an IR reply cut off by the output token limit is completed, not discarded."""
+        from src.llm.gemini_provider import GeminiProvider
+
+        text = json.dumps({'diagrama': {'nodes': [{'id': 'Order', 'label': 'Order', 'kind': 'class'}], 'edges': []},
+                           'metadata': 'm'})
+        replies = [
+            SimpleNamespace(text=text[:50], candidates=[SimpleNamespace(finish_reason=SimpleNamespace(name='MAX_TOKENS'))]),
+            SimpleNamespace(text=text[50:], candidates=[SimpleNamespace(finish_reason=SimpleNamespace(name='STOP'))]),
+        ]
+        calls = []
+
+        def generate_content(model, contents, config):
+            calls.append(config)
+            return replies[len(calls) - 1]
+
+        with patch.dict(os.environ, {'GOOGLE_API_KEY': 'test-key'}):
+            provider = GeminiProvider()
+        provider.router.backends[0].client = SimpleNamespace(models=SimpleNamespace(generate_content=generate_content))
+
+        raw_ir, metadata = provider.generate_ir_from_source_files({'a.py': 'class Order: pass'}, DiagramType.CLASS)
+
+        assert raw_ir['nodes'][0]['id'] == 'Order'
+        assert metadata == 'm'
+        assert len(calls) == 2
+        assert calls[1].response_mime_type == 'text/plain'
@@ -0,0 +1,265 @@
+"""Unit tests for the LLM key/model router."""
+
+import asyncio
+import json
+import os
+import threading
+import time
+import pytest
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import patch
+from src.llm.router import Backend, BackendRouter, is_quota_error, is_retryable_error, pool_from_env
+from src.models import DiagramType, OutputFormat
+
+
+class FakeApiError(Exception):
+    """Stand-in for SDK errors, which carry an HTTP status in `code`."""
+
+    def __init__(self, code, message=""):
+        super().__init__(f"{code} {message}")
+        self.code = code
+
+
+class FakeBackend:
+    """Local backend with injected latency and scripted failures."""
+
+    def __init__(self, latency=0.0, errors=()):
+        self.latency = latency
+        self.errors = list(errors)
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def __call__(self, payload="ok"):
+        with self._lock:
+            self.calls += 1
+            error = self.errors.pop(0) if self.errors else None
+        time.sleep(self.latency)
+        if error:
+            raise error
+        return payload
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def make_router(fakes, **kwargs):
+    backends = [Backend(f"key{i}", "model", fake) for i, fake in enumerate(fakes)]
+    return BackendRouter(backends, **kwargs)
+
+
+def route(router):
+    return router.call(lambda backend: backend.client())
+
+
+class TestBackendRouter:
+    """Test cases for BackendRouter."""
+
+    def test_prefers_faster_backend(self):
+        """Test that EWMA latency steers traffic to the fast backend."""
+        slow, fast = FakeBackend(latency=0.05), FakeBackend(latency=0.001)
+        router = make_router([slow, fast])
+
+        for _ in range(12):
+            route(router)
+
+        # Each backend is measured once, then the fast one takes the rest
+        assert slow.calls == 1
+        assert fast.calls == 11
+
+    def test_least_outstanding_spreads_concurrent_calls(self):
+        """Test that concurrent calls spread across equally fast backends."""
+        fakes = [FakeBackend(latency=0.05) for _ in range(3)]
+        router = make_router(fakes)
+
+        with ThreadPoolExecutor(max_workers=3) as pool:
+            list(pool.map(lambda _: route(router), range(3)))
+
+        assert [fake.calls for fake in fakes] == [1, 1, 1]
+
+    def test_quota_error_fails_over_and_ejects(self):
+        """Test that a 429 moves the call to another key and ejects the first."""
+        limited, spare = FakeBackend(errors=[FakeApiError(429, "RESOURCE_EXHAUSTED")]), FakeBackend()
+        clock = FakeClock()
+        router = make_router([limited, spare], cooldown=30, clock=clock)
+
+        assert route(router) == "ok"
+        route(router)
+        route(router)
+
+        assert limited.calls == 1
+        assert spare.calls == 3
+        assert router.snapshot()[0]["ejected_for"] == 30
+
+    def test_ejected_backend_returns_after_cooldown(self):
+        """Test that an ejected backend is tried again once its cooldown ends."""
+        flaky, spare = FakeBackend(errors=[FakeApiError(429)]), FakeBackend(latency=0.01)
+        clock = FakeClock()
+        router = make_router([flaky, spare], cooldown=30, clock=clock)
+
+        route(router)
+        clock.now += 31
+        route(router)
+
+        assert flaky.calls == 2
+
+    def test_consecutive_failures_eject(self):
+        """Test that transient errors eject only after max_failures in a row."""
+        router = make_router([FakeBackend(errors=[FakeApiError(503)] * 2)], max_failures=2)
+
+        with pytest.raises(FakeApiError):
+            route(router)
+        assert router.snapshot()[0]["ejected_for"] == 0
+        with pytest.raises(FakeApiError):
+            route(router)
+
+        assert router.snapshot()[0]["ejected_for"] > 0
+
+    def test_failures_shift_traffic_before_ejection(self):
+        """Test that a failing backend loses traffic even below max_failures."""
+        flaky = FakeBackend(errors=[FakeApiError(503)])
+        steady = FakeBackend(latency=0.01)
+        router = make_router([flaky, steady], max_failures=5)
+
+        for _ in range(5):
+            route(router)
+
+        assert flaky.calls == 1
+        assert steady.calls == 5
+
+    def test_cooldown_doubles(self):
+        """Test exponential cooldown for a backend that keeps failing."""
+        clock = FakeClock()
+        router = make_router([FakeBackend(errors=[FakeApiError(429)] * 2)], cooldown=10, clock=clock)
+
+        with pytest.raises(FakeApiError):
+            route(router)
+        clock.now += 11
+        with pytest.raises(FakeApiError):
+            route(router)
+
+        assert router.snapshot()[0]["ejected_for"] == 20
+
+    def test_non_retryable_error_is_raised(self):
+        """Test that bad requests are not retried and do not hurt health."""
+        broken, spare = FakeBackend(errors=[FakeApiError(400, "INVALID_ARGUMENT")]), FakeBackend()
+        router = make_router([broken, spare])
+
+        with pytest.raises(FakeApiError):
+            route(router)
+
+        assert spare.calls == 0
+        assert router.snapshot()[0]["failures"] == 0
+
+    def test_all_ejected_still_serves(self):
+        """Test that the backend recovering first is used when none is healthy."""
+        clock = FakeClock()
+        first = FakeBackend(errors=[FakeApiError(429)])
+        second = FakeBackend(errors=[FakeApiError(429)])
+        router = make_router([first, second], cooldown=30, max_attempts=1, clock=clock)
+
+        for _ in range(2):
+            with pytest.raises(FakeApiError):
+                route(router)
+        assert route(router) == "ok"
+
+    def test_rpm_limit(self):
+        """Test that the per-key rate limit moves traffic to other keys."""
+        clock = FakeClock()
+        fakes = [FakeBackend(), FakeBackend()]
+        router = make_router(fakes, rpm_limit=2, clock=clock)
+
+        for _ in range(4):
+            route(router)
+        assert [fake.calls for fake in fakes] == [2, 2]
+
+        clock.now += 61
+        route(router)
+        assert sum(fake.calls for fake in fakes) == 5
+
+    def test_async_failover(self):
+        """Test acall with async fake backends."""
+        async def limited():
+            await asyncio.sleep(0.01)
+            raise FakeApiError(429)
+
+        async def spare():
+            await asyncio.sleep(0.01)
+            return "ok"
+
+        router = BackendRouter([Backend("key0", "model", limited), Backend("key1", "model", spare)])
+
+        assert asyncio.run(router.acall(lambda backend: backend.client())) == "ok"
+        assert router.snapshot()[0]["failures"] == 1
+
+
+class TestErrorClassification:
+    """Test error classification."""
+
+    def test_classification(self):
+        """Test quota, transient and permanent errors."""
+        assert is_quota_error(FakeApiError(429))
+        assert is_quota_error(RuntimeError("RESOURCE_EXHAUSTED: quota exceeded"))
+        assert is_retryable_error(FakeApiError(503))
+        assert is_retryable_error(TimeoutError())
+        assert not is_retryable_error(FakeApiError(400))
+        assert not is_retryable_error(ValueError("bad schema"))
+
+
+class TestPoolFromEnv:
+    """Test pool configuration from the environment."""
+
+    def test_keys_times_models(self):
+        """Test that every key is paired with every model."""
+        env = {'GOOGLE_API_KEYS': 'a, b', 'GEMINI_MODEL_NAMES': 'm1,m2', 'GOOGLE_API_KEY': 'legacy'}
+        with patch.dict(os.environ, env):
+            pool = pool_from_env()
+
+        assert [(key_id, model) for key_id, _, model in pool] == [
+            ("key0", "m1"), ("key0", "m2"), ("key1", "m1"), ("key1", "m2")
+        ]
+
+    def test_single_key_fallback(self):
+        """Test the legacy single key and model variables."""
+        env = {'GOOGLE_API_KEYS': '', 'GEMINI_MODEL_NAMES': '', 'GOOGLE_API_KEY': 'k', 'GEMINI_MODEL_NAME': 'm'}
+        with patch.dict(os.environ, env):
+            assert pool_from_env() == [("key0", "k", "m")]
+
+
+class TestGeminiProviderRouting:
+    """Test GeminiProvider over a pool of fake SDK clients."""
+
+    def test_failover_between_keys(self):
+        """Test that a quota error on one key is answered by another."""
+        from src.llm.gemini_provider import GeminiProvider
+
+        class FakeModels:
+            def __init__(self, error=None):
+                self.error = error
+                self.models_used = []
+
+            def generate_content(self, model, contents, config):
+                self.models_used.append(model)
+                if self.error:
+                    raise self.error
+                return type('Response', (), {'text': json.dumps({'metadata': 'm', 'codigoUML': 'classDiagram'})})()
+
+        limited, spare = FakeModels(FakeApiError(429)), FakeModels()
+        router = BackendRouter([
+            Backend("key0", "gemini-a", type('Client', (), {'models': limited})()),
+            Backend("key1", "gemini-b", type('Client', (), {'models': spare})()),
+        ])
+        provider = GeminiProvider(router=router)
+
+        code, _ = provider.generate_diagram_from_source_files(
+            {'a.py': 'class A: pass'}, DiagramType.CLASS, OutputFormat.MERMAID
+        )
+
+        assert code == "classDiagram"
+        assert provider.model_names == ["gemini-a", "gemini-b"]
+        assert limited.models_used == ["gemini-a"]
+        assert spare.models_used == ["gemini-b"]
@@ -0,0 +1,156 @@
+"""Unit tests for single-flight request coalescing."""
+
+import asyncio
+import threading
+import time
+import pytest
+from concurrent.futures import ThreadPoolExecutor
+from src.models import AnalysisRequest, DiagramType, OutputFormat
+from src.services.diagram_service import DiagramService
+from src.services.async_diagram_service import AsyncDiagramService
+from src.services.single_flight import SingleFlight, coalescing_key
+
+
+def make_request(**overrides):
+    fields = {
+        'code_files': {'user.py': 'class User:\n    pass\n'},
+        'diagram_type': DiagramType.CLASS,
+        'output_format': OutputFormat.MERMAID,
+    }
+    fields.update(overrides)
+    return AnalysisRequest(**fields)
+
+
+class CountingProvider:
+    """Slow provider that counts its calls."""
+
+    model_name = "fake-model"
+
+    def __init__(self, delay=0.2):
+        self.delay = delay
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def generate_diagram_from_source_files(self, source_files, diagram_type, output_format, file_aliases=None):
+        with self._lock:
+            self.calls += 1
+        time.sleep(self.delay)
+        return "classDiagram", "analysis"
+
+    async def agenerate_diagram_from_source_files(self, source_files, diagram_type, output_format, file_aliases=None):
+        with self._lock:
+            self.calls += 1
+        await asyncio.sleep(self.delay)
+        return "classDiagram", "analysis"
+
+
+class TestSingleFlight:
+    """Test cases for SingleFlight."""
+
+    def test_threads_share_one_call(self):
+        """Test that concurrent identical requests trigger one generation."""
+        provider = CountingProvider()
+        service = DiagramService(llm_provider=provider, single_flight=SingleFlight())
+
+        with ThreadPoolExecutor(max_workers=5) as pool:
+            responses = list(pool.map(lambda _: service.generate_diagram(make_request()), range(5)))
+
+        assert provider.calls == 1
+        assert all(response.diagram_code == "classDiagram" for response in responses)
+        assert sum(1 for response in responses if response.metadata.get('coalesced')) == 4
+
+    def test_async_tasks_share_one_call(self):
+        """Test coalescing between asyncio tasks."""
+        provider = CountingProvider()
+        service = AsyncDiagramService(DiagramService(llm_provider=provider, single_flight=SingleFlight()))
+
+        responses = asyncio.run(service.generate_many([make_request() for _ in range(4)]))
+
+        assert provider.calls == 1
+        assert [response.metadata.get('coalesced', False) for response in responses].count(True) == 3
+
+    def test_async_task_joins_thread_call(self):
+        """Test that an asyncio task waits on a generation started by a thread."""
+        provider = CountingProvider()
+        diagram_service = DiagramService(llm_provider=provider, single_flight=SingleFlight())
+        thread = threading.Thread(target=diagram_service.generate_diagram, args=(make_request(),))
+        thread.start()
+        while diagram_service.single_flight.in_flight() == 0:
+            time.sleep(0.001)
+
+        response = AsyncDiagramService(diagram_service).generate_diagram_sync(make_request())
+        thread.join()
+
+        assert provider.calls == 1
+        assert response.metadata['coalesced'] is True
+
+    def test_sequential_requests_are_not_cached(self):
+        """Test that only in-flight requests are shared."""
+        provider = CountingProvider(delay=0)
+        service = DiagramService(llm_provider=provider, single_flight=SingleFlight())
+
+        service.generate_diagram(make_request())
+        response = service.generate_diagram(make_request())
+
+        assert provider.calls == 2
+        assert 'coalesced' not in response.metadata
+
+    def test_opt_out(self):
+        """Test that filters.coalesce=False always generates."""
+        provider = CountingProvider()
+        service = DiagramService(llm_provider=provider, single_flight=SingleFlight())
+        request = make_request(filters={'coalesce': False})
+
+        with ThreadPoolExecutor(max_workers=3) as pool:
+            list(pool.map(lambda _: service.generate_diagram(request), range(3)))
+
+        assert provider.calls == 3
+
+    def test_exception_reaches_followers(self):
+        """Test that followers see the leader's exception."""
+        single_flight = SingleFlight()
+        started = threading.Event()
+
+        def fail():
+            started.set()
+            time.sleep(0.1)
+            raise RuntimeError("quota exceeded")
+
+        errors = []
+
+        def follower():
+            started.wait()
+            try:
+                single_flight.do("key", fail)
+            except RuntimeError as e:
+                errors.append(str(e))
+
+        thread = threading.Thread(target=follower)
+        thread.start()
+        with pytest.raises(RuntimeError):
+            single_flight.do("key", fail)
+        thread.join()
+
+        assert errors == ["quota exceeded"]
+        assert single_flight.in_flight() == 0
+
+
+class TestCoalescingKey:
+    """Test request normalization."""
+
+    def test_equivalent_repo_urls(self):
+        """Test that trivially different repo URLs share a key."""
+        first = make_request(code_files=None, repo_url='https://github.com/User/Repo.git')
+        second = make_request(code_files=None, repo_url='https://github.com/user/repo/')
+
+        assert coalescing_key(first, "m") == coalescing_key(second, "m")
+
+    def test_distinguishing_fields(self):
+        """Test that content, type, format, filters and model change the key."""
+        base = coalescing_key(make_request(), "m")
+
+        assert coalescing_key(make_request(code_files={'user.py': 'class Admin: pass'}), "m") != base
+        assert coalescing_key(make_request(diagram_type=DiagramType.SEQUENCE), "m") != base
+        assert coalescing_key(make_request(output_format=OutputFormat.PLANTUML), "m") != base
+        assert coalescing_key(make_request(filters={'subpath': 'src'}), "m") != base
+        assert coalescing_key(make_request(), "other") != base
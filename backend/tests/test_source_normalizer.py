@@ -0,0 +1,188 @@
+"""Unit tests for comment and whitespace stripping."""
+
+import ast
+from src.models import AnalysisRequest, DiagramType, OutputFormat
+from src.services.diagram_service import DiagramService
+from src.services.ir_cache import IRCache
+from src.services.single_flight import SingleFlight
+from src.services.source_normalizer import SourceNormalizer, keeps_docstrings, normalize_source
+from src.services.source_records import SourceFiles, SourceRecord
+
+PYTHON = '''#!/usr/bin/env python
+"""Orders module.
+
+Long description.
+"""
+import os  # for paths
+
+
+class Order(Base):
+    """An order."""
+
+    QUERY = """
+    SELECT *  -- stays # as is
+    """
+
+    def total(self, lines,
+              discount):
+        # Sum the lines
+        parts = ("a"
+                 "b")
+        return r"#no" + 'it\\'s'
+'''
+
+JAVA = '''/*
+ * Copyright 2024 ACME. Licensed under MIT.
+ */
+package shop;
+
+/** An order. */
+public class Order {
+    // Cached total
+    private int total; /* cents */
+
+    public String url() {
+        return "http://example.com/*";
+    }
+}
+'''
+
+
+class TestNormalizeSource:
+    """Test cases for normalize_source."""
+
+    def test_python_keeps_structure_and_strings(self):
+        """Test that comments and docstrings go while code and string literals stay intact."""
+        result = normalize_source('orders.py', PYTHON)
+
+        assert '#!' not in result and 'for paths' not in result and 'Sum the lines' not in result
+        assert 'Orders module' not in result and 'An order' not in result
+        assert '    SELECT *  -- stays # as is\n    """' in result
+        assert 'return r"#no" + \'it\\\'s\'' in result
+        assert result.startswith('import os\nclass Order(Base):\n QUERY = """')
+        assert ast.dump(ast.parse(result).body[1].body[1]) == ast.dump(ast.parse(PYTHON).body[2].body[2])
+
+    def test_python_keep_docstrings(self):
+        """Test that docstrings can be kept while comments are still dropped."""
+        result = normalize_source('orders.py', PYTHON, keep_docstrings=True)
+
+        assert result.startswith('"""Orders module.\n\nLong description.\n"""\nimport os\n')
+        assert ' """An order."""' in result
+        assert 'for paths' not in result
+
+    def test_python_docstring_only_body(self):
+        """Test that a block left empty by its docstring gets a body so it still parses."""
+        result = normalize_source('errors.py', 'class Missing(Exception):\n    """Not found."""\n\n\nX = 1\n')
+
+        assert result == 'class Missing(Exception):\n    ...\nX = 1\n'
+
+    def test_c_style(self):
+        """Test block, line and license comments in a braces language."""
+        assert normalize_source('Order.java', JAVA) == (
+            'package shop;\n'
+            'public class Order {\n'
+            ' private int total;\n'
+            ' public String url() {\n'
+            '  return "http://example.com/*";\n'
+            ' }\n'
+            '}\n'
+        )
+        assert '/** An order. */\npublic class Order {' in normalize_source('Order.java', JAVA, keep_docstrings=True)
+
+    def test_language_specific_markers(self):
+        """Test attributes, lifetimes, nested comments and =begin blocks."""
+        assert normalize_source('a.php', '<?php\n#[Route]\n# note\n$x = "a # b"; // c\n') == (
+            '<?php\n#[Route]\n$x = "a # b";\n'
+        )
+        assert normalize_source('a.rs', "fn f<'a>(s: &'a str) /* a /* b */ c */ -> char { '\"' }\n") == (
+            "fn f<'a>(s: &'a str) -> char { '\"' }\n"
+        )
+        assert normalize_source('a.rb', 'class A\n=begin\nold\n=end\n  def x; "#{y}" end # c\nend\n') == (
+            'class A\n def x; "#{y}" end\nend\n'
+        )
+
+    def test_javascript_regex_literals(self):
+        """Test that // and /* inside a regex literal are code, while divisions still allow comments."""
+        content = ("const re = /https?:\\/\\//; // url\n"
+                   "const half = total / 2; // half\n"
+                   "if (/[/]/.test(x)) return x.replace(/\\/\\*/g, '') / 2; /* gone */\n")
+
+        assert normalize_source('a.ts', content) == (
+            "const re = /https?:\\/\\//;\n"
+            "const half = total / 2;\n"
+            "if (/[/]/.test(x)) return x.replace(/\\/\\*/g, '') / 2;\n"
+        )
+
+    def test_yaml_keeps_block_scalars(self):
+        """Test that YAML comment lines go but block scalar content stays."""
+        content = '# config\nname: app  # tail\nscript: |\n  # not a comment\n\n  run\nport: 80\n'
+
+        assert normalize_source('app.yml', content) == (
+            'name: app  # tail\nscript: |\n  # not a comment\n\n  run\nport: 80\n'
+        )
+
+    def test_unknown_language_unchanged(self):
+        """Test that files without a known syntax pass through."""
+        assert normalize_source('notes.txt', '# title\n\n\ntext\n') == '# title\n\n\ntext\n'
+
+
+class TestSourceNormalizer:
+    """Test cases for SourceNormalizer and the prompt stage."""
+
+    def test_report_per_language(self):
+        """Test that the report has the reduction for each language."""
+        files, report = SourceNormalizer().normalize({'orders.py': PYTHON, 'Order.java': JAVA})
+
+        assert set(report['languages']) == {'python', 'java'}
+        java = report['languages']['java']
+        assert java['files'] == 1
+        assert java['chars_after'] == len(files['Order.java'])
+        assert java['reduction'] == round(1 - java['chars_after'] / java['chars_before'], 3)
+        assert 0 < report['reduction'] < 1
+
+    def test_lazy_files_stay_lazy(self):
+        """Test that lazy files are normalized when read, not when the stage runs."""
+        loads = []
+        files = SourceFiles(
+            SourceRecord.from_content(path, content, loader=lambda path=path, content=content: loads.append(path) or content)
+            for path, content in {'orders.py': PYTHON, 'Order.java': JAVA}.items()
+        )
+
+        normalized, report = SourceNormalizer().normalize(files)
+
+        assert loads == []
+        assert report['deferred'] and report['chars_before'] == len(PYTHON) + len(JAVA)
+        assert normalized['orders.py'] == normalize_source('orders.py', PYTHON)
+        assert loads == ['orders.py']
+        assert normalized.records['orders.py'].hash != files.records['orders.py'].hash
+        assert SourceNormalizer().normalize(files)[0].records['orders.py'].hash == normalized.records['orders.py'].hash
+
+    def test_docstrings_by_diagram_type(self):
+        """Test that use case diagrams keep docstrings by default and other types do not."""
+        assert keeps_docstrings(DiagramType.USE_CASE)
+        assert not keeps_docstrings(DiagramType.CLASS)
+
+    def test_service_stage(self):
+        """Test that the service sends normalized files and can be told not to."""
+        class Provider:
+            def __init__(self):
+                self.prompts = []
+
+            def generate_diagram_from_source_files(self, source_files, diagram_type, output_format,
+                                                   file_aliases=None):
+                self.prompts.append(dict(source_files))
+                return "classDiagram", ""
+
+        provider = Provider()
+        service = DiagramService(llm_provider=provider, single_flight=SingleFlight(), ir_cache=IRCache())
+
+        def request(**filters):
+            return AnalysisRequest(code_files={'orders.py': PYTHON}, diagram_type=DiagramType.CLASS,
+                                   output_format=OutputFormat.MERMAID, filters={'ir': False, **filters})
+
+        stripped = service.generate_diagram(request())
+        service.generate_diagram(request(strip_comments=False))
+
+        assert provider.prompts[0]['orders.py'] == normalize_source('orders.py', PYTHON)
+        assert provider.prompts[1]['orders.py'] == PYTHON
+        assert stripped.metadata['normalization']['languages']['python']['reduction'] > 0
@@ -0,0 +1,155 @@
+"""Unit tests for lazy source records and the ingestion byte budget."""
+
+import pickle
+from src.models import AnalysisRequest, DiagramType, OutputFormat
+from src.services.deduplication import SourceDeduplicator
+from src.services.diagram_service import DiagramService
+from src.services.ingestion_filter import IngestionFilter
+from src.services.ir_cache import IRCache
+from src.services.local_directory_service import LocalDirectoryService
+from src.services.single_flight import SingleFlight
+from src.services.source_records import SourceBudget, SourceFiles, SourceRecord, content_hash
+
+
+class CountingLoader:
+    """Loader that records how often the content was read."""
+
+    def __init__(self, content):
+        self.content = content
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        return self.content
+
+
+def write_files(root, files):
+    for path, content in files.items():
+        target = root / path
+        target.parent.mkdir(parents=True, exist_ok=True)
+        target.write_text(content, encoding='utf-8')
+
+
+class TestSourceRecord:
+    """Test cases for SourceRecord and SourceFiles."""
+
+    def test_record_metadata(self):
+        """Test that size, hash and language are derived from the content."""
+        record = SourceRecord.from_content('pkg/model.py', 'class A: pass\n')
+
+        assert record.size == 14
+        assert record.hash == content_hash('class A: pass\n')
+        assert record.language == 'python'
+        assert record.load() == 'class A: pass\n'
+        assert not hasattr(record, '__dict__')
+
+    def test_mapping_loads_on_access(self):
+        """Test that SourceFiles only reads a file when it is looked up."""
+        loader = CountingLoader('class A: pass\n')
+        files = SourceFiles([SourceRecord.from_content('a.py', loader.content, loader)])
+
+        assert list(files) == ['a.py']
+        assert len(files) == 1
+        assert files.total_bytes == 14
+        assert loader.calls == 0
+        assert files['a.py'] == 'class A: pass\n'
+        assert loader.calls == 1
+
+    def test_deduplication_keeps_records_lazy(self):
+        """Test that exact deduplication uses the stored hashes without reading files."""
+        loaders = [CountingLoader('x = 1\n') for _ in range(3)]
+        files = SourceFiles(SourceRecord.from_content(f'{i}.py', loader.content, loader)
+                            for i, loader in enumerate(loaders))
+
+        result, aliases, report = SourceDeduplicator(near_duplicates=False).deduplicate(files)
+
+        assert isinstance(result, SourceFiles)
+        assert list(result) == ['0.py']
+        assert aliases == {'0.py': ['1.py', '2.py']}
+        assert report['chars_saved'] == 12
+        assert sum(loader.calls for loader in loaders) == 0
+
+    def test_pipeline_reads_each_file_once(self):
+        """Test that dedup, focus, normalization and the prompt share one read per file."""
+        contents = {
+            'shop/order.py': 'class Order:\n    # total\n    def total(self):\n        return Line()\n',
+            'shop/line.py': 'class Line:\n    price = 1\n',
+        }
+        loaders = {path: CountingLoader(content) for path, content in contents.items()}
+        files = SourceFiles(SourceRecord.from_content(path, content, loaders[path]) for path, content in contents.items())
+        prompts = []
+
+        class Provider:
+            def generate_diagram_from_source_files(self, source_files, diagram_type, output_format, file_aliases=None):
+                prompts.append(dict(source_files))
+                return "classDiagram", ""
+
+        service = DiagramService(llm_provider=Provider(), single_flight=SingleFlight(), ir_cache=IRCache())
+        request = AnalysisRequest(code_files={'x.py': ''}, diagram_type=DiagramType.CLASS,
+                                  output_format=OutputFormat.MERMAID, filters={'ir': False, 'focus': 'order total'})
+
+        response = service.generate_from_sources(request, files, {'type': 'local_directory'})
+
+        assert response.success
+        assert '# total' not in prompts[0]['shop/order.py']
+        assert {path: loader.calls for path, loader in loaders.items()} == {'shop/order.py': 1, 'shop/line.py': 1}
+
+    def test_read_once_view(self):
+        """Test that a read_once view and its subsets share the text until forget()."""
+        loader = CountingLoader('class A: pass\n')
+        view = SourceFiles([SourceRecord.from_content('a.py', loader.content, loader)]).read_once()
+
+        assert view['a.py'] == view.subset(['a.py'])['a.py']
+        assert loader.calls == 1
+        view.forget()
+        assert view.memo == {}
+
+
+class TestSourceBudget:
+    """Test cases for the byte and token budget."""
+
+    def test_admit_until_spent(self):
+        """Test that files are admitted until the byte budget runs out."""
+        budget = SourceBudget(max_bytes=100, max_tokens=1000)
+
+        assert budget.admit(60) is None
+        assert budget.admit(60) == 'byte_budget'
+        assert budget.admit(40) is None
+        assert budget.report()['used_bytes'] == 100
+
+    def test_token_budget(self):
+        """Test that the token estimate is enforced separately."""
+        budget = SourceBudget(max_bytes=10000, max_tokens=10)
+
+        assert budget.admit(80) == 'token_budget'
+        assert budget.admit(40) is None
+
+
+class TestLazyIngestion:
+    """Test the directory scan producing lazy records."""
+
+    def test_directory_scan_is_lazy(self, tmp_path):
+        """Test that records re-read the file and survive pickling for worker processes."""
+        write_files(tmp_path, {'app/models.py': 'class User:\n    pass\n', 'app/views.py': 'def index():\n    pass\n'})
+
+        source_files, report = LocalDirectoryService().get_source_files_with_report(str(tmp_path))
+
+        assert isinstance(source_files, SourceFiles)
+        assert sorted(source_files) == ['app/models.py', 'app/views.py']
+        assert report['budget']['used_bytes'] == source_files.total_bytes
+
+        (tmp_path / 'app' / 'models.py').write_text('class Account:\n    pass\n', encoding='utf-8')
+        assert source_files['app/models.py'] == 'class Account:\n    pass\n'
+
+        restored = pickle.loads(pickle.dumps(source_files))
+        assert restored.materialize() == source_files.materialize()
+
+    def test_budget_skips_files(self, tmp_path):
+        """Test that files past the byte budget are counted as skipped."""
+        write_files(tmp_path, {f'm{i}.py': f'x{i} = {i}\n' * 20 for i in range(5)})
+        ingestion_filter = IngestionFilter(use_git=False)
+
+        records = list(ingestion_filter.iter_source_records(str(tmp_path), budget=SourceBudget(max_bytes=300)))
+
+        assert len(records) == 2
+        assert ingestion_filter.report()['skipped']['byte_budget'] == 3
@@ -30,6 +30,11 @@ class ApiClient {
 
             clearTimeout(timeoutId);
 
+            if (response.status === 429) {
+                const retryAfter = response.headers.get('Retry-After') || '30';
+                throw new Error(`El servidor está ocupado. Intenta de nuevo en ${retryAfter} segundos.`);
+            }
+
             if (!response.ok) {
                 const errorData = await response.json().catch(() => ({}));
                 throw new Error(
@@ -58,6 +63,30 @@ class ApiClient {
         }
     }
 
+    /**
+     * Generate diagram, answering from the browser cache when the same files
+     * were already sent with the same options
+     */
+    async generateDiagramCached(request, manifest, { forceRefresh = false } = {}) {
+        const key = await resultCache.buildKey(manifest, request);
+
+        if (key && !forceRefresh) {
+            const cached = await resultCache.get(key);
+            if (cached && cached.format === request.output_format) {
+                return { ...cached, fromCache: true };
+            }
+            if (cached && irConverter.canConvert(cached)) {
+                return { ...irConverter.convertResult(cached, request.output_format), fromCache: true };
+            }
+        }
+
+        const result = await this.generateDiagram(request);
+        if (key && result.success) {
+            await resultCache.put(key, result);
+        }
+        return result;
+    }
+
     /**
      * Build request object from form data
      */
@@ -68,12 +97,31 @@ class ApiClient {
             diagram_type: formData.diagramType,
             output_format: formData.outputFormat,
             analysis_method: formData.analysisMethod,
-            filters: {}
+            filters: this.buildFilters(formData)
         };
 
         return request;
     }
 
+    /**
+     * Build request filters from form data
+     */
+    buildFilters(formData) {
+        const filters = {};
+
+        // Large projects come back as an overview of packages to open one by one
+        if (formData.partition) {
+            filters.partition = 'auto';
+        }
+
+        // Only the files matching the focus query (and their dependencies) are analysed
+        if (formData.focus) {
+            filters.focus = formData.focus;
+        }
+
+        return filters;
+    }
+
     /**
      * Test API connection
      */
@@ -86,11 +86,32 @@ const CONFIG = {
         }
     },
 
+    // Browser-side result cache (IndexedDB)
+    CACHE: {
+        DB_NAME: 'eduuml-results',
+        STORE: 'results',
+        VERSION: 2, // Bump to invalidate results cached by older versions
+        MAX_BYTES: 20 * 1024 * 1024,
+        MAX_ENTRIES: 200
+    },
+
+    // Diagram rendering
+    RENDER: {
+        SVG_CACHE_ENTRIES: 20,
+        RASTER_CACHE_ENTRIES: 10,
+        RASTER_WORKER_URL: 'js/rasterWorker.js',
+        // Show render timings with ?debug=render or localStorage 'eduuml.debug' = 'render'
+        DEBUG_PARAM: 'render'
+    },
+
     // UI Configuration
     UI: {
         MAX_FILE_SIZE: 1024 * 1024, // 1MB per file
         MAX_TOTAL_FILES: 100,
-        ANIMATION_DURATION: 300
+        ANIMATION_DURATION: 300,
+        // Parallel file readers used when a directory is selected
+        INGEST_WORKERS: Math.min((typeof navigator !== 'undefined' && navigator.hardwareConcurrency) || 4, 8),
+        INGEST_WORKER_URL: 'js/ingestWorker.js'
     }
 };
 
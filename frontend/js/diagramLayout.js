@@ -0,0 +1,318 @@
+// Layered (Sugiyama-style) layout for the Draw.io output of irConverter.
+// Port of backend/src/diagram_layout.py: both must produce the same coordinates.
+
+const LAYOUT_LAYER_GAP = 70;
+const LAYOUT_NODE_GAP = 40;
+// Width reserved in a layer for an edge passing through it
+const LAYOUT_DUMMY_BREADTH = 20;
+const LAYOUT_ORDER_SWEEPS = 8;
+const LAYOUT_POSITION_SWEEPS = 4;
+
+class DiagramLayout {
+    /**
+     * Place nodes in layers so that edges point down (or right).
+     * edges are [upper, lower, key] triples; returns { positions, width, height, waypoints }
+     * with Maps of id -> [x, y] and key -> bend points from upper to lower
+     */
+    layered(ids, sizes, edges, horizontal = false) {
+        if (!ids.length) {
+            return { positions: new Map(), width: 0, height: 0, waypoints: new Map() };
+        }
+
+        // Breadth runs along a layer, depth across it
+        const breadth = new Map();
+        const depth = new Map();
+        ids.forEach(id => {
+            const [width, height] = sizes.get(id);
+            breadth.set(id, horizontal ? height : width);
+            depth.set(id, horizontal ? width : height);
+        });
+
+        const pairs = this.distinctPairs(edges.filter(([upper, lower]) => upper !== lower).map(([upper, lower]) => [upper, lower]));
+        const back = this.backEdges(ids, pairs);
+        const dag = this.distinctPairs(pairs.map(([upper, lower]) => (
+            back.has(this.pairKey(upper, lower)) ? [lower, upper] : [upper, lower]
+        )));
+        const layer = this.assignLayers(ids, dag);
+
+        // Layers with a chain of dummy nodes for every long edge
+        const layers = Array.from({ length: Math.max(...layer.values()) + 1 }, () => []);
+        ids.forEach(id => layers[layer.get(id)].push(id));
+        const upperOf = new Map(ids.map(id => [id, []]));
+        const lowerOf = new Map(ids.map(id => [id, []]));
+        const chains = new Map();
+        const dummyLevel = new Map();
+        dag.forEach(([upper, lower]) => {
+            const chain = [];
+            for (let level = layer.get(upper) + 1; level < layer.get(lower); level++) {
+                const dummy = `\0${upper}\0${lower}\0${level}`;
+                breadth.set(dummy, LAYOUT_DUMMY_BREADTH);
+                depth.set(dummy, 0);
+                dummyLevel.set(dummy, level);
+                upperOf.set(dummy, []);
+                lowerOf.set(dummy, []);
+                layers[level].push(dummy);
+                chain.push(dummy);
+            }
+            chains.set(this.pairKey(upper, lower), chain);
+            const path = [upper, ...chain, lower];
+            for (let i = 0; i + 1 < path.length; i++) {
+                lowerOf.get(path[i]).push(path[i + 1]);
+                upperOf.get(path[i + 1]).push(path[i]);
+            }
+        });
+
+        const ordered = this.orderLayers(layers, upperOf, lowerOf);
+        const centers = this.positionLayers(ordered, upperOf, lowerOf, breadth);
+
+        // Layer bands across the drawing
+        const band = ordered.map(members => Math.max(...members.map(id => depth.get(id))));
+        const offsets = [];
+        let offset = 0;
+        band.forEach(levelDepth => {
+            offsets.push(offset);
+            offset += levelDepth + LAYOUT_LAYER_GAP;
+        });
+        const depthExtent = offset - LAYOUT_LAYER_GAP;
+
+        const all = ordered.flat();
+        const start = Math.min(...all.map(id => centers.get(id) - breadth.get(id) / 2));
+        const breadthExtent = Math.ceil(Math.max(...all.map(id => centers.get(id) + breadth.get(id) / 2)) - start);
+
+        const point = (along, across) => (horizontal ? [across, along] : [along, across]);
+
+        const positions = new Map();
+        ordered.forEach((members, level) => {
+            members.forEach(id => {
+                if (layer.has(id)) {
+                    positions.set(id, point(
+                        Math.floor(centers.get(id) - breadth.get(id) / 2 - start),
+                        offsets[level] + Math.floor((band[level] - depth.get(id)) / 2)
+                    ));
+                }
+            });
+        });
+
+        const waypoints = new Map();
+        edges.forEach(([upper, lower, key]) => {
+            let chain;
+            if (chains.has(this.pairKey(upper, lower))) {
+                chain = chains.get(this.pairKey(upper, lower));
+            } else if (chains.has(this.pairKey(lower, upper))) {
+                chain = [...chains.get(this.pairKey(lower, upper))].reverse();
+            } else {
+                return;
+            }
+            if (chain.length) {
+                waypoints.set(key, chain.map(dummy => point(
+                    Math.floor(centers.get(dummy) - start),
+                    offsets[dummyLevel.get(dummy)] + Math.floor(band[dummyLevel.get(dummy)] / 2)
+                )));
+            }
+        });
+
+        return horizontal
+            ? { positions, width: depthExtent, height: breadthExtent, waypoints }
+            : { positions, width: breadthExtent, height: depthExtent, waypoints };
+    }
+
+    pairKey(upper, lower) {
+        return `${upper}\u0001${lower}`;
+    }
+
+    distinctPairs(pairs) {
+        const seen = new Set();
+        return pairs.filter(([upper, lower]) => {
+            const key = this.pairKey(upper, lower);
+            if (seen.has(key)) {
+                return false;
+            }
+            seen.add(key);
+            return true;
+        });
+    }
+
+    /**
+     * Edges closing a cycle in a depth-first search; reversing them leaves a DAG
+     */
+    backEdges(ids, pairs) {
+        const successors = new Map(ids.map(id => [id, []]));
+        pairs.forEach(([upper, lower]) => successors.get(upper).push(lower));
+        const state = new Map();
+        const back = new Set();
+        ids.forEach(root => {
+            if (state.has(root)) {
+                return;
+            }
+            state.set(root, 1);
+            const stack = [[root, 0]];
+            while (stack.length) {
+                const frame = stack[stack.length - 1];
+                const [id, index] = frame;
+                if (index < successors.get(id).length) {
+                    frame[1] += 1;
+                    const following = successors.get(id)[index];
+                    if (state.get(following) === 1) {
+                        back.add(this.pairKey(id, following));
+                    } else if (!state.has(following)) {
+                        state.set(following, 1);
+                        stack.push([following, 0]);
+                    }
+                } else {
+                    state.set(id, 2);
+                    stack.pop();
+                }
+            }
+        });
+        return back;
+    }
+
+    /**
+     * Longest-path layering, then every node with successors moved down next to the nearest one
+     */
+    assignLayers(ids, dag) {
+        const successors = new Map(ids.map(id => [id, []]));
+        const indegree = new Map(ids.map(id => [id, 0]));
+        dag.forEach(([upper, lower]) => {
+            successors.get(upper).push(lower);
+            indegree.set(lower, indegree.get(lower) + 1);
+        });
+        const layer = new Map(ids.map(id => [id, 0]));
+        const order = ids.filter(id => indegree.get(id) === 0);
+        for (let index = 0; index < order.length; index++) {
+            const id = order[index];
+            successors.get(id).forEach(following => {
+                layer.set(following, Math.max(layer.get(following), layer.get(id) + 1));
+                indegree.set(following, indegree.get(following) - 1);
+                if (indegree.get(following) === 0) {
+                    order.push(following);
+                }
+            });
+        }
+        [...order].reverse().forEach(id => {
+            const next = successors.get(id);
+            if (next.length) {
+                layer.set(id, Math.max(layer.get(id), Math.min(...next.map(following => layer.get(following))) - 1));
+            }
+        });
+        return layer;
+    }
+
+    /**
+     * Barycenter sweeps, alternately down and up, keeping the ordering with the fewest crossings
+     */
+    orderLayers(layers, upperOf, lowerOf) {
+        const position = new Map();
+        layers.forEach(members => members.forEach((id, i) => position.set(id, i)));
+        let best = layers.map(members => [...members]);
+        let fewest = this.crossings(layers, lowerOf, position);
+        for (let sweep = 0; sweep < LAYOUT_ORDER_SWEEPS; sweep++) {
+            if (fewest === 0) {
+                break;
+            }
+            const downward = sweep % 2 === 0;
+            const neighbours = downward ? upperOf : lowerOf;
+            this.levels(layers.length, downward).forEach(level => {
+                const keys = new Map();
+                layers[level].forEach(id => {
+                    const adjacent = neighbours.get(id);
+                    const barycenter = adjacent.length
+                        ? adjacent.reduce((sum, other) => sum + position.get(other), 0) / adjacent.length
+                        : position.get(id);
+                    keys.set(id, [barycenter, position.get(id)]);
+                });
+                layers[level].sort((a, b) => (keys.get(a)[0] - keys.get(b)[0]) || (keys.get(a)[1] - keys.get(b)[1]));
+                layers[level].forEach((id, i) => position.set(id, i));
+            });
+            const crossings = this.crossings(layers, lowerOf, position);
+            if (crossings < fewest) {
+                fewest = crossings;
+                best = layers.map(members => [...members]);
+            }
+        }
+        return best;
+    }
+
+    crossings(layers, lowerOf, position) {
+        let total = 0;
+        layers.forEach(members => {
+            const segments = [];
+            members.forEach(upper => lowerOf.get(upper).forEach(lower => {
+                segments.push([position.get(upper), position.get(lower)]);
+            }));
+            for (let i = 0; i < segments.length; i++) {
+                for (let j = i + 1; j < segments.length; j++) {
+                    if ((segments[i][0] - segments[j][0]) * (segments[i][1] - segments[j][1]) < 0) {
+                        total++;
+                    }
+                }
+            }
+        });
+        return total;
+    }
+
+    /**
+     * Centre of every node along its layer: packed, then pulled towards its neighbours
+     */
+    positionLayers(layers, upperOf, lowerOf, breadth) {
+        const centers = new Map();
+        layers.forEach(members => {
+            let offset = 0;
+            members.forEach(id => {
+                centers.set(id, offset + breadth.get(id) / 2);
+                offset += breadth.get(id) + LAYOUT_NODE_GAP;
+            });
+        });
+        for (let sweep = 0; sweep < LAYOUT_POSITION_SWEEPS; sweep++) {
+            const downward = sweep % 2 === 0;
+            const neighbours = downward ? upperOf : lowerOf;
+            this.levels(layers.length, downward).forEach(level => {
+                const desired = layers[level].map(id => {
+                    const adjacent = neighbours.get(id);
+                    return adjacent.length
+                        ? adjacent.reduce((sum, other) => sum + centers.get(other), 0) / adjacent.length
+                        : centers.get(id);
+                });
+                this.separate(layers[level], desired, breadth).forEach((center, i) => {
+                    centers.set(layers[level][i], center);
+                });
+            });
+        }
+        return centers;
+    }
+
+    /**
+     * Closest centres to the desired ones that keep the order and LAYOUT_NODE_GAP apart:
+     * average of a pass that only pushes right and one that only pushes left
+     */
+    separate(members, desired, breadth) {
+        const count = members.length;
+        const pushedRight = [...desired];
+        for (let i = 1; i < count; i++) {
+            const spacing = (breadth.get(members[i - 1]) + breadth.get(members[i])) / 2 + LAYOUT_NODE_GAP;
+            pushedRight[i] = Math.max(pushedRight[i], pushedRight[i - 1] + spacing);
+        }
+        const pushedLeft = [...desired];
+        for (let i = count - 2; i >= 0; i--) {
+            const spacing = (breadth.get(members[i]) + breadth.get(members[i + 1])) / 2 + LAYOUT_NODE_GAP;
+            pushedLeft[i] = Math.min(pushedLeft[i], pushedLeft[i + 1] - spacing);
+        }
+        return pushedRight.map((right, i) => (right + pushedLeft[i]) / 2);
+    }
+
+    /**
+     * Layer indexes for a sweep: 1..n-1 downwards, n-2..0 upwards
+     */
+    levels(count, downward) {
+        const levels = [];
+        if (downward) {
+            for (let level = 1; level < count; level++) levels.push(level);
+        } else {
+            for (let level = count - 2; level >= 0; level--) levels.push(level);
+        }
+        return levels;
+    }
+}
+
+// Create global instance
+const diagramLayout = new DiagramLayout();
@@ -4,6 +4,20 @@ class DiagramRenderer {
     constructor() {
         this.currentFormat = null;
         this.currentCode = null;
+        this.currentHash = null;
+        this.mermaidInitialized = false;
+
+        // Memoized outputs; Map insertion order doubles as LRU order
+        this.svgCache = new Map();    // code hash -> SVG markup
+        this.rasterCache = new Map(); // `${hash}:${format}` -> Blob
+
+        this.rasterWorker = null;
+        this.rasterWorkerFailed = false;
+        this.rasterTasks = new Map();
+        this.nextRasterTaskId = 0;
+
+        this.renderStats = {};
+        this.rasterStats = null;
     }
 
     /**
@@ -12,6 +26,8 @@ class DiagramRenderer {
     async renderDiagram(diagramCode, format) {
         this.currentCode = diagramCode;
         this.currentFormat = format;
+        this.renderStats = { format, codeLength: diagramCode.length };
+        const started = performance.now();
 
         // Hide all viewers first
         this.hideAllViewers();
@@ -34,6 +50,24 @@ class DiagramRenderer {
             console.error('Error rendering diagram:', error);
             this.showRenderError(error.message);
         }
+
+        this.renderStats.totalMs = performance.now() - started;
+        this.updateDebugPanel();
+    }
+
+    /**
+     * Initialize Mermaid once for this renderer
+     */
+    initializeMermaid() {
+        if (this.mermaidInitialized) return;
+
+        mermaid.initialize({ 
+            startOnLoad: false,
+            theme: 'default',
+            securityLevel: 'loose',
+            fontFamily: 'Arial, sans-serif'
+        });
+        this.mermaidInitialized = true;
     }
 
     /**
@@ -47,27 +81,38 @@ class DiagramRenderer {
             // Clear previous content
             container.innerHTML = '';
             
-            // Initialize Mermaid if not already done
-            if (typeof mermaid !== 'undefined') {
-                mermaid.initialize({ 
-                    startOnLoad: false,
-                    theme: 'default',
-                    securityLevel: 'loose',
-                    fontFamily: 'Arial, sans-serif'
-                });
+            if (typeof mermaid === 'undefined') {
+                throw new Error('Mermaid library not loaded');
+            }
+            this.initializeMermaid();
+
+            const hash = await this.hashCode(code);
+            this.currentHash = hash;
 
+            // Layout measures text in the live DOM, so it cannot run in a worker;
+            // it runs once per distinct diagram and later renders reuse the SVG
+            const layoutStarted = performance.now();
+            let svg = this.cacheGet(this.svgCache, hash);
+            const cached = svg !== undefined;
+            if (!cached) {
                 // Generate unique ID for this diagram
                 const diagramId = 'mermaid-' + Date.now();
-                
-                // Render the diagram
-                const { svg } = await mermaid.render(diagramId, code);
-                container.innerHTML = svg;
-                
-                // Show the viewer
-                viewer.style.display = 'block';
-            } else {
-                throw new Error('Mermaid library not loaded');
+                ({ svg } = await mermaid.render(diagramId, code));
+                this.cacheSet(this.svgCache, hash, svg, CONFIG.RENDER.SVG_CACHE_ENTRIES);
             }
+            const layoutMs = performance.now() - layoutStarted;
+
+            const insertStarted = performance.now();
+            container.innerHTML = svg;
+            
+            // Show the viewer
+            viewer.style.display = 'block';
+
+            Object.assign(this.renderStats, {
+                cached,
+                layoutMs,
+                insertMs: performance.now() - insertStarted
+            });
         } catch (error) {
             console.error('Mermaid rendering error:', error);
             container.innerHTML = `
@@ -381,34 +426,214 @@ class DiagramRenderer {
             throw new Error('No hay diagrama Mermaid renderizado');
         }
 
-        // Convert SVG to canvas and then to image
-        const canvas = document.createElement('canvas');
-        const ctx = canvas.getContext('2d');
-        const img = new Image();
+        const rasterKey = `${this.currentHash}:${format}`;
+        const cachedBlob = this.cacheGet(this.rasterCache, rasterKey);
+        if (cachedBlob) {
+            this.rasterStats = { format, cached: true, totalMs: 0, mode: 'cache' };
+            this.updateDebugPanel();
+            return cachedBlob;
+        }
+
+        const started = performance.now();
+        const svgData = this.svgCache.get(this.currentHash) || new XMLSerializer().serializeToString(svg);
+        const img = await this.loadSvgImage(svgData);
+        const { blob, mode } = await this.rasterize(img, format);
 
+        this.cacheSet(this.rasterCache, rasterKey, blob, CONFIG.RENDER.RASTER_CACHE_ENTRIES);
+        this.rasterStats = { format, cached: false, totalMs: performance.now() - started, mode };
+        this.updateDebugPanel();
+        return blob;
+    }
+
+    /**
+     * Decode SVG markup into an image element
+     */
+    loadSvgImage(svgData) {
         return new Promise((resolve, reject) => {
-            img.onload = () => {
-                canvas.width = img.width;
-                canvas.height = img.height;
-                ctx.drawImage(img, 0, 0);
-                
-                canvas.toBlob((blob) => {
-                    if (blob) {
-                        resolve(blob);
-                    } else {
-                        reject(new Error('Error generando imagen'));
-                    }
-                }, `image/${format}`);
-            };
-            
-            img.onerror = () => reject(new Error('Error procesando SVG'));
-            
-            const svgData = new XMLSerializer().serializeToString(svg);
+            const img = new Image();
             const svgBlob = new Blob([svgData], { type: 'image/svg+xml;charset=utf-8' });
             const url = URL.createObjectURL(svgBlob);
+
+            img.onload = () => {
+                URL.revokeObjectURL(url);
+                resolve(img);
+            };
+            img.onerror = () => {
+                URL.revokeObjectURL(url);
+                reject(new Error('Error procesando SVG'));
+            };
             img.src = url;
         });
     }
+
+    /**
+     * Encode an image to PNG/JPEG, in the raster worker where OffscreenCanvas is supported
+     */
+    async rasterize(img, format) {
+        const type = `image/${format}`;
+        // JPEG has no alpha channel, so paint a white background first
+        const background = format === 'png' ? null : '#ffffff';
+
+        if (this.supportsOffscreenRaster()) {
+            try {
+                const bitmap = await createImageBitmap(img);
+                const blob = await this.runRasterTask(bitmap, type, background);
+                return { blob, mode: 'worker' };
+            } catch (error) {
+                console.warn('Offscreen rasterization failed, using the main thread:', error.message);
+            }
+        }
+
+        // Convert SVG to canvas and then to image
+        const canvas = document.createElement('canvas');
+        const ctx = canvas.getContext('2d');
+        canvas.width = img.width;
+        canvas.height = img.height;
+        if (background) {
+            ctx.fillStyle = background;
+            ctx.fillRect(0, 0, canvas.width, canvas.height);
+        }
+        ctx.drawImage(img, 0, 0);
+
+        const blob = await new Promise((resolve, reject) => {
+            canvas.toBlob((result) => {
+                if (result) {
+                    resolve(result);
+                } else {
+                    reject(new Error('Error generando imagen'));
+                }
+            }, type);
+        });
+        return { blob, mode: 'main' };
+    }
+
+    /**
+     * Check if rasterization can be moved to a worker
+     */
+    supportsOffscreenRaster() {
+        return !this.rasterWorkerFailed &&
+            typeof OffscreenCanvas !== 'undefined' &&
+            typeof createImageBitmap === 'function' &&
+            typeof Worker !== 'undefined';
+    }
+
+    /**
+     * Send a bitmap to the raster worker and wait for the encoded blob
+     */
+    runRasterTask(bitmap, type, background) {
+        if (!this.rasterWorker) {
+            this.rasterWorker = new Worker(CONFIG.RENDER.RASTER_WORKER_URL);
+            this.rasterWorker.onmessage = (event) => {
+                const { taskId, blob, error } = event.data;
+                const task = this.rasterTasks.get(taskId);
+                if (!task) return;
+
+                this.rasterTasks.delete(taskId);
+                if (error) {
+                    task.reject(new Error(error));
+                } else {
+                    task.resolve(blob);
+                }
+            };
+            this.rasterWorker.onerror = (event) => {
+                event.preventDefault();
+                // The worker script could not run; fall back to the main thread from now on
+                this.rasterWorkerFailed = true;
+                this.rasterWorker.terminate();
+                this.rasterWorker = null;
+                for (const task of this.rasterTasks.values()) {
+                    task.reject(new Error(event.message || 'Raster worker failed'));
+                }
+                this.rasterTasks.clear();
+            };
+        }
+
+        return new Promise((resolve, reject) => {
+            const taskId = this.nextRasterTaskId++;
+            this.rasterTasks.set(taskId, { resolve, reject });
+            this.rasterWorker.postMessage({ taskId, bitmap, type, background }, [bitmap]);
+        });
+    }
+
+    /**
+     * Hex SHA-256 of the diagram code (the code itself where Web Crypto is unavailable)
+     */
+    async hashCode(code) {
+        if (!window.crypto || !window.crypto.subtle) {
+            return code;
+        }
+        const digest = await window.crypto.subtle.digest('SHA-256', new TextEncoder().encode(code));
+        return Array.from(new Uint8Array(digest), byte => byte.toString(16).padStart(2, '0')).join('');
+    }
+
+    /**
+     * Read a memoized value and mark it as recently used
+     */
+    cacheGet(cache, key) {
+        if (!cache.has(key)) {
+            return undefined;
+        }
+        const value = cache.get(key);
+        cache.delete(key);
+        cache.set(key, value);
+        return value;
+    }
+
+    /**
+     * Store a memoized value, evicting the least recently used beyond limit
+     */
+    cacheSet(cache, key, value, limit) {
+        cache.delete(key);
+        cache.set(key, value);
+        while (cache.size > limit) {
+            cache.delete(cache.keys().next().value);
+        }
+    }
+
+    /**
+     * Check if the render debug panel was requested
+     */
+    isDebugEnabled() {
+        try {
+            const param = new URLSearchParams(window.location.search).get('debug');
+            return param === CONFIG.RENDER.DEBUG_PARAM ||
+                window.localStorage.getItem('eduuml.debug') === CONFIG.RENDER.DEBUG_PARAM;
+        } catch (error) {
+            return false;
+        }
+    }
+
+    /**
+     * Show the last render and export timings in the debug panel
+     */
+    updateDebugPanel() {
+        if (!this.isDebugEnabled()) return;
+
+        let panel = document.getElementById('render-debug-panel');
+        if (!panel) {
+            const container = document.querySelector('.viewer-container');
+            if (!container) return;
+            panel = document.createElement('div');
+            panel.id = 'render-debug-panel';
+            panel.className = 'render-debug-panel';
+            container.appendChild(panel);
+        }
+
+        const ms = (value) => (typeof value === 'number' ? `${value.toFixed(1)} ms` : '-');
+        const render = this.renderStats || {};
+        const raster = this.rasterStats;
+        let html = `<strong>Render ${render.format || ''}</strong>: ${ms(render.totalMs)}`;
+        if (render.layoutMs !== undefined) {
+            html += ` (layout ${ms(render.layoutMs)}${render.cached ? ', SVG en caché' : ''}, DOM ${ms(render.insertMs)})`;
+        }
+        html += ` · ${render.codeLength || 0} caracteres`;
+        html += ` · caché: ${this.svgCache.size} SVG, ${this.rasterCache.size} imágenes`;
+        if (raster) {
+            html += `<br><strong>Export ${raster.format}</strong>: ${ms(raster.totalMs)} (${raster.mode})`;
+        }
+
+        panel.innerHTML = html;
+    }
 }
 
 // Create global instance
@@ -1,9 +1,62 @@
 // File handling utilities for directory selection and processing
 
+/**
+ * Fixed pool of ingest workers (see ingestWorker.js) that read and hash files in parallel
+ */
+class IngestWorkerPool {
+    constructor(size) {
+        this.workers = [];
+        for (let i = 0; i < size; i++) {
+            this.workers.push(new Worker(CONFIG.UI.INGEST_WORKER_URL));
+        }
+    }
+
+    /**
+     * Read every task ({ path, file }); results keep the task order
+     */
+    run(tasks, onProgress) {
+        return new Promise((resolve, reject) => {
+            const results = new Array(tasks.length);
+            let next = 0;
+            let done = 0;
+
+            const dispatch = (worker) => {
+                if (next >= tasks.length) return;
+                const taskId = next++;
+                worker.postMessage({ taskId, path: tasks[taskId].path, file: tasks[taskId].file });
+            };
+
+            for (const worker of this.workers) {
+                worker.onmessage = (event) => {
+                    results[event.data.taskId] = event.data;
+                    done++;
+                    onProgress(done, tasks.length);
+                    if (done === tasks.length) {
+                        resolve(results);
+                    } else {
+                        dispatch(worker);
+                    }
+                };
+                worker.onerror = (event) => {
+                    event.preventDefault();
+                    reject(new Error(event.message || 'Ingest worker failed'));
+                };
+                dispatch(worker);
+            }
+        });
+    }
+
+    terminate() {
+        this.workers.forEach(worker => worker.terminate());
+    }
+}
+
 class FileHandler {
     constructor() {
         this.selectedFiles = new Map(); // Map of file path -> file content
         this.directoryPath = '';
+        this.manifest = null; // Sorted { path, size, hash } entries plus a hash over all of them
+        this.progressFrame = null;
     }
 
     /**
@@ -55,21 +108,19 @@ class FileHandler {
      */
     async processFiles(files) {
         this.selectedFiles.clear();
-        
-        console.log(`Processing ${files.length} total files`);
-        console.log('Supported extensions:', CONFIG.SUPPORTED_EXTENSIONS);
-        
+        this.manifest = null;
+
+        const skipped = { unsupported: 0, tooLarge: 0, readError: 0 };
+
         // Filter supported files
         const supportedFiles = files.filter(file => {
             const supported = this.isSupportedFile(file.name);
             if (!supported) {
-                console.log(`Skipping unsupported file: ${file.name}`);
+                skipped.unsupported++;
             }
             return supported;
         });
 
-        console.log(`Found ${supportedFiles.length} supported files out of ${files.length} total`);
-
         if (supportedFiles.length === 0) {
             throw new Error('No se encontraron archivos de código fuente soportados');
         }
@@ -78,29 +129,39 @@ class FileHandler {
             throw new Error(`Demasiados archivos. Máximo permitido: ${CONFIG.UI.MAX_TOTAL_FILES}`);
         }
 
-        // Read file contents
+        // Size is known without reading, so oversized files never reach the workers
+        const tasks = [];
         for (const file of supportedFiles) {
             if (file.size > CONFIG.UI.MAX_FILE_SIZE) {
-                console.warn(`Archivo demasiado grande ignorado: ${file.name}`);
+                skipped.tooLarge++;
                 continue;
             }
+            tasks.push({ path: this.getRelativePath(file.webkitRelativePath), file });
+        }
 
-            try {
-                const content = await this.readFileContent(file);
-                const relativePath = this.getRelativePath(file.webkitRelativePath);
-                this.selectedFiles.set(relativePath, content);
-                console.log(`Added file: ${relativePath}`);
-            } catch (error) {
-                console.warn(`Error leyendo archivo ${file.name}:`, error);
-            }
+        // Read file contents in parallel, off the main thread when possible
+        const results = await this.readFiles(tasks, (done, total) => this.showProgress(done, total));
+
+        const readFiles = results
+            .filter(result => {
+                if (result.error) {
+                    skipped.readError++;
+                    return false;
+                }
+                return true;
+            })
+            .sort((a, b) => (a.path < b.path ? -1 : a.path > b.path ? 1 : 0));
+
+        for (const result of readFiles) {
+            this.selectedFiles.set(result.path, result.content);
         }
 
         if (this.selectedFiles.size === 0) {
             throw new Error('No se pudieron leer los archivos seleccionados');
         }
 
-        console.log(`Final selected files: ${this.selectedFiles.size}`);
-        console.log('Selected file paths:', Array.from(this.selectedFiles.keys()));
+        this.manifest = await this.buildManifest(readFiles, skipped);
+        console.log(`Selected ${this.selectedFiles.size} of ${files.length} files`, skipped);
 
         // Set directory path from first file
         if (supportedFiles.length > 0) {
@@ -109,14 +170,102 @@ class FileHandler {
         }
     }
 
+    /**
+     * Read and hash files with the worker pool, falling back to the main thread
+     */
+    async readFiles(tasks, onProgress) {
+        if (tasks.length === 0) {
+            return [];
+        }
+
+        if (typeof Worker !== 'undefined') {
+            let pool = null;
+            try {
+                pool = new IngestWorkerPool(Math.min(CONFIG.UI.INGEST_WORKERS, tasks.length));
+                return await pool.run(tasks, onProgress);
+            } catch (error) {
+                // Workers cannot be created e.g. when the page is opened from file://
+                console.warn('Ingest workers unavailable, reading on the main thread:', error.message);
+            } finally {
+                if (pool) {
+                    pool.terminate();
+                }
+            }
+        }
+
+        return this.readFilesOnMainThread(tasks, onProgress);
+    }
+
+    /**
+     * Fallback reader with a bounded number of concurrent reads
+     */
+    async readFilesOnMainThread(tasks, onProgress) {
+        const results = new Array(tasks.length);
+        const decoder = new TextDecoder('utf-8');
+        let next = 0;
+        let done = 0;
+
+        const readNext = async () => {
+            while (next < tasks.length) {
+                const taskId = next++;
+                const { path, file } = tasks[taskId];
+                try {
+                    const buffer = await file.arrayBuffer();
+                    results[taskId] = {
+                        path,
+                        content: decoder.decode(buffer),
+                        hash: await this.hashBuffer(buffer),
+                        size: file.size
+                    };
+                } catch (error) {
+                    results[taskId] = { path, error: error.message };
+                }
+                onProgress(++done, tasks.length);
+            }
+        };
+
+        const readers = [];
+        for (let i = 0; i < Math.min(CONFIG.UI.INGEST_WORKERS, tasks.length); i++) {
+            readers.push(readNext());
+        }
+        await Promise.all(readers);
+        return results;
+    }
+
+    /**
+     * Hex SHA-256 of a buffer, or null where Web Crypto is unavailable
+     */
+    async hashBuffer(buffer) {
+        if (!window.crypto || !window.crypto.subtle) {
+            return null;
+        }
+        const digest = await window.crypto.subtle.digest('SHA-256', buffer);
+        return Array.from(new Uint8Array(digest), byte => byte.toString(16).padStart(2, '0')).join('');
+    }
+
+    /**
+     * Build the content manifest of the selection
+     */
+    async buildManifest(readFiles, skipped) {
+        const entries = readFiles.map(({ path, size, hash }) => ({ path, size, hash }));
+        const complete = entries.every(entry => entry.hash);
+        const listing = entries.map(entry => `${entry.path}\0${entry.hash}\n`).join('');
+
+        return {
+            algorithm: 'SHA-256',
+            hash: complete ? await this.hashBuffer(new TextEncoder().encode(listing)) : null,
+            files: entries,
+            totalBytes: entries.reduce((total, entry) => total + entry.size, 0),
+            skipped
+        };
+    }
+
     /**
      * Check if file is supported based on extension
      */
     isSupportedFile(filename) {
         const extension = '.' + filename.split('.').pop().toLowerCase();
-        const isSupported = CONFIG.SUPPORTED_EXTENSIONS.includes(extension);
-        console.log(`Checking file: ${filename}, extension: ${extension}, supported: ${isSupported}`);
-        return isSupported;
+        return CONFIG.SUPPORTED_EXTENSIONS.includes(extension);
     }
 
     /**
@@ -184,12 +333,27 @@ class FileHandler {
         selectedPathElement.style.fontStyle = 'italic';
     }
 
+    /**
+     * Show read progress, at most once per animation frame
+     */
+    showProgress(done, total) {
+        this.progress = { done, total };
+        if (this.progressFrame !== null) return;
+
+        this.progressFrame = requestAnimationFrame(() => {
+            this.progressFrame = null;
+            const selectedPathElement = document.getElementById('selected-directory');
+            selectedPathElement.textContent = `Procesando archivos... ${this.progress.done}/${this.progress.total}`;
+        });
+    }
+
     /**
      * Clear file selection
      */
     clearSelection() {
         this.selectedFiles.clear();
         this.directoryPath = '';
+        this.manifest = null;
 
         const selectedPathElement = document.getElementById('selected-directory');
         const directoryInfoElement = document.getElementById('directory-info');
@@ -248,6 +412,13 @@ class FileHandler {
         return filesObject;
     }
 
+    /**
+     * Get the content manifest of the current selection
+     */
+    getManifest() {
+        return this.manifest;
+    }
+
     /**
      * Get directory info for metadata
      */
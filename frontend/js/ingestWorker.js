@@ -0,0 +1,32 @@
+// Web Worker that reads and hashes selected source files off the main thread
+
+const decoder = new TextDecoder('utf-8');
+
+/**
+ * Hex encoded SHA-256 of the file bytes, or null where crypto.subtle is
+ * unavailable (pages served over plain HTTP from anything but localhost)
+ */
+async function sha256Hex(buffer) {
+    if (!self.crypto || !self.crypto.subtle) {
+        return null;
+    }
+    const digest = await self.crypto.subtle.digest('SHA-256', buffer);
+    return Array.from(new Uint8Array(digest), byte => byte.toString(16).padStart(2, '0')).join('');
+}
+
+/**
+ * Each message is one file: { taskId, path, file }.
+ * The reply carries the text content, its hash and size, or an error.
+ */
+self.onmessage = async (event) => {
+    const { taskId, path, file } = event.data;
+
+    try {
+        const buffer = await file.arrayBuffer();
+        const hash = await sha256Hex(buffer);
+        const content = decoder.decode(buffer);
+        self.postMessage({ taskId, path, content, hash, size: file.size });
+    } catch (error) {
+        self.postMessage({ taskId, path, error: error.message || String(error) });
+    }
+};
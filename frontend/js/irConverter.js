@@ -0,0 +1,939 @@
+// Local conversion of the diagram IR to Mermaid, PlantUML and Draw.io.
+// Port of backend/src/diagram_ir.py: both must produce the same code.
+
+const IR_CLASS_KINDS = new Set(['class', 'interface', 'abstract', 'enum', 'object']);
+const IR_CONTAINER_KINDS = new Set(['package', 'system', 'node', 'device', 'partition', 'state', 'component']);
+
+// Arrows shared by Mermaid class diagrams and PlantUML: "source ARROW target"
+const IR_CLASS_ARROWS = {
+    inheritance: '--|>',
+    realization: '..|>',
+    composition: '*--',
+    aggregation: 'o--',
+    association: '--',
+    dependency: '..>',
+    include: '..>',
+    extend: '..>',
+    flow: '-->'
+};
+const IR_MERMAID_FLOW_ARROWS = {
+    inheritance: '-->',
+    realization: '-.->',
+    composition: '---',
+    aggregation: '---',
+    association: '---',
+    dependency: '-.->',
+    include: '-.->',
+    extend: '-.->',
+    flow: '-->'
+};
+const IR_MERMAID_MESSAGE_ARROWS = { sync: '->>', async: '-)', reply: '-->>' };
+const IR_PLANTUML_MESSAGE_ARROWS = { sync: '->', async: '->>', reply: '-->' };
+const IR_EDGE_DEFAULT_LABELS = { include: '«include»', extend: '«extend»' };
+const IR_KIND_STEREOTYPES = {
+    interface: 'interface', abstract: 'abstract', enum: 'enumeration',
+    component: 'component', node: 'node', device: 'device', artifact: 'artifact', actor: 'actor'
+};
+const IR_PLANTUML_KEYWORDS = {
+    class: 'class', interface: 'interface', abstract: 'abstract class', enum: 'enum', object: 'object',
+    component: 'component', package: 'package', database: 'database', node: 'node', device: 'node',
+    artifact: 'artifact', actor: 'actor', usecase: 'usecase', system: 'rectangle', participant: 'participant'
+};
+const IR_PLANTUML_CONTAINER_KEYWORDS = new Set(['package', 'node', 'rectangle', 'component', 'database']);
+const IR_RESERVED_IDS = new Set([
+    'end', 'class', 'graph', 'flowchart', 'subgraph', 'style', 'state', 'note', 'loop', 'alt', 'opt', 'par',
+    'and', 'else', 'participant', 'actor', 'direction', 'click', 'namespace', 'node', 'package', 'component',
+    'database', 'artifact', 'usecase', 'object', 'interface', 'enum', 'abstract', 'title', 'left', 'right'
+]);
+
+const IR_DRAWIO_STYLES = {
+    object: 'rounded=0;fontStyle=4;verticalAlign=top;whiteSpace=wrap;html=0;',
+    component: 'shape=component;align=left;spacingLeft=36;whiteSpace=wrap;html=0;',
+    package: 'shape=folder;tabWidth=80;tabHeight=20;tabPosition=left;verticalAlign=top;align=left;spacingLeft=8;spacingTop=20;whiteSpace=wrap;html=0;',
+    database: 'shape=cylinder3;size=10;whiteSpace=wrap;html=0;',
+    node: 'shape=cube;size=10;verticalAlign=top;align=left;spacingLeft=8;spacingTop=10;whiteSpace=wrap;html=0;',
+    device: 'shape=cube;size=10;verticalAlign=top;align=left;spacingLeft=8;spacingTop=10;whiteSpace=wrap;html=0;',
+    artifact: 'shape=note;size=14;whiteSpace=wrap;html=0;',
+    actor: 'shape=umlActor;verticalLabelPosition=bottom;verticalAlign=top;html=0;',
+    usecase: 'ellipse;whiteSpace=wrap;html=0;',
+    system: 'swimlane;startSize=26;html=0;',
+    participant: 'rounded=0;whiteSpace=wrap;html=0;',
+    initial: 'ellipse;fillColor=#000000;strokeColor=#000000;html=0;',
+    final: 'ellipse;shape=doubleEllipse;fillColor=#000000;strokeColor=#000000;html=0;',
+    action: 'rounded=1;arcSize=40;whiteSpace=wrap;html=0;',
+    state: 'rounded=1;arcSize=20;whiteSpace=wrap;verticalAlign=top;html=0;',
+    decision: 'rhombus;whiteSpace=wrap;html=0;',
+    merge: 'rhombus;whiteSpace=wrap;html=0;',
+    choice: 'rhombus;whiteSpace=wrap;html=0;',
+    fork: 'fillColor=#000000;strokeColor=#000000;html=0;',
+    join: 'fillColor=#000000;strokeColor=#000000;html=0;',
+    partition: 'swimlane;startSize=26;html=0;',
+    interface: 'ellipse;labelPosition=center;verticalLabelPosition=bottom;verticalAlign=top;html=0;'
+};
+const IR_DRAWIO_CLASS_STYLE = 'swimlane;fontStyle=1;align=center;html=0;';
+const IR_DRAWIO_MEMBER_STYLE = 'text;align=left;verticalAlign=top;spacingLeft=4;spacingRight=4;overflow=hidden;html=0;';
+const IR_DRAWIO_EDGE_STYLES = {
+    inheritance: 'endArrow=block;endFill=0;html=0;',
+    realization: 'endArrow=block;endFill=0;dashed=1;html=0;',
+    composition: 'startArrow=diamondThin;startFill=1;startSize=14;endArrow=none;html=0;',
+    aggregation: 'startArrow=diamondThin;startFill=0;startSize=14;endArrow=none;html=0;',
+    association: 'endArrow=none;html=0;',
+    dependency: 'endArrow=open;dashed=1;html=0;',
+    include: 'endArrow=open;dashed=1;html=0;',
+    extend: 'endArrow=open;dashed=1;html=0;',
+    flow: 'endArrow=open;html=0;'
+};
+const IR_DRAWIO_MESSAGE_STYLES = {
+    sync: 'endArrow=block;endFill=1;html=0;',
+    async: 'endArrow=open;html=0;',
+    reply: 'endArrow=open;dashed=1;html=0;'
+};
+const IR_DRAWIO_SIZES = {
+    component: [160, 60], package: [160, 80], database: [100, 80], node: [160, 80], device: [160, 80],
+    artifact: [140, 50], actor: [30, 60], usecase: [140, 60], system: [200, 100], participant: [120, 40],
+    initial: [30, 30], final: [30, 30], action: [140, 40], state: [140, 50], decision: [80, 50],
+    merge: [80, 50], choice: [80, 50], fork: [100, 8], join: [100, 8], partition: [200, 100],
+    interface: [20, 20]
+};
+// Generalizations are laid out with the parent above the child
+const IR_UPWARD_EDGE_KINDS = new Set(['inheritance', 'realization']);
+const IR_LAYOUT = {
+    CONTAINER_PADDING: 20,
+    CONTAINER_HEADER: 40,
+    ROW_HEIGHT: 18,
+    HEADER_HEIGHT: 26,
+    CHAR_WIDTH: 7,
+    LIFELINE_SPACING: 180,
+    MESSAGE_SPACING: 40
+};
+
+class IRConverter {
+    /**
+     * Render a normalized IR (as returned by the backend) in the given format
+     */
+    render(ir, format) {
+        const diagramType = ir.diagram_type;
+        switch (format) {
+            case 'mermaid':
+                return this.renderMermaid(ir, diagramType);
+            case 'plantuml':
+                return this.renderPlantUML(ir, diagramType);
+            case 'drawio':
+                return this.renderDrawIO(ir, diagramType);
+            default:
+                throw new Error(`Formato no soportado: ${format}`);
+        }
+    }
+
+    /**
+     * Whether a result can be converted locally to another format
+     */
+    canConvert(result) {
+        return Boolean(result && result.ir && Array.isArray(result.ir.nodes) && result.ir.nodes.length);
+    }
+
+    /**
+     * Copy of a generation result with its code rendered in another format
+     */
+    convertResult(result, format) {
+        return { ...result, format, diagram_code: this.render(result.ir, format) };
+    }
+
+    renderMermaid(ir, diagramType) {
+        let lines;
+        if (diagramType === 'class' || diagramType === 'object') {
+            lines = this.mermaidClass(ir);
+        } else if (diagramType === 'sequence') {
+            lines = this.mermaidSequence(ir);
+        } else if (diagramType === 'state') {
+            lines = this.mermaidState(ir);
+        } else {
+            lines = this.mermaidFlowchart(ir, diagramType === 'activity' ? 'TD' : 'LR');
+        }
+        return lines.join('\n') + '\n';
+    }
+
+    renderPlantUML(ir, diagramType) {
+        let body;
+        if (diagramType === 'class' || diagramType === 'object') {
+            body = this.plantumlClass(ir);
+        } else if (diagramType === 'sequence') {
+            body = this.plantumlSequence(ir);
+        } else if (diagramType === 'state' || diagramType === 'activity') {
+            body = this.plantumlState(ir);
+        } else {
+            body = this.plantumlGraph(ir, diagramType === 'use_case');
+        }
+        return ['@startuml', ...body, '@enduml'].join('\n') + '\n';
+    }
+
+    renderDrawIO(ir, diagramType) {
+        const cells = ['<mxCell id="0"/>', '<mxCell id="1" parent="0"/>'];
+        // Use case diagrams read left to right: actors, then the use cases they start
+        cells.push(...(diagramType === 'sequence' ? this.drawioSequence(ir) : this.drawioGraph(ir, diagramType === 'use_case')));
+        return '<mxfile host="EduUML"><diagram id="diagram" name="Diagram"><mxGraphModel><root>'
+            + cells.join('')
+            + '</root></mxGraphModel></diagram></mxfile>';
+    }
+
+    // Mermaid
+
+    mermaidClass(ir) {
+        const aliases = this.aliases(ir.nodes);
+        const children = this.children(ir.nodes);
+        const lines = ['classDiagram'];
+
+        const declare = (node, indent) => {
+            let label = node.label;
+            if (node.kind === 'object' && node.stereotype) {
+                label = `${label} : ${node.stereotype}`;
+            }
+            let header = `${indent}class ${aliases.get(node.id)}`;
+            if (label !== aliases.get(node.id)) {
+                header += `["${this.mermaidLabel(label)}"]`;
+            }
+            const stereotype = node.kind === 'object' ? '' : (this.stereotype(node) || this.foreignKind(node));
+            const members = [...node.attributes, ...node.operations].map(member => this.mermaidMember(member));
+            if (!stereotype && !members.length) {
+                lines.push(header);
+                return;
+            }
+            lines.push(header + ' {');
+            if (stereotype) {
+                lines.push(`${indent}    <<${stereotype}>>`);
+            }
+            members.forEach(member => lines.push(`${indent}    ${member}`));
+            lines.push(`${indent}}`);
+        };
+
+        // Mermaid namespaces do not nest: every class goes in its top-level package
+        (children.get('') || []).forEach(node => {
+            if (!children.has(node.id)) {
+                declare(node, '    ');
+                return;
+            }
+            lines.push(`    namespace ${aliases.get(node.id)} {`);
+            this.descendants(node, children).forEach(child => {
+                if (!children.has(child.id)) {
+                    declare(child, '        ');
+                }
+            });
+            lines.push('    }');
+        });
+
+        ir.edges.forEach(edge => {
+            lines.push('    ' + this.relation(edge, aliases, IR_CLASS_ARROWS, text => this.mermaidLabel(text)));
+        });
+        return lines;
+    }
+
+    mermaidSequence(ir) {
+        const aliases = this.aliases(ir.nodes);
+        const lines = ['sequenceDiagram'];
+        ir.nodes.forEach(node => {
+            const keyword = node.kind === 'actor' ? 'actor' : 'participant';
+            const alias = aliases.get(node.id);
+            lines.push(`    ${keyword} ${alias}` + (node.label !== alias ? ` as ${this.mermaidMessage(node.label)}` : ''));
+        });
+
+        const messageLine = message => {
+            const arrow = IR_MERMAID_MESSAGE_ARROWS[message.kind];
+            return `${aliases.get(message.source)}${arrow}${aliases.get(message.target)}: `
+                + (this.mermaidMessage(message.label) || ' ');
+        };
+        lines.push(...this.sequenceLines(ir.messages, messageLine, '    ', { alt: 'else', par: 'and' }));
+        return lines;
+    }
+
+    mermaidState(ir) {
+        const aliases = this.aliases(ir.nodes);
+        const children = this.children(ir.nodes);
+        const nodes = new Map(ir.nodes.map(node => [node.id, node]));
+        const scopedEdges = this.edgesByScope(ir.edges, nodes);
+        const lines = ['stateDiagram-v2'];
+
+        const block = (parentId, indent) => {
+            (children.get(parentId) || []).forEach(node => {
+                const alias = aliases.get(node.id);
+                if (node.kind === 'initial' || node.kind === 'final') {
+                    return;
+                }
+                if (['choice', 'decision', 'merge', 'fork', 'join'].includes(node.kind)) {
+                    const marker = { decision: 'choice', merge: 'choice' }[node.kind] || node.kind;
+                    lines.push(`${indent}state ${alias} <<${marker}>>`);
+                    return;
+                }
+                if (node.label !== alias) {
+                    lines.push(`${indent}state "${this.mermaidStateText(node.label)}" as ${alias}`);
+                }
+                if (children.has(node.id)) {
+                    lines.push(`${indent}state ${alias} {`);
+                    block(node.id, indent + '    ');
+                    lines.push(`${indent}}`);
+                } else if (node.label === alias) {
+                    lines.push(`${indent}${alias}`);
+                }
+                node.operations.forEach(operation => {
+                    lines.push(`${indent}${alias} : ${this.mermaidStateText(operation)}`);
+                });
+            });
+            (scopedEdges.get(parentId) || []).forEach(edge => {
+                const source = this.isTerminal(nodes.get(edge.source)) ? '[*]' : aliases.get(edge.source);
+                const target = this.isTerminal(nodes.get(edge.target)) ? '[*]' : aliases.get(edge.target);
+                const label = edge.label ? ` : ${this.mermaidStateText(edge.label)}` : '';
+                lines.push(`${indent}${source} --> ${target}${label}`);
+            });
+        };
+
+        block('', '    ');
+        return lines;
+    }
+
+    mermaidFlowchart(ir, direction) {
+        const aliases = this.aliases(ir.nodes);
+        const children = this.children(ir.nodes);
+        const lines = [`flowchart ${direction}`];
+        const bars = [];
+
+        const block = (parentId, indent) => {
+            (children.get(parentId) || []).forEach(node => {
+                const alias = aliases.get(node.id);
+                if (children.has(node.id)) {
+                    lines.push(`${indent}subgraph ${alias}["${this.mermaidText(this.titled(node))}"]`);
+                    block(node.id, indent + '    ');
+                    lines.push(`${indent}end`);
+                    return;
+                }
+                lines.push(`${indent}${alias}${this.mermaidShape(node)}`);
+                if (node.kind === 'fork' || node.kind === 'join') {
+                    bars.push(alias);
+                }
+            });
+        };
+
+        block('', '    ');
+        ir.edges.forEach(edge => {
+            const arrow = IR_MERMAID_FLOW_ARROWS[edge.kind];
+            let label = edge.label || IR_EDGE_DEFAULT_LABELS[edge.kind] || '';
+            label = label ? `|"${this.mermaidText(label)}"|` : '';
+            lines.push(`    ${aliases.get(edge.source)} ${arrow}${label} ${aliases.get(edge.target)}`);
+        });
+        if (bars.length) {
+            lines.push('    classDef bar fill:#000,stroke:#000,color:#000');
+            lines.push(`    class ${bars.join(',')} bar`);
+        }
+        return lines;
+    }
+
+    mermaidShape(node) {
+        const kind = node.kind;
+        const text = this.mermaidText(node.label);
+        if (kind === 'initial') return '(("●"))';
+        if (kind === 'final') return '(("◉"))';
+        if (kind === 'fork' || kind === 'join') return '[" "]';
+        if (kind === 'decision' || kind === 'merge' || kind === 'choice') return `{"${text}"}`;
+        if (kind === 'action' || kind === 'state') return `("${text}")`;
+        if (kind === 'usecase') return `(["${text}"])`;
+        if (kind === 'database') return `[("${text}")]`;
+        if (kind === 'interface') return `(("${text}"))`;
+        if (kind === 'actor') return `["${this.mermaidText(`«actor»\n${node.label}`)}"]`;
+        return `["${this.mermaidText(this.titled(node))}"]`;
+    }
+
+    mermaidText(text) {
+        // Entity codes keep quotes and angle brackets from ending a flowchart label
+        return text.replaceAll('"', '#quot;').replaceAll('<', '#lt;').replaceAll('>', '#gt;')
+            .replaceAll('\n', '<br/>');
+    }
+
+    mermaidLabel(text) {
+        return text.replaceAll('"', "'").replaceAll('\n', ' ');
+    }
+
+    mermaidMessage(text) {
+        // A semicolon would end the statement
+        return text.replaceAll('\n', ' ').replaceAll(';', '#59;');
+    }
+
+    mermaidStateText(text) {
+        return text.replaceAll('"', "'").replaceAll('\n', ' ');
+    }
+
+    mermaidMember(member) {
+        // Mermaid writes generics as List~Item~
+        return member.replaceAll('\n', ' ').replaceAll('<', '~').replaceAll('>', '~')
+            .replaceAll('{', '(').replaceAll('}', ')');
+    }
+
+    // PlantUML
+
+    plantumlClass(ir) {
+        const aliases = this.aliases(ir.nodes);
+        const children = this.children(ir.nodes);
+        const lines = [];
+
+        const block = (parentId, indent) => {
+            (children.get(parentId) || []).forEach(node => {
+                const alias = aliases.get(node.id);
+                if (children.has(node.id)) {
+                    lines.push(`${indent}package "${this.plantumlText(node.label)}" as ${alias} {`);
+                    block(node.id, indent + '  ');
+                    lines.push(`${indent}}`);
+                    return;
+                }
+                let label = node.label;
+                if (node.kind === 'object' && node.stereotype) {
+                    label = `${label} : ${node.stereotype}`;
+                }
+                const keyword = IR_CLASS_KINDS.has(node.kind) ? IR_PLANTUML_KEYWORDS[node.kind] : 'class';
+                let header = `${indent}${keyword} "${this.plantumlText(label)}" as ${alias}`;
+                const stereotype = node.kind === 'object' ? '' : (node.stereotype || this.foreignKind(node));
+                if (stereotype) {
+                    header += ` <<${this.plantumlText(stereotype)}>>`;
+                }
+                if (!node.attributes.length && !node.operations.length) {
+                    lines.push(header);
+                    return;
+                }
+                lines.push(header + ' {');
+                node.attributes.forEach(member => lines.push(`${indent}  ${this.plantumlMember(member)}`));
+                if (node.attributes.length && node.operations.length) {
+                    lines.push(`${indent}  --`);
+                }
+                node.operations.forEach(member => lines.push(`${indent}  ${this.plantumlMember(member)}`));
+                lines.push(`${indent}}`);
+            });
+        };
+
+        block('', '');
+        ir.edges.forEach(edge => {
+            lines.push(this.relation(edge, aliases, IR_CLASS_ARROWS, text => this.plantumlText(text)));
+        });
+        return lines;
+    }
+
+    plantumlSequence(ir) {
+        const aliases = this.aliases(ir.nodes);
+        const lines = [];
+        ir.nodes.forEach(node => {
+            const keyword = { actor: 'actor', database: 'database' }[node.kind] || 'participant';
+            lines.push(`${keyword} "${this.plantumlText(node.label)}" as ${aliases.get(node.id)}`);
+        });
+
+        const messageLine = message => {
+            const arrow = IR_PLANTUML_MESSAGE_ARROWS[message.kind];
+            const label = message.label ? ` : ${this.plantumlText(message.label)}` : '';
+            return `${aliases.get(message.source)} ${arrow} ${aliases.get(message.target)}${label}`;
+        };
+        lines.push(...this.sequenceLines(ir.messages, messageLine, '', { alt: 'else', par: 'else' }));
+        return lines;
+    }
+
+    plantumlState(ir) {
+        const aliases = this.aliases(ir.nodes);
+        const children = this.children(ir.nodes);
+        const nodes = new Map(ir.nodes.map(node => [node.id, node]));
+        const scopedEdges = this.edgesByScope(ir.edges, nodes);
+        const lines = ['hide empty description'];
+
+        const block = (parentId, indent) => {
+            (children.get(parentId) || []).forEach(node => {
+                const alias = aliases.get(node.id);
+                if (node.kind === 'initial' || node.kind === 'final') {
+                    return;
+                }
+                if (['choice', 'decision', 'merge', 'fork', 'join'].includes(node.kind)) {
+                    const marker = { decision: 'choice', merge: 'choice' }[node.kind] || node.kind;
+                    lines.push(`${indent}state ${alias} <<${marker}>>`);
+                    return;
+                }
+                const header = `${indent}state "${this.plantumlText(node.label)}" as ${alias}`;
+                if (children.has(node.id)) {
+                    lines.push(header + ' {');
+                    block(node.id, indent + '  ');
+                    lines.push(`${indent}}`);
+                } else {
+                    lines.push(header);
+                }
+                node.operations.forEach(operation => {
+                    lines.push(`${indent}${alias} : ${this.plantumlText(operation)}`);
+                });
+            });
+            (scopedEdges.get(parentId) || []).forEach(edge => {
+                const source = this.isTerminal(nodes.get(edge.source)) ? '[*]' : aliases.get(edge.source);
+                const target = this.isTerminal(nodes.get(edge.target)) ? '[*]' : aliases.get(edge.target);
+                const label = edge.label ? ` : ${this.plantumlText(edge.label)}` : '';
+                lines.push(`${indent}${source} --> ${target}${label}`);
+            });
+        };
+
+        block('', '');
+        return lines;
+    }
+
+    plantumlGraph(ir, useCase) {
+        const aliases = this.aliases(ir.nodes);
+        const children = this.children(ir.nodes);
+        const lines = useCase ? ['left to right direction'] : [];
+
+        const block = (parentId, indent) => {
+            (children.get(parentId) || []).forEach(node => {
+                const alias = aliases.get(node.id);
+                let keyword = IR_PLANTUML_KEYWORDS[node.kind] || 'rectangle';
+                if (children.has(node.id) && !IR_PLANTUML_CONTAINER_KEYWORDS.has(keyword)) {
+                    keyword = 'rectangle';
+                }
+                const stereotype = node.stereotype || (node.kind === 'device' ? 'device' : '');
+                let header = `${indent}${keyword} "${this.plantumlText(node.label)}" as ${alias}`;
+                if (stereotype) {
+                    header += ` <<${this.plantumlText(stereotype)}>>`;
+                }
+                if (children.has(node.id)) {
+                    lines.push(header + ' {');
+                    block(node.id, indent + '  ');
+                    lines.push(`${indent}}`);
+                } else {
+                    lines.push(header);
+                }
+            });
+        };
+
+        block('', '');
+        ir.edges.forEach(edge => {
+            lines.push(this.relation(edge, aliases, IR_CLASS_ARROWS, text => this.plantumlText(text)));
+        });
+        return lines;
+    }
+
+    plantumlText(text) {
+        return text.replaceAll('"', "'").replaceAll('\n', '\\n');
+    }
+
+    plantumlMember(member) {
+        return member.replaceAll('\n', ' ').replaceAll('{', '(').replaceAll('}', ')');
+    }
+
+    // Draw.io
+
+    drawioGraph(ir, horizontal) {
+        const aliases = this.aliases(ir.nodes);
+        const children = this.children(ir.nodes);
+        const nodes = new Map(ir.nodes.map(node => [node.id, node]));
+        const sizes = new Map();
+        // Position relative to the parent cell; bend points relative to the scope's content area
+        const positions = new Map();
+        const waypoints = new Map();
+
+        // Lay out the children of scope with the edges between them (or their descendants)
+        const layout = (scope, padX, padY) => {
+            const group = children.get(scope);
+            group.forEach(node => sizes.set(node.id, measure(node)));
+            const edges = [];
+            ir.edges.forEach((edge, i) => {
+                const source = this.scopeChild(edge.source, scope, nodes);
+                const target = this.scopeChild(edge.target, scope, nodes);
+                if (source && target && source !== target) {
+                    // Keep generalizations pointing up: parents above their children
+                    edges.push(IR_UPWARD_EDGE_KINDS.has(edge.kind) ? [target, source, i] : [source, target, i]);
+                }
+            });
+            const result = diagramLayout.layered(group.map(node => node.id), sizes, edges, horizontal);
+            result.positions.forEach(([x, y], id) => positions.set(id, [x + padX, y + padY]));
+            edges.forEach(([upper, lower, i]) => {
+                const edge = ir.edges[i];
+                // Bend points only for edges drawn between these very nodes
+                const direct = (upper === edge.source && lower === edge.target)
+                    || (upper === edge.target && lower === edge.source);
+                if (result.waypoints.has(i) && direct) {
+                    let points = result.waypoints.get(i);
+                    if (upper !== edge.source) {
+                        points = [...points].reverse();
+                    }
+                    waypoints.set(i, [scope, points.map(([x, y]) => [x + padX, y + padY])]);
+                }
+            });
+            return [result.width + padX * 2, result.height + padY + IR_LAYOUT.CONTAINER_PADDING];
+        };
+
+        const measure = node => {
+            if (!children.has(node.id)) {
+                return this.leafSize(node);
+            }
+            const [width, height] = layout(node.id, IR_LAYOUT.CONTAINER_PADDING, IR_LAYOUT.CONTAINER_HEADER);
+            return [Math.max(width, (IR_DRAWIO_SIZES[node.kind] || [160, 80])[0]), height];
+        };
+
+        layout('', 40, 40);
+
+        const cells = [];
+        // Top-left corner of each scope, to turn relative bend points into absolute ones
+        const origins = new Map([['', [0, 0]]]);
+        const emit = (node, parent) => {
+            const alias = aliases.get(node.id);
+            const [x, y] = positions.get(node.id);
+            const [width, height] = sizes.get(node.id);
+            const [parentX, parentY] = origins.get(node.parent);
+            origins.set(node.id, [parentX + x, parentY + y]);
+            const geometry = `<mxGeometry x="${x}" y="${y}" width="${width}" height="${height}" as="geometry"/>`;
+            if (IR_CLASS_KINDS.has(node.kind) && node.kind !== 'object') {
+                cells.push(...this.drawioClass(node, alias, parent, geometry, width));
+            } else {
+                let style = IR_DRAWIO_STYLES[node.kind] || IR_DRAWIO_STYLES.component;
+                if (children.has(node.id)) {
+                    style += 'container=1;';
+                }
+                cells.push(
+                    `<mxCell id="${alias}" value=${this.quoteAttr(this.drawioLabel(node))} style="${style}" vertex="1" `
+                    + `parent="${parent}">${geometry}</mxCell>`
+                );
+            }
+            (children.get(node.id) || []).forEach(child => emit(child, alias));
+        };
+
+        (children.get('') || []).forEach(node => emit(node, '1'));
+
+        ir.edges.forEach((edge, i) => {
+            const label = edge.label || IR_EDGE_DEFAULT_LABELS[edge.kind] || '';
+            cells.push(
+                `<mxCell id="e${i}" value=${this.quoteAttr(label)} style="${IR_DRAWIO_EDGE_STYLES[edge.kind]}" edge="1" `
+                + `parent="1" source="${aliases.get(edge.source)}" target="${aliases.get(edge.target)}">`
+                + `<mxGeometry relative="1" as="geometry">${this.drawioPoints(waypoints.get(i), origins)}</mxGeometry></mxCell>`
+            );
+            [['source_label', -1], ['target_label', 1]].forEach(([end, x]) => {
+                if (edge[end]) {
+                    const align = x < 0 ? 'left' : 'right';
+                    cells.push(
+                        `<mxCell id="e${i}-${end[0]}" value=${this.quoteAttr(edge[end])} `
+                        + `style="edgeLabel;resizable=0;html=0;align=${align};verticalAlign=bottom;" vertex="1" `
+                        + `connectable="0" parent="e${i}"><mxGeometry x="${x}" relative="1" as="geometry"/></mxCell>`
+                    );
+                }
+            });
+        });
+        return cells;
+    }
+
+    drawioClass(node, alias, parent, geometry, width) {
+        let y = IR_LAYOUT.HEADER_HEIGHT + (this.stereotype(node) ? IR_LAYOUT.ROW_HEIGHT : 0);
+        const cells = [
+            `<mxCell id="${alias}" value=${this.quoteAttr(this.drawioLabel(node))} style="${IR_DRAWIO_CLASS_STYLE}startSize=${y};" `
+            + `vertex="1" parent="${parent}">${geometry}</mxCell>`
+        ];
+        [['attributes', node.attributes], ['operations', node.operations]].forEach(([suffix, members]) => {
+            if (suffix === 'operations') {
+                cells.push(
+                    `<mxCell id="${alias}-line" value="" style="line;strokeWidth=1;html=0;" vertex="1" parent="${alias}">`
+                    + `<mxGeometry y="${y}" width="${width}" height="8" as="geometry"/></mxCell>`
+                );
+                y += 8;
+            }
+            const height = Math.max(1, members.length) * IR_LAYOUT.ROW_HEIGHT;
+            cells.push(
+                `<mxCell id="${alias}-${suffix}" value=${this.quoteAttr(members.join('\n'))} style="${IR_DRAWIO_MEMBER_STYLE}" `
+                + `vertex="1" parent="${alias}"><mxGeometry y="${y}" width="${width}" height="${height}" as="geometry"/></mxCell>`
+            );
+            y += height;
+        });
+        return cells;
+    }
+
+    drawioSequence(ir) {
+        const aliases = this.aliases(ir.nodes);
+        const messages = ir.messages;
+        const centers = new Map();
+        const height = 80 + IR_LAYOUT.MESSAGE_SPACING * (messages.length + 1);
+        const cells = [];
+        ir.nodes.forEach((node, i) => {
+            const x = 40 + i * IR_LAYOUT.LIFELINE_SPACING;
+            centers.set(node.id, x + 60);
+            let style = 'shape=umlLifeline;perimeter=lifelinePerimeter;container=1;collapsible=0;recursiveResize=0;html=0;';
+            if (node.kind === 'actor') {
+                style += 'participant=umlActor;verticalLabelPosition=bottom;verticalAlign=top;';
+            }
+            cells.push(
+                `<mxCell id="${aliases.get(node.id)}" value=${this.quoteAttr(node.label)} style="${style}" vertex="1" parent="1">`
+                + `<mxGeometry x="${x}" y="40" width="120" height="${height}" as="geometry"/></mxCell>`
+            );
+        });
+
+        messages.forEach((message, i) => {
+            const y = 120 + i * IR_LAYOUT.MESSAGE_SPACING;
+            const source = centers.get(message.source);
+            const target = centers.get(message.target);
+            let points = `<mxPoint x="${source}" y="${y}" as="sourcePoint"/>`;
+            if (source === target) {
+                points += `<Array as="points"><mxPoint x="${source + 40}" y="${y}"/><mxPoint x="${source + 40}" y="${y + 20}"/></Array>`;
+                points += `<mxPoint x="${target}" y="${y + 20}" as="targetPoint"/>`;
+            } else {
+                points += `<mxPoint x="${target}" y="${y}" as="targetPoint"/>`;
+            }
+            cells.push(
+                `<mxCell id="m${i}" value=${this.quoteAttr(message.label)} style="${IR_DRAWIO_MESSAGE_STYLES[message.kind]}" `
+                + `edge="1" parent="1"><mxGeometry relative="1" as="geometry">${points}</mxGeometry></mxCell>`
+            );
+        });
+
+        this.fragmentBlocks(messages).forEach((frame, j) => {
+            const xs = [];
+            for (let i = frame.first; i <= frame.last; i++) {
+                xs.push(centers.get(messages[i].source), centers.get(messages[i].target));
+            }
+            const left = Math.min(...xs) - 70;
+            const right = Math.max(...xs) + 70;
+            const top = 120 + frame.first * IR_LAYOUT.MESSAGE_SPACING - 30;
+            const bottom = 120 + frame.last * IR_LAYOUT.MESSAGE_SPACING + 30;
+            const guard = frame.guards[0][1];
+            const label = frame.fragment + (guard ? ` [${guard}]` : '');
+            cells.push(
+                `<mxCell id="f${j}" value=${this.quoteAttr(label)} style="shape=umlFrame;whiteSpace=wrap;html=0;width=120;height=24;" `
+                + `vertex="1" parent="1"><mxGeometry x="${left}" y="${top}" width="${right - left}" height="${bottom - top}" `
+                + 'as="geometry"/></mxCell>'
+            );
+            frame.guards.slice(1).forEach(([index, branchGuard], k) => {
+                const y = 120 + index * IR_LAYOUT.MESSAGE_SPACING - 20;
+                cells.push(
+                    `<mxCell id="f${j}-${k}" value=${this.quoteAttr(branchGuard ? `[${branchGuard}]` : '')} `
+                    + 'style="line;dashed=1;align=left;verticalAlign=bottom;html=0;" vertex="1" parent="1">'
+                    + `<mxGeometry x="${left}" y="${y}" width="${right - left}" height="10" as="geometry"/></mxCell>`
+                );
+            });
+        });
+        return cells;
+    }
+
+    drawioPoints(waypoints, origins) {
+        if (!waypoints) {
+            return '';
+        }
+        const [scope, points] = waypoints;
+        const [originX, originY] = origins.get(scope);
+        return '<Array as="points">'
+            + points.map(([x, y]) => `<mxPoint x="${originX + x}" y="${originY + y}"/>`).join('')
+            + '</Array>';
+    }
+
+    /**
+     * The ancestor of a node (or the node itself) that is a direct child of scope, or ''
+     */
+    scopeChild(nodeId, scope, nodes) {
+        while (nodeId) {
+            const parent = nodes.get(nodeId).parent;
+            if (parent === scope) {
+                return nodeId;
+            }
+            nodeId = parent;
+        }
+        return '';
+    }
+
+    leafSize(node) {
+        if (IR_CLASS_KINDS.has(node.kind)) {
+            const lines = [node.label, ...node.attributes, ...node.operations];
+            const longest = Math.max(...lines.map(line => Array.from(line).length));
+            const width = Math.min(320, Math.max(140, longest * IR_LAYOUT.CHAR_WIDTH + 24));
+            if (node.kind === 'object') {
+                return [width, IR_LAYOUT.HEADER_HEIGHT + IR_LAYOUT.ROW_HEIGHT * node.attributes.length + 8];
+            }
+            const rows = Math.max(1, node.attributes.length) + Math.max(1, node.operations.length);
+            return [width, IR_LAYOUT.HEADER_HEIGHT + (this.stereotype(node) ? IR_LAYOUT.ROW_HEIGHT : 0)
+                + IR_LAYOUT.ROW_HEIGHT * rows + 8];
+        }
+        return IR_DRAWIO_SIZES[node.kind] || [160, 60];
+    }
+
+    drawioLabel(node) {
+        if (node.kind === 'object') {
+            const label = node.stereotype ? `${node.label} : ${node.stereotype}` : node.label;
+            return [label, ...node.attributes].join('\n');
+        }
+        if (['initial', 'final', 'fork', 'join'].includes(node.kind)) {
+            return '';
+        }
+        return this.titled(node);
+    }
+
+    /**
+     * Same output as Python's xml.sax.saxutils.quoteattr
+     */
+    quoteAttr(text) {
+        let data = text.replaceAll('&', '&amp;').replaceAll('<', '&lt;').replaceAll('>', '&gt;')
+            .replaceAll('\n', '&#10;').replaceAll('\r', '&#13;').replaceAll('\t', '&#9;');
+        if (data.includes('"')) {
+            if (data.includes("'")) {
+                return `"${data.replaceAll('"', '&quot;')}"`;
+            }
+            return `'${data}'`;
+        }
+        return `"${data}"`;
+    }
+
+    // Shared helpers
+
+    /**
+     * Group consecutive messages of the same fragment into blocks; a new guard
+     * inside an alt or par block starts a branch, in a loop or opt a new block
+     */
+    fragmentBlocks(messages) {
+        const blocks = [];
+        let current = null;
+        messages.forEach((message, i) => {
+            const { fragment, guard } = message;
+            if (!fragment) {
+                current = null;
+                return;
+            }
+            if (current && current.fragment === fragment) {
+                if (guard !== current.guards[current.guards.length - 1][1]) {
+                    if (fragment === 'alt' || fragment === 'par') {
+                        current.guards.push([i, guard]);
+                    } else {
+                        current = null;
+                    }
+                }
+            } else {
+                current = null;
+            }
+            if (!current) {
+                current = { fragment, first: i, guards: [[i, guard]] };
+                blocks.push(current);
+            }
+            current.last = i;
+        });
+        return blocks;
+    }
+
+    /**
+     * Message lines wrapped in fragment blocks for the text formats
+     */
+    sequenceLines(messages, messageLine, indent, separators) {
+        const openings = new Map();
+        const ends = new Set();
+        this.fragmentBlocks(messages).forEach(block => {
+            openings.set(block.first, `${block.fragment} ${block.guards[0][1]}`.trimEnd());
+            block.guards.slice(1).forEach(([index, guard]) => {
+                openings.set(index, `${separators[block.fragment]} ${guard}`.trimEnd());
+            });
+            ends.add(block.last);
+        });
+
+        const lines = [];
+        messages.forEach((message, i) => {
+            if (openings.has(i)) {
+                lines.push(indent + openings.get(i));
+            }
+            const inner = message.fragment ? indent + '    ' : indent;
+            lines.push(inner + messageLine(message));
+            if (ends.has(i)) {
+                lines.push(indent + 'end');
+            }
+        });
+        return lines;
+    }
+
+    /**
+     * State transitions grouped by the composite state whose block must contain them
+     */
+    edgesByScope(edges, nodes) {
+        const scoped = new Map();
+        edges.forEach(edge => {
+            const source = nodes.get(edge.source);
+            const target = nodes.get(edge.target);
+            let scope;
+            if (this.isTerminal(source)) {
+                scope = source.parent;
+            } else if (this.isTerminal(target)) {
+                scope = target.parent;
+            } else {
+                scope = source.parent === target.parent ? source.parent : '';
+            }
+            if (!scoped.has(scope)) {
+                scoped.set(scope, []);
+            }
+            scoped.get(scope).push(edge);
+        });
+        return scoped;
+    }
+
+    relation(edge, aliases, arrows, escape) {
+        const sourceLabel = edge.source_label ? ` "${escape(edge.source_label)}"` : '';
+        const targetLabel = edge.target_label ? `"${escape(edge.target_label)}" ` : '';
+        let label = edge.label || IR_EDGE_DEFAULT_LABELS[edge.kind] || '';
+        label = label ? ` : ${escape(label)}` : '';
+        return `${aliases.get(edge.source)}${sourceLabel} ${arrows[edge.kind]} ${targetLabel}`
+            + `${aliases.get(edge.target)}${label}`;
+    }
+
+    /**
+     * Identifier that every format accepts for each node id
+     */
+    aliases(nodes) {
+        const aliases = new Map();
+        const used = new Set();
+        nodes.forEach(node => {
+            let alias = node.id.replace(/[^A-Za-z0-9_]/g, '_') || 'n';
+            if (/^[0-9]/.test(alias)) {
+                alias = 'n' + alias;
+            }
+            if (IR_RESERVED_IDS.has(alias.toLowerCase())) {
+                alias += '_';
+            }
+            let candidate = alias;
+            let suffix = 2;
+            while (used.has(candidate.toLowerCase())) {
+                candidate = `${alias}_${suffix}`;
+                suffix++;
+            }
+            used.add(candidate.toLowerCase());
+            aliases.set(node.id, candidate);
+        });
+        return aliases;
+    }
+
+    children(nodes) {
+        const children = new Map();
+        nodes.forEach(node => {
+            if (!children.has(node.parent)) {
+                children.set(node.parent, []);
+            }
+            children.get(node.parent).push(node);
+        });
+        return children;
+    }
+
+    descendants(node, children) {
+        const result = [];
+        (children.get(node.id) || []).forEach(child => {
+            result.push(child, ...this.descendants(child, children));
+        });
+        return result;
+    }
+
+    isTerminal(node) {
+        return node.kind === 'initial' || node.kind === 'final';
+    }
+
+    stereotype(node) {
+        return node.stereotype || IR_KIND_STEREOTYPES[node.kind] || '';
+    }
+
+    /**
+     * Kind shown as stereotype for a node that is not a class in a class diagram
+     */
+    foreignKind(node) {
+        return IR_CLASS_KINDS.has(node.kind) || IR_CONTAINER_KINDS.has(node.kind) ? '' : node.kind;
+    }
+
+    /**
+     * Label with its stereotype on a line of its own
+     */
+    titled(node) {
+        const stereotype = this.stereotype(node);
+        if (stereotype && !['actor', 'usecase', 'interface'].includes(node.kind)) {
+            return `«${stereotype}»\n${node.label}`;
+        }
+        return node.label;
+    }
+}
+
+// Create global instance
+const irConverter = new IRConverter();
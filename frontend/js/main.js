@@ -4,6 +4,8 @@ class UMLDiagramApp {
     constructor() {
         this.isGenerating = false;
         this.currentResult = null;
+        // Request and manifest behind the current partition overview
+        this.partitionContext = null;
     }
 
     /**
@@ -73,6 +75,7 @@ class UMLDiagramApp {
         // Form change handlers
         document.getElementById('output-format').addEventListener('change', () => {
             this.updateFormatDescription();
+            this.convertCurrentResult();
         });
 
         document.getElementById('diagram-type').addEventListener('change', () => {
@@ -159,9 +162,16 @@ class UMLDiagramApp {
             
             // Build API request
             const request = apiClient.buildRequest(formData, files);
+            this.partitionContext = { request, manifest: fileHandler.getManifest(), forceRefresh: formData.forceRefresh };
             
-            // Call API
-            const result = await apiClient.generateDiagram(request);
+            // Call API (or reuse the cached result for the same files and options)
+            const result = await apiClient.generateDiagramCached(request, fileHandler.getManifest(), {
+                forceRefresh: formData.forceRefresh
+            });
+            
+            if (result.fromCache) {
+                this.showTemporaryMessage('Resultado recuperado de la caché local');
+            }
             
             // Handle response
             await this.handleGenerationResult(result);
@@ -195,8 +205,10 @@ class UMLDiagramApp {
                 diagram_type: formData.diagramType,
                 output_format: formData.outputFormat,
                 analysis_method: formData.analysisMethod,
-                filters: {}
+                filters: apiClient.buildFilters(formData)
             };
+            // No manifest for remote sources, so partitions are not cached locally
+            this.partitionContext = { request, manifest: null, forceRefresh: true };
             
             const result = await apiClient.generateDiagram(request);
             await this.handleGenerationResult(result);
@@ -214,7 +226,10 @@ class UMLDiagramApp {
         return {
             analysisMethod: document.querySelector('input[name="analysis-method"]:checked').value,
             outputFormat: document.getElementById('output-format').value,
-            diagramType: document.getElementById('diagram-type').value
+            diagramType: document.getElementById('diagram-type').value,
+            forceRefresh: document.getElementById('force-refresh-checkbox').checked,
+            partition: document.getElementById('partition-checkbox').checked,
+            focus: document.getElementById('focus-input').value.trim()
         };
     }
 
@@ -237,6 +252,9 @@ class UMLDiagramApp {
         // Update metadata view
         this.updateMetadataView(result.metadata);
 
+        // Update partition navigation
+        this.updatePartitionNav(result.metadata);
+
         // Render diagram
         await diagramRenderer.renderDiagram(result.diagram_code, result.format);
 
@@ -246,6 +264,89 @@ class UMLDiagramApp {
         console.log('Diagram generated successfully');
     }
 
+    /**
+     * Redraw the current result in the selected format from its IR, without a new request
+     */
+    async convertCurrentResult() {
+        const format = document.getElementById('output-format').value;
+        if (this.isGenerating || !irConverter.canConvert(this.currentResult) || this.currentResult.format === format) {
+            return;
+        }
+
+        try {
+            this.currentResult = irConverter.convertResult(this.currentResult, format);
+            this.updateCodeView(this.currentResult.diagram_code);
+            await diagramRenderer.renderDiagram(this.currentResult.diagram_code, format);
+            this.showTemporaryMessage('Formato convertido localmente');
+        } catch (error) {
+            console.error('Format conversion error:', error);
+            this.showError(`No se pudo convertir el diagrama: ${error.message}`);
+        }
+    }
+
+    /**
+     * Show the partition list of an overview or partition result
+     */
+    updatePartitionNav(metadata) {
+        const nav = document.getElementById('partition-nav');
+        const partitions = metadata.partitions || metadata.partition;
+
+        if (!partitions || !this.partitionContext) {
+            nav.style.display = 'none';
+            nav.innerHTML = '';
+            return;
+        }
+
+        const activeId = metadata.partition ? metadata.partition.id : null;
+        nav.innerHTML = '';
+
+        const overviewBtn = document.createElement('button');
+        overviewBtn.className = 'partition-btn' + (activeId ? '' : ' active');
+        overviewBtn.textContent = '🗺️ Vista general';
+        overviewBtn.addEventListener('click', () => this.openPartition(null));
+        nav.appendChild(overviewBtn);
+
+        partitions.index.forEach(entry => {
+            const btn = document.createElement('button');
+            btn.className = 'partition-btn' + (entry.id === activeId ? ' active' : '');
+            btn.textContent = `${entry.title} (${entry.file_count})`;
+            btn.title = entry.files.join('\n');
+            btn.addEventListener('click', () => this.openPartition(entry.id));
+            nav.appendChild(btn);
+        });
+
+        nav.style.display = 'flex';
+    }
+
+    /**
+     * Generate one partition (or the overview again); each one is cached separately
+     */
+    async openPartition(partitionId) {
+        if (this.isGenerating || !this.partitionContext) {
+            return;
+        }
+
+        const { request, manifest, forceRefresh } = this.partitionContext;
+        const filters = { ...request.filters, partition: request.filters.partition || true };
+        delete filters.partition_id;
+        if (partitionId) {
+            filters.partition_id = partitionId;
+        }
+
+        try {
+            this.setGeneratingState(true);
+            this.hideError();
+
+            const result = await apiClient.generateDiagramCached({ ...request, filters }, manifest, { forceRefresh });
+            await this.handleGenerationResult(result);
+        } catch (error) {
+            console.error('Partition generation error:', error);
+            this.showError(error.message);
+        } finally {
+            this.setGeneratingState(false);
+        }
+    }
+
     /**
      * Set generating state
      */
@@ -315,6 +416,10 @@ class UMLDiagramApp {
         
         let html = '<h4>Información de Generación</h4>';
         
+        if (this.currentResult && this.currentResult.fromCache) {
+            html += '<p><strong>Origen:</strong> caché local del navegador</p>';
+        }
+        
         if (metadata.source) {
             html += `<p><strong>Fuente:</strong> ${metadata.source.type || 'Archivos locales'}</p>`;
         }
@@ -327,6 +432,21 @@ class UMLDiagramApp {
             html += `<p><strong>Método de análisis:</strong> ${metadata.analysis_method}</p>`;
         }
         
+        if (metadata.partitions && metadata.partitions.partition_count) {
+            html += `<p><strong>Paquetes:</strong> ${metadata.partitions.partition_count}</p>`;
+        }
+        
+        if (metadata.partition) {
+            html += `<p><strong>Paquete:</strong> ${this.escapeHtml(metadata.partition.title)}</p>`;
+        }
+        
+        if (metadata.focus) {
+            const focusText = metadata.focus.matched
+                ? `${metadata.focus.files_out} de ${metadata.focus.files_in} archivos`
+                : 'sin coincidencias, se analizó todo';
+            html += `<p><strong>Enfoque:</strong> ${this.escapeHtml(metadata.focus.query)} (${focusText})</p>`;
+        }
+        
         if (metadata.llm_provider) {
             html += `<p><strong>Proveedor LLM:</strong> ${metadata.llm_provider}</p>`;
         }
@@ -0,0 +1,25 @@
+// Web Worker that encodes rendered diagrams to PNG/JPEG with OffscreenCanvas
+
+/**
+ * Each message is { taskId, bitmap, type, background }; the ImageBitmap is
+ * transferred, drawn and encoded here so the main thread only decodes the SVG.
+ */
+self.onmessage = async (event) => {
+    const { taskId, bitmap, type, background } = event.data;
+
+    try {
+        const canvas = new OffscreenCanvas(bitmap.width, bitmap.height);
+        const ctx = canvas.getContext('2d');
+        if (background) {
+            ctx.fillStyle = background;
+            ctx.fillRect(0, 0, canvas.width, canvas.height);
+        }
+        ctx.drawImage(bitmap, 0, 0);
+        bitmap.close();
+
+        const blob = await canvas.convertToBlob({ type });
+        self.postMessage({ taskId, blob });
+    } catch (error) {
+        self.postMessage({ taskId, error: error.message || String(error) });
+    }
+};
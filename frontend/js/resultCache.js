@@ -0,0 +1,169 @@
+// Browser-side cache of generated diagrams, backed by IndexedDB
+
+class ResultCache {
+    constructor() {
+        this.dbPromise = null;
+    }
+
+    /**
+     * Open (and create on first use) the database; resolves to null when unavailable
+     */
+    open() {
+        if (this.dbPromise) {
+            return this.dbPromise;
+        }
+
+        this.dbPromise = new Promise((resolve) => {
+            if (typeof indexedDB === 'undefined') {
+                resolve(null);
+                return;
+            }
+
+            const request = indexedDB.open(CONFIG.CACHE.DB_NAME, 1);
+
+            request.onupgradeneeded = () => {
+                const store = request.result.createObjectStore(CONFIG.CACHE.STORE, { keyPath: 'key' });
+                store.createIndex('lastUsed', 'lastUsed');
+            };
+            request.onsuccess = () => resolve(request.result);
+            request.onerror = () => {
+                console.warn('Result cache unavailable:', request.error);
+                resolve(null);
+            };
+        });
+
+        return this.dbPromise;
+    }
+
+    /**
+     * Cache key for a selection manifest and the request options, or null if the
+     * manifest could not be hashed. The output format is not part of the key:
+     * results carrying an IR are converted to the requested format on read
+     */
+    async buildKey(manifest, request) {
+        if (!manifest || !manifest.hash || !window.crypto || !window.crypto.subtle) {
+            return null;
+        }
+
+        const options = JSON.stringify({
+            version: CONFIG.CACHE.VERSION,
+            manifest: manifest.hash,
+            diagram_type: request.diagram_type,
+            analysis_method: request.analysis_method,
+            filters: request.filters || {}
+        });
+        const digest = await window.crypto.subtle.digest('SHA-256', new TextEncoder().encode(options));
+        return Array.from(new Uint8Array(digest), byte => byte.toString(16).padStart(2, '0')).join('');
+    }
+
+    /**
+     * Get a cached result and mark it as recently used
+     */
+    async get(key) {
+        const db = await this.open();
+        if (!db || !key) {
+            return null;
+        }
+
+        try {
+            const entry = await this.runRequest(db, 'readonly', store => store.get(key));
+            if (!entry) {
+                return null;
+            }
+
+            entry.lastUsed = Date.now();
+            await this.runRequest(db, 'readwrite', store => store.put(entry));
+            return entry.result;
+        } catch (error) {
+            console.warn('Result cache read failed:', error);
+            return null;
+        }
+    }
+
+    /**
+     * Store a result, then evict least recently used entries over the size limit
+     */
+    async put(key, result) {
+        const db = await this.open();
+        if (!db || !key) {
+            return;
+        }
+
+        const size = JSON.stringify(result).length;
+        if (size > CONFIG.CACHE.MAX_BYTES) {
+            return;
+        }
+
+        try {
+            await this.runRequest(db, 'readwrite', store => store.put({
+                key,
+                result,
+                size,
+                lastUsed: Date.now()
+            }));
+            await this.evict(db);
+        } catch (error) {
+            console.warn('Result cache write failed:', error);
+        }
+    }
+
+    /**
+     * Remove every cached result
+     */
+    async clear() {
+        const db = await this.open();
+        if (db) {
+            await this.runRequest(db, 'readwrite', store => store.clear());
+        }
+    }
+
+    /**
+     * Walk entries from most to least recently used and delete the tail that
+     * exceeds MAX_BYTES or MAX_ENTRIES
+     */
+    evict(db) {
+        return new Promise((resolve, reject) => {
+            const transaction = db.transaction(CONFIG.CACHE.STORE, 'readwrite');
+            const cursorRequest = transaction.objectStore(CONFIG.CACHE.STORE).index('lastUsed').openCursor(null, 'prev');
+            let totalBytes = 0;
+            let count = 0;
+
+            cursorRequest.onsuccess = () => {
+                const cursor = cursorRequest.result;
+                if (!cursor) {
+                    return;
+                }
+
+                totalBytes += cursor.value.size;
+                count++;
+                if (totalBytes > CONFIG.CACHE.MAX_BYTES || count > CONFIG.CACHE.MAX_ENTRIES) {
+                    cursor.delete();
+                }
+                cursor.continue();
+            };
+
+            transaction.oncomplete = () => resolve();
+            transaction.onerror = () => reject(transaction.error);
+        });
+    }
+
+    /**
+     * Run a single store request in its own transaction
+     */
+    runRequest(db, mode, operation) {
+        return new Promise((resolve, reject) => {
+            const transaction = db.transaction(CONFIG.CACHE.STORE, mode);
+            const request = operation(transaction.objectStore(CONFIG.CACHE.STORE));
+            let value;
+
+            request.onsuccess = () => {
+                value = request.result;
+            };
+            transaction.oncomplete = () => resolve(value);
+            transaction.onerror = () => reject(transaction.error);
+        });
+    }
+}
+
+// Create global instance
+const resultCache = new ResultCache();